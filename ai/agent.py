@@ -10,6 +10,7 @@ from datetime import datetime
 from config.settings import OPENAI_CONFIG, PROPERTY_TYPES
 from database.manager import get_database
 from utils.helpers import parse_search_query, calculate_property_score
+from search.ranking import top_k
 
 logger = logging.getLogger(__name__)
 
@@ -120,10 +121,9 @@ class ImoMatchAI:
                     'cons': self._extract_cons(prop, user_preferences)
                 })
             
-            # Trier par score de recommandation
-            explained_properties.sort(key=lambda x: x['recommendation_score'], reverse=True)
-            
-            return explained_properties[:5]  # Top 5
+            # Top 5 par score de recommandation
+            return top_k(explained_properties, 5, lambda x: x['recommendation_score'],
+                         listing=lambda x: x['property'])
             
         except Exception as e:
             logger.error(f"Erreur recommandations IA: {e}")
@@ -1,19 +1,26 @@
 """Module d'authentification pour ImoMatch"""
 import streamlit as st
 import hashlib
-import sqlite3
 from datetime import datetime, timedelta
 import os
 
+from config.settings import DATABASE_CONFIG
+from database.pool import connect_sqlite
+
 class AuthManager:
     def __init__(self, db_path="imomatch.db"):
         self.db_path = db_path
+        self.pragmas = DATABASE_CONFIG["sqlite"].get("pragmas", {})
         self.init_auth_tables()
     
+    def _connect(self, readonly=False):
+        """Ouvre une connexion avec le profil de pragmas partagé (WAL, busy_timeout)"""
+        return connect_sqlite(self.db_path, self.pragmas, readonly=readonly)
+    
     def init_auth_tables(self):
         """Initialise les tables d'authentification"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -53,7 +60,7 @@ class AuthManager:
     def login(self, email, password):
         """Connecte un utilisateur"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect(readonly=True)
             cursor = conn.cursor()
             
             password_hash = self.hash_password(password)
@@ -92,7 +99,7 @@ class AuthManager:
     def register(self, user_data):
         """Inscrit un nouvel utilisateur"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             # Vérifier si l'email existe déjà
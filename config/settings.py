@@ -96,14 +96,79 @@ STREAMLIT_CONFIG = {
 DATABASE_CONFIG = {
     "sqlite": {
         "path": "imomatch.db",
-        "check_same_thread": False
+        "check_same_thread": False,
+        # Profil de pragmas appliqué à chaque connexion
+        "pragmas": {
+            "journal_mode": os.getenv("DB_JOURNAL_MODE", "WAL"),
+            "synchronous": os.getenv("DB_SYNCHRONOUS", "NORMAL"),
+            "mmap_size": 268435456,       # 256 Mo
+            "cache_size": -65536,         # Négatif = en Kio (64 Mo)
+            "temp_store": "MEMORY",
+            "busy_timeout": 5000          # ms
+        },
+        # Requêtes préparées conservées par connexion, et formes de recherche
+        # compilées (database.search_query)
+        "statement_cache_size": 512,
+        # Connexions de lecture (recherches, statistiques)
+        "pool": {
+            "max_size": int(os.getenv("DB_POOL_SIZE", "8")),
+            "min_size": 1,
+            "timeout": 10.0,              # Attente max d'une connexion (s)
+            "max_idle_time": 300.0,       # Éviction après 5 min d'inactivité
+            "health_check_interval": 30.0
+        },
+        # Connexion d'écriture unique : SQLite n'accepte qu'un écrivain à la fois
+        "write_pool": {
+            "max_size": 1,
+            "min_size": 1,
+            "timeout": 30.0,
+            "max_idle_time": 300.0,
+            "health_check_interval": 30.0
+        }
+    },
+    # Cache des pages de recherche (database.result_cache), invalidé par les
+    # écritures du processus et, pour les autres, par le journal des modifications
+    "result_cache": {
+        "enabled": os.getenv("DB_RESULT_CACHE", "1") != "0",
+        "max_bytes": int(os.getenv("DB_RESULT_CACHE_MB", "64")) * 1024 * 1024,
+        "ttl": 300.0,                     # Secondes
+        "log_check_interval": 1.0,        # Secondes entre deux lectures du journal
+        "max_changes_per_invalidation": 1000
+    },
+    # Journal des modifications des annonces (database.change_log)
+    "change_log": {
+        "retention_seconds": float(os.getenv("DB_CHANGE_LOG_RETENTION_DAYS", "7")) * 86400,
+        "read_batch_size": 1000           # Entrées par lecture d'un consommateur
+    },
+    # Historique des recherches (database.search_events) et préférences en mémoire (search.history)
+    "search_history": {
+        "max_events_per_user": int(os.getenv("SEARCH_HISTORY_PER_USER", "200")),
+        "max_pattern_values": 20,         # Valeurs les plus fréquentes par compteur
+        "recent_queries": 5,
+        "cache_users": 1000               # Utilisateurs dont les préférences restent en mémoire
+    },
+    # Façade asyncio (database.async_manager) : pool de threads et file bornée
+    "async": {
+        "max_workers": None,              # Par défaut : taille des pools de connexions
+        "max_pending": int(os.getenv("DB_ASYNC_MAX_PENDING", "64")),
+        "queue_timeout": 10.0             # Attente max d'une place dans la file (s)
     },
     "postgresql": {
         "host": os.getenv("DB_HOST", "localhost"),
         "port": os.getenv("DB_PORT", "5432"),
         "database": os.getenv("DB_NAME", "imomatch"),
         "user": os.getenv("DB_USER", "postgres"),
-        "password": os.getenv("DB_PASSWORD", "")
+        "password": os.getenv("DB_PASSWORD", ""),
+        # database.postgres.PostgresDatabaseManager
+        "options": {
+            "pool": {
+                "min_size": 1,
+                "max_size": int(os.getenv("DB_POOL_SIZE", "8")),
+                "timeout": 10.0
+            },
+            "prepared_statements_max": 256,   # Formes de requête préparées par connexion
+            "export_batch_size": 2000         # Lignes par aller-retour des curseurs serveur
+        }
     }
 }
 
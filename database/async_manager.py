@@ -0,0 +1,190 @@
+"""
+Accès asynchrone à la base pour asyncio (routes async, tâches périodiques)
+Les appels bloquants de DatabaseManager s'exécutent sur un pool de threads
+dédié, derrière une file d'attente bornée
+"""
+import asyncio
+import functools
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config.settings import DATABASE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXECUTOR_CONFIG = {
+    'max_workers': None,      # Par défaut : connexions de lecture + d'écriture
+    'max_pending': 64,        # Appels admis (en cours + en attente d'un thread)
+    'queue_timeout': 10.0,    # Attente max d'une place dans la file (s)
+}
+
+
+class DatabaseBusyError(Exception):
+    """La file d'attente des appels base est restée pleine dans le délai imparti"""
+    pass
+
+
+class AsyncDatabaseManager:
+    """
+    Façade asyncio d'un DatabaseManager
+
+    Chaque méthode publique du gestionnaire synchrone est disponible sous
+    forme de coroutine de même nom et de même signature :
+
+        adb = AsyncDatabaseManager()
+        page = await adb.search_properties_page(filters, limit=20)
+
+    Les appels indépendants peuvent être lancés en parallèle avec gather().
+    Le pool de threads est dimensionné sur les pools de connexions : un
+    thread de plus ne ferait qu'attendre une connexion. Au-delà de
+    max_pending appels admis, les suivants attendent une place puis lèvent
+    DatabaseBusyError : la charge est refusée au lieu de s'accumuler.
+    """
+
+    def __init__(self, db=None, max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, queue_timeout: Optional[float] = None):
+        """
+        Args:
+            db: DatabaseManager synchrone (par défaut l'instance globale)
+            max_workers: Nombre de threads d'exécution
+            max_pending: Taille de la file (appels en cours + en attente)
+            queue_timeout: Attente maximale d'une place dans la file (secondes)
+        """
+        if db is None:
+            from database.manager import get_database
+            db = get_database()
+        self.db = db
+
+        config = dict(DEFAULT_EXECUTOR_CONFIG, **DATABASE_CONFIG.get('async', {}))
+        if max_workers is None:
+            max_workers = config['max_workers'] or self._default_workers(db)
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(self.max_workers, max_pending or config['max_pending'])
+        self.queue_timeout = queue_timeout if queue_timeout is not None else config['queue_timeout']
+
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='imomatch-db')
+
+        # Un sémaphore asyncio par boucle d'événements (une boucle par thread
+        # de serveur ou par tâche périodique)
+        self._slots = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._metrics = {'calls': 0, 'rejected': 0, 'pending': 0, 'max_pending_seen': 0}
+        self._methods = {}
+
+    @staticmethod
+    def _default_workers(db) -> int:
+        workers = 0
+        for pool_name in ('read_pool', 'write_pool'):
+            pool = getattr(db, pool_name, None)
+            workers += getattr(pool, 'max_size', 0)
+        return workers or 4
+
+    def __getattr__(self, name: str) -> Callable[..., Awaitable[Any]]:
+        """Coroutine équivalente à la méthode publique name du gestionnaire"""
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        method = self._methods.get(name)
+        if method is None:
+            target = getattr(self.db, name)
+            if not callable(target):
+                raise AttributeError(f"{name} n'est pas une méthode de {type(self.db).__name__}")
+
+            @functools.wraps(target)
+            async def method(*args, **kwargs):
+                return await self.run(target, *args, **kwargs)
+
+            self._methods[name] = method
+        return method
+
+    def _loop_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            slots = self._slots.get(loop)
+            if slots is None:
+                slots = asyncio.Semaphore(self.max_pending)
+                self._slots[loop] = slots
+            return slots
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Exécute un appel bloquant sur le pool de threads
+
+        Raises:
+            DatabaseBusyError: Aucune place libérée dans la file à temps
+        """
+        slots = self._loop_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._metrics['rejected'] += 1
+            raise DatabaseBusyError(
+                f"File d'appels base pleine après {self.queue_timeout}s ({self.max_pending} appels admis)"
+            )
+
+        with self._lock:
+            self._metrics['calls'] += 1
+            self._metrics['pending'] += 1
+            self._metrics['max_pending_seen'] = max(self._metrics['max_pending_seen'], self._metrics['pending'])
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+        finally:
+            with self._lock:
+                self._metrics['pending'] -= 1
+            slots.release()
+
+    async def gather(self, **calls: Awaitable[Any]) -> Dict[str, Any]:
+        """
+        Lance des requêtes indépendantes en parallèle
+
+            context = await adb.gather(
+                profile=adb.get_user_profile(user_id),
+                stats=adb.get_market_stats(city='Nice'),
+            )
+
+        Returns:
+            Dict[str, Any]: Résultat de chaque appel, sous son nom
+
+        Raises:
+            Exception: Première erreur rencontrée (les autres appels vont à leur terme)
+        """
+        names = list(calls)
+        results = await asyncio.gather(*calls.values())
+        return dict(zip(names, results))
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Appels servis, rejetés et en cours"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics['max_workers'] = self.max_workers
+        metrics['max_pending'] = self.max_pending
+        return metrics
+
+    def close(self, wait: bool = True):
+        """Arrête le pool de threads (le gestionnaire synchrone reste ouvert)"""
+        self.executor.shutdown(wait=wait)
+
+    async def __aenter__(self) -> 'AsyncDatabaseManager':
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+_async_db_manager = None
+_async_db_lock = threading.Lock()
+
+
+def get_async_database() -> AsyncDatabaseManager:
+    """Façade asynchrone partagée de l'instance globale db_manager"""
+    global _async_db_manager
+    with _async_db_lock:
+        if _async_db_manager is None:
+            _async_db_manager = AsyncDatabaseManager()
+        return _async_db_manager
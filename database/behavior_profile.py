@@ -0,0 +1,230 @@
+"""
+Profil comportemental des utilisateurs (favoris, recherches sauvegardées)
+Agrégats par utilisateur tenus à jour à chaque ajout de favori ou recherche
+sauvegardée ; les retraits recalculent le profil du seul utilisateur concerné
+"""
+import json
+import logging
+import sqlite3
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from database.schema import create_schema_versions_table, get_component_version, set_component_version
+
+logger = logging.getLogger(__name__)
+
+BEHAVIOR_PROFILE_VERSION = 1
+
+FAVORITE_TYPE, FAVORITE_LOCATION, SEARCHED_LOCATION = 'favorite_type', 'favorite_location', 'searched_location'
+
+# Type de compteur -> clé du profil retourné
+PROFILE_KEYS = {
+    FAVORITE_TYPE: 'favorite_property_types',
+    FAVORITE_LOCATION: 'favorite_locations',
+    SEARCHED_LOCATION: 'searched_locations',
+}
+
+_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS user_behavior_profile (
+        user_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        value TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, kind, value)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS user_behavior_stats (
+        user_id INTEGER PRIMARY KEY,
+        favorite_count INTEGER NOT NULL DEFAULT 0,
+        favorite_price_count INTEGER NOT NULL DEFAULT 0,
+        favorite_price_sum REAL NOT NULL DEFAULT 0,
+        favorite_price_min REAL,
+        favorite_price_max REAL,
+        saved_search_count INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+]
+
+_COUNTER_UPSERT = '''
+    INSERT INTO user_behavior_profile (user_id, kind, value, count) VALUES ({p}, {p}, {p}, {p})
+    ON CONFLICT (user_id, kind, value) DO UPDATE SET count = user_behavior_profile.count + excluded.count
+'''
+
+# Min / max : une valeur NULL (annonce sans prix) ne remplace pas l'extrême connu
+_STATS_UPSERT = '''
+    INSERT INTO user_behavior_stats (
+        user_id, favorite_count, favorite_price_count, favorite_price_sum,
+        favorite_price_min, favorite_price_max, saved_search_count, updated_at
+    ) VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p}, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id) DO UPDATE SET
+        favorite_count = user_behavior_stats.favorite_count + excluded.favorite_count,
+        favorite_price_count = user_behavior_stats.favorite_price_count + excluded.favorite_price_count,
+        favorite_price_sum = user_behavior_stats.favorite_price_sum + excluded.favorite_price_sum,
+        favorite_price_min = CASE
+            WHEN excluded.favorite_price_min IS NULL THEN user_behavior_stats.favorite_price_min
+            WHEN user_behavior_stats.favorite_price_min IS NULL
+                 OR excluded.favorite_price_min < user_behavior_stats.favorite_price_min
+            THEN excluded.favorite_price_min ELSE user_behavior_stats.favorite_price_min END,
+        favorite_price_max = CASE
+            WHEN excluded.favorite_price_max IS NULL THEN user_behavior_stats.favorite_price_max
+            WHEN user_behavior_stats.favorite_price_max IS NULL
+                 OR excluded.favorite_price_max > user_behavior_stats.favorite_price_max
+            THEN excluded.favorite_price_max ELSE user_behavior_stats.favorite_price_max END,
+        saved_search_count = user_behavior_stats.saved_search_count + excluded.saved_search_count,
+        updated_at = excluded.updated_at
+'''
+
+
+def _searched_location(filters: Any) -> Optional[str]:
+    """Localisation d'une recherche sauvegardée (filtres en dict ou JSON)"""
+    if isinstance(filters, str):
+        try:
+            filters = json.loads(filters)
+        except ValueError:
+            return None
+    location = (filters or {}).get('location')
+    return str(location) if location else None
+
+
+def _apply(cursor, user_id: int, favorites: Iterable[Sequence[Any]], searches: Iterable[Any], p: str):
+    """
+    Ajoute des favoris et des recherches sauvegardées au profil
+
+    Args:
+        favorites: (property_type, city, price) des annonces ajoutées
+        searches: Filtres des recherches ajoutées
+    """
+    counters: Dict[tuple, int] = {}
+    prices = []
+    favorite_count = 0
+    for property_type, city, price in favorites:
+        favorite_count += 1
+        if property_type:
+            counters[(FAVORITE_TYPE, property_type)] = counters.get((FAVORITE_TYPE, property_type), 0) + 1
+        if city:
+            counters[(FAVORITE_LOCATION, city)] = counters.get((FAVORITE_LOCATION, city), 0) + 1
+        if price is not None:
+            prices.append(float(price))
+
+    search_count = 0
+    for filters in searches:
+        search_count += 1
+        location = _searched_location(filters)
+        if location:
+            counters[(SEARCHED_LOCATION, location)] = counters.get((SEARCHED_LOCATION, location), 0) + 1
+
+    if counters:
+        cursor.executemany(
+            _COUNTER_UPSERT.format(p=p),
+            [(user_id, kind, value, count) for (kind, value), count in counters.items()]
+        )
+    cursor.execute(_STATS_UPSERT.format(p=p), (
+        user_id, favorite_count, len(prices), sum(prices),
+        min(prices) if prices else None, max(prices) if prices else None, search_count
+    ))
+
+
+def record_favorite(cursor, user_id: int, property_id: int, placeholder: str = '?'):
+    """Ajoute un favori au profil (à appeler dans la transaction de l'ajout)"""
+    p = placeholder
+    cursor.execute(f"SELECT property_type, city, price FROM properties WHERE id = {p}", (property_id,))
+    _apply(cursor, user_id, cursor.fetchall(), [], p)
+
+
+def record_saved_search(cursor, user_id: int, filters: Optional[Dict[str, Any]], placeholder: str = '?'):
+    """Ajoute une recherche sauvegardée au profil (à appeler dans la transaction de l'ajout)"""
+    _apply(cursor, user_id, [], [filters], placeholder)
+
+
+def rebuild_behavior_profile(cursor, user_id: int, placeholder: str = '?'):
+    """
+    Recalcule le profil d'un utilisateur à partir de ses favoris et recherches
+
+    Appelé après un retrait : les attributs d'une annonce ont pu changer
+    depuis son ajout aux favoris, le décrément ne serait pas exact.
+    """
+    p = placeholder
+    cursor.execute(f"DELETE FROM user_behavior_profile WHERE user_id = {p}", (user_id,))
+    cursor.execute(f"DELETE FROM user_behavior_stats WHERE user_id = {p}", (user_id,))
+
+    cursor.execute(f'''
+        SELECT pr.property_type, pr.city, pr.price
+        FROM favorites f JOIN properties pr ON pr.id = f.property_id
+        WHERE f.user_id = {p}
+    ''', (user_id,))
+    favorites = cursor.fetchall()
+    cursor.execute(f"SELECT filters FROM saved_searches WHERE user_id = {p}", (user_id,))
+    searches = [row[0] for row in cursor.fetchall()]
+
+    if favorites or searches:
+        _apply(cursor, user_id, favorites, searches, p)
+
+
+def rebuild_all_behavior_profiles(cursor, placeholder: str = '?') -> int:
+    """Recalcule le profil de tous les utilisateurs ayant des favoris ou des recherches ; retourne leur nombre"""
+    cursor.execute("SELECT user_id FROM favorites UNION SELECT user_id FROM saved_searches")
+    user_ids = [row[0] for row in cursor.fetchall() if row[0] is not None]
+    for user_id in user_ids:
+        rebuild_behavior_profile(cursor, user_id, placeholder)
+    return len(user_ids)
+
+
+def ensure_behavior_profile(cursor: sqlite3.Cursor) -> bool:
+    """
+    Crée les tables du profil comportemental ; à la première installation,
+    le calcule pour les favoris et recherches existants
+
+    Returns:
+        bool: True si les profils ont été calculés
+    """
+    create_schema_versions_table(cursor)
+    for statement in _TABLES:
+        cursor.execute(statement)
+
+    if get_component_version(cursor, 'behavior_profile') == BEHAVIOR_PROFILE_VERSION:
+        return False
+
+    count = rebuild_all_behavior_profiles(cursor)
+    set_component_version(cursor, 'behavior_profile', BEHAVIOR_PROFILE_VERSION)
+    logger.info(f"Profils comportementaux calculés pour {count} utilisateurs")
+    return True
+
+
+def read_behavior_profile(cursor, user_id: int, placeholder: str = '?') -> Dict[str, Any]:
+    """
+    Profil comportemental d'un utilisateur (lectures indexées)
+
+    Returns:
+        Dict[str, Any]: favorite_property_types, favorite_locations,
+        searched_locations (valeur -> nombre), favorite_count,
+        saved_search_count et favorite_price (min, max, avg ; None sans
+        favori avec prix) ; {} si l'utilisateur n'a ni favori ni recherche
+    """
+    p = placeholder
+    cursor.execute(f'''
+        SELECT favorite_count, favorite_price_count, favorite_price_sum,
+               favorite_price_min, favorite_price_max, saved_search_count
+        FROM user_behavior_stats WHERE user_id = {p}
+    ''', (user_id,))
+    stats = cursor.fetchone()
+    if not stats or not (stats[0] or stats[5]):
+        return {}
+
+    favorite_count, price_count, price_sum, price_min, price_max, saved_search_count = stats
+    profile = {key: {} for key in PROFILE_KEYS.values()}
+    profile.update(
+        favorite_count=favorite_count,
+        saved_search_count=saved_search_count,
+        favorite_price={'min': price_min, 'max': price_max, 'avg': price_sum / price_count} if price_count else None
+    )
+
+    cursor.execute(
+        f"SELECT kind, value, count FROM user_behavior_profile WHERE user_id = {p} AND count > 0",
+        (user_id,)
+    )
+    for kind, value, count in cursor.fetchall():
+        if kind in PROFILE_KEYS:
+            profile[PROFILE_KEYS[kind]][value] = count
+    return profile
@@ -0,0 +1,111 @@
+"""
+Compteur de modifications des annonces
+Chaque insertion ou modification reçoit un numéro de version croissant
+(properties.row_version) : les copies en mémoire ne relisent que les
+lignes modifiées depuis leur dernière synchronisation
+"""
+import logging
+import sqlite3
+from typing import Dict
+
+from database.schema import create_schema_versions_table, get_component_version, set_component_version
+
+logger = logging.getLogger(__name__)
+
+CHANGE_COUNTER_VERSION = 1
+
+ROW_VERSION_COLUMN = 'row_version'
+
+# Incrémente le compteur et numérote la ligne écrite
+_BUMP = '''
+    UPDATE property_change_counter SET version = version + 1 WHERE id = 1;
+    UPDATE properties SET row_version = (SELECT version FROM property_change_counter WHERE id = 1)
+    WHERE id = new.id;
+'''
+
+_TRIGGERS = {
+    'properties_version_after_insert': f'''
+    CREATE TRIGGER IF NOT EXISTS properties_version_after_insert AFTER INSERT ON properties BEGIN
+        {_BUMP}
+    END
+    ''',
+    # La numérotation elle-même (row_version modifié) ne relance pas le trigger
+    'properties_version_after_update': f'''
+    CREATE TRIGGER IF NOT EXISTS properties_version_after_update AFTER UPDATE ON properties
+    WHEN new.row_version IS old.row_version BEGIN
+        {_BUMP}
+    END
+    ''',
+    # Une suppression ne laisse pas de ligne à relire : le compteur de
+    # suppressions signale aux copies qu'un rechargement complet est nécessaire
+    'properties_version_after_delete': '''
+    CREATE TRIGGER IF NOT EXISTS properties_version_after_delete AFTER DELETE ON properties BEGIN
+        UPDATE property_change_counter SET version = version + 1, deletions = deletions + 1 WHERE id = 1;
+    END
+    ''',
+}
+
+
+def ensure_change_counter(cursor: sqlite3.Cursor) -> bool:
+    """
+    Ajoute la colonne row_version, le compteur et ses triggers
+
+    Les annonces existantes sont numérotées dans l'ordre de leur id.
+
+    Returns:
+        bool: True si le compteur a été (re)créé
+    """
+    create_schema_versions_table(cursor)
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'properties_version_%'")
+    existing_triggers = {row[0] for row in cursor.fetchall()}
+
+    if (get_component_version(cursor, 'change_counter') == CHANGE_COUNTER_VERSION
+            and existing_triggers >= set(_TRIGGERS)):
+        return False
+
+    for name in _TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    cursor.execute("PRAGMA table_info(properties)")
+    if ROW_VERSION_COLUMN not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE properties ADD COLUMN {ROW_VERSION_COLUMN} INTEGER NOT NULL DEFAULT 0")
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_properties_{ROW_VERSION_COLUMN} ON properties ({ROW_VERSION_COLUMN})"
+    )
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS property_change_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            deletions INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    cursor.execute(f"UPDATE properties SET {ROW_VERSION_COLUMN} = id")
+    cursor.execute('''
+        INSERT INTO property_change_counter (id, version, deletions)
+        SELECT 1, COALESCE(MAX(id), 0), 0 FROM properties WHERE true
+        ON CONFLICT(id) DO UPDATE SET version = excluded.version, deletions = deletions + 1
+    ''')
+
+    for trigger in _TRIGGERS.values():
+        cursor.execute(trigger)
+
+    set_component_version(cursor, 'change_counter', CHANGE_COUNTER_VERSION)
+    logger.info(f"Compteur de modifications en version {CHANGE_COUNTER_VERSION}")
+    return True
+
+
+def read_change_counter(cursor: sqlite3.Cursor) -> Dict[str, int]:
+    """
+    État du compteur
+
+    Returns:
+        Dict[str, int]: version (dernier numéro attribué), deletions
+    """
+    cursor.execute("SELECT version, deletions FROM property_change_counter WHERE id = 1")
+    row = cursor.fetchone()
+    if row is None:
+        return {'version': 0, 'deletions': 0}
+    return {'version': row[0], 'deletions': row[1]}
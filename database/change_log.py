@@ -0,0 +1,261 @@
+"""
+Journal des modifications des annonces (change data capture)
+Des triggers ajoutent (seq, property_id, op, changed_columns) à chaque
+insertion, modification ou suppression ; les consommateurs lisent le journal
+à partir de leur position enregistrée (feed_cursors)
+"""
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Sequence
+
+from database.change_counter import ROW_VERSION_COLUMN
+from database.schema import create_schema_versions_table, get_component_version, set_component_version
+
+logger = logging.getLogger(__name__)
+
+CHANGE_LOG_VERSION = 1
+
+INSERT, UPDATE, DELETE = 'insert', 'update', 'delete'
+
+# Colonnes dont la modification seule n'est pas journalisée (numérotation)
+IGNORED_COLUMNS = {ROW_VERSION_COLUMN}
+
+DEFAULT_CHANGE_LOG_CONFIG = {
+    'retention_seconds': 7 * 24 * 3600,   # Entrées plus anciennes supprimées même non lues
+    'read_batch_size': 1000,              # Entrées par lecture d'un consommateur
+}
+
+_TRIGGER_NAMES = ['properties_log_insert', 'properties_log_update', 'properties_log_delete']
+
+_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS property_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        property_id INTEGER NOT NULL,
+        op TEXT NOT NULL CHECK (op IN ('insert', 'update', 'delete')),
+        changed_columns TEXT, -- Colonnes modifiées séparées par des virgules, NULL : toutes
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # Position des consommateurs : dernier seq traité
+    '''
+    CREATE TABLE IF NOT EXISTS feed_cursors (
+        consumer TEXT PRIMARY KEY,
+        position INTEGER NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # Dernier seq supprimé par la rétention ou l'acquittement : un lecteur
+    # positionné avant a manqué des entrées
+    '''
+    CREATE TABLE IF NOT EXISTS property_changes_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        truncated_through INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    "INSERT OR IGNORE INTO property_changes_state (id, truncated_through) VALUES (1, 0)",
+]
+
+
+def _trigger_statements(columns: Sequence[str]) -> List[str]:
+    """Triggers du journal pour les colonnes actuelles de properties"""
+    tracked = sorted(column for column in columns if column not in IGNORED_COLUMNS)
+    changed = ' OR '.join(f"old.{column} IS NOT new.{column}" for column in tracked)
+    names = ' || '.join(
+        f"CASE WHEN old.{column} IS NOT new.{column} THEN '{column},' ELSE '' END" for column in tracked
+    )
+    return [
+        f'''CREATE TRIGGER properties_log_insert AFTER INSERT ON properties BEGIN
+    INSERT INTO property_changes (property_id, op) VALUES (new.id, '{INSERT}');
+END''',
+        f'''CREATE TRIGGER properties_log_update AFTER UPDATE ON properties
+WHEN {changed} BEGIN
+    INSERT INTO property_changes (property_id, op, changed_columns)
+    VALUES (new.id, '{UPDATE}', rtrim({names}, ','));
+END''',
+        f'''CREATE TRIGGER properties_log_delete AFTER DELETE ON properties BEGIN
+    INSERT INTO property_changes (property_id, op) VALUES (old.id, '{DELETE}');
+END''',
+    ]
+
+
+def ensure_change_log(cursor: sqlite3.Cursor) -> bool:
+    """
+    Crée le journal et ses triggers ; les triggers sont recréés quand les
+    colonnes de properties changent
+
+    À appeler après les autres composants qui ajoutent des colonnes. À la
+    création du journal, les positions des consommateurs repartent de zéro.
+
+    Returns:
+        bool: True si les triggers ont été (re)créés
+    """
+    create_schema_versions_table(cursor)
+    first_install = get_component_version(cursor, 'change_log') == 0
+
+    for statement in _TABLES:
+        cursor.execute(statement)
+
+    cursor.execute("PRAGMA table_info(properties)")
+    expected = _trigger_statements([row[1] for row in cursor.fetchall()])
+
+    cursor.execute(
+        f"SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({', '.join('?' for _ in _TRIGGER_NAMES)})",
+        _TRIGGER_NAMES
+    )
+    if (not first_install and get_component_version(cursor, 'change_log') == CHANGE_LOG_VERSION
+            and sorted(row[0] for row in cursor.fetchall()) == sorted(expected)):
+        return False
+
+    for name in _TRIGGER_NAMES:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for statement in expected:
+        cursor.execute(statement)
+
+    if first_install:
+        cursor.execute("UPDATE feed_cursors SET position = 0, updated_at = CURRENT_TIMESTAMP")
+
+    set_component_version(cursor, 'change_log', CHANGE_LOG_VERSION)
+    logger.info(f"Journal des modifications en version {CHANGE_LOG_VERSION}")
+    return True
+
+
+def change_log_head(cursor) -> int:
+    """Dernier seq attribué (0 si le journal n'a jamais servi)"""
+    cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM property_changes")
+    head = cursor.fetchone()[0]
+    cursor.execute("SELECT truncated_through FROM property_changes_state WHERE id = 1")
+    row = cursor.fetchone()
+    return max(head, row[0] if row else 0)
+
+
+def read_changes(cursor, since: int, limit: int, placeholder: str = '?') -> Dict[str, Any]:
+    """
+    Entrées du journal postérieures à since
+
+    Args:
+        cursor: Curseur DB-API (SQLite ou PostgreSQL)
+        since: Dernier seq déjà traité
+        limit: Nombre maximum d'entrées
+        placeholder: Marqueur de paramètre du pilote
+
+    Returns:
+        Dict: changes (seq, property_id, op, changed_columns en liste ou
+        None pour toutes, changed_at), position (dernier seq lu, à
+        enregistrer une fois les entrées traitées) et reset (des entrées
+        postérieures à since ont été supprimées : resynchronisation complète)
+    """
+    cursor.execute("SELECT truncated_through FROM property_changes_state WHERE id = 1")
+    row = cursor.fetchone()
+    truncated_through = row[0] if row else 0
+
+    cursor.execute(
+        "SELECT seq, property_id, op, changed_columns, changed_at FROM property_changes"
+        f" WHERE seq > {placeholder} ORDER BY seq LIMIT {placeholder}",
+        (since, limit)
+    )
+    changes = [
+        {
+            'seq': seq, 'property_id': property_id, 'op': op,
+            'changed_columns': changed_columns.split(',') if changed_columns else None,
+            'changed_at': changed_at
+        }
+        for seq, property_id, op, changed_columns, changed_at in cursor.fetchall()
+    ]
+
+    reset = since < truncated_through
+    position = changes[-1]['seq'] if changes else max(since, truncated_through)
+    return {'changes': changes, 'position': position, 'reset': reset}
+
+
+def merge_changes(entries: Sequence[tuple]) -> tuple:
+    """
+    Fusionne les entrées d'une même annonce en la plus récente
+
+    Args:
+        entries: (seq, op, changed_columns) triées par seq
+
+    Returns:
+        tuple: (seq conservé, op, changed_columns) ; op est 'delete' si la
+        dernière entrée est une suppression, 'insert' si l'une d'elles est
+        une insertion, sinon 'update' avec l'union des colonnes
+    """
+    last_seq, last_op, _ = entries[-1]
+    if last_op == DELETE:
+        return last_seq, DELETE, None
+    if any(op == INSERT for _, op, _ in entries):
+        return last_seq, INSERT, None
+
+    columns = set()
+    for _, _, changed_columns in entries:
+        if not changed_columns:
+            return last_seq, UPDATE, None
+        columns.update(changed_columns.split(','))
+    return last_seq, UPDATE, ','.join(sorted(columns))
+
+
+def compact_change_log(cursor, retention_seconds: float, placeholder: str = '?') -> Dict[str, Any]:
+    """
+    Compacte le journal
+
+    1. Supprime les entrées lues par tous les consommateurs enregistrés et
+       celles plus anciennes que la rétention (les consommateurs en retard
+       liront reset=True) ;
+    2. Fusionne les entrées restantes d'une même annonce en la plus récente
+       (voir merge_changes) : un lecteur voit au pire plus de colonnes
+       modifiées que nécessaire, jamais moins.
+
+    Sans consommateur enregistré, seule la rétention s'applique.
+
+    Returns:
+        Dict: deleted, merged, truncated_through, lagging_consumers
+    """
+    p = placeholder
+    cutoff = (datetime.utcnow() - timedelta(seconds=retention_seconds)).strftime('%Y-%m-%d %H:%M:%S')
+
+    cursor.execute(f"SELECT COALESCE(MAX(seq), 0) FROM property_changes WHERE changed_at < {p}", (cutoff,))
+    expired_through = cursor.fetchone()[0]
+    cursor.execute("SELECT MIN(position) FROM feed_cursors")
+    acknowledged_through = cursor.fetchone()[0] or 0
+    through = max(expired_through, acknowledged_through)
+
+    cursor.execute(f"DELETE FROM property_changes WHERE seq <= {p}", (through,))
+    deleted = cursor.rowcount
+    cursor.execute(
+        f"UPDATE property_changes_state SET truncated_through = {p} WHERE id = 1 AND truncated_through < {p}",
+        (through, through)
+    )
+    cursor.execute("SELECT truncated_through FROM property_changes_state WHERE id = 1")
+    truncated_through = cursor.fetchone()[0]
+
+    cursor.execute(f"SELECT consumer FROM feed_cursors WHERE position < {p} ORDER BY consumer", (truncated_through,))
+    lagging = [row[0] for row in cursor.fetchall()]
+
+    cursor.execute('''
+        SELECT property_id, seq, op, changed_columns FROM property_changes
+        WHERE property_id IN (
+            SELECT property_id FROM property_changes GROUP BY property_id HAVING COUNT(*) > 1
+        )
+        ORDER BY property_id, seq
+    ''')
+    groups: Dict[int, List[tuple]] = {}
+    for property_id, seq, op, changed_columns in cursor.fetchall():
+        groups.setdefault(property_id, []).append((seq, op, changed_columns))
+
+    merged, obsolete = [], []
+    for entries in groups.values():
+        seq, op, changed_columns = merge_changes(entries)
+        merged.append((op, changed_columns, seq))
+        obsolete.extend((entry[0],) for entry in entries[:-1])
+
+    if merged:
+        cursor.executemany(f"UPDATE property_changes SET op = {p}, changed_columns = {p} WHERE seq = {p}", merged)
+        cursor.executemany(f"DELETE FROM property_changes WHERE seq = {p}", obsolete)
+
+    if lagging:
+        logger.warning(f"Consommateurs du journal en retard (resynchronisation): {', '.join(lagging)}")
+    return {
+        'deleted': deleted, 'merged': len(obsolete),
+        'truncated_through': truncated_through, 'lagging_consumers': lagging
+    }
@@ -0,0 +1,210 @@
+"""
+Index plein texte FTS5 sur les annonces (titre, description, adresse, ville)
+"""
+import logging
+import re
+import sqlite3
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from database.schema import create_schema_versions_table, get_component_version, set_component_version
+
+logger = logging.getLogger(__name__)
+
+FULLTEXT_VERSION = 1
+
+FTS_COLUMNS = ['title', 'description', 'address', 'city']
+
+# Poids BM25 par colonne, dans l'ordre de FTS_COLUMNS
+BM25_WEIGHTS = (10.0, 1.0, 3.0, 5.0)
+
+# Mots vides ignorés dans les requêtes libres
+FRENCH_STOPWORDS = {
+    'a', 'à', 'au', 'aux', 'avec', 'ce', 'ces', 'dans', 'de', 'des', 'du', 'en', 'et',
+    'la', 'le', 'les', 'l', 'd', 'ou', 'par', 'pour', 'sur', 'un', 'une', 'vers', 'proche'
+}
+
+# Mots d'intention et de liaison des requêtes en langage naturel, sans
+# valeur de recherche ("je cherche ... moins de 500 000 euros")
+QUERY_FILLER_WORDS = {
+    'je', 'j', 'nous', 'on', 'cherche', 'cherchons', 'recherche', 'veux', 'voudrais', 'voudrions',
+    'souhaite', 'souhaitons', 'aimerais', 'acheter', 'achat', 'louer', 'trouver', 'bien', 'biens',
+    'moins', 'plus', 'maximum', 'max', 'maxi', 'minimum', 'min', 'environ', 'budget', 'jusqu',
+    'jusque', 'entre', 'euro', 'euros', 'eur', 'k', 'pas', 'cher', 'chere', 'qui', 'que', 'est', 'y',
+}
+
+# Fragments déjà traduits en filtres structurés par parse_search_query
+_STRUCTURED_PATTERNS = [
+    r'\d+(?:\s?\d+)*\s*(?:€|euros?)',
+    r'\d+\s*(?:pièces?|chambres?)',
+    r'\d+\s*m[²2]',
+]
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Mots au sens du tokenizer unicode61 : lettres et chiffres, tout autre caractère sépare
+_INDEX_WORD_RE = re.compile(r'[^\W_]+')
+
+_FTS_DDL = f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS properties_fts USING fts5(
+        {', '.join(FTS_COLUMNS)},
+        content = 'properties',
+        content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+'''
+
+_NEW_VALUES = ', '.join(f'new.{col}' for col in FTS_COLUMNS)
+_OLD_VALUES = ', '.join(f'old.{col}' for col in FTS_COLUMNS)
+_COLUMN_LIST = ', '.join(FTS_COLUMNS)
+
+# Synchronisation de l'index externe (content=) avec la table properties
+_FTS_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS properties_fts_after_insert AFTER INSERT ON properties BEGIN
+        INSERT INTO properties_fts (rowid, {_COLUMN_LIST}) VALUES (new.id, {_NEW_VALUES});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS properties_fts_after_delete AFTER DELETE ON properties BEGIN
+        INSERT INTO properties_fts (properties_fts, rowid, {_COLUMN_LIST})
+        VALUES ('delete', old.id, {_OLD_VALUES});
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS properties_fts_after_update AFTER UPDATE OF {_COLUMN_LIST} ON properties BEGIN
+        INSERT INTO properties_fts (properties_fts, rowid, {_COLUMN_LIST})
+        VALUES ('delete', old.id, {_OLD_VALUES});
+        INSERT INTO properties_fts (rowid, {_COLUMN_LIST}) VALUES (new.id, {_NEW_VALUES});
+    END
+    ''',
+]
+
+
+def ensure_fulltext_index(cursor: sqlite3.Cursor) -> bool:
+    """
+    Crée l'index FTS5 et ses triggers, et le reconstruit à chaque
+    changement de version
+
+    Returns:
+        bool: True si l'index a été (re)construit
+    """
+    create_schema_versions_table(cursor)
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE name = 'properties_fts'")
+    exists = cursor.fetchone() is not None
+
+    if exists and get_component_version(cursor, 'properties_fts') == FULLTEXT_VERSION:
+        return False
+
+    if exists:
+        for trigger in ('properties_fts_after_insert', 'properties_fts_after_delete',
+                        'properties_fts_after_update'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        cursor.execute("DROP TABLE properties_fts")
+
+    cursor.execute(_FTS_DDL)
+    for trigger in _FTS_TRIGGERS:
+        cursor.execute(trigger)
+
+    # Indexer les annonces déjà présentes
+    cursor.execute("INSERT INTO properties_fts (properties_fts) VALUES ('rebuild')")
+
+    set_component_version(cursor, 'properties_fts', FULLTEXT_VERSION)
+    logger.info(f"Index plein texte en version {FULLTEXT_VERSION}")
+    return True
+
+
+def fold_text(text: Any) -> str:
+    """Minuscules sans accents, comme le tokenizer unicode61 remove_diacritics"""
+    decomposed = unicodedata.normalize('NFD', str(text).lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def index_words(text: Any) -> List[str]:
+    """Mots d'un texte tels que les indexe properties_fts (repliés, découpés sur tout non-alphanumérique)"""
+    return _INDEX_WORD_RE.findall(fold_text(text or ''))
+
+
+def search_terms(text: str) -> List[str]:
+    """Mots significatifs d'une saisie libre (minuscules, sans mots vides ni nombres)"""
+    return [
+        token for token in _TOKEN_RE.findall((text or '').lower())
+        if token not in FRENCH_STOPWORDS and not token.isdigit()
+    ]
+
+
+def build_match_expression(text: str) -> Optional[str]:
+    """
+    Traduit une saisie libre en expression MATCH FTS5
+
+    Chaque mot significatif devient un terme exigé (ET implicite) ; le
+    dernier accepte un préfixe pour la saisie en cours. Les accents et la
+    casse sont neutralisés par le tokenizer (remove_diacritics).
+
+    Args:
+        text: Saisie utilisateur, ex. "vue mer terrasse"
+
+    Returns:
+        Optional[str]: Expression MATCH, ou None si aucun mot exploitable
+    """
+    tokens = search_terms(text)
+    if not tokens:
+        return None
+
+    # Les guillemets neutralisent la syntaxe FTS5 (AND, OR, NEAR, *, :...)
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def residual_search_text(query: str, parsed_filters: Dict[str, Any]) -> str:
+    """
+    Retire d'une requête en langage naturel les fragments déjà traduits
+    en filtres structurés (budget, pièces, surface, type, ville) et les
+    mots d'intention (QUERY_FILLER_WORDS)
+
+    Args:
+        query: Requête d'origine
+        parsed_filters: Résultat de parse_search_query
+
+    Returns:
+        str: Texte restant, à confier à l'index plein texte
+    """
+    residual = (query or '').lower()
+
+    for pattern in _STRUCTURED_PATTERNS:
+        residual = re.sub(pattern, ' ', residual)
+
+    for key in ('property_type', 'location'):
+        value = parsed_filters.get(key)
+        if value:
+            residual = residual.replace(str(value).lower(), ' ')
+
+    words: List[str] = [
+        word for word in _TOKEN_RE.findall(residual)
+        if word not in FRENCH_STOPWORDS and fold_text(word) not in QUERY_FILLER_WORDS and not word.isdigit()
+    ]
+    return ' '.join(words)
+
+
+def text_relevance(row: Dict[str, Any], text: str) -> float:
+    """
+    Pertinence d'une annonce déjà chargée pour des mots facultatifs
+
+    Somme, sur les mots de text, du poids BM25_WEIGHTS de la meilleure
+    colonne qui le contient (le dernier mot en préfixe, comme
+    build_match_expression) ; 0 si aucun mot n'y figure.
+    """
+    terms = [word for term in search_terms(text) for word in index_words(term)]
+    columns = [(set(index_words(row.get(column) or '')), weight) for column, weight in zip(FTS_COLUMNS, BM25_WEIGHTS)]
+
+    score = 0.0
+    for position, term in enumerate(terms):
+        prefix = position == len(terms) - 1
+        score += max(
+            (weight for words, weight in columns
+             if (any(word.startswith(term) for word in words) if prefix else term in words)),
+            default=0.0
+        )
+    return score
@@ -0,0 +1,359 @@
+"""
+Import en flux de fichiers d'annonces (CSV ou JSONL) à mémoire constante
+Lecture par lots, validation parallélisable, écriture par bulk_upsert_properties
+et points de reprise après chaque lot validé en base
+"""
+import csv
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.validators import validate_and_sanitize_property_data
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ('csv', 'jsonl')
+
+CHECKPOINT_VERSION = 1
+
+# Séparateur des équipements dans une cellule CSV ("Piscine|Jardin|Garage")
+CSV_LIST_SEPARATOR = '|'
+
+# Champs au format historique attendus par validate_and_sanitize_property_data
+_VALIDATION_ALIASES = {
+    'location': 'city',
+    'surface': 'surface_total',
+    'year_built': 'construction_year',
+}
+
+# Colonnes numériques natives (et leurs champs historiques) non traitées par
+# validate_and_sanitize_property_data : converties ici, la valeur brute d'un
+# CSV ne doit pas atteindre la base ni le calcul du prix au m²
+_NUMERIC_FIELDS = {
+    'surface_terrain': float,
+    'garden_surface': float,
+    'floor_number': int,
+    'floor': int,
+    'garage_count': int,
+    'parking_spaces': int,
+    'price_per_sqm': int,
+    'monthly_charges': int,
+    'luxury_level': int,
+    'quietness_level': int,
+    'brightness_level': int,
+}
+
+# Équipements (0 / 1 comme les colonnes de la base)
+_BOOLEAN_FIELDS = ('elevator', 'balcony', 'terrace', 'garden', 'swimming_pool')
+_TRUE_VALUES = {'1', 'true', 'oui', 'yes', 'vrai'}
+_FALSE_VALUES = {'0', 'false', 'non', 'no', 'faux'}
+
+
+def detect_format(path: str) -> str:
+    """Déduit le format de l'extension du fichier (.csv, .jsonl, .ndjson)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError(f"Format de fichier non reconnu: {path} (attendu: csv ou jsonl)")
+
+
+def iter_listing_records(path: str, file_format: str, start_offset: int = 0) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """
+    Lit un fichier d'annonces enregistrement par enregistrement
+
+    Args:
+        path: Fichier source
+        file_format: 'csv' ou 'jsonl'
+        start_offset: Position (octets) à partir de laquelle reprendre
+
+    Yields:
+        Tuple[Dict, int]: (annonce brute, position juste après l'annonce)
+
+    Raises:
+        ValueError: Ligne JSON illisible (avec son numéro de ligne)
+    """
+    with open(path, 'rb') as source:
+        position = [0]
+
+        def lines() -> Iterator[str]:
+            while True:
+                raw = source.readline()
+                if not raw:
+                    return
+                position[0] += len(raw)
+                yield raw.decode('utf-8')
+
+        if file_format == 'csv':
+            # L'en-tête est relu à chaque reprise ; csv.reader consomme les
+            # lignes une à une, y compris pour les champs sur plusieurs lignes
+            header_line = next(lines(), '').lstrip('\ufeff')
+            header = next(csv.reader([header_line]), [])
+            if start_offset > position[0]:
+                source.seek(start_offset)
+                position[0] = start_offset
+
+            for values in csv.reader(lines()):
+                if not values:
+                    continue
+                record = {
+                    key.strip(): (value if value != '' else None)
+                    for key, value in zip(header, values)
+                }
+                features = record.get('features')
+                if features:
+                    record['features'] = [item.strip() for item in features.split(CSV_LIST_SEPARATOR) if item.strip()]
+                yield record, position[0]
+
+        elif file_format == 'jsonl':
+            if start_offset:
+                source.seek(start_offset)
+                position[0] = start_offset
+
+            for line_number, line in enumerate(lines(), 1):
+                line = line.strip().lstrip('\ufeff')
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"JSON invalide après l'octet {start_offset}, ligne {line_number}: {e}")
+                yield record, position[0]
+
+        else:
+            raise ValueError(f"Format non supporté: {file_format}")
+
+
+def validate_listing(raw: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    Valide une annonce brute avec validate_and_sanitize_property_data
+
+    Les champs nettoyés remplacent les valeurs brutes ; les autres champs
+    (external_ref, équipements...) sont conservés pour l'import. Les
+    colonnes numériques et les équipements sont convertis : une valeur non
+    convertible rejette l'annonce.
+
+    Returns:
+        Tuple[Optional[Dict], List[str]]: (annonce nettoyée ou None, erreurs)
+    """
+    if not isinstance(raw, dict):
+        return None, ["Enregistrement non structuré"]
+
+    # Les colonnes natives priment sur les champs historiques (voir
+    # normalize_listing) : c'est leur valeur qui est validée puis remplacée
+    to_validate = dict(raw)
+    sources = {}
+    for legacy, column in _VALIDATION_ALIASES.items():
+        if raw.get(column) not in (None, ''):
+            to_validate[legacy] = raw[column]
+            sources[legacy] = column
+
+    cleaned, errors = validate_and_sanitize_property_data(to_validate)
+
+    # Le nettoyage remplace une valeur non convertible par None sans erreur
+    for field, value in cleaned.items():
+        if value is None and to_validate.get(field) not in (None, ''):
+            errors.append(f"{sources.get(field, field)}: valeur invalide ({to_validate[field]!r})")
+
+    candidate = dict(raw)
+    for field, value in cleaned.items():
+        candidate[sources.get(field, field)] = value
+
+    for field, value_type in _NUMERIC_FIELDS.items():
+        if field in candidate:
+            candidate[field], error = _convert(field, candidate[field], value_type)
+            if error:
+                errors.append(error)
+    for field in _BOOLEAN_FIELDS:
+        if field in candidate:
+            candidate[field], error = _convert_boolean(field, candidate[field])
+            if error:
+                errors.append(error)
+
+    if errors:
+        return None, errors
+    return candidate, []
+
+
+def _convert(field: str, value: Any, value_type: type) -> Tuple[Optional[Any], Optional[str]]:
+    """(valeur convertie ou None si vide, erreur)"""
+    if value is None or value == '':
+        return None, None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None, f"{field}: valeur numérique invalide ({value!r})"
+    if number != number or number in (float('inf'), float('-inf')):
+        return None, f"{field}: valeur numérique invalide ({value!r})"
+    return (int(number) if value_type is int else number), None
+
+
+def _convert_boolean(field: str, value: Any) -> Tuple[Optional[int], Optional[str]]:
+    """(0 / 1 ou None si vide, erreur)"""
+    if value is None or value == '':
+        return None, None
+    if isinstance(value, (bool, int, float)):
+        return (1 if value else 0), None
+    label = str(value).strip().lower()
+    if label in _TRUE_VALUES:
+        return 1, None
+    if label in _FALSE_VALUES:
+        return 0, None
+    return None, f"{field}: valeur booléenne invalide ({value!r})"
+
+
+def load_checkpoint(checkpoint_path: str, source_path: str) -> Optional[Dict[str, Any]]:
+    """Relit un point de reprise s'il correspond au fichier source"""
+    if not os.path.exists(checkpoint_path):
+        return None
+
+    try:
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Point de reprise illisible, import depuis le début: {e}")
+        return None
+
+    if (checkpoint.get('version') != CHECKPOINT_VERSION
+            or checkpoint.get('source') != os.path.abspath(source_path)
+            or checkpoint.get('offset', 0) > os.path.getsize(source_path)):
+        logger.warning("Point de reprise d'un autre fichier, import depuis le début")
+        return None
+
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_path: str, checkpoint: Dict[str, Any]):
+    """Écrit le point de reprise de façon atomique"""
+    temporary_path = f"{checkpoint_path}.tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(temporary_path, checkpoint_path)
+
+
+def import_listings_file(db, path: str, file_format: str = None, batch_size: int = 1000,
+                         workers: int = 1, checkpoint_path: str = None, resume: bool = True,
+                         rejects_path: str = None,
+                         progress: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+    """
+    Importe un fichier d'annonces CSV ou JSONL par lots
+
+    Un seul lot est en mémoire à la fois. Chaque lot est validé (sur
+    plusieurs processus si workers > 1), écrit en une transaction, puis le
+    point de reprise est avancé : un import interrompu repart du premier
+    lot non écrit. Le point de reprise est supprimé en fin d'import.
+
+    Args:
+        db: DatabaseManager cible
+        path: Fichier source
+        file_format: 'csv' ou 'jsonl' (déduit de l'extension par défaut)
+        batch_size: Nombre d'annonces par lot et par transaction
+        workers: Nombre de processus de validation
+        checkpoint_path: Fichier de reprise (par défaut <path>.checkpoint.json)
+        resume: Reprendre depuis le point de reprise existant
+        rejects_path: Fichier JSONL recevant les annonces rejetées et leurs erreurs
+        progress: Fonction appelée avec les statistiques après chaque lot
+
+    Returns:
+        Dict[str, Any]: read, imported, inserted, updated, rejected, batches,
+        offset, size, elapsed, rows_per_second, resumed_from
+    """
+    file_format = file_format or detect_format(path)
+    if file_format not in SUPPORTED_FORMATS:
+        raise ValueError(f"Format non supporté: {file_format}")
+
+    checkpoint_path = checkpoint_path or f"{path}.checkpoint.json"
+    batch_size = max(1, batch_size)
+
+    checkpoint = load_checkpoint(checkpoint_path, path) if resume else None
+    start_offset = checkpoint['offset'] if checkpoint else 0
+
+    stats = {
+        'read': 0, 'imported': 0, 'inserted': 0, 'updated': 0, 'rejected': 0, 'batches': 0,
+        'offset': start_offset, 'size': os.path.getsize(path),
+        'elapsed': 0.0, 'rows_per_second': 0.0, 'resumed_from': start_offset
+    }
+    if checkpoint:
+        logger.info(f"Reprise de l'import à l'octet {start_offset} ({checkpoint.get('read', 0)} annonces déjà lues)")
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    # En reprise, les rejets s'ajoutent à ceux des lots déjà traités
+    rejects = open(rejects_path, 'a' if checkpoint else 'w', encoding='utf-8') if rejects_path else None
+    start = time.perf_counter()
+
+    try:
+        records = iter_listing_records(path, file_format, start_offset)
+
+        while True:
+            batch = []
+            offset = stats['offset']
+            for record, offset in records:
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    break
+            if not batch:
+                break
+
+            if executor:
+                chunksize = max(1, len(batch) // (workers * 4))
+                results = list(executor.map(validate_listing, batch, chunksize=chunksize))
+            else:
+                results = [validate_listing(record) for record in batch]
+
+            valid = []
+            for record, (listing, errors) in zip(batch, results):
+                if listing is None:
+                    stats['rejected'] += 1
+                    if rejects:
+                        rejects.write(json.dumps({'record': record, 'errors': errors},
+                                                 ensure_ascii=False, default=str) + '\n')
+                else:
+                    valid.append(listing)
+
+            if valid:
+                written = db.bulk_upsert_properties(valid, chunk_size=len(valid), verbose=False)
+                stats['imported'] += written['rows']
+                stats['inserted'] += written['inserted']
+                stats['updated'] += written['updated']
+                stats['rejected'] += written['rejected']
+
+            if rejects:
+                rejects.flush()
+
+            stats['read'] += len(batch)
+            stats['batches'] += 1
+            stats['offset'] = offset
+            stats['elapsed'] = time.perf_counter() - start
+            stats['rows_per_second'] = stats['read'] / stats['elapsed'] if stats['elapsed'] else 0.0
+
+            save_checkpoint(checkpoint_path, {
+                'version': CHECKPOINT_VERSION,
+                'source': os.path.abspath(path),
+                'format': file_format,
+                'offset': offset,
+                'read': stats['read'] + (checkpoint.get('read', 0) if checkpoint else 0),
+                'updated_at': time.time()
+            })
+
+            if progress:
+                progress(dict(stats))
+
+        # Import complet : le point de reprise n'a plus d'objet
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        stats['elapsed'] = time.perf_counter() - start
+        stats['rows_per_second'] = stats['read'] / stats['elapsed'] if stats['elapsed'] else 0.0
+        logger.info(f"Import terminé: {stats['imported']} annonces importées, {stats['rejected']} rejetées "
+                    f"en {stats['elapsed']:.1f}s ({stats['rows_per_second']:.0f} lignes/s)")
+        return stats
+
+    finally:
+        if executor:
+            executor.shutdown()
+        if rejects:
+            rejects.close()
@@ -0,0 +1,158 @@
+"""
+Normalisation des annonces pour l'import en masse (flux d'agences, fichiers d'exemple)
+"""
+import logging
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Clé d'annonce externe (référence du flux de l'agence), unique si renseignée
+EXTERNAL_KEY = 'external_ref'
+
+# Champs du format historique (data/sample_data.json, utils.helpers) -> colonnes
+LEGACY_FIELDS = {
+    'surface': 'surface_total',
+    'garden_surface': 'surface_terrain',
+    'year_built': 'construction_year',
+    'floor': 'floor_number',
+    'available_date': 'availability_date',
+}
+
+# Équipements du format historique (liste 'features') -> colonnes booléennes ou compteurs
+FEATURE_COLUMNS = [
+    ('piscine', 'swimming_pool'),
+    ('jardin', 'garden'),
+    ('garage', 'garage_count'),
+    ('parking', 'parking_spaces'),
+    ('terrasse', 'terrace'),
+    ('balcon', 'balcony'),
+    ('ascenseur', 'elevator'),
+]
+
+# Colonnes NOT NULL sans valeur par défaut
+REQUIRED_COLUMNS = ('title', 'property_type', 'price', 'city')
+
+# Colonnes gérées par la base, jamais importées
+_MANAGED_COLUMNS = {'id', 'created_at', 'row_version'}
+
+
+def ensure_ingest_schema(cursor: sqlite3.Cursor):
+    """Ajoute la clé externe d'annonce et son index d'unicité"""
+    cursor.execute("PRAGMA table_info(properties)")
+    if EXTERNAL_KEY not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE properties ADD COLUMN {EXTERNAL_KEY} TEXT")
+
+    # Les NULL ne sont pas concernés par l'unicité : annonces saisies à la main
+    cursor.execute(
+        f"CREATE UNIQUE INDEX IF NOT EXISTS idx_properties_{EXTERNAL_KEY} ON properties ({EXTERNAL_KEY})"
+    )
+
+
+def get_importable_columns(cursor: sqlite3.Cursor) -> Set[str]:
+    """Colonnes de properties alimentables par un import"""
+    cursor.execute("PRAGMA table_info(properties)")
+    return {row[1] for row in cursor.fetchall()} - _MANAGED_COLUMNS
+
+
+def normalize_listing(data: Dict[str, Any], columns: Set[str]) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    Convertit une annonce brute en ligne de la table properties
+
+    Les champs du format historique sont renommés, la liste 'features' est
+    traduite en colonnes d'équipements, le prix au m² est calculé s'il
+    manque ; les champs sans colonne correspondante sont écartés.
+
+    Args:
+        data: Annonce brute
+        columns: Colonnes importables (voir get_importable_columns)
+
+    Returns:
+        Tuple[Optional[Dict], List[str]]: (ligne ou None si un champ
+        obligatoire manque, champs écartés)
+    """
+    row = {}
+    ignored = []
+
+    for key, value in data.items():
+        column = LEGACY_FIELDS.get(key, key)
+        if column in columns:
+            # Les colonnes natives priment sur les champs historiques
+            if column not in row or key == column:
+                row[column] = value
+        elif key not in ('location', 'features'):
+            ignored.append(key)
+
+    # Localisation historique : "Quartier, Ville" -> adresse + ville,
+    # "Ville" seule -> ville
+    location = data.get('location')
+    if location and 'city' in columns:
+        parts = [part.strip() for part in str(location).split(',') if part.strip()]
+        # Cellule vide d'un CSV : la localisation la complète
+        if parts and row.get('city') in (None, ''):
+            row['city'] = parts[-1]
+        if len(parts) > 1 and 'address' in columns and row.get('address') in (None, ''):
+            row['address'] = location
+
+    for feature in data.get('features') or []:
+        label = str(feature).lower()
+        for prefix, column in FEATURE_COLUMNS:
+            if label.startswith(prefix) and column in columns:
+                row.setdefault(column, 1)
+
+    if 'price_per_sqm' in columns and not row.get('price_per_sqm'):
+        price, surface = _to_float(row.get('price')), _to_float(row.get('surface_total'))
+        if price and surface:
+            row['price_per_sqm'] = int(price / surface)
+
+    if any(row.get(column) in (None, '') for column in REQUIRED_COLUMNS if column in columns):
+        return None, ignored
+
+    # Prix et surface non numériques : annonce rejetée plutôt qu'écrite telle quelle
+    if 'price' in row and _to_float(row['price']) is None:
+        return None, ignored
+    if row.get('surface_total') not in (None, '') and _to_float(row['surface_total']) is None:
+        return None, ignored
+
+    return row, ignored
+
+
+def _to_float(value: Any) -> Optional[float]:
+    """Valeur numérique d'un champ (None si vide ou non convertible)"""
+    if value is None or value == '':
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number == number and abs(number) != float('inf') else None
+
+
+def iter_chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Découpe un itérable (éventuellement infini) en listes de taille size"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def build_upsert_statement(columns: Tuple[str, ...]) -> str:
+    """
+    INSERT pour un jeu de colonnes donné ; mise à jour de l'annonce
+    existante si la clé externe est déjà connue
+    """
+    placeholders = ', '.join('?' for _ in columns)
+    statement = f"INSERT INTO properties ({', '.join(columns)}) VALUES ({placeholders})"
+
+    if EXTERNAL_KEY in columns:
+        updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column != EXTERNAL_KEY)
+        if updates:
+            statement += f" ON CONFLICT({EXTERNAL_KEY}) DO UPDATE SET {updates}"
+        else:
+            statement += f" ON CONFLICT({EXTERNAL_KEY}) DO NOTHING"
+
+    return statement
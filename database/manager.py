@@ -2,19 +2,105 @@
 Gestionnaire de base de données enrichi pour ImoMatch - Étape 1
 Intègre les structures de données complètes
 """
-import sqlite3
 import json
+import os
 from datetime import datetime
 import random
+import time
+
+from config.settings import DATABASE_CONFIG, get_database_url
+from database.pool import ConnectionPool, connect_sqlite
+from database.schema import (
+    ensure_search_indexes, find_full_scans, search_plan_combinations
+)
+from database.fulltext import ensure_fulltext_index
+from database.spatial import ensure_spatial_index, register_spatial_functions
+from database.ingest import (
+    ensure_ingest_schema, get_importable_columns, normalize_listing, iter_chunks, build_upsert_statement
+)
+from database.market_stats import ensure_market_stats, read_market_stats
+from database.change_counter import ensure_change_counter, read_change_counter, ROW_VERSION_COLUMN
+from database.change_log import (
+    ensure_change_log, change_log_head, read_changes, compact_change_log, DEFAULT_CHANGE_LOG_CONFIG
+)
+from database.behavior_profile import (
+    ensure_behavior_profile, record_favorite, record_saved_search, rebuild_behavior_profile, read_behavior_profile
+)
+from database.property_similarity import (
+    ensure_property_similarity, replace_similarities, similarity_referrers, read_similarities, prune_similarities
+)
+from database.search_events import (
+    DEFAULT_SEARCH_HISTORY_CONFIG, search_counters, search_stats_increment, build_patterns, search_event
+)
+from database.pagination import (
+    SORT_KEYS, resolve_sort, encode_cursor, decode_cursor, keyset_segments
+)
+from database.sample_data import SAMPLE_AGENTS, SAMPLE_USERS, sample_properties
+from database.saved_searches import saved_search
+from database.search_query import SearchQueryBuilder
+from database.result_cache import SearchResultCache, DEFAULT_RESULT_CACHE_CONFIG
+from database.rows import (
+    check_result_format, apply_row_factory, cursor_columns, finalize_row, materialize_rows, RowSet
+)
 
 class DatabaseManager:
-    def __init__(self, db_path="imomatch.db"):
+    def __init__(self, db_path="imomatch.db", pool_config=None, write_pool_config=None, pragmas=None):
         self.db_path = db_path
+        sqlite_config = DATABASE_CONFIG["sqlite"]
+        self.check_same_thread = sqlite_config.get("check_same_thread", False)
+        self.pragmas = pragmas if pragmas is not None else sqlite_config.get("pragmas", {})
+        
+        # Écritures sérialisées sur une connexion dédiée ; en WAL, les lectures
+        # continuent sur leurs propres connexions pendant un import ou une inscription
+        self.write_pool = ConnectionPool(
+            lambda: self._connect(readonly=False),
+            **(write_pool_config or sqlite_config.get("write_pool", {"max_size": 1}))
+        )
+        self.read_pool = ConnectionPool(
+            lambda: self._connect(readonly=True),
+            **(pool_config or sqlite_config.get("pool", {}))
+        )
+        # SQL de recherche compilé par forme ; le même texte réutilise les
+        # requêtes préparées du cache de chaque connexion (cached_statements)
+        self.statement_cache_size = sqlite_config.get("statement_cache_size", 512)
+        self.query_builder = SearchQueryBuilder(max_shapes=self.statement_cache_size)
+        # Pages de recherche déjà servies, invalidées par les écritures d'annonces
+        # de ce processus et par le journal des modifications pour les autres
+        self.result_cache = SearchResultCache(
+            **dict(DEFAULT_RESULT_CACHE_CONFIG, **DATABASE_CONFIG.get("result_cache", {}))
+        )
+        # Rétention et taille de lecture du journal des modifications
+        self.change_log_config = dict(DEFAULT_CHANGE_LOG_CONFIG, **DATABASE_CONFIG.get("change_log", {}))
+        # Historique des recherches et préférences agrégées
+        self.search_history_config = dict(DEFAULT_SEARCH_HISTORY_CONFIG, **DATABASE_CONFIG.get("search_history", {}))
         self.create_tables()
         
+    def _connect(self, readonly=False):
+        """Ouvre une nouvelle connexion physique (appelée par les pools)"""
+        conn = connect_sqlite(self.db_path, self.pragmas, readonly=readonly,
+                              check_same_thread=self.check_same_thread,
+                              cached_statements=self.statement_cache_size)
+        return register_spatial_functions(conn)
+    
     def get_connection(self):
-        """Retourne une connexion à la base de données"""
-        return sqlite3.connect(self.db_path)
+        """Emprunte la connexion d'écriture ; close() la rend au pool"""
+        return self.write_pool.acquire()
+    
+    def get_read_connection(self):
+        """Emprunte une connexion en lecture seule ; close() la rend au pool"""
+        return self.read_pool.acquire()
+    
+    def get_pool_metrics(self):
+        """Retourne les métriques des pools (taille, emprunts, temps d'attente)"""
+        return {
+            'read': self.read_pool.get_metrics(),
+            'write': self.write_pool.get_metrics()
+        }
+    
+    def close(self):
+        """Ferme les connexions des pools"""
+        self.read_pool.close_all()
+        self.write_pool.close_all()
     
     def create_tables(self):
         """Crée les tables principales"""
@@ -92,6 +178,8 @@ class DatabaseManager:
                     address TEXT,
                     city TEXT NOT NULL,
                     postal_code TEXT,
+                    latitude REAL,
+                    longitude REAL,
                     
                     -- Qualité et standing
                     luxury_level INTEGER DEFAULT 3,
@@ -102,6 +190,7 @@ class DatabaseManager:
                     -- Disponibilité
                     availability_date DATE,
                     listing_status TEXT DEFAULT 'active',
+                    external_ref TEXT, -- référence de l'annonce dans le flux de l'agence
                     
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
@@ -136,6 +225,102 @@ class DatabaseManager:
                 )
             ''')
             
+            # Table recherches sauvegardées (filtres JSON)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS saved_searches (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    filters TEXT NOT NULL, -- JSON
+                    alert_enabled BOOLEAN DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_saved_searches_user ON saved_searches (user_id)")
+            
+            # Alertes envoyées : une annonce n'est signalée qu'une fois par utilisateur
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS alert_notifications (
+                    user_id INTEGER NOT NULL,
+                    property_id INTEGER NOT NULL,
+                    saved_search_id INTEGER,
+                    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, property_id)
+                )
+            ''')
+            
+            # Alertes détectées pas encore envoyées (échec d'envoi, email plein) :
+            # retentées aux passages suivants jusqu'à leur envoi
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pending_alerts (
+                    user_id INTEGER NOT NULL,
+                    property_id INTEGER NOT NULL,
+                    saved_search_id INTEGER,
+                    queued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, property_id)
+                )
+            ''')
+            
+            # Historique des recherches (borné par utilisateur) et compteurs
+            # agrégés à l'écriture : villes, types, tranches de budget
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS search_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    query TEXT,
+                    filters TEXT, -- JSON
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_search_events_user ON search_events (user_id, id)")
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_search_patterns (
+                    user_id INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_id, kind, value)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_search_stats (
+                    user_id INTEGER PRIMARY KEY,
+                    search_count INTEGER NOT NULL DEFAULT 0,
+                    price_max_sum REAL NOT NULL DEFAULT 0,
+                    price_max_count INTEGER NOT NULL DEFAULT 0,
+                    last_search_at TIMESTAMP
+                )
+            ''')
+            
+            # Index des prédicats de recherche (versionnés)
+            ensure_search_indexes(cursor)
+            
+            # Index plein texte titre / description / adresse / ville
+            ensure_fulltext_index(cursor)
+            
+            # Coordonnées et index R-tree pour les recherches par rayon / emprise
+            ensure_spatial_index(cursor)
+            
+            # Clé externe des annonces importées (upsert des flux d'agences)
+            ensure_ingest_schema(cursor)
+            
+            # Agrégats de marché par ville / type / chambres (triggers)
+            ensure_market_stats(cursor)
+            
+            # Numéro de version par annonce (copies en mémoire incrémentales)
+            ensure_change_counter(cursor)
+            
+            # Profil comportemental agrégé (favoris, recherches sauvegardées)
+            ensure_behavior_profile(cursor)
+            
+            # Annonces similaires précalculées (search.similarity_table)
+            ensure_property_similarity(cursor)
+            
+            # Journal des modifications et positions de ses consommateurs
+            # (en dernier : ses triggers couvrent toutes les colonnes)
+            ensure_change_log(cursor)
+            
             conn.commit()
             print("Tables enrichies créées avec succès")
             
@@ -156,229 +341,346 @@ class DatabaseManager:
                 print("Données d'exemple déjà présentes")
                 return
             
-            # Agents d'exemple
-            agents = [
-                ("Marie", "Dubois", "Century 21 Nice", "marie.dubois@c21.fr", "0493123456", "luxe", 8),
-                ("Pierre", "Martin", "Orpi Antibes", "pierre.martin@orpi.fr", "0493789123", "vente", 12),
-                ("Sophie", "Leroy", "Laforêt Cannes", "sophie.leroy@laforet.fr", "0493456789", "location", 6),
-                ("Jean", "Moreau", "Indépendant Nice", "jean.moreau@immobilier.fr", "0493987654", "investissement", 15),
-                ("Isabelle", "Garcia", "Prestige Monaco", "isabelle.garcia@prestige.mc", "0493654321", "luxe", 10)
-            ]
-            
-            for agent in agents:
+            # Agents, propriétés et utilisateurs d'exemple (database.sample_data)
+            for agent in SAMPLE_AGENTS:
                 cursor.execute('''
                     INSERT INTO real_estate_agents 
                     (first_name, last_name, agency_name, email, phone, specialization, experience_years)
                     VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''', agent)
             
-            # Propriétés d'exemple variées
-            properties = [
-                {
-                    'title': 'Penthouse Exceptionnel - Croisette Cannes',
-                    'description': 'Magnifique penthouse 200m² avec terrasse 150m², vue mer panoramique, prestations luxe',
-                    'property_type': 'Penthouse', 'property_subtype': 'T5',
-                    'surface_total': 200, 'surface_habitable': 180, 'bedrooms': 4, 'bathrooms': 3,
-                    'construction_year': 2019, 'energy_class': 'A', 'heating_type': 'pompe_à_chaleur',
-                    'elevator': 1, 'terrace': 1, 'swimming_pool': 1, 'garage_count': 2,
-                    'price': 4500000, 'price_per_sqm': 22500,
-                    'city': 'Cannes', 'postal_code': '06400',
-                    'luxury_level': 5, 'view_quality': 'mer', 'quietness_level': 4, 'brightness_level': 5
-                },
-                {
-                    'title': 'Villa Contemporaine - Hauteurs de Nice',
-                    'description': 'Superbe villa 250m² avec piscine, jardin 1500m², vue panoramique, prestations haut de gamme',
-                    'property_type': 'Villa', 'property_subtype': 'T6',
-                    'surface_total': 250, 'surface_habitable': 220, 'surface_terrain': 1500,
-                    'bedrooms': 5, 'bathrooms': 4, 'construction_year': 2010,
-                    'energy_class': 'B', 'heating_type': 'gaz',
-                    'garden': 1, 'swimming_pool': 1, 'garage_count': 2,
-                    'price': 1800000, 'price_per_sqm': 7200,
-                    'city': 'Nice', 'postal_code': '06000',
-                    'luxury_level': 4, 'view_quality': 'montagne', 'quietness_level': 5, 'brightness_level': 4
-                },
-                {
-                    'title': 'Appartement Familial - Centre Antibes',
-                    'description': 'Bel appartement T4 rénové, proche plages et commerces, copropriété sécurisée',
-                    'property_type': 'Appartement', 'property_subtype': 'T4',
-                    'surface_total': 95, 'surface_habitable': 90, 'bedrooms': 3, 'bathrooms': 2,
-                    'construction_year': 1980, 'energy_class': 'D', 'heating_type': 'électrique',
-                    'elevator': 1, 'balcony': 1, 'parking_spaces': 1,
-                    'price': 650000, 'price_per_sqm': 6842, 'monthly_charges': 180,
-                    'city': 'Antibes', 'postal_code': '06600',
-                    'luxury_level': 3, 'view_quality': 'ville', 'quietness_level': 3, 'brightness_level': 4
-                },
-                {
-                    'title': 'Studio Investissement - Gare de Monaco',
-                    'description': 'Studio 28m² rénové, idéal investissement locatif, proche transports',
-                    'property_type': 'Studio', 'property_subtype': 'T1',
-                    'surface_total': 28, 'surface_habitable': 26, 'bedrooms': 1, 'bathrooms': 1,
-                    'construction_year': 2000, 'energy_class': 'C', 'heating_type': 'électrique',
-                    'elevator': 1, 'price': 420000, 'price_per_sqm': 15000,
-                    'city': 'Monaco', 'postal_code': '98000',
-                    'luxury_level': 2, 'view_quality': 'cour', 'quietness_level': 2, 'brightness_level': 3
-                },
-                {
-                    'title': 'Maison de Charme - Vieux Grasse',
-                    'description': 'Authentique maison provençale, terrasses, vue panoramique, cachet exceptionnel',
-                    'property_type': 'Maison', 'property_subtype': 'T5',
-                    'surface_total': 140, 'surface_habitable': 130, 'surface_terrain': 400,
-                    'bedrooms': 4, 'bathrooms': 2, 'construction_year': 1920,
-                    'energy_class': 'E', 'heating_type': 'bois',
-                    'garden': 1, 'terrace': 1, 'fireplace': 1,
-                    'price': 580000, 'price_per_sqm': 4143,
-                    'city': 'Grasse', 'postal_code': '06130',
-                    'luxury_level': 3, 'view_quality': 'montagne', 'quietness_level': 5, 'brightness_level': 4
-                },
-                {
-                    'title': 'Loft Atypique - Port de Saint-Laurent',
-                    'description': 'Magnifique loft 120m², volumes exceptionnels, proche marina, moderne',
-                    'property_type': 'Loft', 'property_subtype': 'T3',
-                    'surface_total': 120, 'surface_habitable': 115, 'bedrooms': 2, 'bathrooms': 2,
-                    'construction_year': 2005, 'energy_class': 'C', 'heating_type': 'pompe_à_chaleur',
-                    'elevator': 1, 'terrace': 1, 'parking_spaces': 1,
-                    'price': 750000, 'price_per_sqm': 6250,
-                    'city': 'Saint-Laurent-du-Var', 'postal_code': '06700',
-                    'luxury_level': 4, 'view_quality': 'mer', 'quietness_level': 3, 'brightness_level': 5
-                }
-            ]
-            
-            for prop in properties:
-                columns = ', '.join(prop.keys())
-                placeholders = ', '.join(['?' for _ in prop])
-                cursor.execute(f'INSERT INTO properties ({columns}) VALUES ({placeholders})', 
-                             list(prop.values()))
-            
-            # Utilisateurs d'exemple avec profils variés
-            users = [
-                {
-                    'email': 'jean.famille@email.fr', 'password_hash': 'hash123',
-                    'first_name': 'Jean', 'last_name': 'Dupont', 'phone': '0612345678',
-                    'age': 38, 'user_type': 'acquéreur',
-                    'budget_min': 800000, 'budget_max': 1200000,
-                    'property_types': json.dumps(['Villa', 'Maison']),
-                    'surface_min': 150, 'bedrooms_min': 4,
-                    'preferred_locations': json.dumps(['Nice', 'Antibes']),
-                    'marital_status': 'marié', 'children_count': 2,
-                    'lifestyle': 'périurbain', 'work_arrangement': 'mixte'
-                },
-                {
-                    'email': 'sophie.jeune@email.fr', 'password_hash': 'hash456',
-                    'first_name': 'Sophie', 'last_name': 'Martin', 'phone': '0623456789',
-                    'age': 26, 'user_type': 'locataire',
-                    'budget_min': 800, 'budget_max': 1500,
-                    'property_types': json.dumps(['Appartement', 'Studio']),
-                    'surface_min': 35, 'bedrooms_min': 1,
-                    'preferred_locations': json.dumps(['Cannes', 'Antibes']),
-                    'marital_status': 'célibataire', 'children_count': 0,
-                    'lifestyle': 'urbain', 'work_arrangement': 'bureau'
-                },
-                {
-                    'email': 'pierre.investisseur@email.fr', 'password_hash': 'hash789',
-                    'first_name': 'Pierre', 'last_name': 'Investisseur', 'phone': '0634567890',
-                    'age': 52, 'user_type': 'investisseur',
-                    'budget_min': 300000, 'budget_max': 800000,
-                    'property_types': json.dumps(['Appartement', 'Studio']),
-                    'surface_min': 25, 'bedrooms_min': 1,
-                    'preferred_locations': json.dumps(['Monaco', 'Nice', 'Cannes']),
-                    'marital_status': 'marié', 'children_count': 3,
-                    'lifestyle': 'urbain', 'work_arrangement': 'mixte'
-                }
-            ]
+            # Même transaction que les agents et les utilisateurs : un échec
+            # n'en laisse aucun (le prochain lancement recommence)
+            self._write_listings(cursor, get_importable_columns(cursor), sample_properties(), set())
             
-            for user in users:
+            for user in SAMPLE_USERS:
                 columns = ', '.join(user.keys())
                 placeholders = ', '.join(['?' for _ in user])
                 cursor.execute(f'INSERT INTO users ({columns}) VALUES ({placeholders})', 
                              list(user.values()))
             
             conn.commit()
+            self.result_cache.clear()
             print("Données d'exemple enrichies ajoutées avec succès")
             
         except Exception as e:
+            conn.rollback()
             print(f"Erreur ajout données: {e}")
         finally:
             conn.close()
     
-    def search_properties_advanced(self, filters=None):
-        """Recherche avancée avec tous les critères"""
+    def bulk_upsert_properties(self, listings, chunk_size=1000, progress=None, verbose=True):
+        """
+        Importe un flux d'annonces en masse
+        
+        Les annonces sont lues au fil de l'eau par lots de chunk_size, chaque
+        lot étant écrit dans une seule transaction. Dans un lot, les lignes
+        sont regroupées par jeu de colonnes et insérées par executemany ;
+        une annonce dont l'external_ref existe déjà est mise à jour.
+        
+        Args:
+            listings: Itérable d'annonces (dict, format table ou historique)
+            chunk_size: Nombre d'annonces par transaction
+            progress: Fonction appelée avec les statistiques après chaque lot
+            verbose: Afficher le bilan de l'import
+            
+        Returns:
+            dict: rows, inserted, updated, rejected, chunks, ignored_fields,
+                  elapsed, rows_per_second
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
+        start = time.perf_counter()
+        stats = {
+            'rows': 0, 'inserted': 0, 'updated': 0, 'rejected': 0,
+            'chunks': 0, 'ignored_fields': [], 'elapsed': 0.0, 'rows_per_second': 0.0
+        }
+        ignored_fields = set()
         
         try:
-            query = "SELECT * FROM properties WHERE listing_status = 'active'"
-            params = []
+            columns = get_importable_columns(cursor)
             
-            if filters:
-                if filters.get('price_max'):
-                    query += " AND price <= ?"
-                    params.append(filters['price_max'])
-                
-                if filters.get('price_min'):
-                    query += " AND price >= ?"
-                    params.append(filters['price_min'])
-                
-                if filters.get('property_type'):
-                    query += " AND property_type = ?"
-                    params.append(filters['property_type'])
-                
-                if filters.get('city'):
-                    query += " AND city LIKE ?"
-                    params.append(f"%{filters['city']}%")
-                
-                if filters.get('bedrooms_min'):
-                    query += " AND bedrooms >= ?"
-                    params.append(filters['bedrooms_min'])
-                
-                if filters.get('surface_min'):
-                    query += " AND surface_total >= ?"
-                    params.append(filters['surface_min'])
-                
-                if filters.get('luxury_level'):
-                    query += " AND luxury_level >= ?"
-                    params.append(filters['luxury_level'])
+            for chunk in iter_chunks(listings, max(1, chunk_size)):
+                try:
+                    result = self._write_listings(cursor, columns, chunk, ignored_fields)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
                 
-                if filters.get('has_garden'):
-                    query += " AND garden = 1"
+                self._invalidate_search_cache(result['changes'], result['written'])
                 
-                if filters.get('has_pool'):
-                    query += " AND swimming_pool = 1"
+                stats['rows'] += result['rows']
+                stats['inserted'] += result['inserted']
+                stats['updated'] += result['rows'] - result['inserted']
+                stats['rejected'] += result['rejected']
+                stats['chunks'] += 1
+                stats['ignored_fields'] = sorted(ignored_fields)
+                stats['elapsed'] = time.perf_counter() - start
+                stats['rows_per_second'] = stats['rows'] / stats['elapsed'] if stats['elapsed'] else 0.0
                 
-                if filters.get('has_garage'):
-                    query += " AND garage_count > 0"
+                if progress:
+                    progress(dict(stats))
             
-            query += " ORDER BY created_at DESC LIMIT 50"
+            stats['elapsed'] = time.perf_counter() - start
+            stats['rows_per_second'] = stats['rows'] / stats['elapsed'] if stats['elapsed'] else 0.0
+            if verbose:
+                print(f"Import: {stats['rows']} annonces ({stats['inserted']} créées, "
+                      f"{stats['updated']} mises à jour, {stats['rejected']} rejetées) "
+                      f"en {stats['elapsed']:.2f}s - {stats['rows_per_second']:.0f} lignes/s")
+            return stats
+            
+        finally:
+            conn.close()
+    
+    def _write_listings(self, cursor, columns, listings, ignored_fields):
+        """
+        Écrit un lot d'annonces sans valider la transaction
+        
+        Les lignes sont regroupées par jeu de colonnes et insérées par
+        executemany (voir bulk_upsert_properties) ; l'appelant valide ou
+        annule la transaction puis invalide le cache avec 'changes'.
+        
+        Returns:
+            dict: rows, inserted, rejected, written (nombre d'annonces
+                  normalisées), changes (paires avant / après pour le cache)
+        """
+        groups = {}
+        written = []
+        rejected = 0
+        for listing in listings:
+            row, ignored = normalize_listing(listing, columns)
+            ignored_fields.update(ignored)
+            if row is None:
+                rejected += 1
+                continue
+            key = tuple(sorted(row))
+            groups.setdefault(key, []).append(tuple(row[column] for column in key))
+            written.append(row)
+        
+        # Les nouvelles lignes reçoivent un id supérieur (AUTOINCREMENT)
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM properties")
+        last_id = cursor.fetchone()[0]
+        
+        # Images avant écriture des annonces mises à jour, pour
+        # invalider les recherches qu'elles quittent
+        changes = self._snapshot_changes(cursor, written)
+        
+        rows = 0
+        for key, group_rows in groups.items():
+            cursor.executemany(build_upsert_statement(key), group_rows)
+            rows += len(group_rows)
+        
+        cursor.execute("SELECT COUNT(*) FROM properties WHERE id > ?", (last_id,))
+        inserted = cursor.fetchone()[0]
+        
+        return {'rows': rows, 'inserted': inserted, 'rejected': rejected,
+                'written': len(written), 'changes': changes}
+    
+    def _snapshot_changes(self, cursor, written):
+        """
+        Paires (image avant, image après) des annonces d'un lot
+        
+        Vide si le cache de recherche est vide ou si le lot dépasse le seuil
+        au-delà duquel le cache est vidé entièrement. L'image après est
+        l'image avant complétée des champs écrits ; une colonne absente
+        d'une insertion est traitée comme satisfaisant tout filtre.
+        """
+        cache = self.result_cache
+        if not written or not len(cache) or len(written) > cache.max_changes_per_invalidation:
+            return []
+        
+        refs = [row['external_ref'] for row in written if row.get('external_ref') is not None]
+        before = {}
+        for start in range(0, len(refs), 500):
+            batch = refs[start:start + 500]
+            cursor.execute(
+                f"SELECT * FROM properties WHERE external_ref IN ({', '.join('?' for _ in batch)})", batch
+            )
+            names = cursor_columns(cursor)
+            for values in cursor.fetchall():
+                image = dict(zip(names, values))
+                before[image['external_ref']] = image
+        
+        changes = []
+        for row in written:
+            old = before.get(row.get('external_ref'))
+            changes.append((old, dict(old or {}, **row)))
+        return changes
+    
+    def _invalidate_search_cache(self, changes, written_count):
+        """Invalide les pages touchées par un lot écrit (commit effectué)"""
+        if not written_count:
+            return
+        if changes:
+            self.result_cache.invalidate_changes(changes)
+        else:
+            # Lot trop gros, ou cache vide lors de la lecture des images :
+            # les pages rangées depuis sont écartées
+            self.result_cache.clear()
+    
+    def get_search_cache_metrics(self):
+        """Taux de succès, taille (octets) et invalidations du cache de recherche"""
+        return self.result_cache.get_metrics()
+    
+    def _build_search_query(self, filters=None, sort_by='date_desc', keyset=None, limit=50):
+        """
+        Construit la requête SQL de recherche et ses paramètres
+        
+        Le SQL est compilé une fois par forme de recherche (voir
+        database.search_query) ; keyset: (condition, paramètres) d'un
+        segment de pagination (voir keyset_segments)
+        """
+        return self.query_builder.build(filters, sort_by, keyset, limit)
+    
+    def get_query_shape_metrics(self):
+        """Réutilisation des formes de requête compilées (hits, misses, formes en cache)"""
+        return self.query_builder.get_metrics()
+    
+    def search_properties_advanced(self, filters=None, result_format='dict'):
+        """Recherche avancée avec tous les critères (première page)"""
+        return self.search_properties_page(filters, result_format=result_format)['properties']
+    
+    def search_properties(self, filters=None, result_format='dict'):
+        """Alias utilisé par le moteur de recherche (search.engine)"""
+        return self.search_properties_advanced(filters, result_format)
+    
+    def search_properties_in_bounds(self, bounds, filters=None, limit=500, result_format='dict'):
+        """
+        Annonces situées dans une emprise de carte
+        
+        Args:
+            bounds: [[sud, ouest], [nord, est]] ou bounds Leaflet de st_folium
+            filters: Critères de recherche complémentaires
+            limit: Nombre maximum de marqueurs
+            result_format: Format des lignes (voir search_properties_page)
+            
+        Returns:
+            list: Propriétés de l'emprise
+        """
+        page = self.search_properties_page(dict(filters or {}, bounds=bounds), limit=limit,
+                                           result_format=result_format)
+        return page['properties']
+    
+    def search_properties_page(self, filters=None, cursor=None, limit=50, result_format='dict'):
+        """
+        Recherche paginée par curseur (keyset)
+        
+        Le tri suit filters['sort_by'] (date_desc, price_asc, price_desc,
+        surface_desc, price_per_m2_asc, ou relevance pour filters['text']) ;
+        chaque page reprend après la dernière ligne servie, sans OFFSET :
+        une page profonde coûte autant que la première.
+        
+        Args:
+            filters: Critères de recherche
+            cursor: Jeton opaque renvoyé par la page précédente
+            limit: Taille de la page
+            result_format: 'dict', 'record' (tuples nommés, accès par clé),
+                'tuple' (RowSet de tuples bruts) ou 'numpy' (tableau structuré)
+            
+        Returns:
+            dict: {'properties': lignes au format demandé, 'next_cursor': jeton ou None}
+            
+        Raises:
+            ValueError: Curseur invalide ou émis pour d'autres filtres,
+                format de résultat inconnu
+        """
+        check_result_format(result_format)
+        sort_by = resolve_sort(filters)
+        after = decode_cursor(cursor, sort_by, filters) if cursor else None
+        
+        # Pages conservées en tuples bruts, remises au format à chaque lecture ;
+        # écritures des autres processus lues dans le journal des modifications
+        self.result_cache.refresh_from_change_log(self)
+        cache_key = self.result_cache.make_key(filters, sort_by, cursor, limit)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            columns, page, next_cursor = cached
+            return {'properties': materialize_rows(columns, page, result_format), 'next_cursor': next_cursor}
+        generation = self.result_cache.generation
+        
+        conn = self.get_read_connection()
+        db_cursor = conn.cursor()
+        
+        columns = ()
+        
+        try:
+            rows = []
             
-            cursor.execute(query, params)
-            columns = [description[0] for description in cursor.description]
-            rows = cursor.fetchall()
+            # Une ligne de plus pour savoir s'il existe une page suivante
+            for segment in keyset_segments(sort_by, after):
+                query, params = self._build_search_query(filters, sort_by, segment, limit + 1 - len(rows))
+                db_cursor.execute(query, params)
+                columns = cursor_columns(db_cursor)
+                rows.extend(db_cursor.fetchall())
+                
+                if len(rows) > limit:
+                    break
             
-            properties = []
-            for row in rows:
-                prop = dict(zip(columns, row))
-                properties.append(prop)
+            page = rows[:limit]
             
-            return properties
+            next_cursor = None
+            if len(rows) > limit and page:
+                next_cursor = encode_cursor(sort_by, dict(zip(columns, page[-1])), filters)
+            
+            self.result_cache.put(cache_key, filters, columns, page, next_cursor, generation)
+            return {'properties': materialize_rows(columns, page, result_format), 'next_cursor': next_cursor}
             
         except Exception as e:
             print(f"Erreur recherche: {e}")
-            return []
+            return {'properties': materialize_rows(columns, [], result_format), 'next_cursor': None}
         finally:
             conn.close()
     
-    def get_property_by_id(self, property_id):
-        """Récupère une propriété par son ID"""
-        conn = self.get_connection()
+    def check_search_query_plans(self):
+        """
+        Vérifie par EXPLAIN QUERY PLAN qu'aucune combinaison de filtres
+        supportée ne parcourt toute la table properties
+        
+        Returns:
+            list: Combinaisons en échec avec les étapes de parcours complet
+        """
+        conn = self.get_read_connection()
         cursor = conn.cursor()
         
         try:
-            cursor.execute("SELECT * FROM properties WHERE id = ?", (property_id,))
-            row = cursor.fetchone()
+            failures = []
             
-            if row:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, row))
-            return None
+            # Constructeur à part : les milliers de formes vérifiées ne doivent
+            # pas évincer celles des recherches en cours
+            plan_builder = SearchQueryBuilder(max_shapes=1)
+            
+            # Pour chaque tri, en première page et en page suivante
+            # (requêtes EXPLAIN, peu coûteuses)
+            for filters in search_plan_combinations():
+                for sort_by in SORT_KEYS:
+                    if sort_by == 'relevance' and 'text' not in filters:
+                        continue
+                    for after in (None, (1, 1), (None, 1)):
+                        for segment in keyset_segments(sort_by, after):
+                            query, params = plan_builder.build(filters, sort_by, segment)
+                            cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+                            # Requêtes paginées : toujours bornées par LIMIT
+                            scans = find_full_scans(cursor.fetchall(), limited=True)
+                            
+                            if scans:
+                                failures.append({'filters': filters, 'sort_by': sort_by,
+                                                 'segment': segment[0], 'scans': scans})
+            
+            return failures
+        finally:
+            conn.close()
+    
+    def get_property_by_id(self, property_id, result_format='dict'):
+        """Récupère une propriété par son ID (format de ligne au choix, 'dict' par défaut)"""
+        check_result_format(result_format)
+        conn = self.get_read_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT * FROM properties WHERE id = ?", (property_id,))
+            apply_row_factory(cursor, result_format)
+            return finalize_row(cursor_columns(cursor), cursor.fetchone(), result_format)
             
         except Exception as e:
             print(f"Erreur récupération propriété: {e}")
@@ -386,36 +688,737 @@ class DatabaseManager:
         finally:
             conn.close()
     
-    def get_user_profile(self, user_id):
-        """Récupère le profil complet d'un utilisateur"""
+    def get_properties_by_ids(self, property_ids, result_format='dict'):
+        """
+        Propriétés d'une liste d'IDs, dans l'ordre de la liste
+        
+        Les IDs absents de la base sont ignorés.
+        """
+        check_result_format(result_format)
+        property_ids = [int(property_id) for property_id in property_ids]
+        conn = self.get_read_connection()
+        cursor = conn.cursor()
+        
+        try:
+            columns = ()
+            found = {}
+            for start in range(0, len(property_ids), 500):
+                batch = property_ids[start:start + 500]
+                cursor.execute(
+                    f"SELECT * FROM properties WHERE id IN ({', '.join('?' for _ in batch)})", batch
+                )
+                columns = cursor_columns(cursor)
+                for row in cursor.fetchall():
+                    found[row[0]] = row
+            
+            rows = [found[property_id] for property_id in property_ids if property_id in found]
+            return materialize_rows(columns, rows, result_format)
+            
+        except Exception as e:
+            print(f"Erreur récupération propriétés: {e}")
+            return materialize_rows((), [], result_format)
+        finally:
+            conn.close()
+    
+    def get_property_change_counter(self):
+        """Dernier numéro de version attribué et nombre de suppressions (voir database.change_counter)"""
+        conn = self.get_read_connection()
+        
+        try:
+            return read_change_counter(conn.cursor())
+        finally:
+            conn.close()
+    
+    def fetch_property_columns(self, columns, since_version=None):
+        """
+        Colonnes choisies des annonces, en tuples bruts
+        
+        Args:
+            columns: Colonnes à lire (id, listing_status et row_version sont
+                toujours ajoutés en tête)
+            since_version: None pour les annonces actives, sinon toutes les
+                annonces modifiées après ce numéro de version
+            
+        Returns:
+            RowSet: Lignes triées par id
+        """
+        leading = ['id', 'listing_status', ROW_VERSION_COLUMN]
+        selected = leading + [column for column in columns if column not in leading]
+        query = f"SELECT {', '.join(selected)} FROM properties"
+        
+        if since_version is None:
+            query += " WHERE listing_status = 'active'"
+            params = ()
+        else:
+            query += f" WHERE {ROW_VERSION_COLUMN} > ?"
+            params = (since_version,)
+        
+        conn = self.get_read_connection()
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query + " ORDER BY id", params)
+            return RowSet(cursor_columns(cursor), cursor.fetchall())
+        finally:
+            conn.close()
+    
+    def get_property_similarities(self, property_id, limit=5):
+        """
+        Annonces similaires précalculées d'une annonce (voir database.property_similarity)
+        
+        Returns:
+            list: (id, similarité) des voisines actives ; vide si la liste
+                  n'est pas encore calculée
+        """
+        conn = self.get_read_connection()
+        
+        try:
+            return read_similarities(conn.cursor(), property_id, limit)
+        except Exception as e:
+            print(f"Erreur lecture annonces similaires: {e}")
+            return []
+        finally:
+            conn.close()
+    
+    def save_property_similarities(self, neighbors, removed_ids=()):
+        """
+        Remplace les listes d'annonces similaires calculées
+        
+        Args:
+            neighbors: ID d'annonce -> (id voisine, similarité) par similarité décroissante
+            removed_ids: Annonces dont la liste est supprimée
+            
+        Returns:
+            bool: True si enregistré
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         
+        try:
+            replace_similarities(cursor, neighbors, removed_ids)
+            conn.commit()
+            return True
+            
+        except Exception as e:
+            conn.rollback()
+            print(f"Erreur enregistrement annonces similaires: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def get_similarity_referrers(self, property_ids):
+        """Annonces dont la liste précalculée contient l'une des annonces données"""
+        conn = self.get_read_connection()
+        
+        try:
+            return similarity_referrers(conn.cursor(), property_ids)
+        finally:
+            conn.close()
+    
+    def prune_property_similarities(self):
+        """Supprime les listes précalculées des annonces supprimées ou inactives"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            removed = prune_similarities(cursor)
+            conn.commit()
+            return removed
+            
+        except Exception as e:
+            conn.rollback()
+            print(f"Erreur nettoyage annonces similaires: {e}")
+            return 0
+        finally:
+            conn.close()
+    
+    def fetch_user_columns(self, columns, user_ids=None):
+        """
+        Colonnes choisies des utilisateurs, en tuples bruts
+        
+        Args:
+            columns: Colonnes à lire (id est toujours ajouté en tête)
+            user_ids: None pour tous les utilisateurs, sinon ces IDs seulement
+            
+        Returns:
+            RowSet: Lignes triées par id
+        """
+        selected = ['id'] + [column for column in columns if column != 'id']
+        query = f"SELECT {', '.join(selected)} FROM users"
+        conn = self.get_read_connection()
+        
+        try:
+            cursor = conn.cursor()
+            if user_ids is None:
+                cursor.execute(query + " ORDER BY id")
+                return RowSet(cursor_columns(cursor), cursor.fetchall())
+            
+            user_ids = [int(user_id) for user_id in user_ids]
+            rows = []
+            for start in range(0, len(user_ids), 500):
+                batch = user_ids[start:start + 500]
+                cursor.execute(query + f" WHERE id IN ({', '.join('?' for _ in batch)})", batch)
+                rows.extend(cursor.fetchall())
+            rows.sort(key=lambda row: row[0])
+            return RowSet(tuple(selected), rows)
+        finally:
+            conn.close()
+    
+    def get_user_profile(self, user_id, result_format='dict'):
+        """Récupère le profil complet d'un utilisateur (format de ligne au choix, 'dict' par défaut)"""
+        check_result_format(result_format)
+        conn = self.get_read_connection()
+        cursor = conn.cursor()
+        
         try:
             cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-            row = cursor.fetchone()
+            apply_row_factory(cursor, result_format)
+            return finalize_row(cursor_columns(cursor), cursor.fetchone(), result_format)
             
-            if row:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, row))
+        except Exception as e:
+            print(f"Erreur récupération utilisateur: {e}")
             return None
+        finally:
+            conn.close()
+    
+    def add_to_favorites(self, user_id, property_id, interest_level=3):
+        """
+        Ajoute une annonce aux favoris et met à jour le profil comportemental
+        
+        Returns:
+            bool: True si le favori a été ajouté (False s'il existait déjà ou si l'annonce est inconnue)
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                INSERT OR IGNORE INTO favorites (user_id, property_id, interest_level)
+                SELECT ?, id, ? FROM properties WHERE id = ?
+            ''', (user_id, interest_level, property_id))
+            added = cursor.rowcount > 0
+            if added:
+                record_favorite(cursor, user_id, property_id)
+            conn.commit()
+            return added
             
         except Exception as e:
-            print(f"Erreur récupération utilisateur: {e}")
+            conn.rollback()
+            print(f"Erreur ajout favori: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def remove_from_favorites(self, user_id, property_id):
+        """Retire une annonce des favoris (profil comportemental recalculé) ; True si elle y figurait"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("DELETE FROM favorites WHERE user_id = ? AND property_id = ?", (user_id, property_id))
+            removed = cursor.rowcount > 0
+            if removed:
+                rebuild_behavior_profile(cursor, user_id)
+            conn.commit()
+            return removed
+            
+        except Exception as e:
+            conn.rollback()
+            print(f"Erreur suppression favori: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def is_favorite(self, user_id, property_id):
+        """Indique si une annonce figure dans les favoris de l'utilisateur"""
+        conn = self.get_read_connection()
+        
+        try:
+            row = conn.execute(
+                "SELECT 1 FROM favorites WHERE user_id = ? AND property_id = ?", (user_id, property_id)
+            ).fetchone()
+            return row is not None
+        finally:
+            conn.close()
+    
+    def get_user_favorites(self, user_id, result_format='dict'):
+        """Annonces favorites d'un utilisateur, les plus récemment ajoutées d'abord (avec interest_level, favorited_at)"""
+        check_result_format(result_format)
+        conn = self.get_read_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                SELECT p.*, f.interest_level, f.created_at AS favorited_at
+                FROM favorites f JOIN properties p ON p.id = f.property_id
+                WHERE f.user_id = ?
+                ORDER BY f.created_at DESC, f.id DESC
+            ''', (user_id,))
+            return materialize_rows(cursor_columns(cursor), cursor.fetchall(), result_format)
+            
+        except Exception as e:
+            print(f"Erreur récupération favoris: {e}")
+            return materialize_rows((), [], result_format)
+        finally:
+            conn.close()
+    
+    def get_user_favorite_ids(self, user_id):
+        """IDs des annonces favorites d'un utilisateur"""
+        conn = self.get_read_connection()
+        
+        try:
+            return {row[0] for row in conn.execute("SELECT property_id FROM favorites WHERE user_id = ?", (user_id,))}
+        finally:
+            conn.close()
+    
+    def fetch_favorite_interactions(self, after_id=0):
+        """
+        Favoris en tuples bruts (id, user_id, property_id, interest_level), triés par id
+        
+        Args:
+            after_id: Ne retourner que les favoris d'id supérieur (ajouts depuis une lecture précédente)
+            
+        Returns:
+            RowSet: Favoris des annonces existantes
+        """
+        conn = self.get_read_connection()
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, user_id, property_id, interest_level FROM favorites
+                WHERE id > ? AND user_id IS NOT NULL AND property_id IS NOT NULL
+                ORDER BY id
+            ''', (after_id,))
+            return RowSet(cursor_columns(cursor), cursor.fetchall())
+        finally:
+            conn.close()
+    
+    def get_favorites_state(self):
+        """Nombre de favoris et plus grand id : un nombre en baisse à id égal signale des retraits"""
+        conn = self.get_read_connection()
+        
+        try:
+            count, last_id = conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM favorites").fetchone()
+            return {'count': count, 'last_id': last_id}
+        finally:
+            conn.close()
+    
+    def fetch_favorite_ids(self, through_id):
+        """IDs des favoris jusqu'à through_id : ceux d'une lecture précédente absents ont été retirés"""
+        conn = self.get_read_connection()
+        
+        try:
+            cursor = conn.execute("SELECT id FROM favorites WHERE id <= ?", (through_id,))
+            return {row[0] for row in cursor.fetchall()}
+        finally:
+            conn.close()
+    
+    def get_user_behavior_profile(self, user_id):
+        """Profil comportemental agrégé d'un utilisateur (voir database.behavior_profile.read_behavior_profile)"""
+        conn = self.get_read_connection()
+        
+        try:
+            return read_behavior_profile(conn.cursor(), user_id)
+        except Exception as e:
+            print(f"Erreur lecture profil comportemental: {e}")
+            return {}
+        finally:
+            conn.close()
+    
+    def save_search(self, user_id, name, filters, alert_enabled=False):
+        """
+        Sauvegarde une recherche
+        
+        Args:
+            user_id: ID de l'utilisateur
+            name: Nom de la recherche
+            filters: Filtres de recherche
+            alert_enabled: Alerter l'utilisateur des nouvelles annonces correspondantes
+            
+        Returns:
+            int: ID de la recherche, None en cas d'erreur
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(
+                "INSERT INTO saved_searches (user_id, name, filters, alert_enabled) VALUES (?, ?, ?, ?)",
+                (user_id, name, json.dumps(filters or {}, default=str), 1 if alert_enabled else 0)
+            )
+            search_id = cursor.lastrowid
+            record_saved_search(cursor, user_id, filters)
+            conn.commit()
+            return search_id
+            
+        except Exception as e:
+            conn.rollback()
+            print(f"Erreur sauvegarde recherche: {e}")
             return None
         finally:
             conn.close()
     
+    def get_saved_searches(self, user_id):
+        """Recherches sauvegardées d'un utilisateur, les plus récentes d'abord (filtres décodés)"""
+        conn = self.get_read_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                SELECT id, user_id, name, filters, alert_enabled, created_at FROM saved_searches
+                WHERE user_id = ? ORDER BY created_at DESC, id DESC
+            ''', (user_id,))
+            return [saved_search(cursor_columns(cursor), row) for row in cursor.fetchall()]
+            
+        except Exception as e:
+            print(f"Erreur récupération recherches sauvegardées: {e}")
+            return []
+        finally:
+            conn.close()
+    
+    def delete_saved_search(self, user_id, search_id):
+        """Supprime une recherche sauvegardée de l'utilisateur ; True si elle existait"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("DELETE FROM saved_searches WHERE id = ? AND user_id = ?", (search_id, user_id))
+            deleted = cursor.rowcount > 0
+            if deleted:
+                rebuild_behavior_profile(cursor, user_id)
+            conn.commit()
+            return deleted
+            
+        except Exception as e:
+            conn.rollback()
+            print(f"Erreur suppression recherche sauvegardée: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def get_alert_searches(self):
+        """Recherches sauvegardées avec alertes, avec l'email et le nom de leur utilisateur"""
+        conn = self.get_read_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                SELECT s.id, s.user_id, s.name, s.filters, s.alert_enabled, s.created_at,
+                       u.email, u.first_name, u.last_name
+                FROM saved_searches s JOIN users u ON u.id = s.user_id
+                WHERE s.alert_enabled = 1
+                ORDER BY s.id
+            ''')
+            return [saved_search(cursor_columns(cursor), row) for row in cursor.fetchall()]
+            
+        except Exception as e:
+            print(f"Erreur récupération alertes: {e}")
+            return []
+        finally:
+            conn.close()
+    
+    def filter_unnotified_alerts(self, pairs):
+        """Couples (user_id, property_id) pas encore signalés, dans l'ordre d'origine"""
+        pairs = [(int(user_id), int(property_id)) for user_id, property_id in pairs]
+        if not pairs:
+            return []
+        conn = self.get_read_connection()
+        cursor = conn.cursor()
+        
+        try:
+            notified = set()
+            for start in range(0, len(pairs), 400):
+                batch = pairs[start:start + 400]
+                cursor.execute(
+                    "SELECT user_id, property_id FROM alert_notifications WHERE (user_id, property_id) IN "
+                    f"(VALUES {', '.join('(?, ?)' for _ in batch)})",
+                    [value for pair in batch for value in pair]
+                )
+                notified.update(cursor.fetchall())
+            return [pair for pair in pairs if pair not in notified]
+        finally:
+            conn.close()
+    
+    def record_alert_notifications(self, notifications):
+        """
+        Enregistre des alertes envoyées : (user_id, property_id, saved_search_id)
+        
+        Elles quittent la file des alertes en attente dans la même transaction.
+        """
+        notifications = list(notifications)
+        conn = self.get_connection()
+        
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO alert_notifications (user_id, property_id, saved_search_id) VALUES (?, ?, ?)",
+                notifications
+            )
+            conn.executemany(
+                "DELETE FROM pending_alerts WHERE user_id = ? AND property_id = ?",
+                [(user_id, property_id) for user_id, property_id, _ in notifications]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def queue_pending_alerts(self, alerts):
+        """Met en attente des alertes à envoyer : (user_id, property_id, saved_search_id)"""
+        conn = self.get_connection()
+        
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO pending_alerts (user_id, property_id, saved_search_id) VALUES (?, ?, ?)",
+                list(alerts)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def get_pending_alerts(self):
+        """Alertes en attente : (user_id, property_id, saved_search_id) par utilisateur et annonce"""
+        conn = self.get_read_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(
+                "SELECT user_id, property_id, saved_search_id FROM pending_alerts ORDER BY user_id, property_id"
+            )
+            return cursor.fetchall()
+        finally:
+            conn.close()
+    
+    def discard_pending_alerts(self, pairs):
+        """Retire de la file des couples (user_id, property_id) devenus sans objet"""
+        conn = self.get_connection()
+        
+        try:
+            conn.executemany(
+                "DELETE FROM pending_alerts WHERE user_id = ? AND property_id = ?",
+                [(int(user_id), int(property_id)) for user_id, property_id in pairs]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def log_search_event(self, user_id, query, filters=None):
+        """
+        Enregistre une recherche et met à jour les préférences agrégées de l'utilisateur
+        
+        Les recherches au-delà de max_events_per_user sont supprimées, les
+        compteurs conservent leur contribution.
+        
+        Args:
+            user_id: ID de l'utilisateur
+            query: Requête saisie
+            filters: Filtres déduits de la requête
+            
+        Returns:
+            int: ID de l'événement, None en cas d'erreur
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(
+                "INSERT INTO search_events (user_id, query, filters) VALUES (?, ?, ?)",
+                (user_id, query, json.dumps(filters or {}, default=str))
+            )
+            event_id = cursor.lastrowid
+            
+            cursor.executemany('''
+                INSERT INTO user_search_patterns (user_id, kind, value, count) VALUES (?, ?, ?, 1)
+                ON CONFLICT(user_id, kind, value) DO UPDATE SET count = count + 1
+            ''', [(user_id, kind, value) for kind, value in search_counters(filters)])
+            
+            price_max_sum, price_max_count = search_stats_increment(filters)
+            cursor.execute('''
+                INSERT INTO user_search_stats (user_id, search_count, price_max_sum, price_max_count, last_search_at)
+                VALUES (?, 1, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    search_count = search_count + 1,
+                    price_max_sum = price_max_sum + excluded.price_max_sum,
+                    price_max_count = price_max_count + excluded.price_max_count,
+                    last_search_at = excluded.last_search_at
+            ''', (user_id, price_max_sum, price_max_count))
+            
+            # Historique borné : suppression au-delà des N dernières recherches
+            cursor.execute('''
+                DELETE FROM search_events WHERE user_id = ? AND id <= (
+                    SELECT id FROM search_events WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+                )
+            ''', (user_id, user_id, self.search_history_config['max_events_per_user']))
+            
+            conn.commit()
+            return event_id
+            
+        except Exception as e:
+            conn.rollback()
+            print(f"Erreur enregistrement recherche: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def get_search_patterns(self, user_id):
+        """
+        Préférences de recherche agrégées d'un utilisateur (voir database.search_events.build_patterns)
+        
+        Lectures indexées : le coût ne dépend pas du volume d'historique.
+        """
+        conn = self.get_read_connection()
+        cursor = conn.cursor()
+        
+        try:
+            # Valeurs les plus fréquentes de chaque type de compteur
+            cursor.execute('''
+                SELECT kind, value, count FROM (
+                    SELECT kind, value, count,
+                           ROW_NUMBER() OVER (PARTITION BY kind ORDER BY count DESC, value) AS rank
+                    FROM user_search_patterns WHERE user_id = ?
+                ) WHERE rank <= ?
+                ORDER BY kind, count DESC, value
+            ''', (user_id, self.search_history_config['max_pattern_values']))
+            counter_rows = cursor.fetchall()
+            
+            cursor.execute(
+                "SELECT search_count, price_max_sum, price_max_count FROM user_search_stats WHERE user_id = ?",
+                (user_id,)
+            )
+            stats_row = cursor.fetchone()
+            
+            cursor.execute(
+                "SELECT query FROM search_events WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, self.search_history_config['recent_queries'])
+            )
+            recent_queries = [row[0] for row in reversed(cursor.fetchall())]
+            
+            return build_patterns(counter_rows, stats_row, recent_queries)
+            
+        except Exception as e:
+            print(f"Erreur lecture préférences de recherche: {e}")
+            return build_patterns([], None, [])
+        finally:
+            conn.close()
+    
+    def get_search_history(self, user_id, limit=20):
+        """Dernières recherches d'un utilisateur, les plus récentes d'abord (filtres décodés)"""
+        conn = self.get_read_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                SELECT id, user_id, query, filters, created_at FROM search_events
+                WHERE user_id = ? ORDER BY id DESC LIMIT ?
+            ''', (user_id, limit))
+            return [search_event(cursor_columns(cursor), row) for row in cursor.fetchall()]
+            
+        except Exception as e:
+            print(f"Erreur récupération historique de recherche: {e}")
+            return []
+        finally:
+            conn.close()
+    
+    def get_feed_cursor(self, consumer):
+        """Position (dernier seq traité) d'un consommateur du journal des modifications, None s'il est nouveau"""
+        conn = self.get_read_connection()
+        
+        try:
+            row = conn.execute("SELECT position FROM feed_cursors WHERE consumer = ?", (consumer,)).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+    
+    def set_feed_cursor(self, consumer, position):
+        """Enregistre la position d'un consommateur du journal des modifications"""
+        conn = self.get_connection()
+        
+        try:
+            conn.execute('''
+                INSERT INTO feed_cursors (consumer, position, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(consumer) DO UPDATE SET position = excluded.position, updated_at = excluded.updated_at
+            ''', (consumer, position))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def get_change_log_head(self):
+        """Dernier seq du journal des modifications (voir database.change_log)"""
+        conn = self.get_read_connection()
+        
+        try:
+            return change_log_head(conn.cursor())
+        finally:
+            conn.close()
+    
+    def read_property_changes(self, since, limit=None):
+        """
+        Modifications d'annonces postérieures au seq since
+        
+        Returns:
+            dict: changes, position (dernier seq lu), reset (entrées
+                  manquantes supprimées par la compaction)
+        """
+        conn = self.get_read_connection()
+        
+        try:
+            return read_changes(conn.cursor(), since, limit or self.change_log_config['read_batch_size'])
+        finally:
+            conn.close()
+    
+    def read_consumer_changes(self, consumer, limit=None):
+        """
+        Modifications non encore traitées par un consommateur
+        
+        Un nouveau consommateur part de la tête du journal. La position
+        retournée est à enregistrer avec set_feed_cursor une fois les
+        entrées traitées : en cas d'échec, elles sont relues.
+        """
+        position = self.get_feed_cursor(consumer)
+        if position is None:
+            position = self.get_change_log_head()
+            self.set_feed_cursor(consumer, position)
+        return self.read_property_changes(position, limit)
+    
+    def drop_change_consumer(self, consumer):
+        """Supprime un consommateur : il ne retient plus la compaction du journal"""
+        conn = self.get_connection()
+        
+        try:
+            conn.execute("DELETE FROM feed_cursors WHERE consumer = ?", (consumer,))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def compact_change_log(self, retention_seconds=None):
+        """
+        Supprime les entrées lues par tous les consommateurs ou expirées, et
+        fusionne les entrées restantes d'une même annonce (à exécuter périodiquement)
+        """
+        if retention_seconds is None:
+            retention_seconds = self.change_log_config['retention_seconds']
+        conn = self.get_connection()
+        
+        try:
+            result = compact_change_log(conn.cursor(), retention_seconds)
+            conn.commit()
+            return result
+        except Exception as e:
+            conn.rollback()
+            print(f"Erreur compaction du journal: {e}")
+            return {}
+        finally:
+            conn.close()
+    
     def get_statistics(self):
         """Retourne des statistiques de la base"""
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         cursor = conn.cursor()
         
         try:
             stats = {}
             
-            # Comptages généraux
-            cursor.execute("SELECT COUNT(*) FROM properties WHERE listing_status = 'active'")
+            # Comptages généraux (annonces actives : agrégats de marché)
+            cursor.execute("SELECT COALESCE(SUM(listing_count), 0) FROM market_stats")
             stats['total_properties'] = cursor.fetchone()[0]
             
             cursor.execute("SELECT COUNT(*) FROM users")
@@ -426,11 +1429,10 @@ class DatabaseManager:
             
             # Prix moyens par ville
             cursor.execute('''
-                SELECT city, AVG(price), COUNT(*) 
-                FROM properties 
-                WHERE listing_status = 'active' 
-                GROUP BY city 
-                ORDER BY AVG(price) DESC
+                SELECT city, SUM(price_sum) * 1.0 / SUM(listing_count) AS avg_price, SUM(listing_count)
+                FROM market_stats
+                GROUP BY city
+                ORDER BY avg_price DESC
             ''')
             stats['price_by_city'] = [
                 {'city': row[0], 'avg_price': int(row[1]), 'count': row[2]}
@@ -439,9 +1441,8 @@ class DatabaseManager:
             
             # Répartition par type
             cursor.execute('''
-                SELECT property_type, COUNT(*) 
-                FROM properties 
-                WHERE listing_status = 'active' 
+                SELECT property_type, SUM(listing_count)
+                FROM market_stats
                 GROUP BY property_type
             ''')
             stats['properties_by_type'] = dict(cursor.fetchall())
@@ -454,29 +1455,57 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    def get_market_stats(self, city=None, property_type=None):
+        """
+        Statistiques de marché (prix moyen, min, max, médiane estimée,
+        surface moyenne, répartition par chambres) lues dans les agrégats
+        
+        Args:
+            city: Ville (correspondance partielle, comme le filtre de recherche)
+            property_type: Type de bien
+            
+        Returns:
+            dict: Statistiques, vide si aucune annonce
+        """
+        conn = self.get_read_connection()
+        
+        try:
+            return read_market_stats(conn.cursor(), city, property_type)
+        except Exception as e:
+            print(f"Erreur statistiques marché: {e}")
+            return {}
+        finally:
+            conn.close()
+    
     def test_connection(self):
         """Test de connexion à la base"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM properties")
-            count = cursor.fetchone()[0]
-            conn.close()
+            with self.get_read_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT COUNT(*) FROM properties")
+                count = cursor.fetchone()[0]
             print(f"Test réussi: {count} propriétés en base")
             return True
         except Exception as e:
             print(f"Test échoué: {e}")
             return False
 
+def create_database_manager():
+    """Instancie le gestionnaire du backend choisi par DB_TYPE (sqlite par défaut)"""
+    if os.getenv("DB_TYPE", "sqlite") == "postgresql":
+        from database.postgres import PostgresDatabaseManager
+        return PostgresDatabaseManager(get_database_url())
+    return DatabaseManager()
+
 # Instance globale
-db_manager = DatabaseManager()
+db_manager = create_database_manager()
 
 # Fonctions utilitaires
 def get_database():
     return db_manager
 
-def search_properties(filters=None):
-    return db_manager.search_properties_advanced(filters)
+def search_properties(filters=None, result_format='dict'):
+    return db_manager.search_properties_advanced(filters, result_format)
 
 def get_stats():
     return db_manager.get_statistics()
@@ -503,6 +1532,10 @@ if __name__ == "__main__":
     print(f"Utilisateurs: {stats.get('total_users', 0)}")
     print(f"Agents: {stats.get('total_agents', 0)}")
     
+    for pool_name, metrics in db_manager.get_pool_metrics().items():
+        print(f"Pool {pool_name}: {metrics['size']}/{metrics['max_size']} connexions, "
+              f"{metrics['checkouts']} emprunts, attente max {metrics['max_wait_time'] * 1000:.1f} ms")
+    
     # Test de recherche
     print("\n=== Test de recherche ===")
     results = db_manager.search_properties_advanced({
@@ -515,4 +1548,13 @@ if __name__ == "__main__":
     for prop in results[:3]:  # Afficher les 3 premiers
         print(f"- {prop['title']} | {prop['price']:,}€ | {prop['city']}")
     
+    # Régression des plans d'exécution
+    print("\n=== Plans de recherche ===")
+    plan_failures = db_manager.check_search_query_plans()
+    if plan_failures:
+        for failure in plan_failures:
+            print(f"❌ Parcours complet pour {failure['filters']} (tri {failure['sort_by']}): {failure['scans']}")
+        exit(1)
+    print("✅ Toutes les combinaisons de filtres utilisent un index")
+    
     print("\n=== Test terminé ===")
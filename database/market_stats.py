@@ -0,0 +1,341 @@
+"""
+Statistiques de marché matérialisées (ville, type de bien, nombre de chambres)
+Tenues à jour par triggers à chaque insertion, modification ou suppression d'annonce
+"""
+import logging
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+from database.schema import create_schema_versions_table, get_component_version, set_component_version
+
+logger = logging.getLogger(__name__)
+
+MARKET_STATS_VERSION = 1
+
+# Les annonces sans nombre de chambres sont regroupées sous cette valeur
+# (une clé primaire ne peut pas dédupliquer les NULL)
+UNKNOWN_BEDROOMS = -1
+
+# Colonnes de properties dont la modification déplace une annonce dans les agrégats
+TRACKED_COLUMNS = ['listing_status', 'city', 'property_type', 'bedrooms', 'price', 'surface_total', 'price_per_sqm']
+
+_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS market_stats (
+        city TEXT NOT NULL,
+        property_type TEXT NOT NULL,
+        bedrooms INTEGER NOT NULL,
+        listing_count INTEGER NOT NULL DEFAULT 0,
+        price_sum INTEGER NOT NULL DEFAULT 0,
+        price_min INTEGER,
+        price_max INTEGER,
+        surface_sum INTEGER NOT NULL DEFAULT 0,
+        surface_count INTEGER NOT NULL DEFAULT 0,
+        price_per_sqm_sum INTEGER NOT NULL DEFAULT 0,
+        price_per_sqm_count INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (city, property_type, bedrooms)
+    ) WITHOUT ROWID
+    ''',
+    # Histogramme des prix par groupe, pour la médiane
+    '''
+    CREATE TABLE IF NOT EXISTS market_price_buckets (
+        city TEXT NOT NULL,
+        property_type TEXT NOT NULL,
+        bedrooms INTEGER NOT NULL,
+        price_floor INTEGER NOT NULL,
+        listing_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (city, property_type, bedrooms, price_floor)
+    ) WITHOUT ROWID
+    ''',
+    # Recalcul du min / max d'un groupe quand l'annonce extrême le quitte
+    '''
+    CREATE INDEX IF NOT EXISTS idx_properties_market_group
+    ON properties (listing_status, city, property_type, bedrooms, price)
+    ''',
+]
+
+_TRIGGER_NAMES = ['market_stats_after_insert', 'market_stats_after_update', 'market_stats_after_delete']
+
+
+def price_bucket_floor_sql(price: str) -> str:
+    """
+    Borne basse de la tranche de prix (précision d'environ 1 à 10 %)
+
+    Arithmétique entière uniquement : les triggers doivent fonctionner
+    sur toute connexion, sans fonction SQL additionnelle.
+    """
+    return (
+        f"CASE WHEN {price} < 100000 THEN {price} / 1000 * 1000"
+        f" WHEN {price} < 1000000 THEN {price} / 10000 * 10000"
+        f" WHEN {price} < 10000000 THEN {price} / 100000 * 100000"
+        f" ELSE {price} / 1000000 * 1000000 END"
+    )
+
+
+def price_bucket_width(price_floor: int) -> int:
+    """Largeur de la tranche commençant à price_floor (voir price_bucket_floor_sql)"""
+    if price_floor < 100000:
+        return 1000
+    if price_floor < 1000000:
+        return 10000
+    if price_floor < 10000000:
+        return 100000
+    return 1000000
+
+
+def _group_key(row: str) -> str:
+    """Conditions de clé du groupe d'une annonce (row = 'old' ou 'new')"""
+    return (f"city = {row}.city AND property_type = {row}.property_type"
+            f" AND bedrooms = COALESCE({row}.bedrooms, {UNKNOWN_BEDROOMS})")
+
+
+def _add_statements(row: str) -> List[str]:
+    """Ajoute une annonce active aux agrégats"""
+    return [
+        f'''
+        INSERT INTO market_stats (
+            city, property_type, bedrooms, listing_count, price_sum, price_min, price_max,
+            surface_sum, surface_count, price_per_sqm_sum, price_per_sqm_count, updated_at
+        )
+        SELECT {row}.city, {row}.property_type, COALESCE({row}.bedrooms, {UNKNOWN_BEDROOMS}),
+               1, {row}.price, {row}.price, {row}.price,
+               COALESCE({row}.surface_total, 0), {row}.surface_total IS NOT NULL,
+               COALESCE({row}.price_per_sqm, 0), {row}.price_per_sqm IS NOT NULL,
+               CURRENT_TIMESTAMP
+        WHERE {row}.listing_status = 'active'
+        ON CONFLICT (city, property_type, bedrooms) DO UPDATE SET
+            listing_count = listing_count + 1,
+            price_sum = price_sum + excluded.price_sum,
+            price_min = MIN(COALESCE(price_min, excluded.price_min), excluded.price_min),
+            price_max = MAX(COALESCE(price_max, excluded.price_max), excluded.price_max),
+            surface_sum = surface_sum + excluded.surface_sum,
+            surface_count = surface_count + excluded.surface_count,
+            price_per_sqm_sum = price_per_sqm_sum + excluded.price_per_sqm_sum,
+            price_per_sqm_count = price_per_sqm_count + excluded.price_per_sqm_count,
+            updated_at = excluded.updated_at
+        ''',
+        f'''
+        INSERT INTO market_price_buckets (city, property_type, bedrooms, price_floor, listing_count)
+        SELECT {row}.city, {row}.property_type, COALESCE({row}.bedrooms, {UNKNOWN_BEDROOMS}),
+               {price_bucket_floor_sql(f"{row}.price")}, 1
+        WHERE {row}.listing_status = 'active'
+        ON CONFLICT (city, property_type, bedrooms, price_floor) DO UPDATE SET
+            listing_count = listing_count + 1
+        ''',
+    ]
+
+
+def _remove_statements(row: str) -> List[str]:
+    """Retire une annonce active des agrégats"""
+    active = f"{row}.listing_status = 'active'"
+    return [
+        f'''
+        UPDATE market_stats SET
+            listing_count = listing_count - 1,
+            price_sum = price_sum - {row}.price,
+            surface_sum = surface_sum - COALESCE({row}.surface_total, 0),
+            surface_count = surface_count - ({row}.surface_total IS NOT NULL),
+            price_per_sqm_sum = price_per_sqm_sum - COALESCE({row}.price_per_sqm, 0),
+            price_per_sqm_count = price_per_sqm_count - ({row}.price_per_sqm IS NOT NULL),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE {_group_key(row)} AND {active}
+        ''',
+        f"DELETE FROM market_stats WHERE {_group_key(row)} AND listing_count <= 0",
+        # L'annonce retirée était l'extrême du groupe : relire l'index
+        f'''
+        UPDATE market_stats SET
+            price_min = (SELECT MIN(price) FROM properties WHERE listing_status = 'active'
+                         AND city = {row}.city AND property_type = {row}.property_type
+                         AND bedrooms IS {row}.bedrooms),
+            price_max = (SELECT MAX(price) FROM properties WHERE listing_status = 'active'
+                         AND city = {row}.city AND property_type = {row}.property_type
+                         AND bedrooms IS {row}.bedrooms)
+        WHERE {_group_key(row)} AND {active}
+          AND (price_min = {row}.price OR price_max = {row}.price)
+        ''',
+        f'''
+        UPDATE market_price_buckets SET listing_count = listing_count - 1
+        WHERE {_group_key(row)} AND price_floor = {price_bucket_floor_sql(f"{row}.price")} AND {active}
+        ''',
+        f"DELETE FROM market_price_buckets WHERE {_group_key(row)} AND listing_count <= 0",
+    ]
+
+
+def _trigger(name: str, event: str, statements: List[str]) -> str:
+    body = ';\n'.join(statement.strip() for statement in statements)
+    return f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON properties BEGIN\n{body};\nEND"
+
+
+_TRIGGERS = [
+    _trigger('market_stats_after_insert', 'INSERT', _add_statements('new')),
+    _trigger('market_stats_after_update', f"UPDATE OF {', '.join(TRACKED_COLUMNS)}",
+             _remove_statements('old') + _add_statements('new')),
+    _trigger('market_stats_after_delete', 'DELETE', _remove_statements('old')),
+]
+
+
+def rebuild_market_stats(cursor: sqlite3.Cursor):
+    """Recalcule entièrement les agrégats depuis la table properties"""
+    cursor.execute("DELETE FROM market_stats")
+    cursor.execute("DELETE FROM market_price_buckets")
+
+    cursor.execute(f'''
+        INSERT INTO market_stats (
+            city, property_type, bedrooms, listing_count, price_sum, price_min, price_max,
+            surface_sum, surface_count, price_per_sqm_sum, price_per_sqm_count
+        )
+        SELECT city, property_type, COALESCE(bedrooms, {UNKNOWN_BEDROOMS}),
+               COUNT(*), SUM(price), MIN(price), MAX(price),
+               COALESCE(SUM(surface_total), 0), COUNT(surface_total),
+               COALESCE(SUM(price_per_sqm), 0), COUNT(price_per_sqm)
+        FROM properties
+        WHERE listing_status = 'active'
+        GROUP BY city, property_type, COALESCE(bedrooms, {UNKNOWN_BEDROOMS})
+    ''')
+
+    cursor.execute(f'''
+        INSERT INTO market_price_buckets (city, property_type, bedrooms, price_floor, listing_count)
+        SELECT city, property_type, COALESCE(bedrooms, {UNKNOWN_BEDROOMS}),
+               {price_bucket_floor_sql('price')}, COUNT(*)
+        FROM properties
+        WHERE listing_status = 'active'
+        GROUP BY 1, 2, 3, 4
+    ''')
+
+
+def ensure_market_stats(cursor: sqlite3.Cursor) -> bool:
+    """
+    Crée les tables d'agrégats et leurs triggers, et les recalcule à
+    chaque changement de version
+
+    Returns:
+        bool: True si les agrégats ont été (re)construits
+    """
+    create_schema_versions_table(cursor)
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'market_stats_%'")
+    existing_triggers = {row[0] for row in cursor.fetchall()}
+
+    if (get_component_version(cursor, 'market_stats') == MARKET_STATS_VERSION
+            and existing_triggers >= set(_TRIGGER_NAMES)):
+        return False
+
+    for name in _TRIGGER_NAMES:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cursor.execute("DROP TABLE IF EXISTS market_stats")
+    cursor.execute("DROP TABLE IF EXISTS market_price_buckets")
+
+    for statement in _TABLES:
+        cursor.execute(statement)
+    for trigger in _TRIGGERS:
+        cursor.execute(trigger)
+
+    rebuild_market_stats(cursor)
+
+    set_component_version(cursor, 'market_stats', MARKET_STATS_VERSION)
+    logger.info(f"Statistiques de marché en version {MARKET_STATS_VERSION}")
+    return True
+
+
+def estimate_median(buckets: List[tuple], total: int, price_min: Optional[int],
+                    price_max: Optional[int]) -> float:
+    """
+    Médiane estimée depuis l'histogramme des prix
+
+    Même rang que sorted(prix)[n // 2], interpolé linéairement dans la
+    tranche qui le contient.
+
+    Args:
+        buckets: (price_floor, nombre d'annonces), triés par prix croissant
+        total: Nombre total d'annonces
+        price_min, price_max: Bornes exactes, pour borner l'estimation
+    """
+    if not total:
+        return 0
+
+    target = total // 2
+    seen = 0
+    for price_floor, count in buckets:
+        if seen + count > target:
+            fraction = (target - seen + 0.5) / count
+            estimate = price_floor + price_bucket_width(price_floor) * fraction
+            if price_min is not None:
+                estimate = max(price_min, estimate)
+            if price_max is not None:
+                estimate = min(price_max, estimate)
+            return estimate
+        seen += count
+
+    return price_max or 0
+
+
+def group_filter_clause(city: Optional[str] = None, property_type: Optional[str] = None):
+    """
+    Conditions SQL sur les groupes (ville approchée comme le filtre de recherche)
+
+    Returns:
+        Tuple[str, List[Any]]: (clause WHERE commençant par ' WHERE' ou vide, paramètres)
+    """
+    conditions, params = [], []
+    if city:
+        conditions.append("city LIKE ?")
+        params.append(f"%{city}%")
+    if property_type:
+        conditions.append("property_type = ?")
+        params.append(property_type)
+
+    clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return clause, params
+
+
+def read_market_stats(cursor: sqlite3.Cursor, city: Optional[str] = None,
+                      property_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Statistiques de marché lues dans les agrégats (O(groupes))
+
+    Returns:
+        Dict[str, Any]: total_properties, average_price, min_price, max_price,
+        median_price (estimée), average_surface, average_price_per_m2,
+        bedroom_distribution ; {} si aucune annonce
+    """
+    where, params = group_filter_clause(city, property_type)
+
+    cursor.execute(f'''
+        SELECT SUM(listing_count), SUM(price_sum), MIN(price_min), MAX(price_max),
+               SUM(surface_sum), SUM(surface_count)
+        FROM market_stats{where}
+    ''', params)
+    total, price_sum, price_min, price_max, surface_sum, surface_count = cursor.fetchone()
+
+    if not total:
+        return {}
+
+    cursor.execute(f'''
+        SELECT price_floor, SUM(listing_count) FROM market_price_buckets{where}
+        GROUP BY price_floor ORDER BY price_floor
+    ''', params)
+    buckets = cursor.fetchall()
+
+    cursor.execute(f'''
+        SELECT bedrooms, SUM(listing_count) FROM market_stats{where}
+        GROUP BY bedrooms ORDER BY bedrooms
+    ''', params)
+    bedroom_distribution = {
+        (None if bedrooms == UNKNOWN_BEDROOMS else bedrooms): count
+        for bedrooms, count in cursor.fetchall()
+    }
+
+    average_price = price_sum / total
+    average_surface = surface_sum / surface_count if surface_count else 0
+
+    return {
+        'total_properties': total,
+        'average_price': average_price,
+        'min_price': price_min,
+        'max_price': price_max,
+        'median_price': estimate_median(buckets, total, price_min, price_max),
+        'average_surface': average_surface,
+        'average_price_per_m2': average_price / average_surface if average_surface else 0,
+        'bedroom_distribution': bedroom_distribution
+    }
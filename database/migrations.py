@@ -8,6 +8,7 @@ from datetime import datetime
 import os
 
 from database.manager import get_database
+from database.importer import import_listings_file
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +23,7 @@ def load_sample_data() -> bool:
         db = get_database()
         
         # Charger le fichier JSON des propriétés d'exemple
-        sample_data_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'sample_properties.json')
+        sample_data_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'sample_data.json')
         
         if not os.path.exists(sample_data_path):
             logger.warning(f"Fichier de données d'exemple non trouvé: {sample_data_path}")
@@ -31,19 +32,17 @@ def load_sample_data() -> bool:
         with open(sample_data_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
-        # Insérer les propriétés d'exemple
-        properties_added = 0
-        for property_data in data.get('properties', []):
-            try:
-                property_id = db.add_property(property_data)
-                if property_id:
-                    properties_added += 1
-                    logger.debug(f"Propriété ajoutée avec ID: {property_id}")
-            except Exception as e:
-                logger.error(f"Erreur ajout propriété {property_data.get('title', 'Unknown')}: {e}")
+        # Insérer les propriétés d'exemple (rejouable : upsert sur external_ref)
+        properties = data.get('properties', [])
+        for index, property_data in enumerate(properties, 1):
+            property_data.setdefault('external_ref', f"sample-data-{index}")
+        
+        stats = db.bulk_upsert_properties(properties)
+        if stats['rejected']:
+            logger.warning(f"{stats['rejected']} propriétés rejetées (champs obligatoires manquants)")
         
-        logger.info(f"Migration terminée: {properties_added} propriétés ajoutées")
-        return properties_added > 0
+        logger.info(f"Migration terminée: {stats['rows']} propriétés importées")
+        return stats['rows'] > 0
         
     except Exception as e:
         logger.error(f"Erreur lors du chargement des données d'exemple: {e}")
@@ -107,14 +106,13 @@ def create_minimal_sample_data() -> bool:
             }
         ]
         
-        properties_added = 0
-        for property_data in minimal_properties:
-            property_id = db.add_property(property_data)
-            if property_id:
-                properties_added += 1
+        for index, property_data in enumerate(minimal_properties, 1):
+            property_data['external_ref'] = f"minimal-{index}"
         
-        logger.info(f"Données minimales créées: {properties_added} propriétés")
-        return properties_added > 0
+        stats = db.bulk_upsert_properties(minimal_properties)
+        
+        logger.info(f"Données minimales créées: {stats['rows']} propriétés")
+        return stats['rows'] > 0
         
     except Exception as e:
         logger.error(f"Erreur création données minimales: {e}")
@@ -663,9 +661,16 @@ if __name__ == "__main__":
     
     parser = argparse.ArgumentParser(description="Scripts de migration ImoMatch")
     parser.add_argument('--action', choices=[
-        'migrate', 'reset', 'backup', 'repair', 'status', 'test-data'
+        'migrate', 'reset', 'backup', 'repair', 'status', 'test-data', 'check-plans', 'import'
     ], default='migrate', help='Action à exécuter')
     parser.add_argument('--backup-path', help='Chemin pour la sauvegarde')
+    parser.add_argument('--file', help="Fichier d'annonces à importer (CSV ou JSONL)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="Format du fichier (déduit de l'extension par défaut)")
+    parser.add_argument('--batch-size', type=int, default=1000, help='Annonces par lot et par transaction')
+    parser.add_argument('--workers', type=int, default=1, help='Processus de validation')
+    parser.add_argument('--checkpoint', help='Fichier de reprise (par défaut <fichier>.checkpoint.json)')
+    parser.add_argument('--restart', action='store_true', help='Ignorer le point de reprise existant')
+    parser.add_argument('--rejects', help='Fichier JSONL des annonces rejetées')
     
     args = parser.parse_args()
     
@@ -699,3 +704,29 @@ if __name__ == "__main__":
     elif args.action == 'test-data':
         success = create_test_data()
         print("✅ Données de test créées" if success else "❌ Échec création données de test")
+    
+    elif args.action == 'check-plans':
+        failures = get_database().check_search_query_plans()
+        for failure in failures:
+            print(f"❌ Parcours complet pour {failure['filters']} (tri {failure['sort_by']}): {failure['scans']}")
+        if failures:
+            exit(1)
+        print("✅ Toutes les combinaisons de filtres utilisent un index")
+    
+    elif args.action == 'import':
+        if not args.file:
+            parser.error("--file est requis pour l'action import")
+        
+        def report_progress(stats):
+            percent = stats['offset'] / stats['size'] * 100 if stats['size'] else 100
+            print(f"📦 {percent:5.1f}% | {stats['read']} lues, {stats['imported']} importées, "
+                  f"{stats['rejected']} rejetées | {stats['rows_per_second']:.0f} lignes/s")
+        
+        stats = import_listings_file(
+            get_database(), args.file, file_format=args.format, batch_size=args.batch_size,
+            workers=args.workers, checkpoint_path=args.checkpoint, resume=not args.restart,
+            rejects_path=args.rejects, progress=report_progress
+        )
+        print(f"✅ Import terminé: {stats['imported']} annonces ({stats['inserted']} créées, "
+              f"{stats['updated']} mises à jour), {stats['rejected']} rejetées "
+              f"en {stats['elapsed']:.1f}s ({stats['rows_per_second']:.0f} lignes/s)")
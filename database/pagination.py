@@ -0,0 +1,142 @@
+"""
+Pagination par curseur (keyset) pour la recherche de propriétés
+"""
+import base64
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from database.fulltext import build_match_expression
+
+CURSOR_VERSION = 1
+
+# Modes de tri paginables : colonne, sens, colonne pouvant être NULL.
+# Le départage se fait toujours sur id, dans le même sens.
+SORT_KEYS = {
+    'date_desc': ('created_at', 'DESC', False),
+    'price_asc': ('price', 'ASC', False),
+    'price_desc': ('price', 'DESC', False),
+    'surface_desc': ('surface_total', 'DESC', True),
+    'price_per_m2_asc': ('price_per_sqm', 'ASC', True),
+    # Pertinence BM25 (recherche plein texte uniquement, plus petit = meilleur)
+    'relevance': ('fts_rank', 'ASC', False),
+}
+
+DEFAULT_SORT = 'date_desc'
+
+# Clés de filtres sans effet sur l'ensemble des résultats
+_NON_FILTER_KEYS = {'sort_by', 'cursor', 'limit'}
+
+
+def resolve_sort(filters: Optional[Dict[str, Any]]) -> str:
+    """
+    Retourne le mode de tri paginable demandé
+
+    Une recherche plein texte est triée par pertinence par défaut ; sans
+    texte, la pertinence retombe sur le tri par date.
+    """
+    filters = filters or {}
+    sort_by = filters.get('sort_by')
+
+    if build_match_expression(filters.get('text')) and sort_by in (None, 'relevance'):
+        return 'relevance'
+    if sort_by in SORT_KEYS and sort_by != 'relevance':
+        return sort_by
+    return DEFAULT_SORT
+
+
+def filters_fingerprint(filters: Optional[Dict[str, Any]]) -> str:
+    """Empreinte courte des filtres, pour lier un curseur à sa recherche"""
+    relevant = {
+        key: value for key, value in (filters or {}).items()
+        if key not in _NON_FILTER_KEYS and value not in (None, '', False)
+    }
+    canonical = json.dumps(relevant, sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:12]
+
+
+def encode_cursor(sort_by: str, row: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> str:
+    """Construit le jeton opaque pointant après la ligne donnée"""
+    column = SORT_KEYS[sort_by][0]
+    payload = {
+        'v': CURSOR_VERSION,
+        's': sort_by,
+        'k': [row.get(column), row['id']],
+        'f': filters_fingerprint(filters)
+    }
+    # Dates PostgreSQL (datetime) sérialisées en texte ISO, relu tel quel par le moteur
+    raw = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str, sort_by: str, filters: Optional[Dict[str, Any]]) -> Tuple[Any, int]:
+    """
+    Décode un jeton de continuation
+
+    Returns:
+        Tuple[Any, int]: (valeur de tri, id) de la dernière ligne servie
+
+    Raises:
+        ValueError: Jeton illisible ou émis pour une autre recherche
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        value, last_id = payload['k']
+        version, token_sort, fingerprint = payload['v'], payload['s'], payload['f']
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ValueError("Curseur de pagination invalide")
+
+    if version != CURSOR_VERSION or token_sort != sort_by or fingerprint != filters_fingerprint(filters):
+        raise ValueError("Curseur de pagination émis pour une autre recherche")
+
+    return value, int(last_id)
+
+
+def keyset_segments(sort_by: str, after: Optional[Tuple[Any, int]]) -> List[Tuple[str, List[Any]]]:
+    """
+    Prédicats SQL sélectionnant les lignes situées après le curseur
+
+    SQLite classe les NULL en premier en ASC et en dernier en DESC. Pour
+    une colonne nullable, la suite du parcours peut couvrir deux segments
+    (valeurs renseignées puis NULL, ou l'inverse) : chaque segment est un
+    prédicat indexable, à interroger dans l'ordre jusqu'à remplir la page.
+
+    Returns:
+        List[Tuple[str, List[Any]]]: (condition, paramètres) par segment ;
+        une condition vide signifie « depuis le début »
+    """
+    if after is None:
+        return [("", [])]
+
+    column, direction, nullable = SORT_KEYS[sort_by]
+    value, last_id = after
+    op = '<' if direction == 'DESC' else '>'
+
+    if value is None:
+        segment = (f"{column} IS NULL AND id {op} ?", [last_id])
+        if direction == 'ASC':
+            # Fin de la tête des NULL, puis toutes les valeurs renseignées
+            return [segment, (f"{column} IS NOT NULL", [])]
+        return [segment]
+
+    segments = [(f"({column}, id) {op} (?, ?)", [value, last_id])]
+    if nullable and direction == 'DESC':
+        # Queue des NULL après la dernière valeur renseignée
+        segments.append((f"{column} IS NULL", []))
+    return segments
+
+
+def order_clause(sort_by: str, explicit_nulls: bool = False) -> str:
+    """
+    Clause ORDER BY du mode de tri, départagée par id
+
+    explicit_nulls impose le placement des NULL de SQLite (en tête en ASC,
+    en queue en DESC) aux moteurs dont le défaut diffère (PostgreSQL) :
+    keyset_segments en dépend.
+    """
+    column, direction, nullable = SORT_KEYS[sort_by]
+    nulls = ''
+    if explicit_nulls and nullable:
+        nulls = ' NULLS FIRST' if direction == 'ASC' else ' NULLS LAST'
+    return f" ORDER BY {column} {direction}{nulls}, id {direction}"
@@ -0,0 +1,361 @@
+"""
+Pool de connexions SQLite pour ImoMatch
+Connexions longue durée partagées entre les threads Streamlit et l'API Flask
+"""
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Pragmas acceptés depuis la configuration, avec leurs valeurs textuelles autorisées
+SUPPORTED_PRAGMAS = {
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA', '0', '1', '2', '3'},
+    'temp_store': {'DEFAULT', 'FILE', 'MEMORY', '0', '1', '2'},
+    'mmap_size': None,
+    'cache_size': None,
+    'busy_timeout': None,
+    'foreign_keys': None
+}
+
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: Optional[Dict[str, Any]] = None,
+                  readonly: bool = False) -> sqlite3.Connection:
+    """
+    Applique un profil de pragmas à une connexion
+
+    Args:
+        conn: Connexion SQLite
+        pragmas: Profil (voir DATABASE_CONFIG['sqlite']['pragmas'])
+        readonly: Connexion de lecture : ne change pas le mode de journal
+                  et interdit les écritures (query_only)
+
+    Returns:
+        La connexion configurée
+    """
+    for name, value in (pragmas or {}).items():
+        if name not in SUPPORTED_PRAGMAS:
+            raise ValueError(f"Pragma non supporté: {name}")
+
+        # Le mode de journal est persistant : seul l'écrivain le positionne
+        if readonly and name == 'journal_mode':
+            continue
+
+        allowed = SUPPORTED_PRAGMAS[name]
+        if allowed is None:
+            value = int(value)
+        else:
+            value = str(value).upper()
+            if value not in allowed:
+                raise ValueError(f"Valeur invalide pour {name}: {value}")
+
+        conn.execute(f"PRAGMA {name} = {value}")
+
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+
+    return conn
+
+
+def connect_sqlite(db_path: str, pragmas: Optional[Dict[str, Any]] = None,
+                   readonly: bool = False, check_same_thread: bool = False,
+                   cached_statements: int = 128) -> sqlite3.Connection:
+    """
+    Ouvre une connexion SQLite configurée selon le profil de pragmas
+
+    cached_statements : nombre de requêtes préparées conservées par la
+    connexion (un même texte SQL n'est ni réanalysé ni replanifié)
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread,
+                           cached_statements=cached_statements)
+    try:
+        return apply_pragmas(conn, pragmas, readonly)
+    except Exception:
+        conn.close()
+        raise
+
+
+class PoolTimeoutError(Exception):
+    """Aucune connexion ne s'est libérée dans le délai imparti"""
+    pass
+
+
+class PooledConnection:
+    """
+    Connexion empruntée au pool
+
+    Se comporte comme une sqlite3.Connection : close() (ou la sortie d'un
+    bloc `with`) rend la connexion au pool au lieu de la fermer.
+    """
+
+    def __init__(self, pool: 'ConnectionPool', raw: sqlite3.Connection):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._raw, name)
+
+    def close(self):
+        """Rend la connexion au pool (idempotent)"""
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw)
+
+    def __enter__(self) -> 'PooledConnection':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self._raw.commit()
+            else:
+                self._raw.rollback()
+        finally:
+            self.close()
+        return False
+
+
+class ConnectionPool:
+    """
+    Pool borné et thread-safe de connexions SQLite
+
+    Chaque thread emprunte au plus une connexion : les emprunts imbriqués
+    d'un même thread réutilisent la connexion déjà détenue. Les connexions
+    inactives sont vérifiées avant réutilisation et évincées au-delà de
+    max_idle_time.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection],
+                 max_size: int = 8, min_size: int = 1, timeout: float = 10.0,
+                 max_idle_time: float = 300.0, health_check_interval: float = 30.0):
+        """
+        Args:
+            connect: Fabrique de nouvelles connexions
+            max_size: Nombre maximum de connexions ouvertes
+            min_size: Nombre de connexions inactives conservées malgré l'éviction
+            timeout: Attente maximale d'une connexion libre (secondes)
+            max_idle_time: Durée d'inactivité avant éviction (secondes)
+            health_check_interval: Inactivité au-delà de laquelle la connexion est testée
+        """
+        self._connect = connect
+        self.max_size = max(1, max_size)
+        self.min_size = max(0, min(min_size, self.max_size))
+        self.timeout = timeout
+        self.max_idle_time = max_idle_time
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = deque()  # (connexion, dernier usage)
+        self._size = 0
+        self._local = threading.local()
+        self._closed = False
+
+        self._metrics = {
+            'created': 0,
+            'closed': 0,
+            'evicted': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+            'total_wait_time': 0.0,
+            'max_wait_time': 0.0
+        }
+
+    def acquire(self) -> PooledConnection:
+        """Emprunte une connexion (réutilise celle du thread si déjà détenue)"""
+        entry = getattr(self._local, 'entry', None)
+        if entry is not None:
+            entry[1] += 1
+            return PooledConnection(self, entry[0])
+
+        raw = self._checkout()
+        self._local.entry = [raw, 1]
+        return PooledConnection(self, raw)
+
+    def release(self, raw: sqlite3.Connection):
+        """Rend une connexion empruntée par le thread courant"""
+        entry = getattr(self._local, 'entry', None)
+        if entry is None or entry[0] is not raw:
+            logger.warning("Libération d'une connexion non détenue par ce thread")
+            return
+
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+
+        self._local.entry = None
+        self._checkin(raw)
+
+    def evict_idle(self) -> int:
+        """Ferme les connexions inactives depuis plus de max_idle_time"""
+        with self._lock:
+            expired = self._collect_expired(time.monotonic())
+
+        for raw in expired:
+            self._close_raw(raw)
+        return len(expired)
+
+    def close_all(self):
+        """Ferme toutes les connexions inactives et refuse les nouveaux emprunts"""
+        with self._lock:
+            self._closed = True
+            idle = [raw for raw, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._metrics['closed'] += len(idle)
+            self._available.notify_all()
+
+        for raw in idle:
+            self._close_raw(raw)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retourne la taille du pool et les temps d'attente"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['size'] = self._size
+            metrics['idle'] = len(self._idle)
+            metrics['in_use'] = self._size - len(self._idle)
+            metrics['max_size'] = self.max_size
+
+        metrics['avg_wait_time'] = (
+            metrics['total_wait_time'] / metrics['waits'] if metrics['waits'] else 0.0
+        )
+        return metrics
+
+    # === MÉTHODES PRIVÉES ===
+
+    def _checkout(self) -> sqlite3.Connection:
+        """Récupère une connexion inactive, en crée une ou attend"""
+        expired = []
+        start = None
+
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Pool de connexions fermé")
+
+                if self._idle:
+                    raw, last_used = self._idle.pop()  # LIFO : la plus chaude d'abord
+                    expired = self._collect_expired(time.monotonic())
+                    break
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    raw, last_used = None, None
+                    break
+
+                if start is None:
+                    start = time.monotonic()
+                    self._metrics['waits'] += 1
+
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._metrics['timeouts'] += 1
+                    self._record_wait(start)
+                    raise PoolTimeoutError(
+                        f"Aucune connexion disponible après {self.timeout}s "
+                        f"({self._size}/{self.max_size} utilisées)"
+                    )
+                self._available.wait(remaining)
+
+            if start is not None:
+                self._record_wait(start)
+            self._metrics['checkouts'] += 1
+
+        for old in expired:
+            self._close_raw(old)
+
+        if raw is not None and not self._is_healthy(raw, last_used):
+            # La place reste réservée pour la connexion de remplacement
+            self._close_raw(raw)
+            with self._lock:
+                self._metrics['closed'] += 1
+            raw = None
+
+        if raw is None:
+            try:
+                raw = self._connect()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                    self._available.notify()
+                raise
+            with self._lock:
+                self._metrics['created'] += 1
+
+        return raw
+
+    def _checkin(self, raw: sqlite3.Connection):
+        """Remet une connexion dans la file des connexions inactives"""
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+        except sqlite3.Error as e:
+            logger.warning(f"Connexion rendue inutilisable, fermeture: {e}")
+            self._close_raw(raw)
+            with self._lock:
+                self._size -= 1
+                self._metrics['closed'] += 1
+                self._available.notify()
+            return
+
+        with self._lock:
+            if self._closed:
+                self._size -= 1
+                self._metrics['closed'] += 1
+                close_now = True
+            else:
+                self._idle.append((raw, time.monotonic()))
+                close_now = False
+            self._available.notify()
+
+        if close_now:
+            self._close_raw(raw)
+
+    def _is_healthy(self, raw: sqlite3.Connection, last_used: float) -> bool:
+        """Teste une connexion restée inactive trop longtemps"""
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            raw.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"Connexion défaillante écartée du pool: {e}")
+            with self._lock:
+                self._metrics['health_check_failures'] += 1
+            return False
+
+    def _collect_expired(self, now: float) -> list:
+        """Retire de la file les connexions expirées (verrou détenu)"""
+        expired = []
+        # Les plus anciennes sont en tête de file
+        while len(self._idle) > self.min_size and now - self._idle[0][1] > self.max_idle_time:
+            raw, _ = self._idle.popleft()
+            expired.append(raw)
+
+        self._size -= len(expired)
+        self._metrics['evicted'] += len(expired)
+        self._metrics['closed'] += len(expired)
+        if expired:
+            self._available.notify(len(expired))
+        return expired
+
+    def _close_raw(self, raw: sqlite3.Connection):
+        """Ferme une connexion sans lever d'erreur"""
+        try:
+            raw.close()
+        except sqlite3.Error:
+            pass
+
+    def _record_wait(self, start: float):
+        """Comptabilise un temps d'attente (verrou détenu)"""
+        waited = time.monotonic() - start
+        self._metrics['total_wait_time'] += waited
+        self._metrics['max_wait_time'] = max(self._metrics['max_wait_time'], waited)
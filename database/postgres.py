@@ -0,0 +1,1905 @@
+"""
+Gestionnaire PostgreSQL, même interface que DatabaseManager (database.manager)
+Connexions en pool, requêtes de recherche préparées par forme, curseurs
+côté serveur pour les exports, index GiST (coordonnées) et BRIN (dates)
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+    import psycopg2.extras
+    import psycopg2.pool
+except ImportError:  # Dépendance optionnelle : seul le backend SQLite est alors disponible
+    psycopg2 = None
+
+from config.settings import DATABASE_CONFIG, get_database_url
+from database.behavior_profile import (
+    read_behavior_profile, rebuild_all_behavior_profiles, rebuild_behavior_profile, record_favorite,
+    record_saved_search
+)
+from database.change_counter import ROW_VERSION_COLUMN
+from database.change_log import DEFAULT_CHANGE_LOG_CONFIG, change_log_head, compact_change_log, read_changes
+from database.fulltext import search_terms
+from database.ingest import EXTERNAL_KEY, iter_chunks, normalize_listing
+from database.pool import PoolTimeoutError
+from database.pagination import (
+    SORT_KEYS, decode_cursor, encode_cursor, keyset_segments, resolve_sort
+)
+from database.property_similarity import (
+    prune_similarities, read_similarities, replace_similarities, similarity_referrers
+)
+from database.search_events import (
+    DEFAULT_SEARCH_HISTORY_CONFIG, build_patterns, search_counters, search_event, search_stats_increment
+)
+from database.sample_data import SAMPLE_AGENTS, SAMPLE_USERS, sample_properties
+from database.saved_searches import saved_search
+from database.schema import search_plan_combinations
+from database.search_query import SearchQueryBuilder
+from database.result_cache import DEFAULT_RESULT_CACHE_CONFIG, SearchResultCache
+from database.rows import RowSet, check_result_format, cursor_columns, materialize_rows
+from database.spatial import EARTH_RADIUS_KM
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POSTGRES_OPTIONS = {
+    'pool': {'min_size': 1, 'max_size': 8, 'timeout': 10.0},
+    'prepared_statements_max': 256,   # Formes de requête préparées par connexion
+    'export_batch_size': 2000,        # Lignes transférées par aller-retour d'un curseur serveur
+}
+
+# Repli des accents, identique côté index (translate) et côté requête
+_ACCENTED = 'àâäáãåçéèêëíìîïñóòôöõúùûüýÿ'
+_UNACCENTED = 'aaaaaaceeeeiiiinooooouuuuyy'
+_UNACCENT_TABLE = str.maketrans(_ACCENTED, _UNACCENTED)
+
+
+def _folded(column: str) -> str:
+    return f"translate(lower(coalesce({column}, '')), '{_ACCENTED}', '{_UNACCENTED}')"
+
+
+# Poids par colonne dans l'ordre des poids BM25 de l'index SQLite
+# (titre > ville > adresse > description)
+_SEARCH_VECTOR = (
+    f"setweight(to_tsvector('simple', {_folded('title')}), 'A')"
+    f" || setweight(to_tsvector('simple', {_folded('city')}), 'B')"
+    f" || setweight(to_tsvector('simple', {_folded('address')}), 'C')"
+    f" || setweight(to_tsvector('simple', {_folded('description')}), 'D')"
+)
+
+_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        first_name TEXT,
+        last_name TEXT,
+        phone TEXT,
+        age INTEGER,
+        user_type TEXT DEFAULT 'acquéreur',
+        budget_min INTEGER,
+        budget_max INTEGER,
+        property_types TEXT, -- JSON array
+        surface_min INTEGER,
+        bedrooms_min INTEGER,
+        preferred_locations TEXT, -- JSON array
+        marital_status TEXT,
+        children_count INTEGER DEFAULT 0,
+        lifestyle TEXT,
+        work_arrangement TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # Équipements en 0/1 comme sous SQLite (filtres garden = 1, normalize_listing)
+    f'''
+    CREATE TABLE IF NOT EXISTS properties (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        title TEXT NOT NULL,
+        description TEXT,
+        property_type TEXT NOT NULL,
+        property_subtype TEXT,
+        surface_total INTEGER,
+        surface_habitable INTEGER,
+        surface_terrain INTEGER,
+        bedrooms INTEGER,
+        bathrooms INTEGER,
+        floor_number INTEGER,
+        construction_year INTEGER,
+        energy_class TEXT,
+        heating_type TEXT,
+        elevator SMALLINT DEFAULT 0,
+        balcony SMALLINT DEFAULT 0,
+        terrace SMALLINT DEFAULT 0,
+        garden SMALLINT DEFAULT 0,
+        swimming_pool SMALLINT DEFAULT 0,
+        garage_count INTEGER DEFAULT 0,
+        parking_spaces INTEGER DEFAULT 0,
+        price BIGINT NOT NULL,
+        price_per_sqm INTEGER,
+        monthly_charges INTEGER,
+        address TEXT,
+        city TEXT NOT NULL,
+        postal_code TEXT,
+        latitude DOUBLE PRECISION,
+        longitude DOUBLE PRECISION,
+        luxury_level INTEGER DEFAULT 3,
+        view_quality TEXT,
+        quietness_level INTEGER DEFAULT 3,
+        brightness_level INTEGER DEFAULT 3,
+        availability_date DATE,
+        listing_status TEXT DEFAULT 'active',
+        external_ref TEXT UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        search_vector TSVECTOR GENERATED ALWAYS AS ({_SEARCH_VECTOR}) STORED
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS real_estate_agents (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        first_name TEXT NOT NULL,
+        last_name TEXT NOT NULL,
+        agency_name TEXT,
+        email TEXT,
+        phone TEXT,
+        specialization TEXT,
+        experience_years INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS favorites (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT REFERENCES users (id),
+        property_id BIGINT REFERENCES properties (id),
+        interest_level INTEGER DEFAULT 3,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (user_id, property_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS saved_searches (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL REFERENCES users (id),
+        name TEXT NOT NULL,
+        filters TEXT NOT NULL, -- JSON
+        alert_enabled BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_saved_searches_user ON saved_searches (user_id)",
+    '''
+    CREATE TABLE IF NOT EXISTS alert_notifications (
+        user_id BIGINT NOT NULL,
+        property_id BIGINT NOT NULL,
+        saved_search_id BIGINT,
+        sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, property_id)
+    )
+    ''',
+    # Alertes détectées pas encore envoyées, retentées jusqu'à leur envoi
+    '''
+    CREATE TABLE IF NOT EXISTS pending_alerts (
+        user_id BIGINT NOT NULL,
+        property_id BIGINT NOT NULL,
+        saved_search_id BIGINT,
+        queued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, property_id)
+    )
+    ''',
+    # Profil comportemental agrégé (voir database.behavior_profile)
+    '''
+    CREATE TABLE IF NOT EXISTS user_behavior_profile (
+        user_id BIGINT NOT NULL,
+        kind TEXT NOT NULL,
+        value TEXT NOT NULL,
+        count BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, kind, value)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS user_behavior_stats (
+        user_id BIGINT PRIMARY KEY,
+        favorite_count BIGINT NOT NULL DEFAULT 0,
+        favorite_price_count BIGINT NOT NULL DEFAULT 0,
+        favorite_price_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+        favorite_price_min DOUBLE PRECISION,
+        favorite_price_max DOUBLE PRECISION,
+        saved_search_count BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # Historique des recherches et préférences agrégées (voir database.search_events)
+    '''
+    CREATE TABLE IF NOT EXISTS search_events (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        query TEXT,
+        filters TEXT, -- JSON
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_search_events_user ON search_events (user_id, id)",
+    '''
+    CREATE TABLE IF NOT EXISTS user_search_patterns (
+        user_id BIGINT NOT NULL,
+        kind TEXT NOT NULL,
+        value TEXT NOT NULL,
+        count BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, kind, value)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS user_search_stats (
+        user_id BIGINT PRIMARY KEY,
+        search_count BIGINT NOT NULL DEFAULT 0,
+        price_max_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+        price_max_count BIGINT NOT NULL DEFAULT 0,
+        last_search_at TIMESTAMP
+    )
+    ''',
+    # Annonces similaires précalculées (voir database.property_similarity)
+    '''
+    CREATE TABLE IF NOT EXISTS property_similarity (
+        property_id BIGINT NOT NULL,
+        neighbor_rank INTEGER NOT NULL,
+        similar_id BIGINT NOT NULL,
+        score DOUBLE PRECISION NOT NULL,
+        computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (property_id, neighbor_rank)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_property_similarity_similar ON property_similarity (similar_id)",
+    # Compteur de modifications (voir database.change_counter). Le verrou de
+    # la ligne du compteur est tenu jusqu'au commit : les numéros suivent
+    # l'ordre des commits, aucune copie ne saute une écriture concurrente
+    f'''
+    ALTER TABLE properties ADD COLUMN IF NOT EXISTS {ROW_VERSION_COLUMN} BIGINT NOT NULL DEFAULT 0
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS property_change_counter (
+        id SMALLINT PRIMARY KEY CHECK (id = 1),
+        version BIGINT NOT NULL,
+        deletions BIGINT NOT NULL DEFAULT 0
+    )
+    ''',
+    f'''
+    INSERT INTO property_change_counter (id, version)
+    SELECT 1, COALESCE(MAX({ROW_VERSION_COLUMN}), 0) FROM properties
+    ON CONFLICT (id) DO NOTHING
+    ''',
+    f'''
+    CREATE OR REPLACE FUNCTION properties_bump_version() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            UPDATE property_change_counter SET version = version + 1, deletions = deletions + 1 WHERE id = 1;
+            RETURN OLD;
+        END IF;
+        UPDATE property_change_counter SET version = version + 1 WHERE id = 1
+        RETURNING version INTO NEW.{ROW_VERSION_COLUMN};
+        RETURN NEW;
+    END
+    $$
+    ''',
+    '''
+    CREATE OR REPLACE TRIGGER properties_version BEFORE INSERT OR UPDATE OR DELETE ON properties
+    FOR EACH ROW EXECUTE FUNCTION properties_bump_version()
+    ''',
+    # Journal des modifications (voir database.change_log). Les entrées sont
+    # écrites pendant que la transaction tient le verrou du compteur : les seq
+    # suivent l'ordre des commits. row_version et search_vector (dérivées)
+    # ne figurent pas dans changed_columns
+    '''
+    CREATE TABLE IF NOT EXISTS feed_cursors (
+        consumer TEXT PRIMARY KEY,
+        position BIGINT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    DO $$
+    BEGIN
+        IF to_regclass('property_changes') IS NULL THEN
+            CREATE TABLE property_changes (
+                seq BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                property_id BIGINT NOT NULL,
+                op TEXT NOT NULL CHECK (op IN ('insert', 'update', 'delete')),
+                changed_columns TEXT,
+                changed_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+            );
+            UPDATE feed_cursors SET position = 0, updated_at = CURRENT_TIMESTAMP;
+        END IF;
+    END
+    $$
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS property_changes_state (
+        id SMALLINT PRIMARY KEY CHECK (id = 1),
+        truncated_through BIGINT NOT NULL DEFAULT 0
+    )
+    ''',
+    "INSERT INTO property_changes_state (id, truncated_through) VALUES (1, 0) ON CONFLICT (id) DO NOTHING",
+    f'''
+    CREATE OR REPLACE FUNCTION properties_log_change() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        changed TEXT;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO property_changes (property_id, op) VALUES (NEW.id, 'insert');
+        ELSIF TG_OP = 'DELETE' THEN
+            INSERT INTO property_changes (property_id, op) VALUES (OLD.id, 'delete');
+        ELSE
+            SELECT string_agg(n.key, ',' ORDER BY n.key) INTO changed
+            FROM jsonb_each(to_jsonb(NEW)) n JOIN jsonb_each(to_jsonb(OLD)) o ON o.key = n.key
+            WHERE n.value IS DISTINCT FROM o.value AND n.key NOT IN ('{ROW_VERSION_COLUMN}', 'search_vector');
+            IF changed IS NOT NULL THEN
+                INSERT INTO property_changes (property_id, op, changed_columns) VALUES (NEW.id, 'update', changed);
+            END IF;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    ''',
+    '''
+    CREATE OR REPLACE TRIGGER properties_log AFTER INSERT OR UPDATE OR DELETE ON properties
+    FOR EACH ROW EXECUTE FUNCTION properties_log_change()
+    ''',
+    # Même formule que database.spatial.haversine_km
+    f'''
+    CREATE OR REPLACE FUNCTION haversine_km(lat1 DOUBLE PRECISION, lng1 DOUBLE PRECISION,
+                                            lat2 DOUBLE PRECISION, lng2 DOUBLE PRECISION)
+    RETURNS DOUBLE PRECISION LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+        SELECT 2 * {EARTH_RADIUS_KM} * asin(least(1.0, sqrt(
+            sin(radians(lat2 - lat1) / 2) ^ 2
+            + cos(radians(lat1)) * cos(radians(lat2)) * sin(radians(lng2 - lng1) / 2) ^ 2
+        )))
+    $$
+    ''',
+]
+
+# Les index de tri reprennent le placement SQLite des NULL (order_clause(explicit_nulls=True))
+POSTGRES_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_properties_status_type_price "
+    "ON properties (listing_status, property_type, price)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_status_created "
+    "ON properties (listing_status, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_status_price "
+    "ON properties (listing_status, price, id)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_status_surface "
+    "ON properties (listing_status, surface_total DESC NULLS LAST, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_status_price_sqm "
+    "ON properties (listing_status, price_per_sqm NULLS FIRST, id)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_active_bedrooms "
+    "ON properties (bedrooms, price) WHERE listing_status = 'active'",
+    "CREATE INDEX IF NOT EXISTS idx_properties_active_luxury "
+    "ON properties (luxury_level) WHERE listing_status = 'active'",
+    "CREATE INDEX IF NOT EXISTS idx_properties_active_pool "
+    "ON properties (created_at) WHERE listing_status = 'active' AND swimming_pool = 1",
+    "CREATE INDEX IF NOT EXISTS idx_properties_active_garden "
+    "ON properties (created_at) WHERE listing_status = 'active' AND garden = 1",
+    "CREATE INDEX IF NOT EXISTS idx_properties_active_garage "
+    "ON properties (created_at) WHERE listing_status = 'active' AND garage_count > 0",
+    # Emprise de carte et rayon : point(longitude, latitude) <@ box(...)
+    "CREATE INDEX IF NOT EXISTS idx_properties_geo "
+    "ON properties USING gist (point(longitude, latitude))",
+    # Dates d'insertion croissantes : un résumé par bloc de pages suffit
+    # aux filtres de période (exports, statistiques)
+    "CREATE INDEX IF NOT EXISTS idx_properties_created_brin "
+    "ON properties USING brin (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_search_vector "
+    "ON properties USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_market_group "
+    "ON properties (listing_status, city, property_type, bedrooms, price)",
+    f"CREATE INDEX IF NOT EXISTS idx_properties_{ROW_VERSION_COLUMN} ON properties ({ROW_VERSION_COLUMN})",
+]
+
+# Créations au-delà desquelles un import relance ANALYZE
+ANALYZE_AFTER_INSERTS = 1000
+
+# Nœuds qui lisent toutes leurs lignes avant d'en rendre une : un LIMIT
+# au-dessus ne borne pas les parcours en dessous
+_BLOCKING_PLAN_NODES = {'Sort', 'Hash', 'Aggregate', 'Materialize', 'WindowAgg', 'SetOp'}
+
+_INDEX_SCAN_NODES = {'Index Scan', 'Index Only Scan', 'Bitmap Index Scan'}
+
+# Prédicat des index partiels limités aux annonces actives (pg_get_expr)
+_ACTIVE_PREDICATE_RE = re.compile(r"listing_status = 'active'::text")
+
+# En deçà, check_search_query_plans est ignorée : tout lire est le meilleur plan
+PLAN_CHECK_MIN_ROWS = 100
+
+# Réglages désactivés tour à tour par check_search_query_plans : parcours
+# séquentiels ; puis parcours d'index simples (clé primaire lue en entier),
+# ne restent que les bitmaps sur condition d'index ; puis tris, pour
+# l'index du ORDER BY lu jusqu'au LIMIT ; puis jointures par hachage et
+# fusion, pour une jointure plein texte pilotée par l'index GIN
+_PLAN_CHECK_SETTINGS = [
+    ('enable_seqscan',),
+    ('enable_seqscan', 'enable_indexscan', 'enable_indexonlyscan'),
+    ('enable_seqscan', 'enable_sort'),
+    ('enable_seqscan', 'enable_indexscan', 'enable_indexonlyscan', 'enable_hashjoin', 'enable_mergejoin'),
+]
+
+# Clés de page suivante des vérifications de plans, pour les colonnes non numériques
+_PLAN_SAMPLE_KEYS = {'created_at': datetime(2024, 1, 1)}
+
+GEO_BOX_CONDITION = "point(longitude, latitude) <@ box(point(?, ?), point(?, ?))"
+
+_PLACEHOLDER_RE = re.compile(r'%s')
+
+
+def find_plan_full_scans(node: Dict[str, Any], table: str = 'properties', selective_indexes: Set[str] = frozenset(),
+                         bounded: bool = False, relation: Optional[str] = None) -> List[str]:
+    """
+    Parcours complets d'une table dans un plan EXPLAIN (FORMAT JSON)
+
+    Un Seq Scan est toujours signalé ; un parcours d'index sans condition
+    d'index aussi (bitmap compris), sauf sur un index partiel sélectif
+    (selective_indexes : prédicat au-delà des annonces actives) ou sous un
+    LIMIT sans tri intermédiaire (index du ORDER BY lu jusqu'à la limite).
+    """
+    scans = []
+    node_type = node.get('Node Type')
+    # Les Bitmap Index Scan portent sur la table de leur Bitmap Heap Scan
+    relation = node.get('Relation Name', relation)
+    if relation == table:
+        if node_type == 'Seq Scan':
+            scans.append(f"Seq Scan on {table}")
+        elif (node_type in _INDEX_SCAN_NODES and 'Index Cond' not in node and not bounded
+              and node.get('Index Name') not in selective_indexes):
+            scans.append(f"{node_type} using {node.get('Index Name')} on {table}")
+
+    if node_type == 'Limit':
+        bounded = True
+    elif node_type in _BLOCKING_PLAN_NODES:
+        bounded = False
+    for child in node.get('Plans', []):
+        scans.extend(find_plan_full_scans(child, table, selective_indexes, bounded, relation))
+    return scans
+
+
+def build_tsquery(text: str) -> Optional[str]:
+    """
+    Traduit une saisie libre en tsquery (mêmes règles que build_match_expression)
+
+    Chaque mot significatif est exigé, le dernier accepte un préfixe ;
+    accents et casse sont repliés comme dans search_vector.
+    """
+    tokens = [token.translate(_UNACCENT_TABLE) for token in search_terms(text)]
+    if not tokens:
+        return None
+
+    terms = [f"'{token}'" for token in tokens]
+    terms[-1] += ':*'
+    return ' & '.join(terms)
+
+
+def to_positional(query: str) -> Tuple[str, int]:
+    """Remplace les %s d'une requête par $1..$n (syntaxe PREPARE)"""
+    counter = [0]
+
+    def positional(_):
+        counter[0] += 1
+        return f"${counter[0]}"
+
+    return _PLACEHOLDER_RE.sub(positional, query), counter[0]
+
+
+class PostgresSearchDialect:
+    """Fragments SQL de la recherche pour PostgreSQL (tsvector, GiST), voir SQLiteSearchDialect"""
+
+    placeholder = '%s'
+    # Placement des NULL de SQLite, dont dépendent les curseurs keyset
+    explicit_nulls = True
+    condition_overrides = {'city': "city ILIKE ?"}
+
+    def text_argument(self, text: Optional[str]) -> Optional[str]:
+        return build_tsquery(text)
+
+    def text_query(self) -> Tuple[str, int]:
+        # Score négatif : le tri de pertinence est ascendant (plus petit = meilleur)
+        return (
+            "WITH fts_matches AS ("
+            " SELECT id AS fts_id, -ts_rank(search_vector, to_tsquery('simple', ?))::float8 AS fts_rank"
+            " FROM properties WHERE search_vector @@ to_tsquery('simple', ?)"
+            ") SELECT properties.*, fts_matches.fts_rank"
+            " FROM {source} JOIN fts_matches ON fts_matches.fts_id = properties.id"
+            " WHERE listing_status = 'active'"
+        ), 2
+
+    def plain_query(self) -> str:
+        return "SELECT properties.* FROM {source} WHERE listing_status = 'active'"
+
+    def source(self, has_box: bool) -> str:
+        # L'index GiST est choisi par le planificateur sur la condition de rectangle
+        return "properties"
+
+    def box_condition(self) -> str:
+        return GEO_BOX_CONDITION
+
+    def box_params(self, box: Tuple[float, float, float, float]) -> List[float]:
+        min_lat, max_lat, min_lng, max_lng = box
+        return [min_lng, min_lat, max_lng, max_lat]
+
+
+if psycopg2 is not None:
+    class _PreparingConnection(psycopg2.extensions.connection):
+        """Connexion psycopg2 qui retient ses requêtes préparées (nom -> dernier usage)"""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.prepared = OrderedDict()
+
+
+class PgPooledConnection:
+    """
+    Connexion empruntée au pool psycopg2
+
+    Comme database.pool.PooledConnection : close() (ou la sortie d'un bloc
+    `with`) rend la connexion au pool, transaction en cours annulée.
+    """
+
+    def __init__(self, pool: 'psycopg2.pool.ThreadedConnectionPool', raw, slots: threading.BoundedSemaphore):
+        self._pool = pool
+        self._raw = raw
+        self._slots = slots
+        self._released = False
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._raw, name)
+
+    def close(self):
+        """Rend la connexion au pool (idempotent)"""
+        if self._released:
+            return
+        self._released = True
+        broken = bool(self._raw.closed)
+        if not broken and self._raw.status != psycopg2.extensions.STATUS_READY:
+            try:
+                self._raw.rollback()
+            except psycopg2.Error:
+                broken = True
+        try:
+            self._pool.putconn(self._raw, close=broken)
+        finally:
+            self._slots.release()
+
+    def __enter__(self) -> 'PgPooledConnection':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self._raw.commit()
+            else:
+                self._raw.rollback()
+        finally:
+            self.close()
+        return False
+
+
+class PostgresDatabaseManager:
+    """
+    Gestionnaire PostgreSQL
+
+    Mêmes méthodes et mêmes formats de résultat que DatabaseManager ;
+    sélectionné par DB_TYPE=postgresql (voir database.manager.create_database_manager).
+    """
+
+    def __init__(self, dsn: Optional[str] = None, options: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            dsn: URL de connexion (par défaut get_database_url())
+            options: Surcharges de DEFAULT_POSTGRES_OPTIONS (pool, requêtes préparées, exports)
+
+        Raises:
+            ImportError: psycopg2 absent
+        """
+        if psycopg2 is None:
+            raise ImportError("Le backend PostgreSQL nécessite le paquet psycopg2 (ou psycopg2-binary)")
+
+        self.dsn = dsn or get_database_url()
+        config = dict(DEFAULT_POSTGRES_OPTIONS, **DATABASE_CONFIG.get('postgresql', {}).get('options', {}))
+        config.update(options or {})
+        self.prepared_statements_max = config['prepared_statements_max']
+        self.export_batch_size = config['export_batch_size']
+
+        pool_config = config['pool']
+        self.pool = psycopg2.pool.ThreadedConnectionPool(
+            pool_config.get('min_size', 1), pool_config.get('max_size', 8),
+            self.dsn, connection_factory=_PreparingConnection
+        )
+        # ThreadedConnectionPool échoue aussitôt quand il est épuisé : les
+        # emprunts attendent ici une place, comme avec database.pool
+        self.pool_timeout = pool_config.get('timeout', 10.0)
+        self._slots = threading.BoundedSemaphore(self.pool.maxconn)
+        self.query_builder = SearchQueryBuilder(PostgresSearchDialect(), max_shapes=self.prepared_statements_max)
+        # Écritures des autres processus lues dans le journal des modifications
+        self.result_cache = SearchResultCache(
+            **dict(DEFAULT_RESULT_CACHE_CONFIG, **DATABASE_CONFIG.get('result_cache', {}))
+        )
+        self.change_log_config = dict(DEFAULT_CHANGE_LOG_CONFIG, **DATABASE_CONFIG.get('change_log', {}))
+        self.search_history_config = dict(DEFAULT_SEARCH_HISTORY_CONFIG, **DATABASE_CONFIG.get('search_history', {}))
+        self._metrics_lock = threading.Lock()
+        self._metrics = {'checkouts': 0, 'timeouts': 0, 'prepares': 0, 'prepared_executions': 0, 'deallocations': 0}
+        self.create_tables()
+
+    # === CONNEXIONS ===
+
+    def get_connection(self) -> PgPooledConnection:
+        """
+        Emprunte une connexion ; close() la rend au pool
+
+        Raises:
+            PoolTimeoutError: Aucune connexion libérée dans le délai imparti
+        """
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            with self._metrics_lock:
+                self._metrics['timeouts'] += 1
+            raise PoolTimeoutError(f"Aucune connexion PostgreSQL disponible après {self.pool_timeout}s")
+
+        try:
+            raw = self.pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._metrics_lock:
+            self._metrics['checkouts'] += 1
+        return PgPooledConnection(self.pool, raw, self._slots)
+
+    def get_read_connection(self) -> PgPooledConnection:
+        """Les lectures partagent le pool : PostgreSQL sert les écrivains en parallèle"""
+        return self.get_connection()
+
+    def get_pool_metrics(self) -> Dict[str, Any]:
+        """Emprunts, connexions ouvertes et usage des requêtes préparées"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics['size'] = len(self.pool._used) + len(self.pool._pool)
+        metrics['in_use'] = len(self.pool._used)
+        metrics['max_size'] = self.pool.maxconn
+        return metrics
+
+    def close(self):
+        """Ferme toutes les connexions du pool"""
+        self.pool.closeall()
+
+    def create_tables(self):
+        """Crée les tables, la fonction haversine_km et les index"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                # Profils comportementaux calculés à la création de leurs tables
+                cursor.execute("SELECT to_regclass('user_behavior_stats') IS NULL")
+                backfill_profiles = cursor.fetchone()[0]
+                for statement in _TABLES:
+                    cursor.execute(statement)
+                for statement in POSTGRES_INDEXES:
+                    cursor.execute(statement)
+                if backfill_profiles:
+                    rebuild_all_behavior_profiles(cursor, '%s')
+            conn.commit()
+            logger.info("Tables PostgreSQL prêtes")
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _execute_prepared(self, cursor, query: str, params: List[Any]):
+        """
+        Exécute une forme de requête préparée sur la connexion du curseur
+
+        La requête est préparée au premier usage (PREPARE), puis exécutée
+        par EXECUTE : le plan n'est plus recalculé à chaque page. Les
+        formes les moins récentes sont libérées (DEALLOCATE) au-delà de
+        prepared_statements_max.
+        """
+        prepared = cursor.connection.prepared
+        name = 'search_' + hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]
+
+        if name in prepared:
+            prepared.move_to_end(name)
+        else:
+            positional, _ = to_positional(query)
+            cursor.execute(f"PREPARE {name} AS {positional}")
+            prepared[name] = True
+            with self._metrics_lock:
+                self._metrics['prepares'] += 1
+
+            while len(prepared) > self.prepared_statements_max:
+                oldest, _ = prepared.popitem(last=False)
+                cursor.execute(f"DEALLOCATE {oldest}")
+                with self._metrics_lock:
+                    self._metrics['deallocations'] += 1
+
+        arguments = f" ({', '.join(['%s'] * len(params))})" if params else ""
+        cursor.execute(f"EXECUTE {name}{arguments}", params)
+        with self._metrics_lock:
+            self._metrics['prepared_executions'] += 1
+
+    # === IMPORT ===
+
+    def _importable_columns(self, cursor) -> set:
+        cursor.execute('''
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'properties' AND table_schema = current_schema()
+              AND is_generated = 'NEVER' AND identity_generation IS NULL
+        ''')
+        return {row[0] for row in cursor.fetchall()} - {'created_at', ROW_VERSION_COLUMN}
+
+    def bulk_upsert_properties(self, listings: Iterable[Dict[str, Any]], chunk_size: int = 1000,
+                               progress: Callable[[Dict[str, Any]], None] = None,
+                               verbose: bool = True) -> Dict[str, Any]:
+        """
+        Importe un flux d'annonces en masse (voir DatabaseManager.bulk_upsert_properties)
+
+        Chaque groupe de colonnes d'un lot part en un INSERT multi-lignes
+        (execute_values) ; RETURNING distingue créations et mises à jour.
+        """
+        conn = self.get_connection()
+        start = time.perf_counter()
+        stats = {
+            'rows': 0, 'inserted': 0, 'updated': 0, 'rejected': 0,
+            'chunks': 0, 'ignored_fields': [], 'elapsed': 0.0, 'rows_per_second': 0.0
+        }
+        ignored_fields = set()
+
+        try:
+            with conn.cursor() as cursor:
+                columns = self._importable_columns(cursor)
+
+                for chunk in iter_chunks(listings, max(1, chunk_size)):
+                    try:
+                        result = self._write_listings(cursor, columns, chunk, ignored_fields)
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+
+                    self._invalidate_search_cache(result['changes'], result['rows'])
+                    stats['rows'] += result['rows']
+                    stats['inserted'] += result['inserted']
+                    stats['updated'] += result['rows'] - result['inserted']
+                    stats['rejected'] += result['rejected']
+                    stats['chunks'] += 1
+                    stats['ignored_fields'] = sorted(ignored_fields)
+                    stats['elapsed'] = time.perf_counter() - start
+                    stats['rows_per_second'] = stats['rows'] / stats['elapsed'] if stats['elapsed'] else 0.0
+
+                    if progress:
+                        progress(dict(stats))
+
+            # Après un chargement massif, l'autovacuum n'a pas encore mis à jour
+            # les statistiques : les plans des recherches partiraient d'une table vide
+            if stats['inserted'] >= ANALYZE_AFTER_INSERTS:
+                with conn.cursor() as cursor:
+                    cursor.execute("ANALYZE properties")
+                conn.commit()
+
+            stats['elapsed'] = time.perf_counter() - start
+            stats['rows_per_second'] = stats['rows'] / stats['elapsed'] if stats['elapsed'] else 0.0
+            if verbose:
+                logger.info(f"Import: {stats['rows']} annonces ({stats['inserted']} créées, "
+                            f"{stats['updated']} mises à jour, {stats['rejected']} rejetées) "
+                            f"en {stats['elapsed']:.2f}s - {stats['rows_per_second']:.0f} lignes/s")
+            return stats
+
+        finally:
+            conn.close()
+
+    def _write_listings(self, cursor, columns: set, listings: Iterable[Dict[str, Any]],
+                        ignored_fields: set) -> Dict[str, Any]:
+        """
+        Écrit un lot d'annonces sans valider la transaction (voir DatabaseManager._write_listings)
+
+        Returns:
+            Dict[str, Any]: rows, inserted, rejected, changes (paires avant /
+            après pour le cache)
+        """
+        groups = {}
+        written = []
+        rejected = 0
+        for listing in listings:
+            row, ignored = normalize_listing(listing, columns)
+            ignored_fields.update(ignored)
+            if row is None:
+                rejected += 1
+                continue
+            key = tuple(sorted(row))
+            values = tuple(row[column] for column in key)
+            rows = groups.setdefault(key, OrderedDict())
+            # Une même référence ne peut être modifiée deux fois par
+            # INSERT : la dernière version du lot l'emporte, comme
+            # avec l'executemany SQLite
+            ref = row.get(EXTERNAL_KEY)
+            rows[ref if ref is not None else ('__row', len(written))] = values
+            written.append(row)
+
+        changes = self._snapshot_changes(cursor, written)
+        inserted = 0
+        for key, rows in groups.items():
+            results = psycopg2.extras.execute_values(
+                cursor, self._build_upsert_statement(key), list(rows.values()),
+                page_size=len(rows), fetch=True
+            )
+            inserted += sum(1 for (created,) in results if created)
+        return {'rows': len(written), 'inserted': inserted, 'rejected': rejected, 'changes': changes}
+
+    def add_comprehensive_sample_data(self):
+        """Ajoute les données d'exemple (database.sample_data) en une seule transaction"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM properties")
+                if cursor.fetchone()[0] > 0:
+                    logger.info("Données d'exemple déjà présentes")
+                    return
+
+                psycopg2.extras.execute_values(
+                    cursor,
+                    "INSERT INTO real_estate_agents"
+                    " (first_name, last_name, agency_name, email, phone, specialization, experience_years)"
+                    " VALUES %s",
+                    SAMPLE_AGENTS
+                )
+                self._write_listings(cursor, self._importable_columns(cursor), sample_properties(), set())
+                for user in SAMPLE_USERS:
+                    cursor.execute(
+                        f"INSERT INTO users ({', '.join(user)}) VALUES ({', '.join('%s' for _ in user)})",
+                        list(user.values())
+                    )
+            conn.commit()
+            self.result_cache.clear()
+            logger.info("Données d'exemple enrichies ajoutées avec succès")
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.error(f"Erreur ajout données: {e}")
+        finally:
+            conn.close()
+
+    def _snapshot_changes(self, cursor, written: List[Dict[str, Any]]) -> List[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]:
+        """Paires (image avant, image après) d'un lot (voir DatabaseManager._snapshot_changes)"""
+        cache = self.result_cache
+        if not written or not len(cache) or len(written) > cache.max_changes_per_invalidation:
+            return []
+
+        refs = [row[EXTERNAL_KEY] for row in written if row.get(EXTERNAL_KEY) is not None]
+        before = {}
+        if refs:
+            cursor.execute(f"SELECT * FROM properties WHERE {EXTERNAL_KEY} = ANY(%s)", (refs,))
+            names = cursor_columns(cursor)
+            for values in cursor.fetchall():
+                image = dict(zip(names, values))
+                before[image[EXTERNAL_KEY]] = image
+
+        changes = []
+        for row in written:
+            old = before.get(row.get(EXTERNAL_KEY))
+            changes.append((old, dict(old or {}, **row)))
+        return changes
+
+    def _invalidate_search_cache(self, changes: list, written_count: int):
+        """Invalide les pages touchées par un lot écrit (commit effectué)"""
+        if not written_count:
+            return
+        if changes:
+            self.result_cache.invalidate_changes(changes)
+        else:
+            self.result_cache.clear()
+
+    def get_search_cache_metrics(self) -> Dict[str, Any]:
+        """Taux de succès, taille (octets) et invalidations du cache de recherche"""
+        return self.result_cache.get_metrics()
+
+    @staticmethod
+    def _build_upsert_statement(columns: Tuple[str, ...]) -> str:
+        """INSERT multi-lignes ; RETURNING vrai pour une création (xmax nul)"""
+        statement = f"INSERT INTO properties ({', '.join(columns)}) VALUES %s"
+
+        if EXTERNAL_KEY in columns:
+            updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in columns if column != EXTERNAL_KEY)
+            if updates:
+                statement += f" ON CONFLICT ({EXTERNAL_KEY}) DO UPDATE SET {updates}"
+            else:
+                statement += f" ON CONFLICT ({EXTERNAL_KEY}) DO UPDATE SET {EXTERNAL_KEY} = EXCLUDED.{EXTERNAL_KEY}"
+
+        return statement + " RETURNING (xmax = 0)"
+
+    # === RECHERCHE ===
+
+    def _build_search_query(self, filters: Optional[Dict[str, Any]] = None, sort_by: str = 'date_desc',
+                            keyset: Optional[Tuple[str, List[Any]]] = None,
+                            limit: Optional[int] = 50) -> Tuple[str, List[Any]]:
+        """
+        Requête de recherche en dialecte PostgreSQL (mêmes filtres que DatabaseManager)
+
+        Le SQL est compilé une fois par forme (database.search_query) puis
+        préparé une fois par connexion. limit=None : sans LIMIT (exports).
+        """
+        return self.query_builder.build(filters, sort_by, keyset, limit)
+
+    def check_search_query_plans(self) -> List[Dict[str, Any]]:
+        """
+        Vérifie par EXPLAIN qu'aucune combinaison de filtres supportée ne
+        parcourt toute la table properties (voir DatabaseManager)
+
+        Les statistiques sont recalculées (ANALYZE) avant la vérification.
+        Sur une petite table, le planificateur préfère un parcours complet
+        même quand un index convient : chaque requête est expliquée sous
+        plusieurs réglages (_PLAN_CHECK_SETTINGS) et n'échoue que si aucun
+        plan n'évite le parcours complet. En deçà de PLAN_CHECK_MIN_ROWS
+        annonces, lire toute la table reste le meilleur plan : la
+        vérification est ignorée (avertissement).
+
+        Returns:
+            List[Dict[str, Any]]: Combinaisons en échec avec les étapes de parcours complet
+        """
+        # Constructeur à part : les formes vérifiées n'évincent pas celles des recherches
+        plan_builder = SearchQueryBuilder(PostgresSearchDialect(), max_shapes=1)
+        failures = []
+
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("ANALYZE properties")
+                cursor.execute("SELECT reltuples FROM pg_class WHERE oid = 'properties'::regclass")
+                rows = cursor.fetchone()[0]
+            conn.commit()
+        finally:
+            conn.close()
+        if rows < PLAN_CHECK_MIN_ROWS:
+            logger.warning(f"Vérification des plans ignorée : {max(int(rows), 0)} annonces "
+                           f"(minimum {PLAN_CHECK_MIN_ROWS} pour des plans représentatifs)")
+            return failures
+
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                selective_indexes = self._selective_indexes(cursor)
+                for filters in search_plan_combinations():
+                    for sort_by in SORT_KEYS:
+                        if sort_by == 'relevance' and 'text' not in filters:
+                            continue
+                        # Clé de page suivante au type de la colonne (dates typées)
+                        sample_key = _PLAN_SAMPLE_KEYS.get(SORT_KEYS[sort_by][0], 1)
+                        for after in (None, (sample_key, 1), (None, 1)):
+                            for segment in keyset_segments(sort_by, after):
+                                query, params = plan_builder.build(filters, sort_by, segment)
+                                scans = self._explain_full_scans(cursor, query, params, selective_indexes)
+
+                                if scans:
+                                    failures.append({'filters': filters, 'sort_by': sort_by,
+                                                     'segment': segment[0], 'scans': scans})
+            return failures
+        finally:
+            conn.rollback()
+            conn.close()
+
+    @staticmethod
+    def _selective_indexes(cursor) -> Set[str]:
+        """Index partiels de properties dont le prédicat restreint plus que les annonces actives"""
+        cursor.execute('''
+            SELECT c.relname, pg_get_expr(i.indpred, i.indrelid)
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = 'properties'::regclass AND i.indpred IS NOT NULL
+        ''')
+        return {
+            name for name, predicate in cursor.fetchall()
+            if re.search(r'\w', _ACTIVE_PREDICATE_RE.sub('', predicate))
+        }
+
+    @staticmethod
+    def _explain_full_scans(cursor, query: str, params: List[Any], selective_indexes: Set[str]) -> List[str]:
+        """Parcours complets du premier plan qui en est exempt, sinon du dernier (voir _PLAN_CHECK_SETTINGS)"""
+        scans = []
+        for settings in _PLAN_CHECK_SETTINGS:
+            for setting in settings:
+                cursor.execute(f"SET LOCAL {setting} = off")
+            try:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+                scans = find_plan_full_scans(cursor.fetchone()[0][0]['Plan'], selective_indexes=selective_indexes)
+            finally:
+                for setting in settings:
+                    cursor.execute(f"SET LOCAL {setting} = on")
+            if not scans:
+                break
+        return scans
+
+    def get_query_shape_metrics(self) -> Dict[str, Any]:
+        """Réutilisation des formes de requête compilées (hits, misses, formes en cache)"""
+        return self.query_builder.get_metrics()
+
+    def search_properties_advanced(self, filters=None, result_format='dict'):
+        """Recherche avancée avec tous les critères (première page)"""
+        return self.search_properties_page(filters, result_format=result_format)['properties']
+
+    def search_properties(self, filters=None, result_format='dict'):
+        """Alias utilisé par le moteur de recherche (search.engine)"""
+        return self.search_properties_advanced(filters, result_format)
+
+    def search_properties_in_bounds(self, bounds, filters=None, limit=500, result_format='dict'):
+        """Annonces situées dans une emprise de carte (voir DatabaseManager)"""
+        page = self.search_properties_page(dict(filters or {}, bounds=bounds), limit=limit,
+                                           result_format=result_format)
+        return page['properties']
+
+    def search_properties_page(self, filters=None, cursor=None, limit=50, result_format='dict'):
+        """
+        Recherche paginée par curseur (keyset), jetons compatibles avec DatabaseManager
+
+        Returns:
+            dict: {'properties': lignes au format demandé, 'next_cursor': jeton ou None}
+
+        Raises:
+            ValueError: Curseur invalide, format de résultat inconnu
+        """
+        check_result_format(result_format)
+        sort_by = resolve_sort(filters)
+        after = decode_cursor(cursor, sort_by, filters) if cursor else None
+
+        self.result_cache.refresh_from_change_log(self)
+        cache_key = self.result_cache.make_key(filters, sort_by, cursor, limit)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            columns, page, next_cursor = cached
+            return {'properties': materialize_rows(columns, page, result_format), 'next_cursor': next_cursor}
+        generation = self.result_cache.generation
+
+        conn = self.get_read_connection()
+        columns = ()
+
+        try:
+            rows = []
+            with conn.cursor() as db_cursor:
+                for segment in keyset_segments(sort_by, after):
+                    query, params = self._build_search_query(filters, sort_by, segment, limit + 1 - len(rows))
+                    self._execute_prepared(db_cursor, query, params)
+                    columns = cursor_columns(db_cursor)
+                    rows.extend(db_cursor.fetchall())
+
+                    if len(rows) > limit:
+                        break
+            conn.commit()
+
+            page = rows[:limit]
+
+            next_cursor = None
+            if len(rows) > limit and page:
+                next_cursor = encode_cursor(sort_by, dict(zip(columns, page[-1])), filters)
+
+            self.result_cache.put(cache_key, filters, columns, page, next_cursor, generation)
+            return {'properties': materialize_rows(columns, page, result_format), 'next_cursor': next_cursor}
+
+        except psycopg2.Error as e:
+            logger.error(f"Erreur recherche: {e}")
+            return {'properties': materialize_rows(columns, [], result_format), 'next_cursor': None}
+        finally:
+            conn.close()
+
+    def iter_properties(self, filters=None, result_format='dict',
+                        batch_size: Optional[int] = None) -> Iterator[Any]:
+        """
+        Parcourt toutes les annonces correspondant aux filtres, pour un export
+
+        Curseur côté serveur (nommé) : les lignes arrivent par paquets de
+        batch_size, la mémoire ne dépend pas du nombre d'annonces.
+
+        Yields:
+            Lignes au format 'dict' ou 'record' (ou blocs 'tuple' / 'numpy'
+            de batch_size lignes)
+        """
+        check_result_format(result_format)
+        batch_size = batch_size or self.export_batch_size
+        query, params = self._build_search_query(filters, resolve_sort(filters), limit=None)
+
+        conn = self.get_read_connection()
+        try:
+            name = f"export_{threading.get_ident()}_{int(time.monotonic() * 1000)}"
+            with conn.cursor(name=name) as db_cursor:
+                db_cursor.itersize = batch_size
+                db_cursor.execute(query, params)
+                columns = ()
+                while True:
+                    rows = db_cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    columns = columns or cursor_columns(db_cursor)
+                    batch = materialize_rows(columns, rows, result_format)
+                    if result_format in ('tuple', 'numpy'):
+                        yield batch
+                    else:
+                        yield from batch
+            conn.commit()
+        finally:
+            conn.close()
+
+    # === LECTURES UNITAIRES ===
+
+    def _fetch_one(self, query: str, params: Tuple[Any, ...], result_format: str):
+        check_result_format(result_format)
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                rows = materialize_rows(cursor_columns(cursor), [row], result_format)
+            conn.commit()
+            return rows[0]
+        finally:
+            conn.close()
+
+    def get_property_by_id(self, property_id, result_format='dict'):
+        """Récupère une propriété par son ID (format de ligne au choix, 'dict' par défaut)"""
+        try:
+            return self._fetch_one("SELECT * FROM properties WHERE id = %s", (property_id,), result_format)
+        except psycopg2.Error as e:
+            logger.error(f"Erreur récupération propriété: {e}")
+            return None
+
+    def get_properties_by_ids(self, property_ids: Iterable[int], result_format: str = 'dict'):
+        """Propriétés d'une liste d'IDs, dans l'ordre de la liste (IDs absents ignorés)"""
+        check_result_format(result_format)
+        property_ids = [int(property_id) for property_id in property_ids]
+        conn = self.get_read_connection()
+        columns = ()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT * FROM properties WHERE id = ANY(%s)", (property_ids,))
+                columns = cursor_columns(cursor)
+                found = {row[0]: row for row in cursor.fetchall()}
+            conn.commit()
+            rows = [found[property_id] for property_id in property_ids if property_id in found]
+            return materialize_rows(columns, rows, result_format)
+        except psycopg2.Error as e:
+            logger.error(f"Erreur récupération propriétés: {e}")
+            return materialize_rows(columns, [], result_format)
+        finally:
+            conn.close()
+
+    def get_property_change_counter(self) -> Dict[str, int]:
+        """Dernier numéro de version attribué et nombre de suppressions"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT version, deletions FROM property_change_counter WHERE id = 1")
+                row = cursor.fetchone()
+            conn.commit()
+            return {'version': row[0], 'deletions': row[1]} if row else {'version': 0, 'deletions': 0}
+        finally:
+            conn.close()
+
+    def fetch_property_columns(self, columns: List[str], since_version: Optional[int] = None) -> RowSet:
+        """Colonnes choisies des annonces, en tuples bruts (voir DatabaseManager.fetch_property_columns)"""
+        leading = ['id', 'listing_status', ROW_VERSION_COLUMN]
+        selected = leading + [column for column in columns if column not in leading]
+        query = f"SELECT {', '.join(selected)} FROM properties"
+
+        if since_version is None:
+            query += " WHERE listing_status = 'active'"
+            params = ()
+        else:
+            query += f" WHERE {ROW_VERSION_COLUMN} > %s"
+            params = (since_version,)
+
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(query + " ORDER BY id", params)
+                rows = RowSet(cursor_columns(cursor), cursor.fetchall())
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+    def fetch_user_columns(self, columns: List[str], user_ids: Optional[Iterable[int]] = None) -> RowSet:
+        """Colonnes choisies des utilisateurs, en tuples bruts (voir DatabaseManager.fetch_user_columns)"""
+        selected = ['id'] + [column for column in columns if column != 'id']
+        query = f"SELECT {', '.join(selected)} FROM users"
+        if user_ids is None:
+            query += " ORDER BY id"
+            params = ()
+        else:
+            query += " WHERE id = ANY(%s) ORDER BY id"
+            params = ([int(user_id) for user_id in user_ids],)
+
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                rows = RowSet(tuple(selected), cursor.fetchall())
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+    def get_user_profile(self, user_id, result_format='dict'):
+        """Récupère le profil complet d'un utilisateur (format de ligne au choix, 'dict' par défaut)"""
+        try:
+            return self._fetch_one("SELECT * FROM users WHERE id = %s", (user_id,), result_format)
+        except psycopg2.Error as e:
+            logger.error(f"Erreur récupération utilisateur: {e}")
+            return None
+
+    # === ANNONCES SIMILAIRES PRÉCALCULÉES ===
+
+    def get_property_similarities(self, property_id, limit: int = 5) -> List[Tuple[int, float]]:
+        """Annonces similaires précalculées (voisines actives) ; vide si la liste n'est pas encore calculée"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                similar = read_similarities(cursor, property_id, limit, '%s')
+            conn.commit()
+            return similar
+        except psycopg2.Error as e:
+            logger.error(f"Erreur lecture annonces similaires: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def save_property_similarities(self, neighbors: Dict[int, List[Tuple[int, float]]],
+                                   removed_ids: Iterable[int] = ()) -> bool:
+        """Remplace les listes d'annonces similaires calculées et supprime celles de removed_ids"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                replace_similarities(cursor, neighbors, removed_ids, '%s')
+            conn.commit()
+            return True
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.error(f"Erreur enregistrement annonces similaires: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def get_similarity_referrers(self, property_ids: Iterable[int]) -> Set[int]:
+        """Annonces dont la liste précalculée contient l'une des annonces données"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                referrers = similarity_referrers(cursor, property_ids, '%s')
+            conn.commit()
+            return referrers
+        finally:
+            conn.close()
+
+    def prune_property_similarities(self) -> int:
+        """Supprime les listes précalculées des annonces supprimées ou inactives"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                removed = prune_similarities(cursor)
+            conn.commit()
+            return removed
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.error(f"Erreur nettoyage annonces similaires: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    # === FAVORIS ET PROFIL COMPORTEMENTAL ===
+
+    def add_to_favorites(self, user_id, property_id, interest_level: int = 3) -> bool:
+        """Ajoute une annonce aux favoris et met à jour le profil ; False si déjà présente ou inconnue"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO favorites (user_id, property_id, interest_level)
+                    SELECT %s, id, %s FROM properties WHERE id = %s
+                    ON CONFLICT (user_id, property_id) DO NOTHING
+                ''', (user_id, interest_level, property_id))
+                added = cursor.rowcount > 0
+                if added:
+                    record_favorite(cursor, user_id, property_id, '%s')
+            conn.commit()
+            return added
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.error(f"Erreur ajout favori: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def remove_from_favorites(self, user_id, property_id) -> bool:
+        """Retire une annonce des favoris (profil recalculé) ; True si elle y figurait"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM favorites WHERE user_id = %s AND property_id = %s", (user_id, property_id)
+                )
+                removed = cursor.rowcount > 0
+                if removed:
+                    rebuild_behavior_profile(cursor, user_id, '%s')
+            conn.commit()
+            return removed
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.error(f"Erreur suppression favori: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def is_favorite(self, user_id, property_id) -> bool:
+        """Indique si une annonce figure dans les favoris de l'utilisateur"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM favorites WHERE user_id = %s AND property_id = %s", (user_id, property_id)
+                )
+                found = cursor.fetchone() is not None
+            conn.commit()
+            return found
+        finally:
+            conn.close()
+
+    def get_user_favorites(self, user_id, result_format: str = 'dict'):
+        """Annonces favorites d'un utilisateur, les plus récemment ajoutées d'abord (avec interest_level, favorited_at)"""
+        check_result_format(result_format)
+        conn = self.get_read_connection()
+        columns = ()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT p.*, f.interest_level, f.created_at AS favorited_at
+                    FROM favorites f JOIN properties p ON p.id = f.property_id
+                    WHERE f.user_id = %s
+                    ORDER BY f.created_at DESC, f.id DESC
+                ''', (user_id,))
+                columns = cursor_columns(cursor)
+                rows = cursor.fetchall()
+            conn.commit()
+            return materialize_rows(columns, rows, result_format)
+        except psycopg2.Error as e:
+            logger.error(f"Erreur récupération favoris: {e}")
+            return materialize_rows(columns, [], result_format)
+        finally:
+            conn.close()
+
+    def get_user_favorite_ids(self, user_id) -> set:
+        """IDs des annonces favorites d'un utilisateur"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT property_id FROM favorites WHERE user_id = %s", (user_id,))
+                property_ids = {row[0] for row in cursor.fetchall()}
+            conn.commit()
+            return property_ids
+        finally:
+            conn.close()
+
+    def fetch_favorite_interactions(self, after_id: int = 0) -> RowSet:
+        """Favoris (id, user_id, property_id, interest_level) d'id supérieur à after_id, triés par id"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT id, user_id, property_id, interest_level FROM favorites
+                    WHERE id > %s AND user_id IS NOT NULL AND property_id IS NOT NULL
+                    ORDER BY id
+                ''', (after_id,))
+                rows = RowSet(cursor_columns(cursor), cursor.fetchall())
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+    def get_favorites_state(self) -> Dict[str, int]:
+        """Nombre de favoris et plus grand id : un nombre en baisse à id égal signale des retraits"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM favorites")
+                count, last_id = cursor.fetchone()
+            conn.commit()
+            return {'count': count, 'last_id': last_id}
+        finally:
+            conn.close()
+
+    def fetch_favorite_ids(self, through_id: int) -> Set[int]:
+        """IDs des favoris jusqu'à through_id : ceux d'une lecture précédente absents ont été retirés"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT id FROM favorites WHERE id <= %s", (through_id,))
+                ids = {row[0] for row in cursor.fetchall()}
+            conn.commit()
+            return ids
+        finally:
+            conn.close()
+
+    def get_user_behavior_profile(self, user_id) -> Dict[str, Any]:
+        """Profil comportemental agrégé d'un utilisateur (voir database.behavior_profile.read_behavior_profile)"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                profile = read_behavior_profile(cursor, user_id, '%s')
+            conn.commit()
+            return profile
+        except psycopg2.Error as e:
+            logger.error(f"Erreur lecture profil comportemental: {e}")
+            return {}
+        finally:
+            conn.close()
+
+    # === RECHERCHES SAUVEGARDÉES ET ALERTES ===
+
+    def save_search(self, user_id, name, filters, alert_enabled=False):
+        """Sauvegarde une recherche ; retourne son ID, None en cas d'erreur"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO saved_searches (user_id, name, filters, alert_enabled)"
+                    " VALUES (%s, %s, %s, %s) RETURNING id",
+                    (user_id, name, json.dumps(filters or {}, default=str), bool(alert_enabled))
+                )
+                search_id = cursor.fetchone()[0]
+                record_saved_search(cursor, user_id, filters, '%s')
+            conn.commit()
+            return search_id
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.error(f"Erreur sauvegarde recherche: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def get_saved_searches(self, user_id) -> List[Dict[str, Any]]:
+        """Recherches sauvegardées d'un utilisateur, les plus récentes d'abord (filtres décodés)"""
+        return self._fetch_saved_searches('''
+            SELECT id, user_id, name, filters, alert_enabled, created_at FROM saved_searches
+            WHERE user_id = %s ORDER BY created_at DESC, id DESC
+        ''', (user_id,))
+
+    def delete_saved_search(self, user_id, search_id) -> bool:
+        """Supprime une recherche sauvegardée de l'utilisateur ; True si elle existait"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM saved_searches WHERE id = %s AND user_id = %s", (search_id, user_id))
+                deleted = cursor.rowcount > 0
+                if deleted:
+                    rebuild_behavior_profile(cursor, user_id, '%s')
+            conn.commit()
+            return deleted
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.error(f"Erreur suppression recherche sauvegardée: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def get_alert_searches(self) -> List[Dict[str, Any]]:
+        """Recherches sauvegardées avec alertes, avec l'email et le nom de leur utilisateur"""
+        return self._fetch_saved_searches('''
+            SELECT s.id, s.user_id, s.name, s.filters, s.alert_enabled, s.created_at,
+                   u.email, u.first_name, u.last_name
+            FROM saved_searches s JOIN users u ON u.id = s.user_id
+            WHERE s.alert_enabled
+            ORDER BY s.id
+        ''', ())
+
+    def _fetch_saved_searches(self, query: str, params: Tuple[Any, ...]) -> List[Dict[str, Any]]:
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                columns = cursor_columns(cursor)
+                rows = cursor.fetchall()
+            conn.commit()
+            return [saved_search(columns, row) for row in rows]
+        except psycopg2.Error as e:
+            logger.error(f"Erreur récupération recherches sauvegardées: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def filter_unnotified_alerts(self, pairs: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """Couples (user_id, property_id) pas encore signalés, dans l'ordre d'origine"""
+        pairs = [(int(user_id), int(property_id)) for user_id, property_id in pairs]
+        if not pairs:
+            return []
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT n.user_id, n.property_id FROM alert_notifications n"
+                    " JOIN unnest(%s::bigint[], %s::bigint[]) AS p (user_id, property_id)"
+                    " ON n.user_id = p.user_id AND n.property_id = p.property_id",
+                    ([user_id for user_id, _ in pairs], [property_id for _, property_id in pairs])
+                )
+                notified = set(cursor.fetchall())
+            conn.commit()
+            return [pair for pair in pairs if pair not in notified]
+        finally:
+            conn.close()
+
+    def record_alert_notifications(self, notifications: Iterable[Tuple[int, int, Optional[int]]]):
+        """Enregistre des alertes envoyées et les retire de la file d'attente (même transaction)"""
+        notifications = list(notifications)
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                psycopg2.extras.execute_values(
+                    cursor,
+                    "INSERT INTO alert_notifications (user_id, property_id, saved_search_id) VALUES %s"
+                    " ON CONFLICT DO NOTHING",
+                    notifications
+                )
+                self._delete_pending_alerts(cursor, [(user_id, property_id) for user_id, property_id, _ in notifications])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def queue_pending_alerts(self, alerts: Iterable[Tuple[int, int, Optional[int]]]):
+        """Met en attente des alertes à envoyer : (user_id, property_id, saved_search_id)"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                psycopg2.extras.execute_values(
+                    cursor,
+                    "INSERT INTO pending_alerts (user_id, property_id, saved_search_id) VALUES %s"
+                    " ON CONFLICT DO NOTHING",
+                    list(alerts)
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_pending_alerts(self) -> List[Tuple[int, int, Optional[int]]]:
+        """Alertes en attente : (user_id, property_id, saved_search_id) par utilisateur et annonce"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT user_id, property_id, saved_search_id FROM pending_alerts ORDER BY user_id, property_id"
+                )
+                rows = cursor.fetchall()
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+    def discard_pending_alerts(self, pairs: Iterable[Tuple[int, int]]):
+        """Retire de la file des couples (user_id, property_id) devenus sans objet"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                self._delete_pending_alerts(cursor, [(int(user_id), int(property_id)) for user_id, property_id in pairs])
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _delete_pending_alerts(cursor, pairs: List[Tuple[int, int]]):
+        """Supprime des couples de la file d'attente (sans valider)"""
+        if pairs:
+            cursor.execute(
+                "DELETE FROM pending_alerts p USING unnest(%s::bigint[], %s::bigint[]) AS d (user_id, property_id)"
+                " WHERE p.user_id = d.user_id AND p.property_id = d.property_id",
+                ([user_id for user_id, _ in pairs], [property_id for _, property_id in pairs])
+            )
+
+    def log_search_event(self, user_id, query: str, filters: Optional[Dict[str, Any]] = None) -> Optional[int]:
+        """
+        Enregistre une recherche et met à jour les préférences agrégées de l'utilisateur
+
+        Les recherches au-delà de max_events_per_user sont supprimées, les
+        compteurs conservent leur contribution.
+
+        Returns:
+            int: ID de l'événement, None en cas d'erreur
+        """
+        price_max_sum, price_max_count = search_stats_increment(filters)
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO search_events (user_id, query, filters) VALUES (%s, %s, %s) RETURNING id",
+                    (user_id, query, json.dumps(filters or {}, default=str))
+                )
+                event_id = cursor.fetchone()[0]
+
+                counters = search_counters(filters)
+                if counters:
+                    psycopg2.extras.execute_values(
+                        cursor,
+                        "INSERT INTO user_search_patterns (user_id, kind, value, count) VALUES %s"
+                        " ON CONFLICT (user_id, kind, value) DO UPDATE SET count = user_search_patterns.count + 1",
+                        [(user_id, kind, value, 1) for kind, value in counters]
+                    )
+
+                cursor.execute('''
+                    INSERT INTO user_search_stats (user_id, search_count, price_max_sum, price_max_count, last_search_at)
+                    VALUES (%s, 1, %s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        search_count = user_search_stats.search_count + 1,
+                        price_max_sum = user_search_stats.price_max_sum + excluded.price_max_sum,
+                        price_max_count = user_search_stats.price_max_count + excluded.price_max_count,
+                        last_search_at = excluded.last_search_at
+                ''', (user_id, price_max_sum, price_max_count))
+
+                # Historique borné : suppression au-delà des N dernières recherches
+                cursor.execute('''
+                    DELETE FROM search_events WHERE user_id = %s AND id <= (
+                        SELECT id FROM search_events WHERE user_id = %s ORDER BY id DESC LIMIT 1 OFFSET %s
+                    )
+                ''', (user_id, user_id, self.search_history_config['max_events_per_user']))
+            conn.commit()
+            return event_id
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.error(f"Erreur enregistrement recherche: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def get_search_patterns(self, user_id) -> Dict[str, Any]:
+        """Préférences de recherche agrégées d'un utilisateur (voir database.search_events.build_patterns)"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT kind, value, count FROM (
+                        SELECT kind, value, count,
+                               ROW_NUMBER() OVER (PARTITION BY kind ORDER BY count DESC, value) AS rank
+                        FROM user_search_patterns WHERE user_id = %s
+                    ) ranked WHERE rank <= %s
+                    ORDER BY kind, count DESC, value
+                ''', (user_id, self.search_history_config['max_pattern_values']))
+                counter_rows = cursor.fetchall()
+
+                cursor.execute(
+                    "SELECT search_count, price_max_sum, price_max_count FROM user_search_stats WHERE user_id = %s",
+                    (user_id,)
+                )
+                stats_row = cursor.fetchone()
+
+                cursor.execute(
+                    "SELECT query FROM search_events WHERE user_id = %s ORDER BY id DESC LIMIT %s",
+                    (user_id, self.search_history_config['recent_queries'])
+                )
+                recent_queries = [row[0] for row in reversed(cursor.fetchall())]
+            conn.commit()
+            return build_patterns(counter_rows, stats_row, recent_queries)
+        except psycopg2.Error as e:
+            logger.error(f"Erreur lecture préférences de recherche: {e}")
+            return build_patterns([], None, [])
+        finally:
+            conn.close()
+
+    def get_search_history(self, user_id, limit: int = 20) -> List[Dict[str, Any]]:
+        """Dernières recherches d'un utilisateur, les plus récentes d'abord (filtres décodés)"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT id, user_id, query, filters, created_at FROM search_events
+                    WHERE user_id = %s ORDER BY id DESC LIMIT %s
+                ''', (user_id, limit))
+                columns = cursor_columns(cursor)
+                rows = cursor.fetchall()
+            conn.commit()
+            return [search_event(columns, row) for row in rows]
+        except psycopg2.Error as e:
+            logger.error(f"Erreur récupération historique de recherche: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def get_feed_cursor(self, consumer: str) -> Optional[int]:
+        """Position (dernier seq traité) d'un consommateur du journal des modifications, None s'il est nouveau"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT position FROM feed_cursors WHERE consumer = %s", (consumer,))
+                row = cursor.fetchone()
+            conn.commit()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def set_feed_cursor(self, consumer: str, position: int):
+        """Enregistre la position d'un consommateur du journal des modifications"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO feed_cursors (consumer, position, updated_at) VALUES (%s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (consumer) DO UPDATE SET position = excluded.position, updated_at = excluded.updated_at
+                ''', (consumer, position))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # === JOURNAL DES MODIFICATIONS ===
+
+    def get_change_log_head(self) -> int:
+        """Dernier seq du journal des modifications (voir database.change_log)"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                head = change_log_head(cursor)
+            conn.commit()
+            return head
+        finally:
+            conn.close()
+
+    def read_property_changes(self, since: int, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Modifications d'annonces postérieures au seq since (voir DatabaseManager.read_property_changes)"""
+        conn = self.get_read_connection()
+        try:
+            with conn.cursor() as cursor:
+                result = read_changes(cursor, since, limit or self.change_log_config['read_batch_size'], '%s')
+            conn.commit()
+            return result
+        finally:
+            conn.close()
+
+    def read_consumer_changes(self, consumer: str, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Modifications non encore traitées par un consommateur (voir DatabaseManager.read_consumer_changes)"""
+        position = self.get_feed_cursor(consumer)
+        if position is None:
+            position = self.get_change_log_head()
+            self.set_feed_cursor(consumer, position)
+        return self.read_property_changes(position, limit)
+
+    def drop_change_consumer(self, consumer: str):
+        """Supprime un consommateur : il ne retient plus la compaction du journal"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM feed_cursors WHERE consumer = %s", (consumer,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def compact_change_log(self, retention_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """Compacte le journal des modifications (voir database.change_log.compact_change_log)"""
+        if retention_seconds is None:
+            retention_seconds = self.change_log_config['retention_seconds']
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                result = compact_change_log(cursor, retention_seconds, '%s')
+            conn.commit()
+            return result
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.error(f"Erreur compaction du journal: {e}")
+            return {}
+        finally:
+            conn.close()
+
+    # === STATISTIQUES ===
+
+    def get_statistics(self):
+        """Retourne des statistiques de la base"""
+        conn = self.get_read_connection()
+
+        try:
+            with conn.cursor() as cursor:
+                stats = {}
+
+                cursor.execute("SELECT COUNT(*) FROM properties WHERE listing_status = 'active'")
+                stats['total_properties'] = cursor.fetchone()[0]
+
+                cursor.execute("SELECT COUNT(*) FROM users")
+                stats['total_users'] = cursor.fetchone()[0]
+
+                cursor.execute("SELECT COUNT(*) FROM real_estate_agents")
+                stats['total_agents'] = cursor.fetchone()[0]
+
+                cursor.execute('''
+                    SELECT city, AVG(price) AS avg_price, COUNT(*)
+                    FROM properties WHERE listing_status = 'active'
+                    GROUP BY city
+                    ORDER BY avg_price DESC
+                ''')
+                stats['price_by_city'] = [
+                    {'city': row[0], 'avg_price': int(row[1]), 'count': row[2]}
+                    for row in cursor.fetchall()
+                ]
+
+                cursor.execute('''
+                    SELECT property_type, COUNT(*)
+                    FROM properties WHERE listing_status = 'active'
+                    GROUP BY property_type
+                ''')
+                stats['properties_by_type'] = dict(cursor.fetchall())
+
+            conn.commit()
+            return stats
+
+        except psycopg2.Error as e:
+            logger.error(f"Erreur statistiques: {e}")
+            return {}
+        finally:
+            conn.close()
+
+    def get_market_stats(self, city=None, property_type=None):
+        """
+        Statistiques de marché (mêmes clés que DatabaseManager.get_market_stats)
+
+        Agrégats calculés à la volée sur l'index (listing_status, city,
+        property_type, bedrooms, price) ; la médiane est exacte.
+        """
+        conditions, params = ["listing_status = 'active'"], []
+        if city:
+            conditions.append("city ILIKE %s")
+            params.append(f"%{city}%")
+        if property_type:
+            conditions.append("property_type = %s")
+            params.append(property_type)
+        where = ' AND '.join(conditions)
+
+        conn = self.get_read_connection()
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f'''
+                    SELECT COUNT(*), AVG(price), MIN(price), MAX(price),
+                           percentile_disc(0.5) WITHIN GROUP (ORDER BY price),
+                           AVG(surface_total)
+                    FROM properties WHERE {where}
+                ''', params)
+                total, average_price, price_min, price_max, median, average_surface = cursor.fetchone()
+
+                if not total:
+                    conn.commit()
+                    return {}
+
+                cursor.execute(f'''
+                    SELECT bedrooms, COUNT(*) FROM properties WHERE {where}
+                    GROUP BY bedrooms ORDER BY bedrooms NULLS FIRST
+                ''', params)
+                bedroom_distribution = dict(cursor.fetchall())
+            conn.commit()
+
+            average_price = float(average_price)
+            average_surface = float(average_surface or 0)
+            return {
+                'total_properties': total,
+                'average_price': average_price,
+                'min_price': price_min,
+                'max_price': price_max,
+                'median_price': median,
+                'average_surface': average_surface,
+                'average_price_per_m2': average_price / average_surface if average_surface else 0,
+                'bedroom_distribution': bedroom_distribution
+            }
+
+        except psycopg2.Error as e:
+            logger.error(f"Erreur statistiques marché: {e}")
+            return {}
+        finally:
+            conn.close()
+
+    def test_connection(self):
+        """Test de connexion à la base"""
+        try:
+            with self.get_read_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT COUNT(*) FROM properties")
+                    count = cursor.fetchone()[0]
+            logger.info(f"Test réussi: {count} propriétés en base")
+            return True
+        except psycopg2.Error as e:
+            logger.error(f"Test échoué: {e}")
+            return False
@@ -0,0 +1,101 @@
+"""
+Annonces similaires précalculées
+Pour chaque annonce active, ses plus proches voisines (search.similarity_index)
+rangées par similarité décroissante ; table remplie par une tâche de fond
+(search.similarity_table) et lue par les pages de détail
+"""
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+_BATCH_SIZE = 500
+
+_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS property_similarity (
+        property_id INTEGER NOT NULL,
+        neighbor_rank INTEGER NOT NULL,
+        similar_id INTEGER NOT NULL,
+        score REAL NOT NULL,
+        computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (property_id, neighbor_rank)
+    ) WITHOUT ROWID
+    ''',
+    # Listes où figure une annonce (à recalculer quand elle change)
+    "CREATE INDEX IF NOT EXISTS idx_property_similarity_similar ON property_similarity (similar_id)",
+]
+
+
+def ensure_property_similarity(cursor):
+    """Crée la table des annonces similaires (SQLite)"""
+    for statement in _TABLES:
+        cursor.execute(statement)
+
+
+def _batches(values: Sequence[int]) -> Iterable[List[int]]:
+    """Lots d'IDs pour les clauses IN"""
+    values = list(values)
+    for start in range(0, len(values), _BATCH_SIZE):
+        yield values[start:start + _BATCH_SIZE]
+
+
+def replace_similarities(cursor, neighbors: Dict[int, Sequence[Tuple[int, float]]],
+                         removed_ids: Iterable[int] = (), placeholder: str = '?'):
+    """
+    Remplace les listes de voisines d'annonces et supprime celles des annonces retirées
+
+    Args:
+        neighbors: ID d'annonce -> (id voisine, similarité) par similarité décroissante
+        removed_ids: Annonces dont la liste est supprimée (supprimées ou inactives)
+    """
+    p = placeholder
+    for batch in _batches(sorted(set(neighbors) | set(removed_ids))):
+        cursor.execute(
+            f"DELETE FROM property_similarity WHERE property_id IN ({', '.join(p for _ in batch)})", batch
+        )
+
+    rows = [
+        (property_id, rank, similar_id, score)
+        for property_id, similar in neighbors.items()
+        for rank, (similar_id, score) in enumerate(similar)
+    ]
+    if rows:
+        cursor.executemany(
+            f"INSERT INTO property_similarity (property_id, neighbor_rank, similar_id, score) VALUES ({p}, {p}, {p}, {p})",
+            rows
+        )
+
+
+def similarity_referrers(cursor, property_ids: Iterable[int], placeholder: str = '?') -> Set[int]:
+    """Annonces dont la liste de voisines contient l'une des annonces données"""
+    p = placeholder
+    referrers = set()
+    for batch in _batches(sorted(set(property_ids))):
+        cursor.execute(
+            f"SELECT DISTINCT property_id FROM property_similarity WHERE similar_id IN ({', '.join(p for _ in batch)})",
+            batch
+        )
+        referrers.update(row[0] for row in cursor.fetchall())
+    return referrers
+
+
+def read_similarities(cursor, property_id: int, limit: int, placeholder: str = '?') -> List[Tuple[int, float]]:
+    """Voisines actives d'une annonce, par similarité décroissante ([] si la liste n'est pas calculée)"""
+    p = placeholder
+    cursor.execute(f'''
+        SELECT s.similar_id, s.score
+        FROM property_similarity s
+        JOIN properties pr ON pr.id = s.similar_id AND pr.listing_status = 'active'
+        WHERE s.property_id = {p}
+        ORDER BY s.neighbor_rank
+        LIMIT {p}
+    ''', (property_id, limit))
+    return [(similar_id, score) for similar_id, score in cursor.fetchall()]
+
+
+def prune_similarities(cursor) -> int:
+    """Supprime les listes des annonces supprimées ou inactives ; retourne le nombre de lignes"""
+    cursor.execute('''
+        DELETE FROM property_similarity WHERE property_id NOT IN (
+            SELECT id FROM properties WHERE listing_status = 'active'
+        )
+    ''')
+    return cursor.rowcount
@@ -0,0 +1,464 @@
+"""
+Cache des résultats de recherche, indexé sur les filtres normalisés
+Invalidé à chaque écriture d'une annonce satisfaisant les prédicats d'une entrée,
+et par le journal des modifications pour les écritures des autres processus
+"""
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from database.fulltext import FTS_COLUMNS, index_words, search_terms
+from database.pagination import filters_fingerprint
+from database.spatial import haversine_km, normalize_bounds
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULT_CACHE_CONFIG = {
+    'enabled': True,
+    'max_bytes': 64 * 1024 * 1024,   # Taille estimée des lignes conservées
+    'ttl': 300.0,                    # Secondes
+    # Secondes entre deux lectures du journal des modifications (écritures
+    # des autres processus : import en ligne de commande, autre serveur)
+    'log_check_interval': 1.0,
+    # Au-delà de ce nombre de lignes modifiées, tout le cache est vidé plutôt
+    # que d'évaluer chaque prédicat (imports en masse)
+    'max_changes_per_invalidation': 1000,
+}
+
+# Clés de filtres sans effet sur l'ensemble des résultats (voir pagination)
+_NON_PREDICATE_KEYS = {'sort_by', 'cursor', 'limit'}
+
+# Filtres numériques : '2000000' et 2000000 désignent la même recherche
+_NUMERIC_FILTERS = {
+    'price_max', 'price_min', 'bedrooms_min', 'surface_min', 'luxury_level',
+    'center_lat', 'center_lng', 'radius_km'
+}
+
+def _number(value: Any) -> Optional[float]:
+    """Valeur numérique, None si elle n'est pas convertible"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Filtres restreignant les résultats, valeurs numériques converties"""
+    normalized = {}
+    for name, value in (filters or {}).items():
+        if name in _NON_PREDICATE_KEYS or value in (None, '', False):
+            continue
+        if name in _NUMERIC_FILTERS:
+            number = _number(value)
+            value = value if number is None else number
+        normalized[name] = value
+    return normalized
+
+
+def _unknown(row: Dict[str, Any], *columns: str) -> bool:
+    return any(column not in row for column in columns)
+
+
+def row_matches_filters(row: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """
+    Indique si une annonce peut figurer dans les résultats des filtres
+
+    Mêmes prédicats que la requête de recherche. Une colonne absente de
+    l'image (insertion partielle) ou une valeur non numérique comparée à
+    un seuil compte comme satisfaisant le prédicat : en cas de doute,
+    l'entrée est invalidée.
+    """
+    if not _unknown(row, 'listing_status') and row['listing_status'] != 'active':
+        return False
+
+    def compare(column: str, check) -> bool:
+        if column not in row:
+            return True
+        value = row[column]
+        return value is not None and check(value)
+
+    def bound(column: str, name: str, minimum: bool) -> bool:
+        limit = _number(filters[name])
+
+        def check(value):
+            number = _number(value)
+            if limit is None or number is None:
+                return True
+            return number >= limit if minimum else number <= limit
+        return compare(column, check)
+
+    if filters.get('price_max') and not bound('price', 'price_max', minimum=False):
+        return False
+    if filters.get('price_min') and not bound('price', 'price_min', minimum=True):
+        return False
+    if filters.get('property_type') and not compare('property_type', lambda v: v == filters['property_type']):
+        return False
+    if filters.get('city') and not compare('city', lambda v: str(filters['city']).lower() in str(v).lower()):
+        return False
+    if filters.get('bedrooms_min') and not bound('bedrooms', 'bedrooms_min', minimum=True):
+        return False
+    if filters.get('surface_min') and not bound('surface_total', 'surface_min', minimum=True):
+        return False
+    if filters.get('luxury_level') and not bound('luxury_level', 'luxury_level', minimum=True):
+        return False
+    if filters.get('has_garden') and not compare('garden', lambda v: _number(v) == 1):
+        return False
+    if filters.get('has_pool') and not compare('swimming_pool', lambda v: _number(v) == 1):
+        return False
+    if filters.get('has_garage') and not compare('garage_count', lambda v: (_number(v) or 0) > 0):
+        return False
+
+    has_coordinates = not _unknown(row, 'latitude', 'longitude')
+    if filters.get('center_lat') and filters.get('center_lng') and filters.get('radius_km') and has_coordinates:
+        distance = haversine_km(float(filters['center_lat']), float(filters['center_lng']),
+                                row['latitude'], row['longitude'])
+        if distance is None or distance > float(filters['radius_km']):
+            return False
+
+    if filters.get('bounds') and has_coordinates:
+        min_lat, max_lat, min_lng, max_lng = normalize_bounds(filters['bounds'])
+        if row['latitude'] is None or row['longitude'] is None:
+            return False
+        if not (min_lat <= row['latitude'] <= max_lat and min_lng <= row['longitude'] <= max_lng):
+            return False
+
+    terms = search_terms(filters.get('text'))
+    if terms and not _unknown(row, *FTS_COLUMNS):
+        words = set(index_words(' '.join(str(row[column] or '') for column in FTS_COLUMNS)))
+        # Un terme coupé par le tokenizer (ex. "a_b") devient une phrase : chaque mot est exigé
+        folded = [word for term in terms for word in index_words(term)]
+        if folded and not all(term in words for term in folded[:-1]):
+            return False
+        if folded and not any(word.startswith(folded[-1]) for word in words):
+            return False
+
+    return True
+
+
+def estimate_rows_size(columns: Sequence[str], rows: Sequence[tuple]) -> int:
+    """Taille approchée en octets des lignes conservées"""
+    size = sys.getsizeof(rows) + sum(sys.getsizeof(column) for column in columns)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+class SearchResultCache:
+    """
+    Cache LRU et TTL de pages de recherche
+
+    Une entrée conserve les lignes brutes (tuples) d'une page : chaque
+    lecture les remet au format demandé, les appelants peuvent modifier
+    les résultats sans altérer le cache. Les entrées sont regroupées par
+    prédicat (filtres normalisés) : une annonce écrite invalide toutes les
+    pages, tris et formats des prédicats qu'elle satisfait avant ou après
+    l'écriture.
+
+    Les écritures des autres processus sont lues dans le journal des
+    modifications (refresh_from_change_log, appelée avant chaque lecture) ;
+    le TTL ne borne plus que les écritures hors journal.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_RESULT_CACHE_CONFIG['max_bytes'],
+                 ttl: float = DEFAULT_RESULT_CACHE_CONFIG['ttl'],
+                 max_changes_per_invalidation: int = DEFAULT_RESULT_CACHE_CONFIG['max_changes_per_invalidation'],
+                 log_check_interval: float = DEFAULT_RESULT_CACHE_CONFIG['log_check_interval'],
+                 enabled: bool = True):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_changes_per_invalidation = max_changes_per_invalidation
+        self.log_check_interval = log_check_interval
+        self.enabled = enabled
+
+        # clé -> (prédicat, colonnes, lignes, curseur suivant, taille, expiration, IDs des lignes)
+        self._entries = OrderedDict()
+        self._predicates = {}           # empreinte -> (filtres, {clés})
+        self._bytes = 0
+        # Incrémenté à chaque invalidation : une page lue avant une écriture
+        # et rangée après n'est pas conservée
+        self._generation = 0
+        # Dernier seq du journal pris en compte (None : pas encore lu)
+        self._log_position: Optional[int] = None
+        self._next_log_check = 0.0
+        self._lock = threading.Lock()
+        self._metrics = {
+            'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expirations': 0,
+            'invalidations': 0, 'invalidated_entries': 0, 'full_clears': 0
+        }
+
+    @staticmethod
+    def make_key(filters: Optional[Dict[str, Any]], sort_by: str, cursor: Optional[str],
+                 limit: int) -> Tuple[str, str, Optional[str], int]:
+        """
+        Clé d'une page : prédicat (filtres normalisés), tri, curseur, taille
+
+        Le format de résultat n'en fait pas partie : toutes les variantes
+        d'une page partagent la même entrée.
+        """
+        return filters_fingerprint(normalize_filters(filters)), sort_by, cursor, limit
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def generation(self) -> int:
+        """À relever avant la requête et à passer à put()"""
+        return self._generation
+
+    def get(self, key: tuple) -> Optional[Tuple[Tuple[str, ...], List[tuple], Optional[str]]]:
+        """
+        Page en cache
+
+        Returns:
+            (colonnes, lignes, curseur suivant) ou None
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._metrics['misses'] += 1
+                return None
+
+            if entry[5] <= time.monotonic():
+                self._remove(key)
+                self._metrics['expirations'] += 1
+                self._metrics['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._metrics['hits'] += 1
+            return entry[1], entry[2], entry[3]
+
+    def put(self, key: tuple, filters: Optional[Dict[str, Any]], columns: Sequence[str],
+            rows: List[tuple], next_cursor: Optional[str], generation: Optional[int] = None):
+        """
+        Conserve une page
+
+        Ignorée si elle dépasse à elle seule max_bytes, ou si une écriture
+        a invalidé le cache depuis generation (relevée avant la requête).
+        """
+        if not self.enabled:
+            return
+
+        size = estimate_rows_size(columns, rows)
+        if size > self.max_bytes:
+            return
+
+        predicate = key[0]
+        normalized = normalize_filters(filters)
+        # Lignes sans colonne id : la page est retirée à chaque modification journalisée
+        ids = frozenset(row[columns.index('id')] for row in rows) if 'id' in columns else None
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (predicate, tuple(columns), list(rows), next_cursor, size,
+                                  time.monotonic() + self.ttl, ids)
+            self._predicates.setdefault(predicate, (normalized, set()))[1].add(key)
+            self._bytes += size
+            self._metrics['stores'] += 1
+
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._metrics['evictions'] += 1
+
+    def invalidate_changes(self, changes: Iterable[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]) -> int:
+        """
+        Invalide les entrées touchées par des écritures d'annonces
+
+        Args:
+            changes: (image avant, image après) par annonce écrite ; None
+                pour une insertion (avant) ou une suppression (après)
+
+        Returns:
+            int: Nombre d'entrées supprimées
+        """
+        changes = list(changes)
+        if not changes:
+            return 0
+
+        with self._lock:
+            self._generation += 1
+            if not self._entries:
+                return 0
+            predicates = [(predicate, normalized) for predicate, (normalized, _) in self._predicates.items()]
+
+        if len(changes) > self.max_changes_per_invalidation:
+            return self.clear()
+
+        try:
+            touched = []
+            for predicate, filters in predicates:
+                for before, after in changes:
+                    if ((before is not None and row_matches_filters(before, filters))
+                            or (after is not None and row_matches_filters(after, filters))):
+                        touched.append(predicate)
+                        break
+        except Exception as e:
+            # L'écriture est validée : une page douteuse ne doit pas survivre
+            logger.warning(f"Invalidation du cache de recherche impossible, cache vidé: {e}")
+            return self.clear()
+
+        return self._remove_predicates(touched)
+
+    def invalidate_properties(self, property_ids: Iterable[int],
+                              images: Dict[int, Dict[str, Any]]) -> int:
+        """
+        Invalide les entrées touchées par des annonces modifiées, sans leur image avant
+
+        Une page contenant l'une des annonces est supprimée (elle a pu
+        quitter le prédicat ou changer de place), ainsi que les pages des
+        prédicats satisfaits par son image actuelle.
+
+        Args:
+            property_ids: Annonces modifiées
+            images: Image actuelle par ID ; absente pour une annonce supprimée
+
+        Returns:
+            int: Nombre d'entrées supprimées
+        """
+        property_ids = set(property_ids)
+        if not property_ids:
+            return 0
+
+        with self._lock:
+            self._generation += 1
+            if not self._entries:
+                return 0
+            predicates = [(predicate, normalized) for predicate, (normalized, _) in self._predicates.items()]
+            containing = [
+                key for key, entry in self._entries.items()
+                if entry[6] is None or not entry[6].isdisjoint(property_ids)
+            ]
+
+        try:
+            touched = [
+                predicate for predicate, filters in predicates
+                if any(row_matches_filters(image, filters) for image in images.values())
+            ]
+        except Exception as e:
+            logger.warning(f"Invalidation du cache de recherche impossible, cache vidé: {e}")
+            return self.clear()
+
+        return self._remove_predicates(touched, containing)
+
+    def refresh_from_change_log(self, db) -> int:
+        """
+        Invalide les entrées touchées par les écritures journalisées depuis la lecture précédente
+
+        Couvre les écritures des autres processus (migrations.py --action
+        import, autre serveur) ; le journal est lu au plus toutes les
+        log_check_interval secondes. Journal compacté au-delà de la
+        position, trop de modifications ou erreur de lecture : le cache est
+        vidé.
+
+        Args:
+            db: Gestionnaire de base (get_change_log_head,
+                read_property_changes, get_properties_by_ids)
+
+        Returns:
+            int: Nombre d'entrées supprimées
+        """
+        if not self.enabled:
+            return 0
+
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_log_check:
+                return 0
+            self._next_log_check = now + self.log_check_interval
+            position = self._log_position
+
+        try:
+            head = db.get_change_log_head()
+            if position is None or head <= position:
+                # Premier passage : le cache ne contient que des pages lues depuis
+                self._advance_log(head)
+                return 0
+
+            batch = db.read_property_changes(position, self.max_changes_per_invalidation)
+            if batch['reset'] or batch['position'] < head:
+                removed = self.clear()
+                self._advance_log(head)
+                return removed
+
+            property_ids = {change['property_id'] for change in batch['changes']}
+            images = {row['id']: row for row in db.get_properties_by_ids(property_ids)}
+            removed = self.invalidate_properties(property_ids, images)
+            self._advance_log(batch['position'])
+            return removed
+
+        except Exception as e:
+            logger.warning(f"Lecture du journal des modifications impossible, cache de recherche vidé: {e}")
+            return self.clear()
+
+    def clear(self) -> int:
+        """Vide le cache ; retourne le nombre d'entrées supprimées"""
+        with self._lock:
+            self._generation += 1
+            removed = len(self._entries)
+            self._entries.clear()
+            self._predicates.clear()
+            self._bytes = 0
+            if removed:
+                self._metrics['full_clears'] += 1
+                self._metrics['invalidated_entries'] += removed
+        return removed
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Taux de succès, taille et invalidations"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['entries'] = len(self._entries)
+            metrics['predicates'] = len(self._predicates)
+            metrics['bytes'] = self._bytes
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hit_rate'] = metrics['hits'] / lookups if lookups else 0.0
+        metrics['max_bytes'] = self.max_bytes
+        return metrics
+
+    def _advance_log(self, position: int):
+        """Enregistre la position lue dans le journal"""
+        with self._lock:
+            if self._log_position is None or position > self._log_position:
+                self._log_position = position
+
+    def _remove_predicates(self, predicates: Iterable[str], keys: Iterable[tuple] = ()) -> int:
+        """Supprime les entrées des prédicats et les clés données"""
+        removed = 0
+        with self._lock:
+            for predicate in predicates:
+                group = self._predicates.get(predicate)
+                if group is None:
+                    continue
+                for key in list(group[1]):
+                    self._remove(key)
+                    removed += 1
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+                    removed += 1
+            self._metrics['invalidations'] += 1
+            self._metrics['invalidated_entries'] += removed
+        return removed
+
+    def _remove(self, key: tuple):
+        """Retire une entrée (verrou détenu)"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[4]
+        group = self._predicates.get(entry[0])
+        if group is not None:
+            group[1].discard(key)
+            if not group[1]:
+                del self._predicates[entry[0]]
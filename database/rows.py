@@ -0,0 +1,199 @@
+"""
+Formats de résultat des lectures (dict, enregistrement léger, tuples, tableau NumPy)
+Choisis par appel, appliqués via row_factory du curseur SQLite
+"""
+import sqlite3
+from collections import namedtuple
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+RESULT_FORMATS = ('dict', 'record', 'tuple', 'numpy')
+
+
+class RecordMixin:
+    """
+    Accès par clé sur un enregistrement nommé (prop['price'], prop.get('city'))
+
+    Les enregistrements sont des tuples nommés : aucune allocation de
+    dictionnaire par ligne, attributs en lecture seule.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            # Champs seulement : count / index sont aussi des méthodes du tuple
+            if key not in self._fields:
+                raise KeyError(key)
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self._fields else default
+
+    def keys(self) -> Tuple[str, ...]:
+        return self._fields
+
+    def __contains__(self, key) -> bool:
+        return key in self._fields
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(zip(self._fields, self))
+
+    @classmethod
+    def from_row(cls, cursor: sqlite3.Cursor, row: tuple):
+        """row_factory : construit l'enregistrement sans recopier les valeurs"""
+        return tuple.__new__(cls, row)
+
+
+@lru_cache(maxsize=64)
+def record_class(columns: Tuple[str, ...]) -> type:
+    """Type d'enregistrement partagé par toutes les lignes d'un même jeu de colonnes"""
+    base = namedtuple('Record', columns)
+    return type('Record', (RecordMixin, base), {'__slots__': ()})
+
+
+class RowSet:
+    """
+    Lignes brutes (tuples SQLite) et leur schéma commun
+
+    Itérable et indexable comme une liste de tuples ; index_of() et
+    column() donnent l'accès par nom de colonne.
+    """
+    __slots__ = ('columns', 'rows', '_index')
+
+    def __init__(self, columns: Sequence[str], rows: List[tuple]):
+        self.columns = tuple(columns)
+        self.rows = rows
+        self._index = {name: position for position, name in enumerate(self.columns)}
+
+    def index_of(self, column: str) -> int:
+        return self._index[column]
+
+    def column(self, name: str) -> List[Any]:
+        position = self._index[name]
+        return [row[position] for row in self.rows]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self.rows)
+
+    def __getitem__(self, position):
+        return self.rows[position]
+
+    def __bool__(self) -> bool:
+        return bool(self.rows)
+
+
+def check_result_format(result_format: str) -> str:
+    """Vérifie le nom du format demandé"""
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Format de résultat inconnu: {result_format} (attendu: {', '.join(RESULT_FORMATS)})")
+    return result_format
+
+
+def cursor_columns(cursor: sqlite3.Cursor) -> Tuple[str, ...]:
+    """Noms des colonnes de la dernière requête exécutée"""
+    return tuple(description[0] for description in cursor.description or ())
+
+
+def apply_row_factory(cursor: sqlite3.Cursor, result_format: str) -> sqlite3.Cursor:
+    """
+    Positionne la row_factory du curseur après execute()
+
+    'dict' et 'record' matérialisent chaque ligne au fetch ; 'tuple' et
+    'numpy' gardent les tuples bruts, convertis en bloc par finalize_rows.
+    """
+    check_result_format(result_format)
+    if result_format == 'dict':
+        columns = list(cursor_columns(cursor))
+        cursor.row_factory = lambda _, row: dict(zip(columns, row))
+    elif result_format == 'record':
+        cursor.row_factory = record_class(cursor_columns(cursor)).from_row
+    else:
+        cursor.row_factory = None
+    return cursor
+
+
+def materialize_rows(columns: Sequence[str], rows: List[tuple], result_format: str):
+    """
+    Met au format demandé des tuples déjà lus
+
+    Pour les pilotes sans row_factory (psycopg2) : une seule conversion par
+    ligne, sans passer par un curseur de dictionnaires.
+    """
+    check_result_format(result_format)
+    if result_format == 'dict':
+        columns = list(columns)
+        return [dict(zip(columns, row)) for row in rows]
+    if result_format == 'record':
+        make = record_class(tuple(columns)).from_row
+        return [make(None, row) for row in rows]
+    return finalize_rows(columns, rows, result_format)
+
+
+def finalize_rows(columns: Sequence[str], rows: List[Any], result_format: str):
+    """Conteneur final des lignes lues avec apply_row_factory"""
+    if result_format == 'tuple':
+        return RowSet(columns, rows)
+    if result_format == 'numpy':
+        return to_structured_array(columns, rows)
+    return rows
+
+
+def finalize_row(columns: Sequence[str], row: Any, result_format: str):
+    """Ligne unique lue avec apply_row_factory (fetchone), None si absente"""
+    if row is None or result_format != 'numpy':
+        return row
+    return to_structured_array(columns, [row])[0]
+
+
+def row_as_mapping(columns: Sequence[str], row: Any, result_format: str) -> Any:
+    """Accès par nom à une ligne, quel que soit son format"""
+    if result_format in ('tuple', 'numpy'):
+        return dict(zip(columns, row))
+    return row
+
+
+def to_structured_array(columns: Sequence[str], rows: List[tuple]):
+    """
+    Convertit des tuples en tableau NumPy structuré, colonne par colonne
+
+    Types déduits des valeurs : entiers -> int64 (float64 avec NaN s'il y a
+    des NULL), réels -> float64, le reste (texte, dates) -> objet.
+
+    Raises:
+        ImportError: NumPy absent
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("Le format 'numpy' nécessite le paquet numpy")
+
+    values_by_column = list(zip(*rows)) if rows else [() for _ in columns]
+    dtypes = []
+    converted = []
+
+    for name, values in zip(columns, values_by_column):
+        present = [value for value in values if value is not None]
+        if present and all(isinstance(value, int) for value in present):
+            if len(present) == len(values):
+                dtype = np.int64
+                column = values
+            else:
+                dtype = np.float64
+                column = [np.nan if value is None else value for value in values]
+        elif present and all(isinstance(value, (int, float)) for value in present):
+            dtype = np.float64
+            column = [np.nan if value is None else value for value in values]
+        else:
+            dtype = object
+            column = values
+        dtypes.append((name, dtype))
+        converted.append(column)
+
+    array = np.empty(len(rows), dtype=dtypes)
+    for (name, _), column in zip(dtypes, converted):
+        array[name] = column
+    return array
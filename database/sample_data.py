@@ -0,0 +1,126 @@
+"""
+Données d'exemple des gestionnaires de base (SQLite et PostgreSQL)
+Agents, annonces et utilisateurs chargés par add_comprehensive_sample_data
+"""
+import json
+from typing import Any, Dict, List, Tuple
+
+# Agents : (prénom, nom, agence, email, téléphone, spécialisation, années d'expérience)
+SAMPLE_AGENTS: List[Tuple] = [
+    ("Marie", "Dubois", "Century 21 Nice", "marie.dubois@c21.fr", "0493123456", "luxe", 8),
+    ("Pierre", "Martin", "Orpi Antibes", "pierre.martin@orpi.fr", "0493789123", "vente", 12),
+    ("Sophie", "Leroy", "Laforêt Cannes", "sophie.leroy@laforet.fr", "0493456789", "location", 6),
+    ("Jean", "Moreau", "Indépendant Nice", "jean.moreau@immobilier.fr", "0493987654", "investissement", 15),
+    ("Isabelle", "Garcia", "Prestige Monaco", "isabelle.garcia@prestige.mc", "0493654321", "luxe", 10)
+]
+
+_SAMPLE_PROPERTIES: List[Dict[str, Any]] = [
+    {
+        'title': 'Penthouse Exceptionnel - Croisette Cannes',
+        'description': 'Magnifique penthouse 200m² avec terrasse 150m², vue mer panoramique, prestations luxe',
+        'property_type': 'Penthouse', 'property_subtype': 'T5',
+        'surface_total': 200, 'surface_habitable': 180, 'bedrooms': 4, 'bathrooms': 3,
+        'construction_year': 2019, 'energy_class': 'A', 'heating_type': 'pompe_à_chaleur',
+        'elevator': 1, 'terrace': 1, 'swimming_pool': 1, 'garage_count': 2,
+        'price': 4500000, 'price_per_sqm': 22500,
+        'city': 'Cannes', 'postal_code': '06400', 'latitude': 43.5513, 'longitude': 7.0275,
+        'luxury_level': 5, 'view_quality': 'mer', 'quietness_level': 4, 'brightness_level': 5
+    },
+    {
+        'title': 'Villa Contemporaine - Hauteurs de Nice',
+        'description': 'Superbe villa 250m² avec piscine, jardin 1500m², vue panoramique, prestations haut de gamme',
+        'property_type': 'Villa', 'property_subtype': 'T6',
+        'surface_total': 250, 'surface_habitable': 220, 'surface_terrain': 1500,
+        'bedrooms': 5, 'bathrooms': 4, 'construction_year': 2010,
+        'energy_class': 'B', 'heating_type': 'gaz',
+        'garden': 1, 'swimming_pool': 1, 'garage_count': 2,
+        'price': 1800000, 'price_per_sqm': 7200,
+        'city': 'Nice', 'postal_code': '06000', 'latitude': 43.7221, 'longitude': 7.2497,
+        'luxury_level': 4, 'view_quality': 'montagne', 'quietness_level': 5, 'brightness_level': 4
+    },
+    {
+        'title': 'Appartement Familial - Centre Antibes',
+        'description': 'Bel appartement T4 rénové, proche plages et commerces, copropriété sécurisée',
+        'property_type': 'Appartement', 'property_subtype': 'T4',
+        'surface_total': 95, 'surface_habitable': 90, 'bedrooms': 3, 'bathrooms': 2,
+        'construction_year': 1980, 'energy_class': 'D', 'heating_type': 'électrique',
+        'elevator': 1, 'balcony': 1, 'parking_spaces': 1,
+        'price': 650000, 'price_per_sqm': 6842, 'monthly_charges': 180,
+        'city': 'Antibes', 'postal_code': '06600', 'latitude': 43.5808, 'longitude': 7.1239,
+        'luxury_level': 3, 'view_quality': 'ville', 'quietness_level': 3, 'brightness_level': 4
+    },
+    {
+        'title': 'Studio Investissement - Gare de Monaco',
+        'description': 'Studio 28m² rénové, idéal investissement locatif, proche transports',
+        'property_type': 'Studio', 'property_subtype': 'T1',
+        'surface_total': 28, 'surface_habitable': 26, 'bedrooms': 1, 'bathrooms': 1,
+        'construction_year': 2000, 'energy_class': 'C', 'heating_type': 'électrique',
+        'elevator': 1, 'price': 420000, 'price_per_sqm': 15000,
+        'city': 'Monaco', 'postal_code': '98000', 'latitude': 43.739, 'longitude': 7.4197,
+        'luxury_level': 2, 'view_quality': 'cour', 'quietness_level': 2, 'brightness_level': 3
+    },
+    {
+        'title': 'Maison de Charme - Vieux Grasse',
+        'description': 'Authentique maison provençale, terrasses, vue panoramique, cachet exceptionnel',
+        'property_type': 'Maison', 'property_subtype': 'T5',
+        'surface_total': 140, 'surface_habitable': 130, 'surface_terrain': 400,
+        'bedrooms': 4, 'bathrooms': 2, 'construction_year': 1920,
+        'energy_class': 'E', 'heating_type': 'bois',
+        'garden': 1, 'terrace': 1, 'fireplace': 1,
+        'price': 580000, 'price_per_sqm': 4143,
+        'city': 'Grasse', 'postal_code': '06130', 'latitude': 43.6584, 'longitude': 6.9225,
+        'luxury_level': 3, 'view_quality': 'montagne', 'quietness_level': 5, 'brightness_level': 4
+    },
+    {
+        'title': 'Loft Atypique - Port de Saint-Laurent',
+        'description': 'Magnifique loft 120m², volumes exceptionnels, proche marina, moderne',
+        'property_type': 'Loft', 'property_subtype': 'T3',
+        'surface_total': 120, 'surface_habitable': 115, 'bedrooms': 2, 'bathrooms': 2,
+        'construction_year': 2005, 'energy_class': 'C', 'heating_type': 'pompe_à_chaleur',
+        'elevator': 1, 'terrace': 1, 'parking_spaces': 1,
+        'price': 750000, 'price_per_sqm': 6250,
+        'city': 'Saint-Laurent-du-Var', 'postal_code': '06700', 'latitude': 43.6672, 'longitude': 7.1904,
+        'luxury_level': 4, 'view_quality': 'mer', 'quietness_level': 3, 'brightness_level': 5
+    }
+]
+
+SAMPLE_USERS: List[Dict[str, Any]] = [
+    {
+        'email': 'jean.famille@email.fr', 'password_hash': 'hash123',
+        'first_name': 'Jean', 'last_name': 'Dupont', 'phone': '0612345678',
+        'age': 38, 'user_type': 'acquéreur',
+        'budget_min': 800000, 'budget_max': 1200000,
+        'property_types': json.dumps(['Villa', 'Maison']),
+        'surface_min': 150, 'bedrooms_min': 4,
+        'preferred_locations': json.dumps(['Nice', 'Antibes']),
+        'marital_status': 'marié', 'children_count': 2,
+        'lifestyle': 'périurbain', 'work_arrangement': 'mixte'
+    },
+    {
+        'email': 'sophie.jeune@email.fr', 'password_hash': 'hash456',
+        'first_name': 'Sophie', 'last_name': 'Martin', 'phone': '0623456789',
+        'age': 26, 'user_type': 'locataire',
+        'budget_min': 800, 'budget_max': 1500,
+        'property_types': json.dumps(['Appartement', 'Studio']),
+        'surface_min': 35, 'bedrooms_min': 1,
+        'preferred_locations': json.dumps(['Cannes', 'Antibes']),
+        'marital_status': 'célibataire', 'children_count': 0,
+        'lifestyle': 'urbain', 'work_arrangement': 'bureau'
+    },
+    {
+        'email': 'pierre.investisseur@email.fr', 'password_hash': 'hash789',
+        'first_name': 'Pierre', 'last_name': 'Investisseur', 'phone': '0634567890',
+        'age': 52, 'user_type': 'investisseur',
+        'budget_min': 300000, 'budget_max': 800000,
+        'property_types': json.dumps(['Appartement', 'Studio']),
+        'surface_min': 25, 'bedrooms_min': 1,
+        'preferred_locations': json.dumps(['Monaco', 'Nice', 'Cannes']),
+        'marital_status': 'marié', 'children_count': 3,
+        'lifestyle': 'urbain', 'work_arrangement': 'mixte'
+    }
+]
+
+
+def sample_properties() -> List[Dict[str, Any]]:
+    """Annonces d'exemple (copies), avec leur référence externe demo-<n>"""
+    return [dict(prop, external_ref=f"demo-{index}") for index, prop in enumerate(_SAMPLE_PROPERTIES, 1)]
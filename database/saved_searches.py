@@ -0,0 +1,18 @@
+"""
+Recherches sauvegardées des utilisateurs (saved_searches)
+Filtres conservés en JSON ; les recherches avec alert_enabled alimentent
+les alertes de nouvelles annonces (search.alerts)
+"""
+import json
+from typing import Any, Dict, Sequence
+
+
+def saved_search(columns: Sequence[str], row: tuple) -> Dict[str, Any]:
+    """Ligne de saved_searches en dict, filtres JSON décodés"""
+    search = dict(zip(columns, row))
+    try:
+        search['filters'] = json.loads(search['filters'] or '{}')
+    except ValueError:
+        search['filters'] = {}
+    search['alert_enabled'] = bool(search['alert_enabled'])
+    return search
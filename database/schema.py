@@ -0,0 +1,200 @@
+"""
+Éléments de schéma versionnés pour ImoMatch (index, tables annexes)
+"""
+import logging
+import sqlite3
+from typing import Any, Dict, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Index des prédicats de recherche de search_properties_advanced.
+# Incrémenter la version à chaque modification de la liste et déplacer
+# les index retirés dans RETIRED_SEARCH_INDEXES.
+SEARCH_INDEXES_VERSION = 2
+
+RETIRED_SEARCH_INDEXES: List[str] = [
+    # v2 : remplacés par des index (listing_status, colonne de tri) pour la pagination keyset
+    "idx_properties_active_price",
+    "idx_properties_active_surface",
+]
+
+SEARCH_INDEXES: List[Tuple[str, str]] = [
+    # Filtre type + fourchette de prix
+    ("idx_properties_status_type_price",
+     "CREATE INDEX IF NOT EXISTS idx_properties_status_type_price "
+     "ON properties (listing_status, property_type, price)"),
+    # Couvre le tri ORDER BY created_at DESC (et son départage par id)
+    ("idx_properties_status_created",
+     "CREATE INDEX IF NOT EXISTS idx_properties_status_created "
+     "ON properties (listing_status, created_at, id)"),
+    # Parcours ordonnés des autres modes de tri (l'id est implicite en fin d'index)
+    ("idx_properties_status_price",
+     "CREATE INDEX IF NOT EXISTS idx_properties_status_price "
+     "ON properties (listing_status, price)"),
+    ("idx_properties_status_surface",
+     "CREATE INDEX IF NOT EXISTS idx_properties_status_surface "
+     "ON properties (listing_status, surface_total)"),
+    ("idx_properties_status_price_sqm",
+     "CREATE INDEX IF NOT EXISTS idx_properties_status_price_sqm "
+     "ON properties (listing_status, price_per_sqm)"),
+    # Index partiels limités aux annonces actives
+    ("idx_properties_active_bedrooms",
+     "CREATE INDEX IF NOT EXISTS idx_properties_active_bedrooms "
+     "ON properties (bedrooms, price) WHERE listing_status = 'active'"),
+    ("idx_properties_active_luxury",
+     "CREATE INDEX IF NOT EXISTS idx_properties_active_luxury "
+     "ON properties (luxury_level) WHERE listing_status = 'active'"),
+    ("idx_properties_active_pool",
+     "CREATE INDEX IF NOT EXISTS idx_properties_active_pool "
+     "ON properties (created_at) WHERE listing_status = 'active' AND swimming_pool = 1"),
+    ("idx_properties_active_garden",
+     "CREATE INDEX IF NOT EXISTS idx_properties_active_garden "
+     "ON properties (created_at) WHERE listing_status = 'active' AND garden = 1"),
+    ("idx_properties_active_garage",
+     "CREATE INDEX IF NOT EXISTS idx_properties_active_garage "
+     "ON properties (created_at) WHERE listing_status = 'active' AND garage_count > 0"),
+]
+
+# Valeurs d'exemple des filtres supportés, pour la vérification des plans
+SEARCH_PLAN_SAMPLE_FILTERS = {
+    'price_max': 1000000,
+    'price_min': 200000,
+    'property_type': 'Appartement',
+    'city': 'Nice',
+    'bedrooms_min': 2,
+    'surface_min': 60,
+    'luxury_level': 3,
+    'has_garden': True,
+    'has_pool': True,
+    'has_garage': True
+}
+
+# Filtres qui pilotent la requête par un index annexe (plein texte, R-tree).
+# Vérifiés entre eux, puis avec chaque filtre simple et avec tous à la fois.
+SEARCH_PLAN_SAMPLE_DRIVERS = {
+    'text': {'text': 'vue mer terrasse'},
+    'radius': {'center_lat': 43.5804, 'center_lng': 7.1225, 'radius_km': 5},
+    'bounds': {'bounds': [[43.55, 7.05], [43.62, 7.15]]}
+}
+
+
+
+def search_plan_combinations() -> Iterator[Dict[str, Any]]:
+    """
+    Combinaisons de filtres vérifiées par check_search_query_plans
+
+    Toutes les combinaisons de filtres simples ; avec un index annexe
+    (texte, rayon, emprise), chaque filtre seul puis tous.
+    """
+    keys = list(SEARCH_PLAN_SAMPLE_FILTERS)
+    drivers = list(SEARCH_PLAN_SAMPLE_DRIVERS)
+    scalar_masks = list(range(1 << len(keys)))
+    driver_scalar_masks = [0, (1 << len(keys)) - 1] + [1 << bit for bit in range(len(keys))]
+
+    for driver_mask in range(1 << len(drivers)):
+        for mask in (driver_scalar_masks if driver_mask else scalar_masks):
+            filters = {
+                key: SEARCH_PLAN_SAMPLE_FILTERS[key]
+                for bit, key in enumerate(keys) if mask & (1 << bit)
+            }
+            for bit, driver in enumerate(drivers):
+                if driver_mask & (1 << bit):
+                    filters.update(SEARCH_PLAN_SAMPLE_DRIVERS[driver])
+            yield filters
+
+def create_schema_versions_table(cursor: sqlite3.Cursor):
+    """Crée la table de suivi des versions de schéma"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_versions (
+            component TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def get_component_version(cursor: sqlite3.Cursor, component: str) -> int:
+    """Retourne la version appliquée d'un composant (0 si absent)"""
+    cursor.execute("SELECT version FROM schema_versions WHERE component = ?", (component,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def set_component_version(cursor: sqlite3.Cursor, component: str, version: int):
+    """Enregistre la version appliquée d'un composant"""
+    cursor.execute('''
+        INSERT INTO schema_versions (component, version, applied_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(component) DO UPDATE SET
+            version = excluded.version,
+            applied_at = excluded.applied_at
+    ''', (component, version))
+
+
+def ensure_search_indexes(cursor: sqlite3.Cursor) -> bool:
+    """
+    Met le jeu d'index de recherche à la version courante
+
+    Returns:
+        bool: True si le jeu d'index a été (re)construit
+    """
+    create_schema_versions_table(cursor)
+
+    current = get_component_version(cursor, 'search_indexes')
+    expected = {name for name, _ in SEARCH_INDEXES}
+
+    # Index manquants (base restaurée, suppression manuelle...)
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'properties'")
+    existing = {row[0] for row in cursor.fetchall()}
+
+    if current == SEARCH_INDEXES_VERSION and expected <= existing:
+        return False
+
+    # Supprimer les index retirés par une version précédente
+    for name in RETIRED_SEARCH_INDEXES:
+        if name in existing:
+            cursor.execute(f"DROP INDEX IF EXISTS {name}")
+            logger.info(f"Index obsolète supprimé: {name}")
+
+    for _, statement in SEARCH_INDEXES:
+        cursor.execute(statement)
+
+    set_component_version(cursor, 'search_indexes', SEARCH_INDEXES_VERSION)
+    cursor.execute("PRAGMA optimize")
+
+    logger.info(f"Index de recherche en version {SEARCH_INDEXES_VERSION}")
+    return True
+
+
+def find_full_scans(plan_rows: List[tuple], table: str = 'properties', limited: bool = False) -> List[str]:
+    """
+    Extrait d'un EXPLAIN QUERY PLAN les parcours complets d'une table
+
+    Un parcours sans index est toujours signalé, un parcours complet d'index
+    (SCAN ... USING [COVERING] INDEX) aussi. Seule exception : le premier
+    parcours d'index quand il fournit l'ordre du ORDER BY (pas de USE TEMP
+    B-TREE FOR ORDER BY) et qu'un LIMIT borne la requête, la lecture
+    s'arrêtant à la limite.
+
+    Args:
+        plan_rows: Lignes (id, parent, notused, detail) de l'EXPLAIN
+        table: Table surveillée
+        limited: La requête se termine par un LIMIT
+
+    Returns:
+        List[str]: Détails des étapes qui parcourent toute la table ou tout un index
+    """
+    ordered = limited and not any(row[-1] == 'USE TEMP B-TREE FOR ORDER BY' for row in plan_rows)
+    scans = []
+    for row in plan_rows:
+        detail = row[-1]
+        words = detail.split()
+        if len(words) < 2 or words[0] != 'SCAN' or words[1] != table:
+            continue
+        if ordered and 'INDEX' in detail:
+            # Index du ORDER BY, lu jusqu'à la limite ; une boucle imbriquée
+            # plus loin est lue en entier à chaque ligne
+            ordered = False
+            continue
+        scans.append(detail)
+    return scans
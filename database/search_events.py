@@ -0,0 +1,111 @@
+"""
+Historique des recherches des utilisateurs
+Chaque recherche est journalisée (search_events, bornée par utilisateur) et
+incrémente des compteurs agrégés par utilisateur (villes, types, tranches de
+prix) : les préférences déduites se lisent sans parcourir l'historique
+"""
+import bisect
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_SEARCH_HISTORY_CONFIG = {
+    'max_events_per_user': 200,   # Recherches conservées par utilisateur (les compteurs couvrent tout)
+    'max_pattern_values': 20,     # Valeurs les plus fréquentes retournées par type de compteur
+    'recent_queries': 5,          # Dernières requêtes retournées avec les préférences
+    'cache_users': 1000,          # Préférences gardées en mémoire (search.history)
+}
+
+LOCATION, PROPERTY_TYPE, PRICE_RANGE = 'location', 'property_type', 'price_range'
+
+# Clé du compteur -> clé des préférences retournées
+PATTERN_KEYS = {
+    LOCATION: 'preferred_locations',
+    PROPERTY_TYPE: 'preferred_types',
+    PRICE_RANGE: 'price_ranges',
+}
+
+# Bornes supérieures des tranches de budget maximum (euros)
+PRICE_RANGE_BOUNDS = [200000, 300000, 500000, 750000, 1000000, 1500000, 2000000, 3000000, 5000000]
+
+
+def price_range(price_max: float) -> str:
+    """Tranche d'un budget maximum, ex. '300000-500000' ou '5000000+'"""
+    index = bisect.bisect_left(PRICE_RANGE_BOUNDS, price_max)
+    if index == len(PRICE_RANGE_BOUNDS):
+        return f"{PRICE_RANGE_BOUNDS[-1]}+"
+    lower = PRICE_RANGE_BOUNDS[index - 1] if index else 0
+    return f"{lower}-{PRICE_RANGE_BOUNDS[index]}"
+
+
+def search_counters(filters: Optional[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """Compteurs (type, valeur) incrémentés par une recherche"""
+    filters = filters or {}
+    counters = []
+    if filters.get('location'):
+        counters.append((LOCATION, str(filters['location'])))
+    if filters.get('property_type'):
+        counters.append((PROPERTY_TYPE, str(filters['property_type'])))
+    price_max = _price_max(filters)
+    if price_max is not None:
+        counters.append((PRICE_RANGE, price_range(price_max)))
+    return counters
+
+
+def _price_max(filters: Dict[str, Any]) -> Optional[float]:
+    """Budget maximum d'une recherche (None si absent ou invalide)"""
+    try:
+        value = float(filters.get('price_max') or 0)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def search_stats_increment(filters: Optional[Dict[str, Any]]) -> Tuple[float, int]:
+    """(somme, nombre) de budgets maximum à ajouter aux statistiques de l'utilisateur"""
+    price_max = _price_max(filters or {})
+    return (price_max, 1) if price_max is not None else (0.0, 0)
+
+
+def empty_patterns() -> Dict[str, Any]:
+    """Préférences d'un utilisateur sans recherche"""
+    patterns = {key: {} for key in PATTERN_KEYS.values()}
+    patterns.update(search_frequency=0, average_price_max=None, price_max_count=0, recent_queries=[])
+    return patterns
+
+
+def build_patterns(counter_rows: Sequence[tuple], stats_row: Optional[tuple],
+                   recent_queries: Sequence[str]) -> Dict[str, Any]:
+    """
+    Préférences d'un utilisateur à partir des tables agrégées
+
+    Args:
+        counter_rows: (kind, value, count) triées par nombre décroissant
+        stats_row: (search_count, price_max_sum, price_max_count) ou None
+        recent_queries: Dernières requêtes, de la plus ancienne à la plus récente
+
+    Returns:
+        Dict[str, Any]: preferred_locations, preferred_types, price_ranges
+        (valeur -> nombre de recherches), search_frequency,
+        average_price_max et price_max_count (recherches avec budget),
+        recent_queries
+    """
+    patterns = empty_patterns()
+    for kind, value, count in counter_rows:
+        if kind in PATTERN_KEYS:
+            patterns[PATTERN_KEYS[kind]][value] = count
+
+    if stats_row:
+        search_count, price_max_sum, price_max_count = stats_row
+        patterns['search_frequency'] = search_count
+        if price_max_count:
+            patterns['average_price_max'] = price_max_sum / price_max_count
+            patterns['price_max_count'] = price_max_count
+    patterns['recent_queries'] = list(recent_queries)
+    return patterns
+
+
+def search_event(columns: Sequence[str], row: tuple) -> Dict[str, Any]:
+    """Ligne de search_events en dict, filtres décodés"""
+    event = dict(zip(columns, row))
+    event['filters'] = json.loads(event['filters']) if event.get('filters') else {}
+    return event
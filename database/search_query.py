@@ -0,0 +1,209 @@
+"""
+Construction des requêtes de recherche par forme (filtres présents, tri, segment)
+Le SQL est compilé une fois par forme ; seuls les paramètres sont recalculés,
+et le texte identique d'un appel à l'autre réutilise les requêtes préparées
+du cache de la connexion
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from database.fulltext import BM25_WEIGHTS, build_match_expression
+from database.pagination import order_clause
+from database.spatial import RTREE_BOX_CONDITION, RTREE_SOURCE, spatial_filter
+
+# Paramètre d'un filtre simple : la valeur, la valeur encadrée de % (LIKE), ou aucun
+VALUE, CONTAINS, FLAG = 'value', 'contains', 'flag'
+
+# Filtres simples : (clé, condition SQL, paramètre). L'ordre est celui des
+# conditions dans la requête.
+SCALAR_FILTERS: List[Tuple[str, str, str]] = [
+    ('price_max', "price <= ?", VALUE),
+    ('price_min', "price >= ?", VALUE),
+    ('property_type', "property_type = ?", VALUE),
+    ('city', "city LIKE ?", CONTAINS),
+    ('bedrooms_min', "bedrooms >= ?", VALUE),
+    ('surface_min', "surface_total >= ?", VALUE),
+    ('luxury_level', "luxury_level >= ?", VALUE),
+    ('has_garden', "garden = 1", FLAG),
+    ('has_pool', "swimming_pool = 1", FLAG),
+    ('has_garage', "garage_count > 0", FLAG),
+]
+
+DEFAULT_MAX_SHAPES = 512
+
+
+class SQLiteSearchDialect:
+    """Fragments SQL de la recherche pour SQLite (FTS5, R-tree)"""
+
+    placeholder = '?'
+    explicit_nulls = False
+    # Conditions remplaçant celles de SCALAR_FILTERS pour ce moteur
+    condition_overrides: Dict[str, str] = {}
+
+    def text_argument(self, text: Optional[str]) -> Optional[str]:
+        return build_match_expression(text)
+
+    def text_query(self) -> Tuple[str, int]:
+        """Début de requête plein texte et nombre de paramètres de l'argument"""
+        weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+        return (
+            "WITH fts_matches AS ("
+            f" SELECT rowid AS fts_id, bm25(properties_fts, {weights}) AS fts_rank"
+            " FROM properties_fts WHERE properties_fts MATCH ?"
+            ") SELECT properties.*, fts_matches.fts_rank"
+            " FROM {source} JOIN fts_matches ON fts_matches.fts_id = properties.id"
+            " WHERE listing_status = 'active'"
+        ), 1
+
+    def plain_query(self) -> str:
+        return "SELECT properties.* FROM {source} WHERE listing_status = 'active'"
+
+    def source(self, has_box: bool) -> str:
+        # Rayon / emprise de carte : l'index R-tree pilote la requête
+        return RTREE_SOURCE if has_box else "properties"
+
+    def box_condition(self) -> str:
+        return RTREE_BOX_CONDITION
+
+    def box_params(self, box: Tuple[float, float, float, float]) -> List[float]:
+        return list(box)
+
+
+class SearchQueryBuilder:
+    """
+    Requêtes de recherche compilées par forme
+
+    La forme d'une recherche est la liste canonique de ses filtres actifs
+    (dans l'ordre de SCALAR_FILTERS), la présence d'un texte ou d'un
+    rectangle, le tri, le segment de pagination et la présence d'un LIMIT.
+    Le SQL d'une forme est compilé une fois et conservé (LRU) : deux
+    recherches "ville + prix max + chambres" produisent le même texte, que
+    le cache de requêtes préparées de la connexion reconnaît.
+    """
+
+    def __init__(self, dialect=None, max_shapes: int = DEFAULT_MAX_SHAPES):
+        self.dialect = dialect or SQLiteSearchDialect()
+        self._text_param_count = self.dialect.text_query()[1]
+        self.max_shapes = max(1, max_shapes)
+        self._shapes = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def build(self, filters: Optional[Dict[str, Any]] = None, sort_by: str = 'date_desc',
+              keyset: Optional[Tuple[str, List[Any]]] = None,
+              limit: Optional[int] = 50) -> Tuple[str, List[Any]]:
+        """
+        Requête et paramètres d'une recherche
+
+        Args:
+            filters: Critères de recherche
+            sort_by: Mode de tri (voir database.pagination.SORT_KEYS)
+            keyset: (condition, paramètres) d'un segment de pagination
+            limit: Nombre de lignes, None pour un parcours complet
+
+        Returns:
+            Tuple[str, List[Any]]: (requête, paramètres)
+        """
+        filters = filters or {}
+        params = []
+
+        text_argument = self.dialect.text_argument(filters.get('text'))
+        if text_argument:
+            params.extend([text_argument] * self._text_param_count)
+
+        box, spatial_conditions = spatial_filter(filters)
+        if box:
+            params.extend(self.dialect.box_params(box))
+
+        active = []
+        for key, _, kind in SCALAR_FILTERS:
+            value = filters.get(key)
+            if value:
+                active.append(key)
+                if kind is VALUE:
+                    params.append(value)
+                elif kind is CONTAINS:
+                    params.append(f"%{value}%")
+
+        # Contrôle exact de la distance ou de l'emprise
+        for _, condition_params in spatial_conditions:
+            params.extend(condition_params)
+
+        keyset_condition = keyset[0] if keyset and keyset[0] else ''
+        if keyset_condition:
+            params.extend(keyset[1])
+
+        if limit is not None:
+            params.append(limit)
+
+        shape = (
+            bool(text_argument), bool(box), tuple(active),
+            tuple(condition for condition, _ in spatial_conditions),
+            sort_by, keyset_condition, limit is not None
+        )
+        return self._query_for(shape), params
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Formes réutilisées (hits), compilées (misses) et évincées"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['shapes'] = len(self._shapes)
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hit_rate'] = metrics['hits'] / lookups if lookups else 0.0
+        return metrics
+
+    def clear(self):
+        """Oublie les formes compilées (les compteurs sont conservés)"""
+        with self._lock:
+            self._shapes.clear()
+
+    # === MÉTHODES PRIVÉES ===
+
+    def _query_for(self, shape: tuple) -> str:
+        with self._lock:
+            query = self._shapes.get(shape)
+            if query is not None:
+                self._shapes.move_to_end(shape)
+                self._metrics['hits'] += 1
+                return query
+            self._metrics['misses'] += 1
+
+        query = self._compile(shape)
+
+        with self._lock:
+            self._shapes[shape] = query
+            while len(self._shapes) > self.max_shapes:
+                self._shapes.popitem(last=False)
+                self._metrics['evictions'] += 1
+        return query
+
+    def _compile(self, shape: tuple) -> str:
+        """SQL d'une forme (conditions dans l'ordre des paramètres de build)"""
+        has_text, has_box, active, spatial_conditions, sort_by, keyset_condition, has_limit = shape
+        dialect = self.dialect
+        conditions = {key: condition for key, condition, _ in SCALAR_FILTERS}
+        conditions.update(dialect.condition_overrides)
+
+        template = dialect.text_query()[0] if has_text else dialect.plain_query()
+        query = template.replace('{source}', dialect.source(has_box))
+
+        if has_box:
+            query += f" AND {dialect.box_condition()}"
+
+        for key in active:
+            query += f" AND {conditions[key]}"
+
+        for condition in spatial_conditions:
+            query += f" AND {condition}"
+
+        if keyset_condition:
+            query += f" AND {keyset_condition}"
+
+        query += order_clause(sort_by, explicit_nulls=dialect.explicit_nulls)
+        if has_limit:
+            query += " LIMIT ?"
+
+        if dialect.placeholder != '?':
+            query = query.replace('?', dialect.placeholder)
+        return query
@@ -0,0 +1,350 @@
+"""
+Copie en colonnes (NumPy) des annonces actives, pour le scoring
+Villes et types de bien encodés par dictionnaire, équipements en bits,
+mise à jour incrémentale depuis le compteur de modifications
+"""
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dépendance de pandas
+    np = None
+
+from database.rows import RowSet
+
+# Colonnes numériques copiées (float64, NaN pour NULL)
+NUMERIC_COLUMNS = [
+    ('price', 'price'),
+    ('surface', 'surface_total'),
+    ('bedrooms', 'bedrooms'),
+    ('bathrooms', 'bathrooms'),
+    ('luxury_level', 'luxury_level'),
+    ('price_per_sqm', 'price_per_sqm'),
+    ('latitude', 'latitude'),
+    ('longitude', 'longitude'),
+]
+
+# Colonnes texte encodées par dictionnaire (codes int32, -1 pour NULL)
+ENCODED_COLUMNS = [
+    ('city', 'city'),
+    ('property_type', 'property_type'),
+]
+
+# Équipements : bit -> (colonne, présent si valeur > 0)
+FEATURE_BITS = {
+    'elevator': 1 << 0,
+    'balcony': 1 << 1,
+    'terrace': 1 << 2,
+    'garden': 1 << 3,
+    'swimming_pool': 1 << 4,
+    'garage': 1 << 5,
+    'parking': 1 << 6,
+}
+FEATURE_COLUMNS = {
+    'elevator': 'elevator',
+    'balcony': 'balcony',
+    'terrace': 'terrace',
+    'garden': 'garden',
+    'swimming_pool': 'swimming_pool',
+    'garage': 'garage_count',
+    'parking': 'parking_spaces',
+}
+
+# Libellés des équipements au format historique (liste 'features')
+FEATURE_LABELS = {
+    'elevator': 'Ascenseur',
+    'balcony': 'Balcon',
+    'terrace': 'Terrasse',
+    'garden': 'Jardin',
+    'swimming_pool': 'Piscine',
+    'garage': 'Garage',
+    'parking': 'Parking',
+}
+
+SNAPSHOT_COLUMNS = (
+    ['created_at']
+    + [column for _, column in NUMERIC_COLUMNS]
+    + [column for _, column in ENCODED_COLUMNS]
+    + list(FEATURE_COLUMNS.values())
+)
+
+# Au-delà de cette part de lignes modifiées, la copie est relue entièrement
+DEFAULT_FULL_RELOAD_RATIO = 0.25
+
+
+class PropertyColumns:
+    """
+    État figé de la copie : un tableau par colonne, mêmes positions partout
+
+    Une synchronisation produit un nouvel objet ; celui qu'un scorer tient
+    reste cohérent pendant tout son calcul.
+
+    Attributes:
+        ids: IDs des annonces, croissants (int64)
+        price, surface, bedrooms, bathrooms, luxury_level, price_per_sqm,
+        latitude, longitude: float64, NaN pour NULL
+        city_codes, property_type_codes: int32, index dans cities /
+            property_types, -1 pour NULL
+        features: Bits d'équipements (uint8, voir FEATURE_BITS)
+        created_at: Dates de création (datetime64[s], départage des classements)
+        version: Numéro de version du compteur à la synchronisation
+    """
+
+    def __init__(self, arrays: Dict[str, Any], cities: Tuple[str, ...], property_types: Tuple[str, ...],
+                 version: int, deletions: int):
+        self.ids = arrays['ids']
+        for name, _ in NUMERIC_COLUMNS:
+            setattr(self, name, arrays[name])
+        self.city_codes = arrays['city_codes']
+        self.property_type_codes = arrays['property_type_codes']
+        self.features = arrays['features']
+        self.created_at = arrays['created_at']
+        self.cities = cities
+        self.property_types = property_types
+        self.version = version
+        self.deletions = deletions
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def arrays(self) -> Dict[str, Any]:
+        arrays = {'ids': self.ids, 'city_codes': self.city_codes,
+                  'property_type_codes': self.property_type_codes, 'features': self.features,
+                  'created_at': self.created_at}
+        for name, _ in NUMERIC_COLUMNS:
+            arrays[name] = getattr(self, name)
+        return arrays
+
+    def positions_of(self, property_ids: Iterable[int]) -> 'np.ndarray':
+        """Positions des IDs présents dans la copie (les autres sont ignorés)"""
+        wanted = np.asarray(list(property_ids), dtype=np.int64)
+        positions = np.searchsorted(self.ids, wanted)
+        positions = np.minimum(positions, max(len(self.ids) - 1, 0))
+        if not len(self.ids):
+            return positions[:0]
+        return positions[self.ids[positions] == wanted]
+
+    def as_listing(self, position: int) -> Dict[str, Any]:
+        """
+        Annonce à une position, au format historique des scorers
+
+        location = ville, surface = surface totale, features = libellés
+        des équipements (voir database.ingest.LEGACY_FIELDS / FEATURE_COLUMNS).
+        """
+        def value(array):
+            item = array[position].item()
+            return None if item != item else item  # NaN -> None
+
+        city_code = int(self.city_codes[position])
+        type_code = int(self.property_type_codes[position])
+        bits = int(self.features[position])
+        listing = {'id': int(self.ids[position])}
+        for name, _ in NUMERIC_COLUMNS:
+            listing[name] = value(getattr(self, name))
+        listing['location'] = self.cities[city_code] if city_code >= 0 else None
+        listing['property_type'] = self.property_types[type_code] if type_code >= 0 else None
+        listing['features'] = [label for name, label in FEATURE_LABELS.items() if bits & FEATURE_BITS[name]]
+        return listing
+
+    def has_features(self, *names: str) -> 'np.ndarray':
+        """Masque des annonces disposant de tous les équipements nommés"""
+        mask = 0
+        for name in names:
+            mask |= FEATURE_BITS[name]
+        return (self.features & mask) == mask
+
+    def city_mask(self, predicate: Callable[[str], bool]) -> 'np.ndarray':
+        """Masque des annonces dont la ville satisfait predicate (évalué une fois par ville)"""
+        return self.map_cities(lambda city: bool(predicate(city)), False, bool)
+
+    def property_type_mask(self, predicate: Callable[[str], bool]) -> 'np.ndarray':
+        """Masque des annonces dont le type satisfait predicate (évalué une fois par type)"""
+        return self.map_property_types(lambda value: bool(predicate(value)), False, bool)
+
+    def has_any_feature(self, *names: str) -> 'np.ndarray':
+        """Masque des annonces disposant d'au moins un des équipements nommés"""
+        mask = 0
+        for name in names:
+            mask |= FEATURE_BITS[name]
+        return (self.features & mask) != 0
+
+    def map_cities(self, func: Callable[[str], Any], missing: Any = np.nan if np else None,
+                   dtype: Any = float) -> 'np.ndarray':
+        """func(ville) par annonce, calculé une fois par ville distincte ; missing pour NULL"""
+        return _map_codes(self.city_codes, self.cities, func, missing, dtype)
+
+    def map_property_types(self, func: Callable[[str], Any], missing: Any = np.nan if np else None,
+                           dtype: Any = float) -> 'np.ndarray':
+        """func(type) par annonce, calculé une fois par type distinct ; missing pour NULL"""
+        return _map_codes(self.property_type_codes, self.property_types, func, missing, dtype)
+
+
+def _map_codes(codes: 'np.ndarray', dictionary: Sequence[str], func: Callable[[str], Any],
+               missing: Any, dtype: Any) -> 'np.ndarray':
+    # Dernière entrée de la table : NULL (code -1)
+    lookup = np.array([func(value) for value in dictionary] + [missing], dtype=dtype)
+    return lookup[codes]
+
+
+class PropertySnapshot:
+    """
+    Copie en mémoire des annonces actives, en colonnes
+
+        columns = get_property_snapshot().get()
+        affordable = columns.price <= budget
+        nice = columns.city_mask(lambda city: 'nice' in city.lower())
+
+    get() relit le compteur de modifications et n'applique que les lignes
+    modifiées depuis la synchronisation précédente ; une suppression en
+    base ou un lot de modifications trop important déclenche une relecture
+    complète.
+    """
+
+    def __init__(self, db=None, full_reload_ratio: float = DEFAULT_FULL_RELOAD_RATIO):
+        """
+        Args:
+            db: Gestionnaire de base (par défaut l'instance globale)
+            full_reload_ratio: Part de lignes modifiées au-delà de laquelle
+                la copie est relue entièrement
+
+        Raises:
+            ImportError: NumPy absent
+        """
+        if np is None:
+            raise ImportError("PropertySnapshot nécessite le paquet numpy")
+        if db is None:
+            from database.manager import get_database
+            db = get_database()
+        self.db = db
+        self.full_reload_ratio = full_reload_ratio
+
+        self._columns: Optional[PropertyColumns] = None
+        self._lock = threading.Lock()
+        self._metrics = {'full_loads': 0, 'incremental_refreshes': 0, 'rows_applied': 0}
+
+    def get(self) -> PropertyColumns:
+        """État à jour de la copie (synchronisée si la base a changé)"""
+        with self._lock:
+            counter = self.db.get_property_change_counter()
+            current = self._columns
+
+            if current is None or counter['deletions'] != current.deletions:
+                self._columns = self._load(counter)
+            elif counter['version'] != current.version:
+                changes = self.db.fetch_property_columns(SNAPSHOT_COLUMNS, since_version=current.version)
+                if len(changes) > max(1, len(current)) * self.full_reload_ratio:
+                    self._columns = self._load(counter)
+                else:
+                    self._columns = self._apply(current, changes, counter)
+            return self._columns
+
+    def invalidate(self):
+        """Force une relecture complète au prochain get()"""
+        with self._lock:
+            self._columns = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Relectures complètes, synchronisations incrémentales et taille"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            current = self._columns
+        metrics['rows'] = len(current) if current is not None else 0
+        metrics['version'] = current.version if current is not None else None
+        metrics['bytes'] = sum(array.nbytes for array in current.arrays.values()) if current is not None else 0
+        return metrics
+
+    # === MÉTHODES PRIVÉES ===
+
+    def _load(self, counter: Dict[str, int]) -> PropertyColumns:
+        """Relecture complète des annonces actives"""
+        rows = self.db.fetch_property_columns(SNAPSHOT_COLUMNS)
+        cities, property_types = {}, {}
+        arrays = _encode(rows, cities, property_types)
+
+        # Compteur lu avant les lignes : une écriture intercalée sera
+        # réappliquée à la synchronisation suivante, sans effet de bord
+        self._metrics['full_loads'] += 1
+        return PropertyColumns(arrays, tuple(cities), tuple(property_types),
+                               counter['version'], counter['deletions'])
+
+    def _apply(self, current: PropertyColumns, changes, counter: Dict[str, int]) -> PropertyColumns:
+        """Nouvel état : lignes modifiées remplacées, désactivées retirées, nouvelles ajoutées"""
+        cities = {value: code for code, value in enumerate(current.cities)}
+        property_types = {value: code for code, value in enumerate(current.property_types)}
+
+        status = changes.index_of('listing_status')
+        active_rows = [row for row in changes if row[status] == 'active']
+        changed_ids = np.asarray(changes.column('id'), dtype=np.int64)
+
+        keep = ~np.isin(current.ids, changed_ids)
+        added = _encode(RowSet(changes.columns, active_rows), cities, property_types)
+
+        arrays = {}
+        for name, array in current.arrays.items():
+            arrays[name] = np.concatenate([array[keep], added[name]])
+
+        # Une annonce réactivée peut avoir un id inférieur aux autres
+        if len(added['ids']) and keep.any() and added['ids'][0] < current.ids[keep][-1]:
+            order = np.argsort(arrays['ids'], kind='stable')
+            arrays = {name: array[order] for name, array in arrays.items()}
+
+        self._metrics['incremental_refreshes'] += 1
+        self._metrics['rows_applied'] += len(changes)
+        return PropertyColumns(arrays, tuple(cities), tuple(property_types),
+                               counter['version'], current.deletions)
+
+
+def _encode(rows, cities: Dict[str, int], property_types: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Tableaux d'un lot de lignes (RowSet de fetch_property_columns)
+
+    cities / property_types : dictionnaires valeur -> code, complétés des
+    valeurs nouvelles (les codes existants restent valides).
+    """
+    count = len(rows)
+    columns = list(zip(*rows.rows)) if count else [()] * len(rows.columns)
+    by_name = dict(zip(rows.columns, columns))
+
+    arrays = {
+        'ids': np.fromiter(by_name['id'], dtype=np.int64, count=count),
+        'created_at': np.array(by_name['created_at'], dtype='datetime64[s]').reshape(count),
+    }
+
+    for name, column in NUMERIC_COLUMNS:
+        arrays[name] = np.array([np.nan if value is None else value for value in by_name[column]],
+                                dtype=np.float64).reshape(count)
+
+    for (name, column), dictionary in zip(ENCODED_COLUMNS, (cities, property_types)):
+        codes = np.empty(count, dtype=np.int32)
+        for position, value in enumerate(by_name[column]):
+            if value is None:
+                codes[position] = -1
+            else:
+                code = dictionary.get(value)
+                if code is None:
+                    code = dictionary[value] = len(dictionary)
+                codes[position] = code
+        arrays[f'{name}_codes'] = codes
+
+    features = np.zeros(count, dtype=np.uint8)
+    for name, column in FEATURE_COLUMNS.items():
+        present = np.array([bool(value) and value > 0 for value in by_name[column]], dtype=bool).reshape(count)
+        features[present] |= FEATURE_BITS[name]
+    arrays['features'] = features
+
+    return arrays
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_property_snapshot() -> PropertySnapshot:
+    """Copie partagée des annonces de l'instance globale db_manager"""
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None:
+            _snapshot = PropertySnapshot()
+        return _snapshot
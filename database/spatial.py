@@ -0,0 +1,219 @@
+"""
+Index spatial R-tree sur les coordonnées des annonces
+Recherche par rayon et par emprise de carte filtrée en SQL
+"""
+import logging
+import math
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from database.schema import create_schema_versions_table, get_component_version, set_component_version
+
+logger = logging.getLogger(__name__)
+
+SPATIAL_VERSION = 1
+
+# Rayon terrestre moyen, identique à utils.helpers.calculate_distance
+EARTH_RADIUS_KM = 6371.0
+
+# Longueur d'un degré de latitude
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+
+SPATIAL_COLUMNS = [('latitude', 'REAL'), ('longitude', 'REAL')]
+
+_RTREE_DDL = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS properties_rtree USING rtree(
+        property_id,
+        min_lat, max_lat,
+        min_lng, max_lng
+    )
+'''
+
+_HAS_COORDINATES = "new.latitude IS NOT NULL AND new.longitude IS NOT NULL"
+
+# Source de la requête de recherche quand un rectangle est connu : le R-tree
+# pilote le parcours (CROSS JOIN fixe l'ordre) et chaque candidat est lu par id
+RTREE_SOURCE = "properties_rtree CROSS JOIN properties ON properties.id = properties_rtree.property_id"
+
+RTREE_BOX_CONDITION = (
+    "properties_rtree.max_lat >= ? AND properties_rtree.min_lat <= ?"
+    " AND properties_rtree.max_lng >= ? AND properties_rtree.min_lng <= ?"
+)
+
+# Une annonce est un point : boîte dégénérée (min = max)
+_RTREE_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS properties_rtree_after_insert AFTER INSERT ON properties
+    WHEN {_HAS_COORDINATES} BEGIN
+        INSERT INTO properties_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS properties_rtree_after_update AFTER UPDATE OF latitude, longitude ON properties BEGIN
+        DELETE FROM properties_rtree WHERE property_id = old.id;
+        INSERT INTO properties_rtree
+        SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE {_HAS_COORDINATES};
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS properties_rtree_after_delete AFTER DELETE ON properties BEGIN
+        DELETE FROM properties_rtree WHERE property_id = old.id;
+    END
+    ''',
+]
+
+
+def haversine_km(lat1: Optional[float], lng1: Optional[float],
+                 lat2: Optional[float], lng2: Optional[float]) -> Optional[float]:
+    """
+    Distance orthodromique entre deux points GPS (formule de Haversine)
+
+    Enregistrée comme fonction SQL haversine_km ; retourne None (NULL)
+    si une coordonnée manque.
+
+    Returns:
+        Optional[float]: Distance en kilomètres
+    """
+    if lat1 is None or lng1 is None or lat2 is None or lng2 is None:
+        return None
+
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def register_spatial_functions(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """Déclare les fonctions SQL spatiales sur une connexion"""
+    conn.create_function('haversine_km', 4, haversine_km, deterministic=True)
+    return conn
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    Rectangle englobant un cercle de rayon donné
+
+    Returns:
+        Tuple[float, float, float, float]: (min_lat, max_lat, min_lng, max_lng)
+    """
+    delta_lat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(-90.0, lat - delta_lat), min(90.0, lat + delta_lat)
+
+    # Près des pôles le cercle couvre toutes les longitudes
+    cos_lat = min(math.cos(math.radians(min_lat)), math.cos(math.radians(max_lat)))
+    if cos_lat <= 1e-9:
+        return min_lat, max_lat, -180.0, 180.0
+
+    delta_lng = min(180.0, delta_lat / cos_lat)
+    return min_lat, max_lat, max(-180.0, lng - delta_lng), min(180.0, lng + delta_lng)
+
+
+def normalize_bounds(bounds: Any) -> Tuple[float, float, float, float]:
+    """
+    Convertit une emprise de carte en (min_lat, max_lat, min_lng, max_lng)
+
+    Accepte le format de folium / get_map_bounds : [[sud, ouest], [nord, est]],
+    ou les bounds Leaflet renvoyés par st_folium ({'_southWest': {...}, '_northEast': {...}})
+
+    Raises:
+        ValueError: Emprise mal formée
+    """
+    try:
+        if isinstance(bounds, dict):
+            bounds = [
+                [bounds['_southWest']['lat'], bounds['_southWest']['lng']],
+                [bounds['_northEast']['lat'], bounds['_northEast']['lng']]
+            ]
+        (south, west), (north, east) = bounds
+        south, west, north, east = float(south), float(west), float(north), float(east)
+    except (TypeError, ValueError, KeyError):
+        raise ValueError(f"Emprise de carte invalide: {bounds!r}")
+
+    return min(south, north), max(south, north), min(west, east), max(west, east)
+
+
+def spatial_filter(filters: Dict[str, Any]) -> Tuple[Optional[Tuple[float, float, float, float]],
+                                                  List[Tuple[str, List[Any]]]]:
+    """
+    Traduit les filtres géographiques de recherche
+
+    - center_lat / center_lng / radius_km : rectangle englobant le cercle,
+      puis contrôle exact par haversine_km
+    - bounds : emprise de carte [[sud, ouest], [nord, est]]
+
+    Le R-tree stocke des flottants 32 bits arrondis vers l'extérieur : les
+    bornes de l'emprise sont revérifiées sur les colonnes de la ligne.
+
+    Returns:
+        (rectangle à interroger dans le R-tree ou None,
+         [(condition, paramètres)] à vérifier sur chaque ligne)
+    """
+    boxes = []
+    conditions = []
+
+    if filters.get('center_lat') and filters.get('center_lng') and filters.get('radius_km'):
+        lat, lng = float(filters['center_lat']), float(filters['center_lng'])
+        radius = float(filters['radius_km'])
+        boxes.append(bounding_box(lat, lng, radius))
+        conditions.append(("haversine_km(?, ?, latitude, longitude) <= ?", [lat, lng, radius]))
+
+    if filters.get('bounds'):
+        box = normalize_bounds(filters['bounds'])
+        boxes.append(box)
+        conditions.append(("latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?", list(box)))
+
+    if not boxes:
+        return None, conditions
+
+    # Rayon et emprise combinés : intersection des rectangles
+    box = (
+        max(b[0] for b in boxes), min(b[1] for b in boxes),
+        max(b[2] for b in boxes), min(b[3] for b in boxes)
+    )
+    return box, conditions
+
+
+def ensure_spatial_index(cursor: sqlite3.Cursor) -> bool:
+    """
+    Ajoute les colonnes de coordonnées, crée l'index R-tree et ses
+    triggers, et le reconstruit à chaque changement de version
+
+    Returns:
+        bool: True si l'index a été (re)construit
+    """
+    create_schema_versions_table(cursor)
+
+    # Bases créées avant l'ajout des coordonnées
+    cursor.execute("PRAGMA table_info(properties)")
+    existing_columns = {row[1] for row in cursor.fetchall()}
+    for column, column_type in SPATIAL_COLUMNS:
+        if column not in existing_columns:
+            cursor.execute(f"ALTER TABLE properties ADD COLUMN {column} {column_type}")
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE name = 'properties_rtree'")
+    exists = cursor.fetchone() is not None
+
+    if exists and get_component_version(cursor, 'properties_rtree') == SPATIAL_VERSION:
+        return False
+
+    for trigger in ('properties_rtree_after_insert', 'properties_rtree_after_update',
+                    'properties_rtree_after_delete'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("DROP TABLE IF EXISTS properties_rtree")
+
+    cursor.execute(_RTREE_DDL)
+    for trigger in _RTREE_TRIGGERS:
+        cursor.execute(trigger)
+
+    # Indexer les annonces déjà géolocalisées
+    cursor.execute('''
+        INSERT INTO properties_rtree
+        SELECT id, latitude, latitude, longitude, longitude FROM properties
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    ''')
+
+    set_component_version(cursor, 'properties_rtree', SPATIAL_VERSION)
+    logger.info(f"Index spatial en version {SPATIAL_VERSION}")
+    return True
+
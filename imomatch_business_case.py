@@ -11,6 +11,8 @@ import json
 import hashlib
 import sqlite3
 
+from database.rows import apply_row_factory, cursor_columns, finalize_rows
+
 # Configuration de la page
 st.set_page_config(
     page_title="ImoMatch - Trouvez votre bien idéal",
@@ -333,8 +335,8 @@ class ImoMatchDatabase:
             }
         return False, None
     
-    def search_properties(self, filters=None):
-        """Recherche de propriétés avec filtres"""
+    def search_properties(self, filters=None, result_format='dict'):
+        """Recherche de propriétés avec filtres (result_format : dict, record, tuple ou numpy)"""
         conn = self.get_connection()
         query = "SELECT * FROM properties WHERE listing_status = 'active'"
         params = []
@@ -361,9 +363,12 @@ class ImoMatchDatabase:
         
         query += " ORDER BY created_at DESC LIMIT 50"
         
-        df = pd.read_sql_query(query, conn, params=params)
-        conn.close()
-        return df.to_dict('records') if not df.empty else []
+        try:
+            cursor = conn.execute(query, params)
+            apply_row_factory(cursor, result_format)
+            return finalize_rows(cursor_columns(cursor), cursor.fetchall(), result_format)
+        finally:
+            conn.close()
     
     def calculate_match_score(self, user_prefs, property_data):
         """Calcule un score de compatibilité IA"""
@@ -0,0 +1,267 @@
+"""
+Alertes des recherches sauvegardées
+Les annonces créées ou modifiées depuis le dernier passage (journal des
+modifications) sont confrontées à un index des recherches avec alertes ;
+un email groupé par utilisateur, chaque annonce n'étant signalée qu'une fois
+"""
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from database.change_log import DELETE
+from database.result_cache import row_matches_filters
+from utils.email import get_email_manager
+
+logger = logging.getLogger(__name__)
+
+ALERT_CONSUMER = 'property_alerts'
+
+# Colonnes des prédicats de recherche (voir row_matches_filters) : une
+# modification d'autres colonnes ne fait entrer l'annonce dans aucune recherche
+ALERT_COLUMNS = frozenset([
+    'listing_status', 'title', 'description', 'address', 'city', 'property_type', 'price', 'bedrooms',
+    'surface_total', 'luxury_level', 'garden', 'swimming_pool', 'garage_count', 'latitude', 'longitude'
+])
+
+MAX_PROPERTIES_PER_ALERT = 10
+
+# Clés des filtres de l'interface -> clés des prédicats de recherche
+_FILTER_ALIASES = {'location': 'city', 'bedrooms': 'bedrooms_min'}
+
+
+def alert_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Filtres d'une recherche sauvegardée aux clés de la recherche (city, bedrooms_min)"""
+    normalized = dict(filters or {})
+    for alias, key in _FILTER_ALIASES.items():
+        value = normalized.pop(alias, None)
+        if value and not normalized.get(key):
+            normalized[key] = value
+    return normalized
+
+
+class SavedSearchIndex:
+    """
+    Recherches avec alertes indexées par type de bien et par ville
+
+    Une annonce n'est évaluée (row_matches_filters) que contre les recherches
+    de son type ou sans type, et de sa ville ou sans ville.
+    """
+
+    def __init__(self, searches: Iterable[Dict[str, Any]]):
+        self.searches: Dict[int, Dict[str, Any]] = {}
+        self._by_type: Dict[str, Set[int]] = {}
+        self._by_city: Dict[str, Set[int]] = {}
+        self._any_type: Set[int] = set()
+        self._any_city: Set[int] = set()
+
+        for search in searches:
+            filters = alert_filters(search.get('filters'))
+            search = dict(search, predicate=filters)
+            self.searches[search['id']] = search
+
+            if filters.get('property_type'):
+                self._by_type.setdefault(filters['property_type'], set()).add(search['id'])
+            else:
+                self._any_type.add(search['id'])
+            if filters.get('city'):
+                self._by_city.setdefault(str(filters['city']).lower(), set()).add(search['id'])
+            else:
+                self._any_city.add(search['id'])
+
+    def __len__(self) -> int:
+        return len(self.searches)
+
+    def matching(self, row: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Recherches satisfaites par une annonce active, par id croissant"""
+        by_type = self._by_type.get(row.get('property_type'), set()) | self._any_type
+        if not by_type:
+            return []
+
+        # Filtre ville : sous-chaîne de la ville de l'annonce (LIKE de la recherche)
+        city = str(row.get('city') or '').lower()
+        by_city = set(self._any_city)
+        for searched_city, search_ids in self._by_city.items():
+            if searched_city in city:
+                by_city |= search_ids
+
+        return [
+            self.searches[search_id] for search_id in sorted(by_type & by_city)
+            if row_matches_filters(row, self.searches[search_id]['predicate'])
+        ]
+
+
+class AlertEngine:
+    """
+    Moteur d'alertes incrémental
+
+    Chaque passage (run_once) lit le journal des modifications depuis la
+    position enregistrée du consommateur ALERT_CONSUMER, confronte les
+    annonces créées ou modifiées aux recherches avec alertes et met les
+    couples utilisateur / annonce nouveaux en attente (pending_alerts) avant
+    d'enregistrer la nouvelle position. Il envoie ensuite un email par
+    utilisateur ayant des alertes en attente (annonces de toutes ses
+    recherches, dédoublonnées). Au premier passage, la position part de
+    l'état courant : le catalogue existant ne déclenche pas d'alertes.
+
+    Un email présente au plus max_properties_per_alert annonces (les plus
+    récentes). Seules les annonces envoyées quittent la file : celles d'un
+    envoi échoué ou au-delà de la limite partent aux passages suivants.
+    Une annonce en attente devenue inactive, ou qui ne satisfait plus sa
+    recherche (modifiée, supprimée ou sans alerte), est retirée de la file.
+    """
+
+    def __init__(self, db=None, email_manager=None, consumer: str = ALERT_CONSUMER,
+                 max_properties_per_alert: int = MAX_PROPERTIES_PER_ALERT):
+        if db is None:
+            from database.manager import get_database
+            db = get_database()
+        self.db = db
+        self.email_manager = email_manager or get_email_manager()
+        self.consumer = consumer
+        self.max_properties_per_alert = max_properties_per_alert
+        self._lock = threading.Lock()
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        Traite les modifications d'annonces depuis le passage précédent
+
+        Returns:
+            Dict[str, int]: changes (entrées du journal lues), searches,
+            matches (couples utilisateur / annonce nouveaux), emails_sent,
+            emails_failed, pending (couples restant en attente), position
+        """
+        with self._lock:
+            summary = {'changes': 0, 'searches': 0, 'matches': 0, 'emails_sent': 0, 'emails_failed': 0,
+                       'pending': 0}
+
+            position = self.db.get_feed_cursor(self.consumer)
+            if position is None:
+                position = self.db.get_change_log_head()
+                self.db.set_feed_cursor(self.consumer, position)
+                summary['position'] = position
+                return summary
+
+            # Annonces créées, ou modifiées sur une colonne des prédicats
+            property_ids: Set[int] = set()
+            while True:
+                batch = self.db.read_property_changes(position)
+                if batch['reset']:
+                    logger.warning("Journal compacté au-delà de la position des alertes : modifications ignorées")
+                position = batch['position']
+                if not batch['changes']:
+                    break
+                summary['changes'] += len(batch['changes'])
+                for change in batch['changes']:
+                    if change['op'] == DELETE:
+                        property_ids.discard(change['property_id'])
+                    elif change['changed_columns'] is None or not ALERT_COLUMNS.isdisjoint(change['changed_columns']):
+                        property_ids.add(change['property_id'])
+
+            summary['position'] = position
+            index = None
+            if property_ids:
+                index = SavedSearchIndex(self.db.get_alert_searches())
+                summary['searches'] = len(index)
+
+                # Annonce -> première recherche satisfaite, par utilisateur
+                matches: Dict[int, Dict[int, Dict[str, Any]]] = {}
+                if index:
+                    ordered_ids = sorted(property_ids)
+                    for start in range(0, len(ordered_ids), 500):
+                        for row in self.db.get_properties_by_ids(ordered_ids[start:start + 500]):
+                            if row['listing_status'] != 'active':
+                                continue
+                            for search in index.matching(row):
+                                matches.setdefault(search['user_id'], {}).setdefault(row['id'], search)
+
+                new_pairs = self.db.filter_unnotified_alerts(
+                    (user_id, property_id) for user_id, properties in matches.items() for property_id in properties
+                )
+                summary['matches'] = len(new_pairs)
+                # En file avant d'avancer la position : un envoi échoué ne perd rien
+                self.db.queue_pending_alerts(
+                    (user_id, property_id, matches[user_id][property_id]['id']) for user_id, property_id in new_pairs
+                )
+
+            self.db.set_feed_cursor(self.consumer, position)
+
+            pending: Dict[int, Dict[int, Optional[int]]] = {}
+            for user_id, property_id, search_id in self.db.get_pending_alerts():
+                pending.setdefault(user_id, {})[property_id] = search_id
+            if not pending:
+                return summary
+
+            if index is None:
+                index = SavedSearchIndex(self.db.get_alert_searches())
+                summary['searches'] = len(index)
+
+            for user_id, user_pending in pending.items():
+                sent, remaining = self._notify(user_id, user_pending, index)
+                if sent is not None:
+                    summary['emails_sent' if sent else 'emails_failed'] += 1
+                summary['pending'] += remaining
+
+            logger.info(f"Alertes: {summary}")
+            return summary
+
+    def _notify(self, user_id: int, pending: Dict[int, Optional[int]], index: SavedSearchIndex) -> Tuple[Optional[bool], int]:
+        """
+        Envoie l'email groupé d'un utilisateur et enregistre les annonces signalées
+
+        Args:
+            pending: Annonce en attente -> recherche qui l'a retenue
+
+        Returns:
+            Tuple[Optional[bool], int]: envoi réussi (None si rien à envoyer)
+            et nombre d'annonces restant en attente
+        """
+        # Annonces encore actives et satisfaisant leur recherche
+        rows = {row['id']: row for row in self.db.get_properties_by_ids(pending)}
+        valid: Dict[int, Dict[str, Any]] = {}
+        for property_id, search_id in pending.items():
+            row = rows.get(property_id)
+            search = index.searches.get(search_id)
+            if (row is not None and search is not None and search['user_id'] == user_id
+                    and row['listing_status'] == 'active' and row_matches_filters(row, search['predicate'])):
+                valid[property_id] = search
+        stale = [(user_id, property_id) for property_id in pending if property_id not in valid]
+        if stale:
+            self.db.discard_pending_alerts(stale)
+        if not valid:
+            return None, 0
+
+        property_ids = sorted(valid, reverse=True)[:self.max_properties_per_alert]
+        properties = [rows[property_id] for property_id in property_ids]
+        user_searches = [valid[property_id] for property_id in property_ids]
+        first = user_searches[0]
+        search_names = list(dict.fromkeys(search['name'] for search in user_searches))
+
+        sent = self.email_manager.send_property_alert(
+            first['email'],
+            first.get('first_name') or first['email'],
+            [dict(property_data, location=property_data.get('city'), surface=property_data.get('surface_total'))
+             for property_data in properties],
+            ', '.join(search_names)
+        )
+        if not sent:
+            logger.warning(f"Alerte non envoyée à l'utilisateur {user_id} : nouvel essai au prochain passage")
+            return False, len(valid)
+
+        self.db.record_alert_notifications(
+            (user_id, property_data['id'], search['id'])
+            for property_data, search in zip(properties, user_searches)
+        )
+        return True, len(valid) - len(properties)
+
+
+_alert_engine = None
+_alert_engine_lock = threading.Lock()
+
+
+def get_alert_engine() -> AlertEngine:
+    """Retourne l'instance du moteur d'alertes"""
+    global _alert_engine
+    with _alert_engine_lock:
+        if _alert_engine is None:
+            _alert_engine = AlertEngine()
+        return _alert_engine
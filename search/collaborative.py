@@ -0,0 +1,331 @@
+"""
+Filtrage collaboratif par annonces (item-based)
+Matrice creuse utilisateurs x annonces issue des favoris (pondérés par
+interest_level), similarités cosinus annonce-annonce calculées par blocs et
+conservées en table des plus proches voisins
+"""
+import heapq
+import logging
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NEIGHBORS = 50          # Voisins conservés par annonce
+DEFAULT_SHRINKAGE = 2.0         # Atténue les similarités fondées sur peu d'utilisateurs communs
+DEFAULT_MAX_PAIRS = 2_000_000   # Couples (annonce, annonce) d'un bloc de calcul
+DEFAULT_INTEREST_LEVEL = 3
+MAX_INTEREST_LEVEL = 5
+
+
+def interaction_weight(interest_level: Optional[int]) -> float:
+    """Poids d'un favori dans la matrice (interest_level ramené sur ]0, 1])"""
+    level = interest_level if interest_level else DEFAULT_INTEREST_LEVEL
+    return min(max(level, 1), MAX_INTEREST_LEVEL) / MAX_INTEREST_LEVEL
+
+
+class ItemNeighborIndex:
+    """
+    Table des voisins des annonces pour le filtrage collaboratif
+
+        index = ItemNeighborIndex()
+        index.build(db.fetch_favorite_interactions())
+        index.add_interaction(user_id, property_id, weight)   # nouveau favori
+        index.remove_interaction(user_id, property_id)        # favori retiré
+        index.recommend(user_id, limit=10)
+
+    Similarité : cosinus des colonnes de la matrice, multiplié par
+    n / (n + shrinkage) où n est le nombre d'utilisateurs communs. build()
+    calcule toutes les similarités par blocs d'annonces (au plus max_pairs
+    produits par bloc). add_interaction() recalcule les similarités de
+    l'annonce avec les autres favoris de l'utilisateur, met les autres à
+    l'échelle de la nouvelle norme et les reporte chez ses voisins ;
+    remove_interaction() fait de même après le retrait. Les listes
+    d'autres annonces où elle figure sans être parmi ses propres voisins
+    gardent l'ancienne valeur : une reconstruction périodique rétablit les
+    listes exactes.
+    """
+
+    def __init__(self, neighbors: int = DEFAULT_NEIGHBORS, shrinkage: float = DEFAULT_SHRINKAGE,
+                 max_pairs: int = DEFAULT_MAX_PAIRS):
+        self.neighbors = neighbors
+        self.shrinkage = shrinkage
+        self.max_pairs = max_pairs
+
+        self._user_items: Dict[int, Dict[int, float]] = {}
+        self._item_users: Dict[int, Dict[int, float]] = {}
+        self._item_norms: Dict[int, float] = {}        # Somme des carrés des poids
+        self._neighbors: Dict[int, Dict[int, float]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._item_users)
+
+    def build(self, interactions: Iterable[Sequence]):
+        """
+        Reconstruit la matrice et la table des voisins
+
+        Args:
+            interactions: (user_id, property_id, poids) ou lignes de
+                fetch_favorite_interactions (id, user_id, property_id, interest_level)
+        """
+        user_items: Dict[int, Dict[int, float]] = {}
+        item_users: Dict[int, Dict[int, float]] = {}
+        for row in interactions:
+            user_id, property_id, weight = _interaction(row)
+            user_items.setdefault(user_id, {})[property_id] = weight
+            item_users.setdefault(property_id, {})[user_id] = weight
+
+        neighbors = self._compute_neighbors(user_items, item_users)
+        item_norms = {
+            item: sum(weight * weight for weight in users.values()) for item, users in item_users.items()
+        }
+
+        with self._lock:
+            self._user_items = user_items
+            self._item_users = item_users
+            self._item_norms = item_norms
+            self._neighbors = neighbors
+
+    def add_interaction(self, user_id: int, property_id: int, weight: float):
+        """Ajoute (ou repondère) un favori et met à jour les voisins de l'annonce"""
+        with self._lock:
+            user_items = self._user_items.setdefault(user_id, {})
+            previous = user_items.get(property_id)
+            user_items[property_id] = weight
+            self._item_users.setdefault(property_id, {})[user_id] = weight
+
+            old_norm = self._item_norms.get(property_id, 0.0)
+            new_norm = old_norm - (previous or 0.0) ** 2 + weight * weight
+            self._item_norms[property_id] = new_norm
+
+            # Hors favoris de l'utilisateur, seule la norme de l'annonce change :
+            # similarités mises à l'échelle, ordre inchangé
+            scale = math.sqrt(old_norm / new_norm) if old_norm else 0.0
+            row = {other: similarity * scale for other, similarity in self._neighbors.get(property_id, {}).items()}
+            for other in user_items:
+                if other != property_id:
+                    row[other] = self._pair_similarity(property_id, other)
+
+            self._neighbors[property_id] = dict(
+                heapq.nlargest(self.neighbors, row.items(), key=lambda item: (item[1], -item[0]))
+            )
+            for other, similarity in row.items():
+                self._offer_neighbor(other, property_id, similarity)
+
+    def remove_interaction(self, user_id: int, property_id: int):
+        """Retire un favori et met à jour les voisins de l'annonce"""
+        with self._lock:
+            user_items = self._user_items.get(user_id, {})
+            weight = user_items.pop(property_id, None)
+            if weight is None:
+                return
+            if not user_items:
+                del self._user_items[user_id]
+            users = self._item_users[property_id]
+            del users[user_id]
+
+            if not users:
+                # Annonce sans favori : ses seuls voisins partageaient cet utilisateur
+                del self._item_users[property_id]
+                del self._item_norms[property_id]
+                for other in set(self._neighbors.pop(property_id, {})) | set(user_items):
+                    self._neighbors.get(other, {}).pop(property_id, None)
+                return
+
+            old_norm = self._item_norms[property_id]
+            new_norm = old_norm - weight * weight
+            self._item_norms[property_id] = new_norm
+
+            # Les autres favoris de l'utilisateur perdent un utilisateur commun
+            scale = math.sqrt(old_norm / new_norm)
+            row = {other: similarity * scale for other, similarity in self._neighbors.get(property_id, {}).items()}
+            for other in user_items:
+                similarity = self._pair_similarity(property_id, other)
+                if similarity > 0:
+                    row[other] = similarity
+                else:
+                    row.pop(other, None)
+                    self._neighbors.get(other, {}).pop(property_id, None)
+
+            self._neighbors[property_id] = dict(
+                heapq.nlargest(self.neighbors, row.items(), key=lambda item: (item[1], -item[0]))
+            )
+            for other, similarity in row.items():
+                self._offer_neighbor(other, property_id, similarity)
+
+    def similar_items(self, property_id: int, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Voisins d'une annonce, par similarité décroissante"""
+        with self._lock:
+            neighbors = list(self._neighbors.get(property_id, {}).items())
+        neighbors.sort(key=lambda item: (-item[1], item[0]))
+        return neighbors if limit is None else neighbors[:limit]
+
+    def recommend(self, user_id: int, limit: int = 10,
+                  exclude: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """
+        Annonces recommandées à un utilisateur
+
+        Score d'une annonce : somme, sur les favoris de l'utilisateur, du
+        poids du favori multiplié par la similarité ; ses favoris et exclude
+        sont écartés.
+
+        Returns:
+            List[Tuple[int, float]]: (property_id, score) par score décroissant
+        """
+        with self._lock:
+            items = dict(self._user_items.get(user_id, {}))
+            excluded = set(items).union(exclude or ())
+            scores: Dict[int, float] = {}
+            for item, weight in items.items():
+                for other, similarity in self._neighbors.get(item, {}).items():
+                    if other not in excluded:
+                        scores[other] = scores.get(other, 0.0) + weight * similarity
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+
+    def user_items(self, user_id: int) -> Dict[int, float]:
+        """Favoris d'un utilisateur dans la matrice (property_id -> poids)"""
+        with self._lock:
+            return dict(self._user_items.get(user_id, {}))
+
+    def get_metrics(self) -> Dict[str, int]:
+        """Taille de la matrice et de la table des voisins"""
+        with self._lock:
+            return {
+                'users': len(self._user_items),
+                'items': len(self._item_users),
+                'interactions': sum(len(items) for items in self._user_items.values()),
+                'neighbor_entries': sum(len(neighbors) for neighbors in self._neighbors.values()),
+            }
+
+    # === MÉTHODES PRIVÉES ===
+
+    def _similarity(self, dot: float, common: int, norm_a: float, norm_b: float) -> float:
+        return dot / math.sqrt(norm_a * norm_b) * common / (common + self.shrinkage)
+
+    def _pair_similarity(self, item: int, other: int) -> float:
+        """Similarité exacte de deux annonces (parcours des utilisateurs de la moins populaire)"""
+        users, other_users = self._item_users[item], self._item_users[other]
+        if len(other_users) < len(users):
+            users, other_users = other_users, users
+        dot, common = 0.0, 0
+        for user_id, weight in users.items():
+            other_weight = other_users.get(user_id)
+            if other_weight is not None:
+                dot += weight * other_weight
+                common += 1
+        return self._similarity(dot, common, self._item_norms[item], self._item_norms[other])
+
+    def _offer_neighbor(self, item: int, candidate: int, similarity: float):
+        """Range candidate parmi les voisins de item s'il y a sa place"""
+        neighbors = self._neighbors.setdefault(item, {})
+        if candidate in neighbors or len(neighbors) < self.neighbors:
+            neighbors[candidate] = similarity
+            return
+        weakest = min(neighbors, key=lambda other: (neighbors[other], -other))
+        if (similarity, -candidate) > (neighbors[weakest], -weakest):
+            del neighbors[weakest]
+            neighbors[candidate] = similarity
+
+    def _compute_neighbors(self, user_items: Dict[int, Dict[int, float]],
+                           item_users: Dict[int, Dict[int, float]]) -> Dict[int, Dict[int, float]]:
+        """Table des voisins, calculée par blocs d'annonces sur la matrice creuse"""
+        if not item_users:
+            return {}
+
+        item_ids = np.array(sorted(item_users), dtype=np.int64)
+        positions = {int(item): position for position, item in enumerate(item_ids)}
+        n_items = len(item_ids)
+
+        # Matrice en lignes (utilisateurs) et en colonnes (annonces), format CSR
+        user_ptr, user_cols, user_weights = _csr(
+            [[(positions[item], weight) for item, weight in items.items()] for items in user_items.values()]
+        )
+        user_positions = {user_id: position for position, user_id in enumerate(user_items)}
+        item_ptr, item_rows, item_weights = _csr(
+            [[(user_positions[user_id], weight) for user_id, weight in item_users[int(item)].items()]
+             for item in item_ids]
+        )
+        norms = np.sqrt(np.bincount(
+            np.repeat(np.arange(n_items), np.diff(item_ptr)), weights=item_weights ** 2, minlength=n_items
+        ))
+
+        # Couples produits par annonce : somme des favoris de ses utilisateurs
+        user_degree = np.diff(user_ptr)
+        pairs_per_item = np.add.reduceat(user_degree[item_rows], item_ptr[:-1]) if len(item_rows) else \
+            np.zeros(n_items, dtype=np.int64)
+
+        neighbors: Dict[int, Dict[int, float]] = {}
+        start = 0
+        while start < n_items:
+            end = start + 1
+            budget = pairs_per_item[start]
+            while end < n_items and budget + pairs_per_item[end] <= self.max_pairs:
+                budget += pairs_per_item[end]
+                end += 1
+            self._compute_block(start, end, item_ids, item_ptr, item_rows, item_weights,
+                                user_ptr, user_cols, user_weights, norms, neighbors)
+            start = end
+        return neighbors
+
+    def _compute_block(self, start: int, end: int, item_ids, item_ptr, item_rows, item_weights,
+                       user_ptr, user_cols, user_weights, norms, neighbors: Dict[int, Dict[int, float]]):
+        """Similarités des annonces [start, end) avec toutes les autres, k meilleures conservées"""
+        n_items = len(item_ids)
+        lo, hi = item_ptr[start], item_ptr[end]
+        sources = np.repeat(np.arange(start, end), np.diff(item_ptr[start:end + 1]))
+        users = item_rows[lo:hi]
+        source_weights = item_weights[lo:hi]
+
+        # Développe chaque (annonce, utilisateur) en les favoris de l'utilisateur
+        lengths = user_ptr[users + 1] - user_ptr[users]
+        total = int(lengths.sum())
+        if not total:
+            return
+        offsets = np.repeat(user_ptr[users] - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        pair_sources = np.repeat(sources, lengths)
+        pair_targets = user_cols[offsets]
+        products = np.repeat(source_weights, lengths) * user_weights[offsets]
+
+        keep = pair_sources != pair_targets
+        keys = (pair_sources[keep] - start).astype(np.int64) * n_items + pair_targets[keep]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        dots = np.bincount(inverse, weights=products[keep])
+        common = np.bincount(inverse)
+
+        rows = unique_keys // n_items + start
+        cols = unique_keys % n_items
+        similarities = dots / (norms[rows] * norms[cols]) * common / (common + self.shrinkage)
+
+        # k meilleurs voisins par annonce (ex aequo : plus petit id)
+        order = np.lexsort((item_ids[cols], -similarities, rows))
+        rows, cols, similarities = rows[order], cols[order], similarities[order]
+        row_starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        row_ends = np.r_[row_starts[1:], len(rows)]
+        for row_start, row_end in zip(row_starts, row_ends):
+            row_end = min(row_end, row_start + self.neighbors)
+            neighbors[int(item_ids[rows[row_start]])] = dict(zip(
+                item_ids[cols[row_start:row_end]].tolist(), similarities[row_start:row_end].tolist()
+            ))
+
+
+def _interaction(row: Sequence) -> Tuple[int, int, float]:
+    """(user_id, property_id, poids) d'un triplet ou d'une ligne de fetch_favorite_interactions"""
+    if len(row) == 4:
+        _, user_id, property_id, interest_level = row
+        return int(user_id), int(property_id), interaction_weight(interest_level)
+    user_id, property_id, weight = row
+    return int(user_id), int(property_id), float(weight)
+
+
+def _csr(rows: List[List[Tuple[int, float]]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pointeurs, colonnes et poids d'une matrice creuse donnée ligne par ligne"""
+    ptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    ptr[1:] = np.cumsum([len(row) for row in rows])
+    cols = np.fromiter((col for row in rows for col, _ in row), dtype=np.int64, count=int(ptr[-1]))
+    weights = np.fromiter((weight for row in rows for _, weight in row), dtype=np.float64, count=int(ptr[-1]))
+    return ptr, cols, weights
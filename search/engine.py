@@ -4,10 +4,14 @@ Moteur de recherche avancé pour ImoMatch
 import logging
 from typing import Dict, List, Any, Optional, Tuple
 import re
-from datetime import datetime
 
 from database.manager import get_database
-from utils.helpers import calculate_distance, geocode_address, parse_search_query, calculate_property_score
+from database.fulltext import residual_search_text, text_relevance
+from utils.helpers import geocode_address, parse_search_query, calculate_property_score
+from search.ranking import top_k
+from search.history import SearchHistory
+from search.similarity_index import get_similar_listings
+from search.similarity_table import get_similarity_worker
 
 logger = logging.getLogger(__name__)
 
@@ -33,23 +37,7 @@ class SearchEngine:
             properties = self.db.search_properties(filters)
             
             # Enrichir avec des calculs
-            enriched_properties = []
-            
-            for prop in properties:
-                enriched_prop = prop.copy()
-                
-                # Calculer le score de compatibilité si préférences fournies
-                if user_preferences:
-                    enriched_prop['compatibility_score'] = calculate_property_score(prop, user_preferences)
-                
-                # Calculer le prix/m²
-                if prop.get('surface') and prop.get('surface') > 0:
-                    enriched_prop['price_per_m2'] = prop['price'] / prop['surface']
-                
-                # Enrichir les informations de localisation
-                enriched_prop = self._enrich_location_data(enriched_prop)
-                
-                enriched_properties.append(enriched_prop)
+            enriched_properties = self._enrich_properties(properties, user_preferences)
             
             # Appliquer les filtres avancés
             filtered_properties = self._apply_advanced_filters(enriched_properties, filters)
@@ -64,10 +52,48 @@ class SearchEngine:
             logger.error(f"Erreur lors de la recherche: {e}")
             return []
     
+    def search_page(self, filters: Dict[str, Any], cursor: Optional[str] = None, limit: int = 20,
+                    user_preferences: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Recherche paginée par curseur
+        
+        Le tri est fait en base (filters['sort_by'] : date_desc, price_asc,
+        price_desc, surface_desc, price_per_m2_asc) et n'est pas refait
+        ici : l'ordre reste stable d'une page à l'autre.
+        
+        Args:
+            filters: Filtres de recherche
+            cursor: Jeton de continuation renvoyé par la page précédente
+            limit: Nombre de propriétés par page
+            user_preferences: Préférences utilisateur pour le scoring
+            
+        Returns:
+            Dict[str, Any]: {'properties': [...], 'next_cursor': jeton ou None}
+        """
+        try:
+            page = self.db.search_properties_page(filters, cursor=cursor, limit=limit)
+            
+            enriched_properties = self._enrich_properties(page['properties'], user_preferences)
+            filtered_properties = self._apply_advanced_filters(enriched_properties, filters)
+            
+            return {'properties': filtered_properties, 'next_cursor': page['next_cursor']}
+            
+        except ValueError as e:
+            logger.warning(f"Curseur de recherche rejeté: {e}")
+            return {'properties': [], 'next_cursor': None}
+        except Exception as e:
+            logger.error(f"Erreur lors de la recherche paginée: {e}")
+            return {'properties': [], 'next_cursor': None}
+    
     def search_by_query(self, query: str, user_preferences: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """
         Recherche par requête en langage naturel
         
+        Les mots que parse_search_query ne traduit pas en filtres passent
+        par l'index plein texte lorsqu'ils sont les seuls critères ; à côté
+        de filtres reconnus, ils ne font que classer les annonces qui les
+        contiennent en tête (ex. "maison à Grasse avec jardin").
+        
         Args:
             query: Requête en langage naturel
             user_preferences: Préférences utilisateur
@@ -79,6 +105,14 @@ class SearchEngine:
             # Parser la requête en filtres
             filters = parse_search_query(query)
             
+            # Les mots non traduits en filtres : recherche plein texte, ou simple classement
+            text = residual_search_text(query, filters)
+            keywords = None
+            if text and filters:
+                keywords = text
+            elif text:
+                filters['text'] = text
+            
             # Ajouter les préférences utilisateur comme filtres de base
             if user_preferences:
                 base_filters = {
@@ -95,16 +129,46 @@ class SearchEngine:
                     if key not in filters and value is not None:
                         filters[key] = value
             
-            return self.search(filters, user_preferences)
+            results = self.search(filters, user_preferences)
+            if keywords:
+                # Tri stable : à pertinence égale, l'ordre de search() est conservé
+                results.sort(key=lambda prop: -text_relevance(prop, keywords))
+            return results
             
         except Exception as e:
             logger.error(f"Erreur recherche par requête: {e}")
             return []
     
+    def search_in_bounds(self, bounds: Any, filters: Dict[str, Any] = None,
+                         limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        Propriétés visibles dans l'emprise courante de la carte
+        
+        Args:
+            bounds: [[sud, ouest], [nord, est]] ou bounds Leaflet de st_folium
+            filters: Filtres de recherche complémentaires
+            limit: Nombre maximum de marqueurs
+            
+        Returns:
+            List[Dict[str, Any]]: Propriétés de l'emprise
+        """
+        try:
+            properties = self.db.search_properties_in_bounds(bounds, filters, limit)
+            return self._enrich_properties(properties, None)
+        except Exception as e:
+            logger.error(f"Erreur recherche par emprise: {e}")
+            return []
+    
     def get_similar_properties(self, property_id: int, limit: int = 5) -> List[Dict[str, Any]]:
         """
         Trouve des propriétés similaires à une propriété donnée
         
+        Les voisines sont lues dans la table précalculée (voir
+        search.similarity_table). Une annonce que la tâche de fond n'a pas
+        encore traitée est comparée à la volée dans l'index des annonces
+        s'il est déjà construit, sinon rien n'est affiché ; la tâche de
+        fond est lancée au premier passage par ce cas.
+        
         Args:
             property_id: ID de la propriété de référence
             limit: Nombre maximum de résultats
@@ -113,38 +177,20 @@ class SearchEngine:
             List[Dict[str, Any]]: Propriétés similaires
         """
         try:
-            # Récupérer la propriété de référence
-            reference_property = self.db.get_property_by_id(property_id)
-            if not reference_property:
-                return []
-            
-            # Créer des filtres basés sur la propriété de référence
-            filters = {
-                'property_type': reference_property['property_type'],
-                'price_min': int(reference_property['price'] * 0.7),  # ±30% du prix
-                'price_max': int(reference_property['price'] * 1.3),
-                'bedrooms': reference_property.get('bedrooms'),
-                'limit': limit + 5  # Plus de résultats pour filtrer ensuite
-            }
-            
-            # Rechercher les propriétés similaires
-            similar_properties = self.db.search_properties(filters)
+            neighbors = self.db.get_property_similarities(property_id, limit)
+            if not neighbors:
+                # Table incomplète (nouvelle annonce, premier déploiement) : tâche de fond
+                # lancée si besoin, et index consulté seulement s'il est déjà construit
+                get_similarity_worker().start()
+                similar_listings = get_similar_listings()
+                neighbors = similar_listings.similar(property_id, limit) if similar_listings.is_ready() else []
+            scores = dict(neighbors)
             
-            # Exclure la propriété de référence
-            similar_properties = [p for p in similar_properties if p['id'] != property_id]
+            results = self.db.get_properties_by_ids([similar_id for similar_id, _ in neighbors])
+            for result in results:
+                result['similarity_score'] = scores[result['id']]
             
-            # Calculer la similarité et trier
-            scored_properties = []
-            
-            for prop in similar_properties:
-                similarity_score = self._calculate_similarity(reference_property, prop)
-                prop['similarity_score'] = similarity_score
-                scored_properties.append(prop)
-            
-            # Trier par score de similarité et prendre les meilleurs
-            scored_properties.sort(key=lambda x: x['similarity_score'], reverse=True)
-            
-            return scored_properties[:limit]
+            return results
             
         except Exception as e:
             logger.error(f"Erreur recherche propriétés similaires: {e}")
@@ -200,43 +246,8 @@ class SearchEngine:
             Dict[str, Any]: Statistiques de marché
         """
         try:
-            filters = {}
-            
-            if location:
-                filters['location'] = location
-            if property_type:
-                filters['property_type'] = property_type
-            
-            properties = self.db.search_properties(filters)
-            
-            if not properties:
-                return {}
-            
-            prices = [p['price'] for p in properties]
-            surfaces = [p.get('surface', 0) for p in properties if p.get('surface')]
-            
-            stats = {
-                'total_properties': len(properties),
-                'average_price': sum(prices) / len(prices) if prices else 0,
-                'min_price': min(prices) if prices else 0,
-                'max_price': max(prices) if prices else 0,
-                'median_price': sorted(prices)[len(prices) // 2] if prices else 0,
-                'average_surface': sum(surfaces) / len(surfaces) if surfaces else 0,
-                'average_price_per_m2': 0
-            }
-            
-            if surfaces and stats['average_surface'] > 0:
-                stats['average_price_per_m2'] = stats['average_price'] / stats['average_surface']
-            
-            # Répartition par nombre de chambres
-            bedroom_distribution = {}
-            for prop in properties:
-                bedrooms = prop.get('bedrooms', 0)
-                bedroom_distribution[bedrooms] = bedroom_distribution.get(bedrooms, 0) + 1
-            
-            stats['bedroom_distribution'] = bedroom_distribution
-            
-            return stats
+            # Agrégats maintenus par triggers : lecture en O(groupes)
+            return self.db.get_market_stats(location, property_type)
             
         except Exception as e:
             logger.error(f"Erreur statistiques marché: {e}")
@@ -244,21 +255,35 @@ class SearchEngine:
     
     # === MÉTHODES PRIVÉES ===
     
+    def _enrich_properties(self, properties: List[Dict[str, Any]], 
+                           user_preferences: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Enrichit les propriétés (score de compatibilité, prix/m², localisation)"""
+        enriched_properties = []
+        
+        for prop in properties:
+            enriched_prop = prop.copy()
+            
+            # Calculer le score de compatibilité si préférences fournies
+            if user_preferences:
+                enriched_prop['compatibility_score'] = calculate_property_score(prop, user_preferences)
+            
+            # Calculer le prix/m²
+            if prop.get('surface') and prop.get('surface') > 0:
+                enriched_prop['price_per_m2'] = prop['price'] / prop['surface']
+            
+            # Enrichir les informations de localisation
+            enriched_prop = self._enrich_location_data(enriched_prop)
+            
+            enriched_properties.append(enriched_prop)
+        
+        return enriched_properties
+    
     def _apply_advanced_filters(self, properties: List[Dict[str, Any]], filters: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Applique des filtres avancés aux propriétés"""
         filtered = properties.copy()
         
-        # Filtre par distance si coordonnées fournies
-        if filters.get('center_lat') and filters.get('center_lng') and filters.get('radius_km'):
-            center_lat = filters['center_lat']
-            center_lng = filters['center_lng']
-            radius = filters['radius_km']
-            
-            filtered = [
-                prop for prop in filtered
-                if prop.get('latitude') and prop.get('longitude') and
-                calculate_distance(center_lat, center_lng, prop['latitude'], prop['longitude']) <= radius
-            ]
+        # Le filtre par rayon (center_lat, center_lng, radius_km) et par
+        # emprise (bounds) est appliqué en SQL via l'index R-tree
         
         # Filtre par prix/m²
         if filters.get('max_price_per_m2'):
@@ -311,48 +336,12 @@ class SearchEngine:
                 return sorted(properties, 
                             key=lambda x: (x.get('compatibility_score', 0), x.get('created_at', '')), 
                             reverse=True)
+            elif filters.get('text'):
+                # Ordre de pertinence BM25 déjà fourni par l'index plein texte
+                return sorted(properties, key=lambda x: x.get('fts_rank', 0))
             else:
                 return sorted(properties, key=lambda x: x.get('created_at', ''), reverse=True)
     
-    def _calculate_similarity(self, prop1: Dict[str, Any], prop2: Dict[str, Any]) -> float:
-        """Calcule la similarité entre deux propriétés"""
-        score = 0.0
-        
-        # Similarité de prix (±20% = score max)
-        price1, price2 = prop1.get('price', 0), prop2.get('price', 0)
-        if price1 > 0 and price2 > 0:
-            price_diff = abs(price1 - price2) / max(price1, price2)
-            price_score = max(0, 1 - (price_diff / 0.2))  # Score max si différence ≤ 20%
-            score += price_score * 0.3
-        
-        # Similarité de surface
-        surface1, surface2 = prop1.get('surface', 0), prop2.get('surface', 0)
-        if surface1 > 0 and surface2 > 0:
-            surface_diff = abs(surface1 - surface2) / max(surface1, surface2)
-            surface_score = max(0, 1 - (surface_diff / 0.3))
-            score += surface_score * 0.2
-        
-        # Même type de propriété
-        if prop1.get('property_type') == prop2.get('property_type'):
-            score += 0.2
-        
-        # Même nombre de chambres
-        if prop1.get('bedrooms') == prop2.get('bedrooms'):
-            score += 0.15
-        
-        # Proximité géographique
-        if (prop1.get('latitude') and prop1.get('longitude') and 
-            prop2.get('latitude') and prop2.get('longitude')):
-            distance = calculate_distance(
-                prop1['latitude'], prop1['longitude'],
-                prop2['latitude'], prop2['longitude']
-            )
-            # Score max si distance < 5km
-            geo_score = max(0, 1 - (distance / 10))
-            score += geo_score * 0.15
-        
-        return min(1.0, score)
-    
     def _enrich_location_data(self, property_data: Dict[str, Any]) -> Dict[str, Any]:
         """Enrichit les données de localisation d'une propriété"""
         
@@ -416,9 +405,11 @@ class SmartSearchEngine(SearchEngine):
     
     def __init__(self):
         super().__init__()
-        self.search_history = []
+        # Historique persistant et préférences agrégées (bornées en mémoire)
+        self.search_history = SearchHistory(self.db)
     
-    def smart_search(self, query: str, user_id: int, user_preferences: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    def smart_search(self, query: str, user_id: int, user_preferences: Dict[str, Any] = None,
+                     limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Recherche intelligente avec apprentissage des préférences
         
@@ -426,6 +417,7 @@ class SmartSearchEngine(SearchEngine):
             query: Requête de recherche
             user_id: ID de l'utilisateur
             user_preferences: Préférences utilisateur
+            limit: Nombre de résultats (None : tous, classés)
             
         Returns:
             List[Dict[str, Any]]: Résultats optimisés
@@ -445,7 +437,7 @@ class SmartSearchEngine(SearchEngine):
             properties = self.search(enhanced_filters, user_preferences)
             
             # Appliquer le machine learning pour le ranking
-            ranked_properties = self._apply_ml_ranking(properties, user_patterns, user_preferences)
+            ranked_properties = self._apply_ml_ranking(properties, user_patterns, user_preferences, limit)
             
             return ranked_properties
             
@@ -468,11 +460,11 @@ class SmartSearchEngine(SearchEngine):
         try:
             # Analyser les préférences de l'utilisateur
             user_preferences = self.db.get_user_preferences(user_id)
-            user_favorites = self.db.get_user_favorites(user_id)
+            user_behavior = self.db.get_user_behavior_profile(user_id)
             user_patterns = self._analyze_user_patterns(user_id)
             
             # Créer un profil utilisateur consolidé
-            consolidated_profile = self._create_user_profile(user_preferences, user_favorites, user_patterns)
+            consolidated_profile = self._create_user_profile(user_preferences, user_behavior, user_patterns)
             
             # Générer des filtres de recommandation
             recommendation_filters = self._generate_recommendation_filters(consolidated_profile)
@@ -481,7 +473,7 @@ class SmartSearchEngine(SearchEngine):
             candidates = self.search(recommendation_filters, user_preferences)
             
             # Exclure les propriétés déjà en favoris
-            favorite_ids = {fav['id'] for fav in user_favorites}
+            favorite_ids = self.db.get_user_favorite_ids(user_id) if user_behavior.get('favorite_count') else set()
             candidates = [prop for prop in candidates if prop['id'] not in favorite_ids]
             
             # Scorer et trier les candidats
@@ -491,8 +483,9 @@ class SmartSearchEngine(SearchEngine):
                 prop['recommendation_score'] = score
                 scored_candidates.append(prop)
             
-            # Trier par score et diversifier les résultats
-            scored_candidates.sort(key=lambda x: x['recommendation_score'], reverse=True)
+            # Meilleurs scores puis diversification ; un candidat de plus que
+            # limit signale à _diversify_results qu'il y a matière à rééquilibrer
+            scored_candidates = top_k(scored_candidates, limit + 1, lambda x: x['recommendation_score'])
             diversified_results = self._diversify_results(scored_candidates, limit)
             
             return diversified_results
@@ -554,49 +547,18 @@ class SmartSearchEngine(SearchEngine):
     
     def _log_search(self, user_id: int, query: str):
         """Enregistre une recherche pour l'apprentissage"""
-        search_entry = {
-            'user_id': user_id,
-            'query': query,
-            'timestamp': datetime.now().isoformat(),
-            'filters': parse_search_query(query)
-        }
-        
-        self.search_history.append(search_entry)
+        self.search_history.record(user_id, query, parse_search_query(query))
         
-        # Dans une vraie implémentation, sauvegarder en base
         logger.info(f"Recherche enregistrée pour utilisateur {user_id}: {query}")
     
     def _analyze_user_patterns(self, user_id: int) -> Dict[str, Any]:
-        """Analyse les patterns de recherche d'un utilisateur"""
-        user_searches = [s for s in self.search_history if s['user_id'] == user_id]
-        
-        if not user_searches:
+        """Patterns de recherche d'un utilisateur (compteurs agrégés, voir search.history)"""
+        if user_id is None:
             return {}
         
-        patterns = {
-            'preferred_locations': {},
-            'preferred_types': {},
-            'price_ranges': [],
-            'search_frequency': len(user_searches),
-            'recent_queries': [s['query'] for s in user_searches[-5:]]
-        }
-        
-        # Analyser les localisations préférées
-        for search in user_searches:
-            location = search['filters'].get('location')
-            if location:
-                patterns['preferred_locations'][location] = patterns['preferred_locations'].get(location, 0) + 1
-        
-        # Analyser les types préférés
-        for search in user_searches:
-            prop_type = search['filters'].get('property_type')
-            if prop_type:
-                patterns['preferred_types'][prop_type] = patterns['preferred_types'].get(prop_type, 0) + 1
-        
-        # Analyser les fourchettes de prix
-        for search in user_searches:
-            if search['filters'].get('price_max'):
-                patterns['price_ranges'].append(search['filters']['price_max'])
+        patterns = self.search_history.patterns(user_id)
+        if not patterns['search_frequency']:
+            return {}
         
         return patterns
     
@@ -620,16 +582,16 @@ class SmartSearchEngine(SearchEngine):
             enhanced['property_type'] = most_preferred_type
         
         # Ajuster les fourchettes de prix basées sur l'historique
-        if patterns.get('price_ranges') and not enhanced.get('price_max'):
-            avg_max_price = sum(patterns['price_ranges']) / len(patterns['price_ranges'])
-            enhanced['price_max'] = int(avg_max_price * 1.1)  # +10% de marge
+        if patterns.get('average_price_max') and not enhanced.get('price_max'):
+            enhanced['price_max'] = int(patterns['average_price_max'] * 1.1)  # +10% de marge
         
         return enhanced
     
     def _apply_ml_ranking(self, properties: List[Dict[str, Any]], 
                          patterns: Dict[str, Any], 
-                         user_preferences: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-        """Applique un ranking basé sur le machine learning"""
+                         user_preferences: Dict[str, Any] = None,
+                         limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Applique un ranking basé sur le machine learning (limit : meilleurs résultats seulement)"""
         
         scored_properties = []
         
@@ -661,13 +623,13 @@ class SmartSearchEngine(SearchEngine):
             
             scored_properties.append(prop)
         
-        # Trier par score ML
-        return sorted(scored_properties, key=lambda x: x['ml_score'], reverse=True)
+        # Meilleurs scores ML
+        return top_k(scored_properties, limit, lambda x: x['ml_score'])
     
     def _create_user_profile(self, preferences: Dict[str, Any], 
-                           favorites: List[Dict[str, Any]], 
+                           behavior: Dict[str, Any], 
                            patterns: Dict[str, Any]) -> Dict[str, Any]:
-        """Crée un profil utilisateur consolidé"""
+        """Crée un profil utilisateur consolidé (favoris : agrégats du profil comportemental)"""
         
         profile = {
             'explicit_preferences': preferences or {},
@@ -675,31 +637,17 @@ class SmartSearchEngine(SearchEngine):
             'behavior_patterns': patterns
         }
         
-        # Analyser les favoris pour extraire les préférences implicites
-        if favorites:
-            favorite_types = {}
-            favorite_locations = {}
-            price_range = []
-            
-            for fav in favorites:
-                # Types préférés
-                prop_type = fav['property_type']
-                favorite_types[prop_type] = favorite_types.get(prop_type, 0) + 1
-                
-                # Localisations préférées
-                location = fav.get('city', fav.get('location', ''))
-                favorite_locations[location] = favorite_locations.get(location, 0) + 1
-                
-                # Fourchette de prix
-                price_range.append(fav['price'])
+        # Préférences implicites issues des favoris
+        if behavior and behavior.get('favorite_count'):
+            price_range = behavior.get('favorite_price') or {}
             
             profile['implicit_preferences'] = {
-                'favorite_types': favorite_types,
-                'favorite_locations': favorite_locations,
+                'favorite_types': behavior.get('favorite_property_types', {}),
+                'favorite_locations': behavior.get('favorite_locations', {}),
                 'price_range': {
-                    'min': min(price_range) if price_range else 0,
-                    'max': max(price_range) if price_range else 0,
-                    'avg': sum(price_range) / len(price_range) if price_range else 0
+                    'min': price_range.get('min') or 0,
+                    'max': price_range.get('max') or 0,
+                    'avg': price_range.get('avg') or 0
                 }
             }
         
@@ -0,0 +1,120 @@
+"""
+Préférences de recherche des utilisateurs en mémoire
+Cache LRU borné devant les compteurs agrégés de database.search_events,
+mis à jour à chaque recherche enregistrée par ce processus
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from database.search_events import (
+    DEFAULT_SEARCH_HISTORY_CONFIG, PATTERN_KEYS, search_counters, search_stats_increment
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SearchHistory:
+    """
+    Historique persistant des recherches et préférences déduites
+
+    record() écrit en base (événement et compteurs) puis met à jour l'entrée
+    en mémoire de l'utilisateur ; patterns() la lit sans requête tant
+    qu'elle est en cache. Au plus cache_users utilisateurs sont conservés,
+    chacun avec au plus max_pattern_values valeurs par compteur : une valeur
+    nouvelle remplace la moins fréquente, comme le classement de la base.
+    """
+
+    def __init__(self, db, cache_users: Optional[int] = None):
+        self.db = db
+        self.config = dict(DEFAULT_SEARCH_HISTORY_CONFIG, **getattr(db, 'search_history_config', {}))
+        self.cache_users = cache_users if cache_users is not None else self.config['cache_users']
+
+        self._patterns: 'OrderedDict[int, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {'hits': 0, 'misses': 0, 'evictions': 0, 'records': 0}
+
+    def record(self, user_id: Optional[int], query: str, filters: Optional[Dict[str, Any]]) -> Optional[int]:
+        """
+        Enregistre une recherche
+
+        Returns:
+            int: ID de l'événement, None si l'utilisateur est anonyme ou en cas d'erreur
+        """
+        if user_id is None:
+            return None
+
+        event_id = self.db.log_search_event(user_id, query, filters)
+        if event_id is None:
+            # Compteurs en base inchangés : l'entrée en mémoire reste exacte
+            return None
+
+        with self._lock:
+            self._metrics['records'] += 1
+            patterns = self._patterns.get(user_id)
+            if patterns is not None:
+                self._apply(patterns, query, filters)
+        return event_id
+
+    def patterns(self, user_id: int) -> Dict[str, Any]:
+        """Préférences de l'utilisateur (voir database.search_events.build_patterns), copie"""
+        with self._lock:
+            patterns = self._patterns.get(user_id)
+            if patterns is not None:
+                self._patterns.move_to_end(user_id)
+                self._metrics['hits'] += 1
+                return _copy_patterns(patterns)
+            self._metrics['misses'] += 1
+
+        patterns = self.db.get_search_patterns(user_id)
+
+        with self._lock:
+            # Une recherche enregistrée pendant la lecture est déjà en base
+            if user_id not in self._patterns:
+                self._patterns[user_id] = patterns
+                while len(self._patterns) > self.cache_users:
+                    self._patterns.popitem(last=False)
+                    self._metrics['evictions'] += 1
+            return _copy_patterns(self._patterns[user_id])
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Oublie les préférences en mémoire d'un utilisateur (toutes si None)"""
+        with self._lock:
+            if user_id is None:
+                self._patterns.clear()
+            else:
+                self._patterns.pop(user_id, None)
+
+    def get_metrics(self) -> Dict[str, int]:
+        """Compteurs du cache et nombre d'utilisateurs conservés"""
+        with self._lock:
+            return dict(self._metrics, users=len(self._patterns))
+
+    def _apply(self, patterns: Dict[str, Any], query: str, filters: Optional[Dict[str, Any]]):
+        """Reporte une recherche sur une entrée en mémoire"""
+        max_values = self.config['max_pattern_values']
+        for kind, value in search_counters(filters):
+            counts = patterns[PATTERN_KEYS[kind]]
+            counts[value] = counts.get(value, 0) + 1
+            if len(counts) > max_values:
+                del counts[min(counts, key=lambda key: (counts[key], key))]
+
+        patterns['search_frequency'] += 1
+
+        price_max_sum, price_max_count = search_stats_increment(filters)
+        if price_max_count:
+            previous_sum = (patterns['average_price_max'] or 0) * patterns['price_max_count']
+            patterns['price_max_count'] += price_max_count
+            patterns['average_price_max'] = (previous_sum + price_max_sum) / patterns['price_max_count']
+
+        patterns['recent_queries'] = (patterns['recent_queries'] + [query])[-self.config['recent_queries']:]
+
+
+def _copy_patterns(patterns: Dict[str, Any]) -> Dict[str, Any]:
+    """Copie protégeant l'entrée en cache des modifications de l'appelant"""
+    copied = dict(patterns)
+    for key in PATTERN_KEYS.values():
+        copied[key] = dict(patterns[key])
+    copied['recent_queries'] = list(patterns['recent_queries'])
+    return copied
@@ -3,19 +3,40 @@ Algorithmes de matching utilisateur/propriétés pour ImoMatch
 """
 import logging
 import math
+import threading
+import time
 from typing import Dict, List, Any, Tuple, Optional
 from datetime import datetime
 
-from utils.helpers import calculate_distance
+import numpy as np
+
 from database.manager import get_database
+from database.snapshot import PropertySnapshot, get_property_snapshot
+from search.ranking import top_k_indices
+from search.collaborative import ItemNeighborIndex, interaction_weight, DEFAULT_NEIGHBORS
+from search.similarity_index import get_similar_listings
 
 logger = logging.getLogger(__name__)
 
+COLLABORATIVE_MAX_AGE = 3600.0   # Secondes avant reconstruction de la table des voisins
+
+# Critères d'équipement -> équipements de la copie en colonnes (au moins un
+# requis), mêmes correspondances que les libellés de _calculate_features_score ;
+# 'furnished' n'a pas de colonne et n'est jamais satisfait
+CRITERIA_FEATURES = {
+    'has_garage': ('garage',),
+    'has_garden': ('garden',),
+    'has_pool': ('swimming_pool',),
+    'has_balcony': ('balcony', 'terrace'),
+    'furnished': (),
+}
+
 class PropertyMatcher:
     """Classe pour le matching de propriétés selon les préférences utilisateur"""
     
     def __init__(self):
         self.db = get_database()
+        self.snapshot = get_property_snapshot()
         self.weight_config = {
             'price': 0.25,
             'location': 0.20,
@@ -110,6 +131,58 @@ class PropertyMatcher:
             logger.error(f"Erreur calcul score matching: {e}")
             return 0.0
     
+    def score_batch(self, user_preferences: Dict[str, Any], snapshot,
+                    user_behavior: Dict[str, Any] = None) -> np.ndarray:
+        """
+        Scores de compatibilité de toutes les annonces d'une copie en colonnes
+        
+        Mêmes formules et mêmes branches que calculate_match_score, évaluées
+        colonne par colonne : les critères texte (ville, type) sont calculés
+        une fois par valeur distincte puis diffusés par leur code. Une annonce
+        dont une valeur utile au calcul est NULL obtient 0, comme l'erreur
+        rattrapée du calcul unitaire.
+        
+        Args:
+            user_preferences: Préférences explicites de l'utilisateur
+            snapshot: PropertySnapshot ou état PropertyColumns
+            user_behavior: Données comportementales (historique, favoris)
+            
+        Returns:
+            np.ndarray: Score entre 0 et 1 par position de la copie
+        """
+        columns = snapshot.get() if isinstance(snapshot, PropertySnapshot) else snapshot
+        count = len(columns)
+        
+        try:
+            failed = columns.city_codes < 0  # location.lower() sur None
+            total_score = np.zeros(count)
+            total_weight = 0.0
+            
+            with np.errstate(divide='ignore', invalid='ignore'):
+                for scorer in (self._batch_price_score, self._batch_location_score,
+                               self._batch_type_score, self._batch_surface_score,
+                               self._batch_bedrooms_score, self._batch_bathrooms_score,
+                               self._batch_features_score):
+                    score, weight, missing = scorer(columns, user_preferences)
+                    total_score = total_score + score * weight
+                    total_weight += weight
+                    if missing is not None:
+                        failed |= missing
+                
+                if user_behavior:
+                    total_score = total_score + self._batch_behavior_bonus(columns, user_behavior) * 0.1
+                    total_weight += 0.1
+                
+                final_score = total_score / total_weight if total_weight > 0 else np.zeros(count)
+            
+            final_score = np.minimum(1.0, np.maximum(0.0, final_score))
+            final_score[failed] = 0.0
+            return final_score
+            
+        except Exception as e:
+            logger.error(f"Erreur calcul scores matching: {e}")
+            return np.zeros(count)
+    
     def find_matches(self, user_id: int, limit: int = 10, 
                     min_score: float = 0.3) -> List[Dict[str, Any]]:
         """
@@ -133,28 +206,25 @@ class PropertyMatcher:
             # Récupérer le comportement utilisateur
             user_behavior = self._get_user_behavior(user_id)
             
-            # Récupérer toutes les propriétés disponibles
-            all_properties = self.db.search_properties({'is_available': True})
+            # Scorer toutes les annonces actives en une passe sur la copie en colonnes
+            columns = self.snapshot.get()
+            scores = self.score_batch(user_preferences, columns, user_behavior)
             
-            # Calculer les scores
-            scored_properties = []
+            # Meilleurs scores (ex aequo : annonces les plus récentes)
+            best = top_k_indices(scores, limit, columns.created_at, columns.ids, min_score)
+            positions = {int(columns.ids[position]): position for position in best}
             
-            for property_data in all_properties:
-                score = self.calculate_match_score(
-                    property_data, user_preferences, user_behavior
+            scored_properties = []
+            for property_data in self.db.get_properties_by_ids(list(positions)):
+                position = positions[property_data['id']]
+                score = float(scores[position])
+                property_data['match_score'] = score
+                property_data['match_explanation'] = self._generate_match_explanation(
+                    columns.as_listing(position), user_preferences, score
                 )
-                
-                if score >= min_score:
-                    property_data['match_score'] = score
-                    property_data['match_explanation'] = self._generate_match_explanation(
-                        property_data, user_preferences, score
-                    )
-                    scored_properties.append(property_data)
-            
-            # Trier par score décroissant
-            scored_properties.sort(key=lambda x: x['match_score'], reverse=True)
+                scored_properties.append(property_data)
             
-            return scored_properties[:limit]
+            return scored_properties
             
         except Exception as e:
             logger.error(f"Erreur recherche matches: {e}")
@@ -173,31 +243,15 @@ class PropertyMatcher:
             Liste des propriétés similaires
         """
         try:
-            # Récupérer la propriété de référence
-            reference = self.db.get_property_by_id(reference_property_id)
-            if not reference:
-                return []
-            
-            # Récupérer toutes les autres propriétés
-            all_properties = self.db.search_properties({'is_available': True})
-            other_properties = [p for p in all_properties if p['id'] != reference_property_id]
+            # Voisins dans l'index des annonces actives (voir search.similarity_index)
+            neighbors = get_similar_listings().similar(reference_property_id, limit, min_similarity=0.3)
+            scores = dict(neighbors)
             
-            # Calculer la similarité
-            similar_properties = []
-            
-            for property_data in other_properties:
-                similarity_score = self._calculate_property_similarity(
-                    reference, property_data
-                )
-                
-                if similarity_score > 0.3:  # Seuil de similarité
-                    property_data['similarity_score'] = similarity_score
-                    similar_properties.append(property_data)
+            similar_properties = self.db.get_properties_by_ids([property_id for property_id, _ in neighbors])
+            for property_data in similar_properties:
+                property_data['similarity_score'] = scores[property_data['id']]
             
-            # Trier par similarité décroissante
-            similar_properties.sort(key=lambda x: x['similarity_score'], reverse=True)
-            
-            return similar_properties[:limit]
+            return similar_properties
             
         except Exception as e:
             logger.error(f"Erreur propriétés similaires: {e}")
@@ -378,6 +432,135 @@ class PropertyMatcher:
         score = satisfied_criteria / total_criteria
         return score, weight
     
+    # === VERSIONS VECTORISÉES (score_batch) ===
+    # Chaque méthode retourne (scores, poids, masque des annonces en erreur ou None)
+    
+    def _batch_price_score(self, columns, user_preferences: Dict) -> Tuple[np.ndarray, float, Optional[np.ndarray]]:
+        weight = self.weight_config['price']
+        
+        price = columns.price
+        user_budget_min = user_preferences.get('budget_min', 0)
+        user_budget_max = user_preferences.get('budget_max', float('inf'))
+        
+        if user_budget_max == 0:
+            return np.full(len(price), 0.5), weight, None
+        
+        if user_budget_max > user_budget_min:
+            position = (price - user_budget_min) / (user_budget_max - user_budget_min)
+            in_budget = 1.0 - np.abs(position - 0.5) * 0.4
+        else:
+            in_budget = 1.0
+        
+        ratio = price / user_budget_min if user_budget_min > 0 else 1
+        below_budget = 0.8 + (1.0 - ratio) * 0.2
+        excess_ratio = (price - user_budget_max) / user_budget_max
+        over_budget = np.maximum(0.0, 0.5 - excess_ratio * 0.5)
+        
+        score = np.where((user_budget_min <= price) & (price <= user_budget_max), in_budget,
+                         np.where(price < user_budget_min, below_budget, over_budget))
+        return score, weight, np.isnan(price)
+    
+    def _batch_location_score(self, columns, user_preferences: Dict) -> Tuple[np.ndarray, float, Optional[np.ndarray]]:
+        weight = self.weight_config['location']
+        preferred_location = user_preferences.get('location', '').lower()
+        
+        def score(city: str) -> float:
+            return self._calculate_location_score({'location': city}, user_preferences)[0]
+        
+        if not preferred_location:
+            return np.full(len(columns), 0.5), weight, None
+        return columns.map_cities(score, 0.0), weight, None
+    
+    def _batch_type_score(self, columns, user_preferences: Dict) -> Tuple[np.ndarray, float, Optional[np.ndarray]]:
+        weight = self.weight_config['property_type']
+        
+        def score(property_type: Optional[str]) -> float:
+            return self._calculate_type_score({'property_type': property_type}, user_preferences)[0]
+        
+        return columns.map_property_types(score, score(None)), weight, None
+    
+    def _batch_surface_score(self, columns, user_preferences: Dict) -> Tuple[np.ndarray, float, Optional[np.ndarray]]:
+        weight = self.weight_config['surface']
+        
+        surface = columns.surface
+        min_surface = user_preferences.get('surface_min', 0)
+        
+        if min_surface == 0:
+            return np.full(len(surface), 0.5), weight, None
+        
+        excess_ratio = (surface - min_surface) / min_surface
+        deficit_ratio = surface / min_surface
+        score = np.where(surface >= min_surface, np.minimum(1.0, 0.8 + excess_ratio * 0.2), deficit_ratio * 0.6)
+        return score, weight, np.isnan(surface)
+    
+    def _batch_bedrooms_score(self, columns, user_preferences: Dict) -> Tuple[np.ndarray, float, Optional[np.ndarray]]:
+        weight = self.weight_config['bedrooms']
+        
+        bedrooms = columns.bedrooms
+        desired_bedrooms = user_preferences.get('bedrooms', 0)
+        
+        if desired_bedrooms == 0:
+            return np.full(len(bedrooms), 0.5), weight, None
+        
+        score = np.where(bedrooms >= desired_bedrooms, 1.0,
+                         np.where(bedrooms == desired_bedrooms - 1, 0.7, 0.3))
+        return score, weight, np.isnan(bedrooms)
+    
+    def _batch_bathrooms_score(self, columns, user_preferences: Dict) -> Tuple[np.ndarray, float, Optional[np.ndarray]]:
+        weight = self.weight_config['bathrooms']
+        
+        bathrooms = columns.bathrooms
+        desired_bathrooms = user_preferences.get('bathrooms', 0)
+        
+        if desired_bathrooms == 0:
+            return np.full(len(bathrooms), 0.5), weight, None
+        
+        ratio = bathrooms / desired_bathrooms if desired_bathrooms > 0 else 0
+        score = np.where(bathrooms >= desired_bathrooms, 1.0, ratio * 0.8)
+        return score, weight, np.isnan(bathrooms)
+    
+    def _batch_features_score(self, columns, user_preferences: Dict) -> Tuple[np.ndarray, float, Optional[np.ndarray]]:
+        weight = self.weight_config['features']
+        desired_criteria = user_preferences.get('criteria', {})
+        
+        if not desired_criteria:
+            return np.full(len(columns), 0.5), weight, None
+        
+        satisfied_criteria = np.zeros(len(columns))
+        total_criteria = 0
+        
+        for criterion, desired in desired_criteria.items():
+            if desired and criterion in CRITERIA_FEATURES:
+                total_criteria += 1
+                features = CRITERIA_FEATURES[criterion]
+                if features:
+                    satisfied_criteria += columns.has_any_feature(*features)
+        
+        if total_criteria == 0:
+            return np.full(len(columns), 0.5), weight, None
+        
+        return satisfied_criteria / total_criteria, weight, None
+    
+    def _batch_behavior_bonus(self, columns, user_behavior: Dict) -> np.ndarray:
+        favorite_types = user_behavior.get('favorite_property_types', {})
+        searched_locations = user_behavior.get('searched_locations', {})
+        total_favorites = sum(favorite_types.values())
+        
+        def type_bonus(property_type: Optional[str]) -> float:
+            if property_type in favorite_types:
+                return (favorite_types[property_type] / total_favorites) * 0.2 if total_favorites > 0 else 0
+            return 0.0
+        
+        def location_bonus(city: str) -> float:
+            property_location = city.lower()
+            for searched_loc, count in searched_locations.items():
+                if searched_loc.lower() in property_location:
+                    return min(0.1, count * 0.02)
+            return 0.0
+        
+        bonus = columns.map_property_types(type_bonus, type_bonus(None)) + columns.map_cities(location_bonus, 0.0)
+        return np.minimum(0.3, bonus)
+    
     def _calculate_behavior_bonus(self, property_data: Dict, user_behavior: Dict) -> float:
         """Calcule un bonus basé sur le comportement utilisateur"""
         bonus = 0.0
@@ -403,75 +586,10 @@ class PropertyMatcher:
         
         return min(0.3, bonus)  # Bonus maximum de 0.3
     
-    def _calculate_property_similarity(self, prop1: Dict, prop2: Dict) -> float:
-        """Calcule la similarité entre deux propriétés"""
-        similarity_score = 0.0
-        
-        # Similarité de prix (±20%)
-        price1, price2 = prop1.get('price', 0), prop2.get('price', 0)
-        if price1 > 0 and price2 > 0:
-            price_diff = abs(price1 - price2) / max(price1, price2)
-            price_sim = max(0, 1 - price_diff / 0.2) * 0.3
-            similarity_score += price_sim
-        
-        # Même type de propriété
-        if prop1.get('property_type') == prop2.get('property_type'):
-            similarity_score += 0.25
-        
-        # Similarité de surface (±30%)
-        surface1, surface2 = prop1.get('surface', 0), prop2.get('surface', 0)
-        if surface1 > 0 and surface2 > 0:
-            surface_diff = abs(surface1 - surface2) / max(surface1, surface2)
-            surface_sim = max(0, 1 - surface_diff / 0.3) * 0.2
-            similarity_score += surface_sim
-        
-        # Même nombre de chambres
-        if prop1.get('bedrooms') == prop2.get('bedrooms'):
-            similarity_score += 0.15
-        
-        # Proximité géographique
-        if (prop1.get('latitude') and prop1.get('longitude') and 
-            prop2.get('latitude') and prop2.get('longitude')):
-            
-            distance = calculate_distance(
-                prop1['latitude'], prop1['longitude'],
-                prop2['latitude'], prop2['longitude']
-            )
-            
-            # Similarité max si distance < 5km
-            geo_sim = max(0, 1 - distance / 10) * 0.1
-            similarity_score += geo_sim
-        
-        return min(1.0, similarity_score)
-    
     def _get_user_behavior(self, user_id: int) -> Dict[str, Any]:
-        """Récupère les données comportementales de l'utilisateur"""
+        """Données comportementales de l'utilisateur (profil agrégé, voir database.behavior_profile)"""
         try:
-            behavior = {}
-            
-            # Analyser les favoris
-            favorites = self.db.get_user_favorites(user_id)
-            if favorites:
-                favorite_types = {}
-                for fav in favorites:
-                    prop_type = fav['property_type']
-                    favorite_types[prop_type] = favorite_types.get(prop_type, 0) + 1
-                
-                behavior['favorite_property_types'] = favorite_types
-            
-            # Analyser les recherches sauvegardées
-            saved_searches = self.db.get_saved_searches(user_id)
-            if saved_searches:
-                searched_locations = {}
-                for search in saved_searches:
-                    filters = search.get('filters', {})
-                    location = filters.get('location', '')
-                    if location:
-                        searched_locations[location] = searched_locations.get(location, 0) + 1
-                
-                behavior['searched_locations'] = searched_locations
-            
-            return behavior
+            return self.db.get_user_behavior_profile(user_id)
             
         except Exception as e:
             logger.error(f"Erreur récupération comportement utilisateur {user_id}: {e}")
@@ -514,90 +632,126 @@ class PropertyMatcher:
 
 
 class CollaborativeFilter:
-    """Filtrage collaboratif pour les recommandations"""
+    """
+    Filtrage collaboratif par annonces pour les recommandations
+
+    La table des voisins (voir search.collaborative) est construite dans un
+    thread de fond au premier appel puis toutes les max_age secondes, ou
+    par rebuild() depuis une tâche périodique ; les requêtes sont servies
+    par la table en place pendant la construction (aucune recommandation
+    avant la première). Entre deux constructions, les favoris ajoutés sont
+    relus par id croissant et intégrés un à un ; un nombre de favoris
+    inattendu fait relire leurs ids, et les favoris retirés sont sortis de
+    la table un à un.
+    """
     
-    def __init__(self):
-        self.db = get_database()
+    def __init__(self, db=None, max_age: float = COLLABORATIVE_MAX_AGE,
+                 neighbors: int = DEFAULT_NEIGHBORS):
+        self.db = db or get_database()
+        self.max_age = max_age
+        self.index = ItemNeighborIndex(neighbors=neighbors)
+        
+        self._built_at = None
+        self._last_id = 0
+        self._favorites: Dict[int, Tuple[int, int]] = {}   # id du favori -> (user_id, property_id)
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_thread: Optional[threading.Thread] = None
     
     def get_collaborative_recommendations(self, user_id: int, 
                                         limit: int = 10) -> List[Dict[str, Any]]:
         """
-        Recommandations basées sur les utilisateurs similaires
+        Recommandations basées sur les annonces proches des favoris de l'utilisateur
         
         Args:
             user_id: ID de l'utilisateur
             limit: Nombre de recommandations
             
         Returns:
-            Liste des propriétés recommandées
+            Liste des propriétés recommandées (actives), avec recommendation_score
         """
         try:
-            # Trouver des utilisateurs similaires
-            similar_users = self._find_similar_users(user_id)
+            self._sync()
             
-            if not similar_users:
-                return []
-            
-            # Récupérer les favoris des utilisateurs similaires
-            recommended_properties = {}
+            # Marge pour les annonces retirées de la vente depuis leur mise en favori
+            ranked = self.index.recommend(user_id, limit * 2)
+            scores = dict(ranked)
             
-            for similar_user_id, similarity_score in similar_users:
-                user_favorites = self.db.get_user_favorites(similar_user_id)
-                
-                for favorite in user_favorites:
-                    prop_id = favorite['id']
-                    if prop_id not in recommended_properties:
-                        recommended_properties[prop_id] = {
-                            'property': favorite,
-                            'recommendation_score': 0.0,
-                            'recommender_count': 0
-                        }
-                    
-                    recommended_properties[prop_id]['recommendation_score'] += similarity_score
-                    recommended_properties[prop_id]['recommender_count'] += 1
-            
-            # Exclure les propriétés déjà en favoris de l'utilisateur
-            user_favorites = self.db.get_user_favorites(user_id)
-            user_favorite_ids = {fav['id'] for fav in user_favorites}
-            
-            recommendations = [
-                data for prop_id, data in recommended_properties.items()
-                if prop_id not in user_favorite_ids
-            ]
-            
-            # Trier par score et prendre les meilleures
-            recommendations.sort(
-                key=lambda x: x['recommendation_score'], 
-                reverse=True
-            )
+            recommendations = []
+            for property_data in self.db.get_properties_by_ids([property_id for property_id, _ in ranked]):
+                if property_data.get('listing_status', 'active') != 'active':
+                    continue
+                property_data['recommendation_score'] = scores[property_data['id']]
+                recommendations.append(property_data)
             
-            return [rec['property'] for rec in recommendations[:limit]]
+            return recommendations[:limit]
             
         except Exception as e:
             logger.error(f"Erreur recommandations collaboratives: {e}")
             return []
     
-    def _find_similar_users(self, user_id: int, limit: int = 10) -> List[Tuple[int, float]]:
-        """Trouve des utilisateurs similaires basés sur les préférences et favoris"""
+    def rebuild(self) -> Dict[str, int]:
+        """Reconstruit la matrice et la table des voisins (à exécuter périodiquement)"""
+        with self._rebuild_lock:
+            rows = self.db.fetch_favorite_interactions()
+            index = ItemNeighborIndex(
+                neighbors=self.index.neighbors, shrinkage=self.index.shrinkage, max_pairs=self.index.max_pairs
+            )
+            index.build(rows)
+            
+            # Remplacement atomique : les favoris postérieurs à la lecture seront relus par _sync
+            with self._lock:
+                self.index = index
+                self._favorites = {favorite_id: (user_id, property_id)
+                                   for favorite_id, user_id, property_id, _ in rows}
+                self._last_id = rows[-1][0] if rows else 0
+                self._built_at = time.monotonic()
+        
+        logger.info(f"Filtrage collaboratif reconstruit: {index.get_metrics()}")
+        return index.get_metrics()
+    
+    def _sync(self):
+        """Lance la reconstruction si besoin et intègre à la table en place les favoris ajoutés ou retirés"""
+        with self._lock:
+            if self._built_at is None:
+                self._start_rebuild()
+                return
+            if time.monotonic() - self._built_at >= self.max_age:
+                self._start_rebuild()
+            
+            state = self.db.get_favorites_state()
+            if state['last_id'] == self._last_id and state['count'] == len(self._favorites):
+                return
+            
+            added = [row for row in self.db.fetch_favorite_interactions(self._last_id) if row[0] <= state['last_id']]
+            if len(self._favorites) + len(added) != state['count']:
+                # Retraits (ou écritures concurrentes) : favoris connus absents de la base
+                current = self.db.fetch_favorite_ids(state['last_id'])
+                for favorite_id in [favorite_id for favorite_id in self._favorites if favorite_id not in current]:
+                    user_id, property_id = self._favorites.pop(favorite_id)
+                    self.index.remove_interaction(user_id, property_id)
+                added = [row for row in added if row[0] in current]
+            
+            for favorite_id, user_id, property_id, interest_level in added:
+                self.index.add_interaction(user_id, property_id, interaction_weight(interest_level))
+                self._favorites[favorite_id] = (user_id, property_id)
+            self._last_id = state['last_id']
+    
+    def _start_rebuild(self):
+        """Lance rebuild() dans un thread de fond s'il ne tourne pas déjà"""
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            return
+        self._rebuild_thread = threading.Thread(
+            target=self._run_rebuild, name='collaborative-rebuild', daemon=True
+        )
+        self._rebuild_thread.start()
+    
+    def _run_rebuild(self):
+        """Corps du thread de reconstruction"""
         try:
-            target_user_prefs = self.db.get_user_preferences(user_id)
-            target_user_favorites = self.db.get_user_favorites(user_id)
-            
-            if not target_user_prefs and not target_user_favorites:
-                return []
-            
-            # Récupérer tous les autres utilisateurs
-            # (Dans une vraie implémentation, optimiser cette requête)
-            similar_users = []
-            
-            # Logique simplifiée : comparer les préférences
-            # Dans une vraie implémentation, utiliser des algorithmes plus sophistiqués
-            
-            return similar_users[:limit]
-            
+            self.rebuild()
         except Exception as e:
-            logger.error(f"Erreur recherche utilisateurs similaires: {e}")
-            return []
+            logger.error(f"Erreur reconstruction filtrage collaboratif: {e}")
 
 
 # Instance globale
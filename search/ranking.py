@@ -0,0 +1,96 @@
+"""
+Sélection des k meilleurs résultats (matching, recommandations)
+Les ex aequo sont départagés comme le tri par défaut des recherches
+(date_desc) : annonce la plus récente d'abord, puis id décroissant
+"""
+import heapq
+from typing import Any, Callable, Iterable, List, Mapping, Optional, TypeVar
+
+import numpy as np
+
+T = TypeVar('T')
+
+
+def tie_break_key(listing: Mapping[str, Any]) -> tuple:
+    """Clé de départage d'une annonce (dict ou enregistrement) : (created_at, id)"""
+    created_at = listing.get('created_at')
+    return ('' if created_at is None else str(created_at), listing.get('id') or 0)
+
+
+def top_k(items: Iterable[T], k: Optional[int], score: Callable[[T], float],
+          listing: Callable[[T], Mapping[str, Any]] = None) -> List[T]:
+    """
+    Les k éléments de meilleur score, du meilleur au moins bon
+
+    Tas de taille k sur les scores : O(n log k) au lieu du tri complet de
+    la liste ; seuls les candidats retenus sont triés avec le départage.
+
+    Args:
+        items: Candidats
+        k: Nombre d'éléments retenus (None : tous, triés)
+        score: Score d'un élément (le plus grand est le meilleur)
+        listing: Annonce d'un élément, pour départager les ex aequo
+            (par défaut l'élément lui-même)
+
+    Returns:
+        List: Éléments retenus, par score décroissant
+    """
+    def key(item):
+        return (score(item),) + tie_break_key(listing(item) if listing else item)
+
+    if k is None:
+        return sorted(items, key=key, reverse=True)
+    if k <= 0:
+        return []
+
+    # Seuil du k-ième score sur les seuls scores, puis départage des
+    # candidats qui l'atteignent (k éléments plus les ex aequo du seuil)
+    items = list(items)
+    scores = list(map(score, items))
+    if len(items) > k:
+        threshold = heapq.nlargest(k, scores)[-1]
+        items = [item for item, value in zip(items, scores) if value >= threshold]
+    return sorted(items, key=key, reverse=True)[:k]
+
+
+def top_k_indices(scores: np.ndarray, k: Optional[int], created_at: Optional[np.ndarray] = None,
+                  ids: Optional[np.ndarray] = None, min_score: Optional[float] = None) -> np.ndarray:
+    """
+    Positions des k meilleurs scores d'un tableau, du meilleur au moins bon
+
+    argpartition isole les k meilleurs en O(n) ; seuls ces candidats (et
+    les ex aequo du k-ième) sont triés.
+
+    Args:
+        scores: Score par position
+        k: Nombre de positions retenues (None : toutes, triées)
+        created_at: Dates de création (datetime64) pour départager les ex aequo
+        ids: IDs des annonces, départage final
+        min_score: Score minimum requis
+
+    Returns:
+        np.ndarray: Positions retenues
+    """
+    candidates = np.arange(len(scores)) if min_score is None else np.flatnonzero(scores >= min_score)
+    values = scores[candidates]
+
+    if k is not None:
+        if k <= 0:
+            return candidates[:0]
+        if k < len(candidates):
+            threshold = np.partition(values, len(values) - k)[len(values) - k]
+            kept = values >= threshold
+            candidates, values = candidates[kept], values[kept]
+
+    # lexsort : dernière clé prioritaire ; l'ordre croissant inversé donne
+    # score, date puis id décroissants (NaT = plus ancien)
+    keys = []
+    if ids is not None:
+        keys.append(ids[candidates])
+    if created_at is not None:
+        keys.append(created_at[candidates].view('i8'))
+    keys.append(values)
+    order = np.lexsort(keys)[::-1]
+
+    selected = candidates[order]
+    return selected if k is None else selected[:k]
@@ -0,0 +1,431 @@
+"""
+Matching inverse : utilisateurs intéressés par une nouvelle annonce
+Les critères des profils (budget, surface, chambres en index triés ; villes
+et types de bien en listes inversées) ne laissent scorer que les
+utilisateurs capables d'atteindre le seuil d'alerte
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+from itertools import combinations
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from search.matching import PropertyMatcher, get_property_matcher
+
+logger = logging.getLogger(__name__)
+
+USER_PROFILE_COLUMNS = [
+    'budget_min', 'budget_max', 'property_types', 'preferred_locations', 'surface_min', 'bedrooms_min'
+]
+
+DEFAULT_ALERT_THRESHOLD = 0.7
+DEFAULT_MAX_AGE = 300.0   # Secondes avant relecture complète des profils
+
+# Au-delà de ces marges un critère est "manqué" : son score est plafonné par
+# MISS_SCORES (bornes des méthodes _calculate_*_score de PropertyMatcher)
+PRICE_TOLERANCE = 0.2   # Prix > budget_max * 1.2 : score prix < 0.4
+SURFACE_RATIO = 0.8     # Surface < surface_min * 0.8 : score surface < 0.48
+BEDROOMS_SLACK = 1      # Chambres < bedrooms_min - 1 : score chambres 0.3
+
+MISS_SCORES = {
+    'price': 0.5 - 0.5 * PRICE_TOLERANCE,
+    'location': 0.0,
+    'property_type': 0.2,
+    'surface': 0.6 * SURFACE_RATIO,
+    'bedrooms': 0.3,
+}
+
+# Critères absents de la table users : score neutre
+NEUTRAL_CRITERIA = ('bathrooms', 'features')
+NEUTRAL_SCORE = 0.5
+
+_UNBOUNDED = float('inf')
+
+
+def _json_list(value: Any) -> List[str]:
+    """Tableau JSON (ou liste) de chaînes non vides"""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            value = [value]
+    if not isinstance(value, (list, tuple)):
+        return []
+    return [str(item) for item in value if item]
+
+
+def user_match_profile(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Critères d'un utilisateur, normalisés pour le matching inverse
+
+    Valeurs absentes à 0 (critère neutre), villes en minuscules, fourchette
+    de budget inversée remise dans l'ordre.
+    """
+    budget_min = row.get('budget_min') or 0
+    budget_max = row.get('budget_max') or 0
+    if budget_min > budget_max > 0:
+        budget_min, budget_max = budget_max, budget_min
+
+    return {
+        'budget_min': budget_min,
+        'budget_max': budget_max,
+        'property_types': sorted(set(_json_list(row.get('property_types')))),
+        'locations': sorted({location.lower() for location in _json_list(row.get('preferred_locations'))}),
+        'surface_min': row.get('surface_min') or 0,
+        'bedrooms_min': row.get('bedrooms_min') or 0,
+    }
+
+
+class _SortedIndex:
+    """Index trié (valeur, id utilisateur) : utilisateurs d'une borne en O(log n + m)"""
+
+    def __init__(self, entries: Iterable[Tuple[float, int]] = ()):
+        self._entries = sorted(entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, value: float, user_id: int):
+        bisect.insort(self._entries, (value, user_id))
+
+    def remove(self, value: float, user_id: int):
+        position = bisect.bisect_left(self._entries, (value, user_id))
+        if position < len(self._entries) and self._entries[position] == (value, user_id):
+            del self._entries[position]
+
+    def at_most(self, bound: float) -> Tuple[int, Callable[[], Iterable[int]]]:
+        """(nombre, itérateur) des utilisateurs de valeur <= bound"""
+        end = bisect.bisect_right(self._entries, (bound, _UNBOUNDED))
+        return end, lambda: (user_id for _, user_id in self._entries[:end])
+
+    def at_least(self, bound: float) -> Tuple[int, Callable[[], Iterable[int]]]:
+        """(nombre, itérateur) des utilisateurs de valeur >= bound"""
+        start = bisect.bisect_left(self._entries, (bound, -_UNBOUNDED))
+        return len(self._entries) - start, lambda: (user_id for _, user_id in self._entries[start:])
+
+
+class ReverseMatcher:
+    """
+    Utilisateurs à alerter pour une annonce
+
+        matcher = get_reverse_matcher()
+        for candidate in matcher.find_interested_users(new_listing):
+            notify(candidate['user_id'], candidate['match_score'])
+
+    Le score est celui de PropertyMatcher.calculate_match_score (mêmes
+    méthodes et mêmes poids), avec pour chaque utilisateur le meilleur de
+    ses types de bien et de ses villes préférés. Chaque critère indexé est
+    soit satisfait (utilisateur retourné par l'index), soit manqué (score
+    plafonné par MISS_SCORES) : seules les combinaisons de critères manqués
+    compatibles avec le seuil sont parcourues, à partir de l'index le plus
+    sélectif. Le résultat est identique au scoring de tous les profils.
+
+    Aucun flux ne l'appelle encore : les alertes envoyées portent sur les
+    recherches sauvegardées (search.alerts). Un appelant qui modifie les
+    critères d'un utilisateur appelle refresh_users([user_id]) ; sans
+    cela, les profils ne sont relus qu'au bout de max_age secondes.
+    """
+
+    def __init__(self, db=None, matcher: Optional[PropertyMatcher] = None,
+                 max_age: float = DEFAULT_MAX_AGE):
+        """
+        Args:
+            db: Gestionnaire de base (par défaut celui du matcher)
+            matcher: PropertyMatcher fournissant les scores par critère
+            max_age: Secondes avant relecture complète des profils
+        """
+        self.matcher = matcher or get_property_matcher()
+        self.db = db or self.matcher.db
+        self.max_age = max_age
+
+        self._profiles: Dict[int, Dict[str, Any]] = {}
+        self._budget_max = _SortedIndex()
+        self._surface_min = _SortedIndex()
+        self._bedrooms_min = _SortedIndex()
+        self._locations: Dict[str, Set[int]] = {}
+        self._property_types: Dict[str, Set[int]] = {}
+        self._any_location: Set[int] = set()
+        self._any_property_type: Set[int] = set()
+
+        self._loaded_at: Optional[float] = None
+        self._required_by_threshold: Dict[float, List[Tuple[str, ...]]] = {}
+        self._lock = threading.RLock()
+        self._metrics = {'queries': 0, 'candidates_scored': 0, 'full_scans': 0, 'reloads': 0}
+
+    def find_interested_users(self, property_data: Dict[str, Any],
+                              threshold: float = DEFAULT_ALERT_THRESHOLD,
+                              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Utilisateurs dont le score pour l'annonce atteint le seuil
+
+        Args:
+            property_data: Annonce (ligne de properties ou format de find_matches)
+            threshold: Score minimum
+            limit: Nombre maximum d'utilisateurs (None : tous)
+
+        Returns:
+            Liste de {'user_id', 'match_score'}, meilleur score d'abord
+        """
+        listing = self._listing(property_data)
+        if listing is None:
+            return []
+
+        try:
+            self._ensure_loaded()
+            with self._lock:
+                location_scores = {
+                    location: self.matcher._calculate_location_score(listing, {'location': location})[0]
+                    for location in self._locations
+                }
+                type_scores = {
+                    property_type: self.matcher._calculate_type_score(listing, {'property_type': property_type})[0]
+                    for property_type in self._property_types
+                }
+
+                candidates = self._candidates(listing, threshold, location_scores, type_scores)
+                results = []
+                for user_id in candidates:
+                    score = self._score(self._profiles[user_id], listing, location_scores, type_scores)
+                    if score >= threshold:
+                        results.append({'user_id': user_id, 'match_score': score})
+
+                self._metrics['queries'] += 1
+                self._metrics['candidates_scored'] += len(candidates)
+
+        except Exception as e:
+            logger.error(f"Erreur matching inverse: {e}")
+            return []
+
+        results.sort(key=lambda result: (-result['match_score'], result['user_id']))
+        return results if limit is None else results[:limit]
+
+    def refresh_users(self, user_ids: Iterable[int]):
+        """Relit les profils de ces utilisateurs (créés, modifiés ou supprimés)"""
+        user_ids = {int(user_id) for user_id in user_ids}
+        if not user_ids or self._loaded_at is None:
+            return
+
+        rows = self.db.fetch_user_columns(USER_PROFILE_COLUMNS, user_ids=sorted(user_ids))
+        with self._lock:
+            for user_id in user_ids:
+                self._remove(user_id)
+            for row in rows:
+                self._add(row[0], user_match_profile(dict(zip(rows.columns, row))))
+
+    def invalidate(self):
+        """Force une relecture complète des profils à la prochaine requête"""
+        with self._lock:
+            self._loaded_at = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Requêtes, candidats scorés par requête et taille des index"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['users'] = len(self._profiles)
+            metrics['locations'] = len(self._locations)
+            metrics['property_types'] = len(self._property_types)
+        metrics['candidates_per_query'] = (
+            metrics['candidates_scored'] / metrics['queries'] if metrics['queries'] else 0.0
+        )
+        return metrics
+
+    # === MÉTHODES PRIVÉES ===
+
+    def _ensure_loaded(self):
+        """Relit tous les profils au premier appel puis toutes les max_age secondes"""
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.max_age:
+                return
+
+            rows = self.db.fetch_user_columns(USER_PROFILE_COLUMNS)
+            self._profiles = {}
+            self._locations = {}
+            self._property_types = {}
+            self._any_location = set()
+            self._any_property_type = set()
+
+            budget_max, surface_min, bedrooms_min = [], [], []
+            for row in rows:
+                user_id = row[0]
+                profile = user_match_profile(dict(zip(rows.columns, row)))
+                self._index_terms(user_id, profile)
+                budget_max.append((profile['budget_max'] or _UNBOUNDED, user_id))
+                surface_min.append((profile['surface_min'], user_id))
+                bedrooms_min.append((profile['bedrooms_min'], user_id))
+
+            self._budget_max = _SortedIndex(budget_max)
+            self._surface_min = _SortedIndex(surface_min)
+            self._bedrooms_min = _SortedIndex(bedrooms_min)
+            self._loaded_at = time.monotonic()
+            self._metrics['reloads'] += 1
+
+    def _add(self, user_id: int, profile: Dict[str, Any]):
+        self._index_terms(user_id, profile)
+        self._budget_max.add(profile['budget_max'] or _UNBOUNDED, user_id)
+        self._surface_min.add(profile['surface_min'], user_id)
+        self._bedrooms_min.add(profile['bedrooms_min'], user_id)
+
+    def _index_terms(self, user_id: int, profile: Dict[str, Any]):
+        self._profiles[user_id] = profile
+        for location in profile['locations']:
+            self._locations.setdefault(location, set()).add(user_id)
+        if not profile['locations']:
+            self._any_location.add(user_id)
+        for property_type in profile['property_types']:
+            self._property_types.setdefault(property_type, set()).add(user_id)
+        if not profile['property_types']:
+            self._any_property_type.add(user_id)
+
+    def _remove(self, user_id: int):
+        profile = self._profiles.pop(user_id, None)
+        if profile is None:
+            return
+
+        for terms, key in ((self._locations, 'locations'), (self._property_types, 'property_types')):
+            for term in profile[key]:
+                users = terms.get(term)
+                if users is not None:
+                    users.discard(user_id)
+                    if not users:
+                        del terms[term]
+        self._any_location.discard(user_id)
+        self._any_property_type.discard(user_id)
+
+        self._budget_max.remove(profile['budget_max'] or _UNBOUNDED, user_id)
+        self._surface_min.remove(profile['surface_min'], user_id)
+        self._bedrooms_min.remove(profile['bedrooms_min'], user_id)
+
+    @staticmethod
+    def _listing(property_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Annonce au format des méthodes de score de PropertyMatcher, None si inactive"""
+        if property_data.get('listing_status', 'active') != 'active':
+            return None
+
+        surface = property_data.get('surface')
+        if surface is None:
+            surface = property_data.get('surface_total')
+        return {
+            'location': property_data.get('location') or property_data.get('city') or '',
+            'property_type': property_data.get('property_type') or '',
+            'price': property_data.get('price') or 0,
+            'surface': surface or 0,
+            'bedrooms': property_data.get('bedrooms') or 0,
+        }
+
+    def _required_criteria(self, threshold: float) -> List[Tuple[str, ...]]:
+        """
+        Groupes de critères à satisfaire ensemble pour atteindre le seuil
+
+        Un groupe par combinaison maximale de critères manqués dont le score
+        plafond reste au-dessus du seuil ; un groupe vide impose de scorer
+        tous les profils.
+        """
+        required = self._required_by_threshold.get(threshold)
+        if required is not None:
+            return required
+
+        weights = self.matcher.weight_config
+        total_weight = sum(weights.values())
+        neutral = sum(weights[criterion] for criterion in NEUTRAL_CRITERIA) * NEUTRAL_SCORE
+
+        feasible = []
+        for size in range(len(MISS_SCORES) + 1):
+            for missed in combinations(MISS_SCORES, size):
+                ceiling = neutral + sum(
+                    weights[criterion] * (MISS_SCORES[criterion] if criterion in missed else 1.0)
+                    for criterion in MISS_SCORES
+                )
+                if ceiling / total_weight >= threshold:
+                    feasible.append(set(missed))
+
+        maximal = [missed for missed in feasible if not any(missed < other for other in feasible)]
+        required = [tuple(criterion for criterion in MISS_SCORES if criterion not in missed) for missed in maximal]
+        self._required_by_threshold[threshold] = required
+        return required
+
+    def _candidates(self, listing: Dict[str, Any], threshold: float,
+                    location_scores: Dict[str, float], type_scores: Dict[str, float]) -> Set[int]:
+        """Profils pouvant atteindre le seuil (à scorer)"""
+        required = self._required_criteria(threshold)
+        if not required:
+            return set()
+        if any(not group for group in required):
+            self._metrics['full_scans'] += 1
+            return set(self._profiles)
+
+        price = listing['price']
+        price_floor = price / (1 + PRICE_TOLERANCE)
+        surface_ceiling = listing['surface'] / SURFACE_RATIO
+        bedrooms_ceiling = listing['bedrooms'] + BEDROOMS_SLACK
+
+        matching_locations = set(self._any_location)
+        for location, score in location_scores.items():
+            if score > MISS_SCORES['location']:
+                matching_locations |= self._locations[location]
+        matching_types = set(self._any_property_type)
+        for property_type, score in type_scores.items():
+            if score > MISS_SCORES['property_type']:
+                matching_types |= self._property_types[property_type]
+
+        # Critère -> ((nombre, itérateur) des utilisateurs qui le satisfont, test d'appartenance)
+        profiles = self._profiles
+        criteria = {
+            'price': (self._budget_max.at_least(price_floor),
+                      lambda user_id: (profiles[user_id]['budget_max'] or _UNBOUNDED) >= price_floor),
+            'location': ((len(matching_locations), lambda: iter(matching_locations)),
+                         matching_locations.__contains__),
+            'property_type': ((len(matching_types), lambda: iter(matching_types)),
+                              matching_types.__contains__),
+            'surface': (self._surface_min.at_most(surface_ceiling),
+                        lambda user_id: profiles[user_id]['surface_min'] <= surface_ceiling),
+            'bedrooms': (self._bedrooms_min.at_most(bedrooms_ceiling),
+                         lambda user_id: profiles[user_id]['bedrooms_min'] <= bedrooms_ceiling),
+        }
+
+        candidates = set()
+        for group in required:
+            driver = min(group, key=lambda criterion: criteria[criterion][0][0])
+            others = [criteria[criterion][1] for criterion in group if criterion != driver]
+            for user_id in criteria[driver][0][1]():
+                if user_id not in candidates and all(test(user_id) for test in others):
+                    candidates.add(user_id)
+        return candidates
+
+    def _score(self, profile: Dict[str, Any], listing: Dict[str, Any],
+               location_scores: Dict[str, float], type_scores: Dict[str, float]) -> float:
+        """Score de calculate_match_score avec les meilleurs ville et type du profil"""
+        matcher = self.matcher
+        weights = matcher.weight_config
+
+        scores = {
+            'price': matcher._calculate_price_score(
+                listing, {'budget_min': profile['budget_min'], 'budget_max': profile['budget_max']}
+            )[0],
+            'location': max((location_scores[location] for location in profile['locations']),
+                            default=NEUTRAL_SCORE),
+            'property_type': max((type_scores[property_type] for property_type in profile['property_types']),
+                                 default=NEUTRAL_SCORE),
+            'surface': matcher._calculate_surface_score(listing, {'surface_min': profile['surface_min']})[0],
+            'bedrooms': matcher._calculate_bedrooms_score(listing, {'bedrooms': profile['bedrooms_min']})[0],
+        }
+        for criterion in NEUTRAL_CRITERIA:
+            scores[criterion] = NEUTRAL_SCORE
+
+        total_weight = sum(weights.values())
+        total = sum(weights[criterion] * score for criterion, score in scores.items())
+        return min(1.0, max(0.0, total / total_weight))
+
+
+_reverse_matcher = None
+_reverse_matcher_lock = threading.Lock()
+
+
+def get_reverse_matcher() -> ReverseMatcher:
+    """Retourne l'instance du matcher inverse"""
+    global _reverse_matcher
+    with _reverse_matcher_lock:
+        if _reverse_matcher is None:
+            _reverse_matcher = ReverseMatcher()
+        return _reverse_matcher
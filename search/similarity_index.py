@@ -0,0 +1,577 @@
+"""
+Index approché des annonces similaires
+Chaque annonce devient un vecteur de caractéristiques normalisées (prix et
+surface en log, chambres, type en one-hot, position, niveaux de standing,
+calme et luminosité) ; les voisins sont cherchés par hachage sensible à la
+localité (projections aléatoires) puis classés exactement
+"""
+import logging
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import MAP_CONFIG, PROPERTY_TYPES
+from database.change_log import DELETE
+from database.rows import RowSet
+
+logger = logging.getLogger(__name__)
+
+# Colonnes lues pour les vecteurs (fetch_property_columns)
+VECTOR_COLUMNS = [
+    'price', 'surface_total', 'bedrooms', 'property_type', 'latitude', 'longitude',
+    'luxury_level', 'quietness_level', 'brightness_level',
+]
+
+# Poids de chaque caractéristique dans la distance (mêmes proportions que
+# l'ancien score de similarité) et écart valant une unité de distance
+FEATURE_WEIGHTS = {
+    'price': 0.3,
+    'property_type': 0.25,
+    'surface': 0.2,
+    'bedrooms': 0.15,
+    'location': 0.15,
+    'levels': 0.05,   # Par niveau (standing, calme, luminosité)
+}
+PRICE_UNIT = 0.2         # Écart de log-prix (environ ±20 %)
+SURFACE_UNIT = 0.3       # Écart de log-surface (environ ±30 %)
+BEDROOMS_UNIT = 1.0
+LOCATION_UNIT_KM = 10.0
+LEVEL_UNIT = 2.0
+
+# Valeurs de remplacement des colonnes vides (et référence des écarts)
+REFERENCE_PRICE = 400000.0
+REFERENCE_SURFACE = 80.0
+REFERENCE_BEDROOMS = 2.0
+REFERENCE_LEVEL = 3.0
+REFERENCE_LOCATION = tuple(MAP_CONFIG['default_location'])
+KM_PER_DEGREE = 111.2
+
+LEVEL_COLUMNS = ['luxury_level', 'quietness_level', 'brightness_level']
+_TYPE_INDEX = {property_type: index for index, property_type in enumerate(PROPERTY_TYPES)}
+_TYPE_OFFSET = 3
+_LOCATION_OFFSET = _TYPE_OFFSET + len(PROPERTY_TYPES) + 1   # + 1 : types hors liste
+_LEVEL_OFFSET = _LOCATION_OFFSET + 2
+VECTOR_DIMENSIONS = _LEVEL_OFFSET + len(LEVEL_COLUMNS)
+
+DEFAULT_TABLES = 12          # Tables de hachage
+DEFAULT_HASHES = 6           # Projections concaténées par table
+DEFAULT_NEIGHBORS_SAMPLE = 128
+DEFAULT_WIDTH_FACTOR = 4.0   # Largeur des seaux / distance médiane au 10e voisin
+DEFAULT_COMPACT_RATIO = 0.25  # Part d'ajouts et de retraits avant reconstruction des tables
+
+
+def similarity_from_distance(squared_distance):
+    """Similarité dans ]0, 1] d'une distance au carré (1 pour deux annonces identiques)"""
+    return 1.0 / (1.0 + squared_distance)
+
+
+def listing_vectors(columns: Dict[str, Sequence[Any]]) -> np.ndarray:
+    """
+    Vecteurs de caractéristiques d'un lot d'annonces
+
+    La distance euclidienne au carré entre deux vecteurs est la somme des
+    écarts de chaque caractéristique (rapportés à leur unité, au carré)
+    multipliés par leur poids. Les valeurs absentes prennent la valeur de
+    référence (une annonce sans coordonnées est placée au centre de la carte).
+
+    Args:
+        columns: Colonne -> valeurs (VECTOR_COLUMNS, None pour NULL)
+
+    Returns:
+        np.ndarray: Matrice float32 (annonces x VECTOR_DIMENSIONS)
+    """
+    count = len(columns['price'])
+
+    def numeric(column: str, default: float) -> np.ndarray:
+        values = columns.get(column)
+        if values is None:
+            return np.full(count, default)
+        array = np.array([np.nan if value is None else value for value in values], dtype=np.float64).reshape(count)
+        array[~np.isfinite(array)] = default
+        return array
+
+    vectors = np.zeros((count, VECTOR_DIMENSIONS), dtype=np.float32)
+
+    price = numeric('price', REFERENCE_PRICE)
+    price[price <= 0] = REFERENCE_PRICE
+    vectors[:, 0] = np.log(price / REFERENCE_PRICE) / PRICE_UNIT * math.sqrt(FEATURE_WEIGHTS['price'])
+
+    surface = numeric('surface_total', REFERENCE_SURFACE)
+    surface[surface <= 0] = REFERENCE_SURFACE
+    vectors[:, 1] = np.log(surface / REFERENCE_SURFACE) / SURFACE_UNIT * math.sqrt(FEATURE_WEIGHTS['surface'])
+
+    bedrooms = numeric('bedrooms', REFERENCE_BEDROOMS)
+    vectors[:, 2] = (bedrooms - REFERENCE_BEDROOMS) / BEDROOMS_UNIT * math.sqrt(FEATURE_WEIGHTS['bedrooms'])
+
+    # Deux types différents : écart de poids property_type
+    type_positions = np.array(
+        [_TYPE_INDEX.get(value, len(PROPERTY_TYPES)) for value in columns['property_type']], dtype=np.int64
+    ).reshape(count)
+    vectors[np.arange(count), _TYPE_OFFSET + type_positions] = math.sqrt(FEATURE_WEIGHTS['property_type'] / 2)
+
+    # Projection équirectangulaire en km autour de la référence
+    reference_lat, reference_lon = REFERENCE_LOCATION
+    latitude = numeric('latitude', reference_lat)
+    longitude = numeric('longitude', reference_lon)
+    missing = np.array(
+        [lat is None or lon is None for lat, lon in zip(columns['latitude'], columns['longitude'])], dtype=bool
+    ).reshape(count)
+    latitude[missing], longitude[missing] = reference_lat, reference_lon
+    location_scale = KM_PER_DEGREE / LOCATION_UNIT_KM * math.sqrt(FEATURE_WEIGHTS['location'])
+    vectors[:, _LOCATION_OFFSET] = (latitude - reference_lat) * location_scale
+    vectors[:, _LOCATION_OFFSET + 1] = (longitude - reference_lon) * np.cos(np.radians(latitude)) * location_scale
+
+    for offset, column in enumerate(LEVEL_COLUMNS):
+        level = numeric(column, REFERENCE_LEVEL)
+        vectors[:, _LEVEL_OFFSET + offset] = (level - REFERENCE_LEVEL) / LEVEL_UNIT * math.sqrt(FEATURE_WEIGHTS['levels'])
+
+    return vectors
+
+
+def listing_vector(listing: Dict[str, Any]) -> np.ndarray:
+    """Vecteur d'une annonce (dict de ligne de la table properties)"""
+    return listing_vectors({column: [listing.get(column)] for column in VECTOR_COLUMNS})[0]
+
+
+def rows_vectors(rows) -> Tuple[np.ndarray, np.ndarray]:
+    """IDs et vecteurs des lignes de fetch_property_columns(VECTOR_COLUMNS)"""
+    count = len(rows)
+    columns = list(zip(*rows.rows)) if count else [()] * len(rows.columns)
+    by_name = dict(zip(rows.columns, columns))
+    ids = np.fromiter(by_name['id'], dtype=np.int64, count=count)
+    return ids, listing_vectors(by_name)
+
+
+class SimilarityIndex:
+    """
+    Index LSH (projections aléatoires p-stables) des vecteurs d'annonces
+
+        index = SimilarityIndex()
+        index.build(ids, vectors)
+        index.query(vector, limit=5, exclude={property_id})
+
+    Chaque table hache un vecteur en concaténant hashes projections
+    floor((a.x + b) / w) : des vecteurs proches partagent un seau dans au
+    moins une table avec une forte probabilité. Les candidats des seaux du
+    vecteur cherché sont classés par distance exacte ; s'ils sont moins
+    nombreux que demandé, tout l'index est parcouru.
+
+    build() trie les clés de chaque table (recherche par dichotomie) ;
+    upsert() et remove() tiennent à jour des seaux complémentaires en
+    mémoire, refondus dans les tables triées au-delà de compact_ratio
+    ajouts et retraits. La largeur w est déduite des données à la
+    construction (distance médiane au 10e voisin d'un échantillon).
+    """
+
+    def __init__(self, tables: int = DEFAULT_TABLES, hashes: int = DEFAULT_HASHES,
+                 bucket_width: Optional[float] = None, compact_ratio: float = DEFAULT_COMPACT_RATIO,
+                 seed: int = 0):
+        self.tables = tables
+        self.hashes = hashes
+        self.bucket_width = bucket_width
+        self.compact_ratio = compact_ratio
+
+        random = np.random.default_rng(seed)
+        self._projections = random.standard_normal((VECTOR_DIMENSIONS, tables * hashes)).astype(np.float32)
+        self._offsets = random.random(tables * hashes).astype(np.float32)
+        self._multipliers = random.integers(1, 2 ** 62, size=hashes, dtype=np.int64) | 1
+
+        self._ids = np.empty(0, dtype=np.int64)
+        self._vectors = np.empty((0, VECTOR_DIMENSIONS), dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+        self._size = 0           # Positions utilisées (triées puis ajoutées)
+        self._base_size = 0      # Positions couvertes par les tables triées, par id croissant
+        self._dead = 0
+        self._base_keys: List[np.ndarray] = []
+        self._base_order: List[np.ndarray] = []
+        self._added_buckets: List[Dict[int, List[int]]] = []
+        self._added_positions: Dict[int, int] = {}
+        self._lock = threading.RLock()
+        self._metrics = {'builds': 0, 'compactions': 0, 'queries': 0, 'exhaustive_queries': 0, 'candidates': 0}
+
+    def __len__(self) -> int:
+        return self._size - self._dead
+
+    def build(self, ids: Sequence[int], vectors: np.ndarray):
+        """Reconstruit l'index (ids uniques, vecteurs de listing_vectors)"""
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        order = np.argsort(ids, kind='stable')
+        ids, vectors = ids[order], vectors[order]
+
+        with self._lock:
+            if self.bucket_width is None and len(ids):
+                self.bucket_width = _bucket_width(vectors)
+            self._reset(ids, vectors)
+            self._metrics['builds'] += 1
+
+    def upsert(self, ids: Sequence[int], vectors: np.ndarray):
+        """Ajoute des annonces ou remplace leur vecteur"""
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(ids), VECTOR_DIMENSIONS)
+        if not len(ids):
+            return
+
+        with self._lock:
+            if self.bucket_width is None:
+                self.build(ids, vectors)
+                return
+            self._remove(ids)
+            self._grow(len(ids))
+
+            start = self._size
+            positions = np.arange(start, start + len(ids))
+            self._ids[positions] = ids
+            self._vectors[positions] = vectors
+            self._alive[positions] = True
+            self._size += len(ids)
+
+            keys = self._keys(vectors)
+            for row, position in enumerate(positions.tolist()):
+                self._added_positions[int(ids[row])] = position
+                for table, buckets in enumerate(self._added_buckets):
+                    buckets.setdefault(int(keys[row, table]), []).append(position)
+            self._maybe_compact()
+
+    def remove(self, ids: Iterable[int]):
+        """Retire des annonces (les ids absents sont ignorés)"""
+        with self._lock:
+            self._remove(np.asarray(list(ids), dtype=np.int64))
+            self._maybe_compact()
+
+    def ids(self) -> np.ndarray:
+        """IDs indexés, croissants"""
+        with self._lock:
+            return np.sort(self._ids[:self._size][self._alive[:self._size]])
+
+    def vector_of(self, property_id: int) -> Optional[np.ndarray]:
+        """Vecteur indexé d'une annonce (None si absente)"""
+        with self._lock:
+            position = self._position(property_id)
+            return None if position is None else self._vectors[position].copy()
+
+    def query(self, vector: np.ndarray, limit: int = 5, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """
+        Annonces les plus proches d'un vecteur
+
+        Returns:
+            List[Tuple[int, float]]: (id, similarité), par similarité décroissante puis id
+        """
+        vector = np.asarray(vector, dtype=np.float32).reshape(VECTOR_DIMENSIONS)
+        excluded = np.asarray(list(exclude), dtype=np.int64)
+
+        with self._lock:
+            self._metrics['queries'] += 1
+            if limit <= 0 or not len(self):
+                return []
+
+            candidates = self._candidates(vector)
+            candidates = candidates[self._alive[candidates]]
+            if len(excluded):
+                candidates = candidates[~np.isin(self._ids[candidates], excluded)]
+            if len(candidates) < limit:
+                self._metrics['exhaustive_queries'] += 1
+                candidates = np.flatnonzero(self._alive[:self._size])
+                if len(excluded):
+                    candidates = candidates[~np.isin(self._ids[candidates], excluded)]
+            self._metrics['candidates'] += len(candidates)
+
+            differences = self._vectors[candidates] - vector
+            distances = np.einsum('ij,ij->i', differences, differences)
+            ids = self._ids[candidates]
+
+        if len(candidates) > limit:
+            nearest = np.argpartition(distances, limit - 1)[:limit]
+            distances, ids = distances[nearest], ids[nearest]
+        order = np.lexsort((ids, distances))
+        return [(int(ids[i]), float(similarity_from_distance(distances[i]))) for i in order]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Taille, largeur des seaux et compteurs de requêtes"""
+        with self._lock:
+            return dict(self._metrics, size=len(self), added=self._size - self._base_size,
+                        dead=self._dead, bucket_width=self.bucket_width)
+
+    # === MÉTHODES PRIVÉES ===
+
+    def _reset(self, ids: np.ndarray, vectors: np.ndarray):
+        """Tables triées sur des ids croissants, sans ajout en attente"""
+        self._ids = ids.copy()
+        self._vectors = vectors.copy()
+        self._alive = np.ones(len(ids), dtype=bool)
+        self._size = self._base_size = len(ids)
+        self._dead = 0
+        self._added_positions = {}
+        self._added_buckets = [{} for _ in range(self.tables)]
+
+        keys = self._keys(vectors) if len(ids) else np.empty((0, self.tables), dtype=np.int64)
+        self._base_order = []
+        self._base_keys = []
+        for table in range(self.tables):
+            order = np.argsort(keys[:, table], kind='stable').astype(np.int32)
+            self._base_order.append(order)
+            self._base_keys.append(keys[order, table])
+
+    def _keys(self, vectors: np.ndarray) -> np.ndarray:
+        """Clé de seau de chaque vecteur dans chaque table (annonces x tables)"""
+        projected = np.floor((vectors @ self._projections) / self.bucket_width + self._offsets).astype(np.int64)
+        projected = projected.reshape(len(vectors), self.tables, self.hashes)
+        # Débordement d'entiers voulu : combinaison des projections en une clé
+        return (projected * self._multipliers).sum(axis=2)
+
+    def _candidates(self, vector: np.ndarray) -> np.ndarray:
+        """Positions partageant un seau avec le vecteur (mortes comprises)"""
+        keys = self._keys(vector.reshape(1, -1))[0]
+        parts = []
+        for table in range(self.tables):
+            key = keys[table]
+            base_keys = self._base_keys[table]
+            start = np.searchsorted(base_keys, key, side='left')
+            end = np.searchsorted(base_keys, key, side='right')
+            if end > start:
+                parts.append(self._base_order[table][start:end])
+            added = self._added_buckets[table].get(int(key))
+            if added:
+                parts.append(np.asarray(added, dtype=np.int32))
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts)).astype(np.int64)
+
+    def _position(self, property_id: int) -> Optional[int]:
+        """Position vivante d'une annonce"""
+        position = self._added_positions.get(int(property_id))
+        if position is None:
+            found = int(np.searchsorted(self._ids[:self._base_size], property_id))
+            if found < self._base_size and self._ids[found] == property_id:
+                position = found
+        if position is None or not self._alive[position]:
+            return None
+        return position
+
+    def _remove(self, ids: np.ndarray):
+        """Marque les positions des annonces comme mortes"""
+        for property_id in ids.tolist():
+            position = self._position(property_id)
+            if position is not None:
+                self._alive[position] = False
+                self._dead += 1
+                self._added_positions.pop(property_id, None)
+
+    def _grow(self, count: int):
+        """Capacité des tableaux pour count positions de plus"""
+        needed = self._size + count
+        if needed <= len(self._ids):
+            return
+        capacity = max(needed, 2 * len(self._ids), 1024)
+        ids = np.empty(capacity, dtype=np.int64)
+        vectors = np.empty((capacity, VECTOR_DIMENSIONS), dtype=np.float32)
+        alive = np.zeros(capacity, dtype=bool)
+        ids[:self._size] = self._ids[:self._size]
+        vectors[:self._size] = self._vectors[:self._size]
+        alive[:self._size] = self._alive[:self._size]
+        self._ids, self._vectors, self._alive = ids, vectors, alive
+
+    def _maybe_compact(self):
+        """Refond les ajouts et retire les positions mortes au-delà de compact_ratio"""
+        pending = (self._size - self._base_size) + self._dead
+        if pending <= max(1, self._base_size) * self.compact_ratio:
+            return
+        alive = np.flatnonzero(self._alive[:self._size])
+        order = alive[np.argsort(self._ids[alive], kind='stable')]
+        self._reset(self._ids[order], self._vectors[order])
+        self._metrics['compactions'] += 1
+
+
+def _bucket_width(vectors: np.ndarray, sample: int = DEFAULT_NEIGHBORS_SAMPLE, neighbor: int = 10) -> float:
+    """Largeur des seaux : DEFAULT_WIDTH_FACTOR x distance médiane au 10e voisin d'un échantillon"""
+    count = len(vectors)
+    neighbor = min(neighbor, count - 1)
+    if neighbor < 1:
+        return 1.0
+    positions = np.random.default_rng(0).choice(count, size=min(sample, count), replace=False)
+    norms = np.einsum('ij,ij->i', vectors, vectors)
+
+    distances = []
+    for start in range(0, len(positions), 16):
+        queries = vectors[positions[start:start + 16]]
+        squared = norms[None, :] - 2 * (queries @ vectors.T) + np.einsum('ij,ij->i', queries, queries)[:, None]
+        # Colonne 0 : le point lui-même
+        nearest = np.partition(squared, neighbor, axis=1)[:, neighbor]
+        distances.append(np.sqrt(np.maximum(nearest, 0)))
+    width = float(np.median(np.concatenate(distances))) * DEFAULT_WIDTH_FACTOR
+    return width if width > 0 else 1.0
+
+
+class SimilarListings:
+    """
+    Annonces similaires servies par un SimilarityIndex des annonces actives
+
+    L'index est construit dans un thread de fond au premier appel de
+    similar() (ou par rebuild() hors requête) ; en attendant, similar() ne
+    retourne rien. Il est ensuite synchronisé à chaque appel depuis le
+    compteur de modifications : seules les annonces modifiées depuis la
+    version indexée sont relues et réindexées, et les annonces supprimées
+    sont lues dans le journal des modifications puis retirées. Un journal
+    compacté au-delà de la position lue relance une construction de fond,
+    l'index en place restant servi.
+    """
+
+    def __init__(self, db=None, **index_options):
+        if db is None:
+            from database.manager import get_database
+            db = get_database()
+        self.db = db
+        self.index_options = index_options
+        self.index = SimilarityIndex(**index_options)
+
+        self._version = None
+        self._deletions = None
+        self._log_position = 0
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_thread: Optional[threading.Thread] = None
+
+    def is_ready(self) -> bool:
+        """True une fois l'index construit"""
+        return self._version is not None
+
+    def similar(self, property_id: int, limit: int = 5, min_similarity: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Annonces actives les plus proches d'une annonce
+
+        Une annonce hors index (vendue, retirée) est relue en base et
+        comparée aux annonces actives. Ne construit pas l'index dans
+        l'appel : liste vide tant que la construction de fond n'est pas
+        terminée.
+
+        Returns:
+            List[Tuple[int, float]]: (id, similarité), par similarité décroissante
+        """
+        self.sync(blocking=False)
+        if not self.is_ready():
+            return []
+        vector = self.index.vector_of(property_id)
+        if vector is None:
+            listing = self.db.get_property_by_id(property_id)
+            if not listing:
+                return []
+            vector = listing_vector(listing)
+        return self.similar_to_vector(vector, limit, min_similarity, exclude=(property_id,))
+
+    def similar_to_vector(self, vector: np.ndarray, limit: int = 5, min_similarity: float = 0.0,
+                          exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """Annonces actives les plus proches d'un vecteur (voir listing_vector), sans synchronisation"""
+        return [
+            (property_id, similarity) for property_id, similarity in self.index.query(vector, limit, exclude)
+            if similarity >= min_similarity
+        ]
+
+    def sync(self, blocking: bool = True):
+        """
+        Reporte dans l'index les annonces modifiées ou supprimées
+
+        Args:
+            blocking: Construire l'index dans l'appel s'il ne l'est pas (tâches
+                de fond) ; sinon la construction est lancée dans un thread
+                et l'index en place est servi (requêtes)
+        """
+        if blocking and not self.is_ready():
+            self.rebuild()
+
+        rebuild = False
+        with self._lock:
+            if not self.is_ready():
+                self._start_rebuild()
+                return
+
+            counter = self.db.get_property_change_counter()
+            if counter['deletions'] != self._deletions and not self._remove_deleted(counter):
+                # Suppressions illisibles : reconstruction, l'index en place reste servi d'ici là
+                if blocking:
+                    rebuild = True
+                else:
+                    self._start_rebuild()
+            if counter['version'] != self._version:
+                changes = self.db.fetch_property_columns(VECTOR_COLUMNS, since_version=self._version)
+                status = changes.index_of('listing_status')
+                self.index.remove(changes.column('id'))
+                active = [row for row in changes if row[status] == 'active']
+                if active:
+                    self.index.upsert(*rows_vectors(RowSet(changes.columns, active)))
+                self._version = counter['version']
+
+        if rebuild:
+            self.rebuild()
+
+    def rebuild(self) -> Dict[str, Any]:
+        """Reconstruit l'index depuis la base (à exécuter hors requête)"""
+        with self._rebuild_lock:
+            # Compteur et position du journal lus avant les lignes : une écriture intercalée sera relue
+            counter = self.db.get_property_change_counter()
+            position = self.db.get_change_log_head()
+            ids, vectors = rows_vectors(self.db.fetch_property_columns(VECTOR_COLUMNS))
+            index = SimilarityIndex(**self.index_options)
+            index.build(ids, vectors)
+
+            with self._lock:
+                self.index = index
+                self._version = counter['version']
+                self._deletions = counter['deletions']
+                self._log_position = position
+        logger.info(f"Index des annonces similaires construit: {len(ids)} annonces")
+        return index.get_metrics()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Métriques de l'index et version indexée"""
+        return dict(self.index.get_metrics(), version=self._version)
+
+    def _remove_deleted(self, counter: Dict[str, int]) -> bool:
+        """Retire de l'index les annonces supprimées depuis la position lue ; False si le journal a été compacté"""
+        deleted = []
+        position = self._log_position
+        while True:
+            batch = self.db.read_property_changes(position)
+            if batch['reset']:
+                logger.warning("Journal compacté au-delà de la position de l'index des annonces similaires")
+                return False
+            position = batch['position']
+            if not batch['changes']:
+                break
+            deleted.extend(change['property_id'] for change in batch['changes'] if change['op'] == DELETE)
+
+        if deleted:
+            self.index.remove(np.asarray(deleted, dtype=np.int64))
+        self._log_position = position
+        self._deletions = counter['deletions']
+        return True
+
+    def _start_rebuild(self):
+        """Lance rebuild() dans un thread de fond s'il ne tourne pas déjà (appelée sous _lock)"""
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            return
+        self._rebuild_thread = threading.Thread(
+            target=self._run_rebuild, name='similar-listings-rebuild', daemon=True
+        )
+        self._rebuild_thread.start()
+
+    def _run_rebuild(self):
+        """Corps du thread de reconstruction"""
+        try:
+            self.rebuild()
+        except Exception as e:
+            logger.error(f"Erreur construction de l'index des annonces similaires: {e}")
+
+
+_similar_listings = None
+_similar_listings_lock = threading.Lock()
+
+
+def get_similar_listings() -> SimilarListings:
+    """Index partagé des annonces similaires de l'instance globale db_manager"""
+    global _similar_listings
+    with _similar_listings_lock:
+        if _similar_listings is None:
+            _similar_listings = SimilarListings()
+        return _similar_listings
@@ -0,0 +1,207 @@
+"""
+Table des annonces similaires, tenue à jour en tâche de fond
+Le premier passage calcule les voisines de toutes les annonces actives
+(property_similarity) ; les suivants ne recalculent que les annonces créées,
+modifiées sur une caractéristique des vecteurs ou retirées (journal des
+modifications) et les listes où elles figurent
+"""
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from database.change_log import DELETE
+from search.similarity_index import VECTOR_COLUMNS, SimilarListings, SimilarityIndex, get_similar_listings
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_CONSUMER = 'property_similarity'
+
+STORED_NEIGHBORS = 20       # Voisines enregistrées par annonce (marge pour les annonces retirées depuis)
+WRITE_BATCH_SIZE = 500      # Listes enregistrées par transaction
+DEFAULT_INTERVAL = 300.0    # Secondes entre deux passages du thread de fond
+
+# Colonnes des vecteurs : la modification d'autres colonnes ne change aucune similarité
+SIMILARITY_COLUMNS = frozenset(VECTOR_COLUMNS) | {'listing_status'}
+
+
+class SimilarityTableWorker:
+    """
+    Précalcul incrémental des annonces similaires
+
+    run_once() lit le journal des modifications depuis la position du
+    consommateur SIMILARITY_CONSUMER. Une annonce créée ou modifiée (prix,
+    surface, type, position, niveaux, statut) voit sa liste recalculée,
+    ainsi que les listes où elle figurait et celles de ses nouvelles
+    voisines ; une annonce supprimée ou désactivée perd sa liste et les
+    listes où elle figurait sont recalculées. Au premier passage, ou si le
+    journal a été compacté au-delà de la position, toutes les listes sont
+    recalculées.
+
+    start() exécute run_once() toutes les interval secondes dans un thread
+    de fond ; utils.helpers.refresh_similar_properties() permet de le
+    planifier ailleurs.
+    """
+
+    def __init__(self, db=None, similar_listings: Optional[SimilarListings] = None,
+                 consumer: str = SIMILARITY_CONSUMER, neighbors: int = STORED_NEIGHBORS):
+        if similar_listings is None:
+            similar_listings = get_similar_listings() if db is None else SimilarListings(db)
+        if db is None:
+            from database.manager import get_database
+            db = get_database()
+        self.db = db
+        self.similar_listings = similar_listings
+        self.consumer = consumer
+        self.neighbors = neighbors
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> Dict[str, Any]:
+        """
+        Met à jour la table depuis le passage précédent
+
+        Returns:
+            Dict[str, Any]: changes (entrées du journal lues), computed
+            (listes recalculées), removed (listes supprimées), full
+            (recalcul complet), position
+        """
+        with self._lock:
+            summary = {'changes': 0, 'computed': 0, 'removed': 0, 'full': False}
+
+            position = self.db.get_feed_cursor(self.consumer)
+            if position is None:
+                return self._recompute_all(summary)
+
+            touched: Set[int] = set()
+            removed: Set[int] = set()
+            while True:
+                batch = self.db.read_property_changes(position)
+                if batch['reset']:
+                    logger.warning("Journal compacté au-delà de la position des similarités : recalcul complet")
+                    return self._recompute_all(summary)
+                position = batch['position']
+                if not batch['changes']:
+                    break
+                summary['changes'] += len(batch['changes'])
+                for change in batch['changes']:
+                    property_id = change['property_id']
+                    if change['op'] == DELETE:
+                        touched.discard(property_id)
+                        removed.add(property_id)
+                    elif change['changed_columns'] is None or not SIMILARITY_COLUMNS.isdisjoint(change['changed_columns']):
+                        touched.add(property_id)
+                        removed.discard(property_id)
+
+            if (touched or removed) and not self._refresh(touched, removed, summary):
+                # Position inchangée : les modifications seront relues au prochain passage
+                return summary
+
+            self.db.set_feed_cursor(self.consumer, position)
+            summary['position'] = position
+            if summary['computed'] or summary['removed']:
+                logger.info(f"Annonces similaires: {summary}")
+            return summary
+
+    def start(self, interval: float = DEFAULT_INTERVAL) -> bool:
+        """Lance le thread de fond ; False s'il tourne déjà"""
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(interval,), name='property-similarity', daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self, timeout: Optional[float] = None):
+        """Arrête le thread de fond après le passage en cours"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # === MÉTHODES PRIVÉES ===
+
+    def _run(self, interval: float):
+        """Boucle du thread de fond"""
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Erreur mise à jour des annonces similaires: {e}")
+            self._stop.wait(interval)
+
+    def _recompute_all(self, summary: Dict[str, Any]) -> Dict[str, Any]:
+        """Recalcule les listes de toutes les annonces actives"""
+        # Position lue avant l'index : une écriture intercalée sera relue
+        position = self.db.get_change_log_head()
+        self.similar_listings.sync()
+        index = self.similar_listings.index
+
+        property_ids = index.ids().tolist()
+        for start in range(0, len(property_ids), WRITE_BATCH_SIZE):
+            neighbors, _ = self._compute(index, property_ids[start:start + WRITE_BATCH_SIZE])
+            if not self.db.save_property_similarities(neighbors):
+                return summary
+            summary['computed'] += len(neighbors)
+        summary['removed'] = self.db.prune_property_similarities()
+
+        self.db.set_feed_cursor(self.consumer, position)
+        summary.update(full=True, position=position)
+        logger.info(f"Annonces similaires recalculées: {summary}")
+        return summary
+
+    def _refresh(self, touched: Set[int], removed: Set[int], summary: Dict[str, Any]) -> bool:
+        """Recalcule les listes touchées par des annonces modifiées ou retirées"""
+        self.similar_listings.sync()
+        index = self.similar_listings.index
+
+        neighbors, inactive = self._compute(index, touched)
+        removed = removed | inactive
+
+        # Listes où figuraient les annonces, et nouvelles voisines des annonces modifiées
+        affected = self.db.get_similarity_referrers(touched | removed)
+        for similar in neighbors.values():
+            affected.update(similar_id for similar_id, _ in similar)
+        affected -= set(neighbors) | removed
+
+        recomputed, inactive = self._compute(index, affected)
+        neighbors.update(recomputed)
+        removed |= inactive
+
+        items = list(neighbors.items())
+        for start in range(0, max(len(items), 1), WRITE_BATCH_SIZE):
+            batch = dict(items[start:start + WRITE_BATCH_SIZE])
+            if not self.db.save_property_similarities(batch, removed if start == 0 else ()):
+                return False
+        summary['computed'] += len(neighbors)
+        summary['removed'] += len(removed)
+        return True
+
+    def _compute(self, index: SimilarityIndex,
+                 property_ids: Iterable[int]) -> Tuple[Dict[int, List[Tuple[int, float]]], Set[int]]:
+        """Voisines des annonces indexées, et annonces absentes de l'index (inactives)"""
+        neighbors: Dict[int, List[Tuple[int, float]]] = {}
+        inactive: Set[int] = set()
+        for property_id in property_ids:
+            vector = index.vector_of(property_id)
+            if vector is None:
+                inactive.add(property_id)
+            else:
+                neighbors[property_id] = index.query(vector, self.neighbors, exclude=(property_id,))
+        return neighbors, inactive
+
+
+_similarity_worker = None
+_similarity_worker_lock = threading.Lock()
+
+
+def get_similarity_worker() -> SimilarityTableWorker:
+    """Retourne l'instance de la tâche des annonces similaires"""
+    global _similarity_worker
+    with _similarity_worker_lock:
+        if _similarity_worker is None:
+            _similarity_worker = SimilarityTableWorker()
+        return _similarity_worker
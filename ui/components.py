@@ -12,6 +12,7 @@ import logging
 from config.settings import COLORS
 from database.manager import get_database
 from auth.authentication import get_current_user
+from search.engine import get_search_engine
 
 logger = logging.getLogger(__name__)
 
@@ -223,6 +224,18 @@ def _show_property_details(property_data: Dict) -> None:
             for i, feature in enumerate(features):
                 with cols[i % 3]:
                     st.write(f"• {feature}")
+        
+        # Biens similaires (table précalculée, voir search.similarity_table)
+        similar_properties = get_search_engine().get_similar_properties(property_data['id'], limit=3)
+        if similar_properties:
+            st.markdown("#### 🏘️ Biens similaires")
+            cols = st.columns(len(similar_properties))
+            for col, similar in zip(cols, similar_properties):
+                with col:
+                    st.write(f"**{similar['title']}**")
+                    price = f"{similar['price']:,}€" if similar.get('price') is not None else "Prix non communiqué"
+                    st.write(f"{price} • {similar.get('city') or ''}")
+                    st.caption(f"Similarité : {similar['similarity_score']:.0%}")
 
 def _show_contact_info(property_data: Dict) -> None:
     """Affiche les informations de contact"""
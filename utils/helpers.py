@@ -684,12 +684,13 @@ def import_sample_properties() -> bool:
             }
         ]
         
-        # Ajouter les propriétés
-        for prop in sample_properties:
-            db.add_property(prop)
+        # Ajouter (ou mettre à jour) les propriétés en un seul lot
+        for index, prop in enumerate(sample_properties, 1):
+            prop['external_ref'] = f"sample-{index}"
+        stats = db.bulk_upsert_properties(sample_properties)
         
-        logger.info(f"{len(sample_properties)} propriétés d'exemple ajoutées")
-        return True
+        logger.info(f"{stats['rows']} propriétés d'exemple importées")
+        return stats['rows'] > 0
         
     except Exception as e:
         logger.error(f"Erreur import propriétés d'exemple: {e}")
@@ -764,27 +765,99 @@ def send_notification_email(to_email: str, subject: str, message: str) -> bool:
     logger.info(f"Email simulé envoyé à {to_email}: {subject}")
     return True
 
-def create_property_alerts_check():
+def create_property_alerts_check() -> Dict[str, int]:
     """
     Vérifie les nouvelles propriétés correspondant aux alertes utilisateurs
     (À exécuter périodiquement)
+    
+    Seules les annonces créées ou modifiées depuis la vérification précédente
+    sont confrontées aux recherches avec alertes (voir search.alerts) ; le
+    journal des modifications est ensuite compacté.
+    
+    Returns:
+        Dict[str, int]: Bilan du passage (annonces lues, emails envoyés...)
     """
     try:
-        from database.manager import get_database
-        db = get_database()
-        
-        # Récupérer toutes les recherches avec alertes activées
-        # (nécessite une requête SQL personnalisée)
-        
-        # Pour chaque recherche sauvegardée avec alerte
-        # 1. Exécuter la recherche
-        # 2. Comparer avec les résultats précédents
-        # 3. Envoyer une notification si nouvelles propriétés
+        from search.alerts import get_alert_engine
+        alert_engine = get_alert_engine()
+        summary = alert_engine.run_once()
+        alert_engine.db.compact_change_log()
         
         logger.info("Vérification des alertes propriétés effectuée")
+        return summary
         
     except Exception as e:
         logger.error(f"Erreur vérification alertes: {e}")
+        return {}
+
+def rebuild_collaborative_recommendations() -> Dict[str, int]:
+    """
+    Recalcule la table des voisins du filtrage collaboratif hors requête
+    (À exécuter périodiquement)
+    
+    Les favoris ajoutés ou retirés entre deux passages sont intégrés à la
+    volée par search.matching.CollaborativeFilter.
+    
+    Returns:
+        Dict[str, int]: Taille de la matrice et de la table des voisins
+    """
+    try:
+        from search.matching import get_collaborative_filter
+        metrics = get_collaborative_filter().rebuild()
+        
+        logger.info("Table du filtrage collaboratif recalculée")
+        return metrics
+        
+    except Exception as e:
+        logger.error(f"Erreur recalcul filtrage collaboratif: {e}")
+        return {}
+
+def rebuild_similarity_index() -> Dict[str, Any]:
+    """
+    Reconstruit l'index des annonces similaires hors requête
+    (À exécuter périodiquement ou après un import massif)
+    
+    Les annonces modifiées ou supprimées entre deux passages sont
+    reportées à la volée par search.similarity_index.SimilarListings.
+    
+    Returns:
+        Dict[str, Any]: Taille de l'index et largeur des seaux
+    """
+    try:
+        from search.similarity_index import get_similar_listings
+        metrics = get_similar_listings().rebuild()
+        
+        logger.info("Index des annonces similaires reconstruit")
+        return metrics
+        
+    except Exception as e:
+        logger.error(f"Erreur reconstruction index des annonces similaires: {e}")
+        return {}
+
+def refresh_similar_properties() -> Dict[str, Any]:
+    """
+    Met à jour la table des annonces similaires
+    (À exécuter périodiquement, ou get_similarity_worker().start() en tâche de fond)
+    
+    Seules les annonces créées, modifiées ou retirées depuis le passage
+    précédent sont recalculées (voir search.similarity_table) ; le journal
+    des modifications est ensuite compacté.
+    
+    Returns:
+        Dict[str, Any]: Bilan du passage (listes recalculées, supprimées...)
+    """
+    try:
+        from search.similarity_table import get_similarity_worker
+        worker = get_similarity_worker()
+        summary = worker.run_once()
+        worker.db.compact_change_log()
+        
+        logger.info("Table des annonces similaires mise à jour")
+        return summary
+        
+    except Exception as e:
+        logger.error(f"Erreur mise à jour annonces similaires: {e}")
+        return {}
 
 def validate_property_data(property_data: Dict[str, Any]) -> Tuple[bool, List[str]]:
     """